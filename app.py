@@ -2,12 +2,19 @@
 
 import streamlit as st
 import pandas as pd
-from datetime import date, timedelta
+from datetime import datetime
 from streamlit_option_menu import option_menu
 
 # Import core modules
-from src.data_loader import fetch_stock_data
-from src.views import dashboard, risk, ai_forecast, portfolio
+from src.fetch_service import get_fetch_service
+from src.dataset_cache import get_dataset_cache
+from src.data_loader import save_to_price_store, default_date_range, base_interval
+from src.snapshots import get_snapshot_store
+from src.scheduler import get_scheduler
+from src.alerts import AlertEngine, PERIODS_PER_YEAR, recent_alerts
+from src.quant_engine import get_field_panel
+from src import config
+from src.views import dashboard, risk, ai_forecast, portfolio, screener
 
 # --- 1. CONFIGURATION ---
 st.set_page_config(page_title="AlphaQuant Terminal", layout="wide", page_icon="⚡", initial_sidebar_state="expanded")
@@ -48,7 +55,8 @@ st.markdown("""
 # --- 3. STATE MANAGEMENT ---
 if 'tickers' not in st.session_state: 
     st.session_state.tickers = ["BTC-USD", "ETH-USD", "AAPL"]
-if 'df' not in st.session_state: st.session_state.df = None
+# Session chỉ giữ handle nhẹ tới dữ liệu trong cache dùng chung của process (không copy DataFrame)
+if 'dataset' not in st.session_state: st.session_state.dataset = None
 
 # Hàm callback: Thêm mã khi ấn Enter
 def add_ticker_callback():
@@ -65,9 +73,10 @@ with st.sidebar:
     st.write("") 
     nav_selection = option_menu(
         menu_title=None,
-        options=["Market Overview", "Risk Analysis (CFA)", "AI Forecast", "Portfolio Builder"],
-        icons=["graph-up-arrow", "shield-check", "cpu", "briefcase"], 
+        options=["Market Overview", "Risk Analysis (CFA)", "AI Forecast", "Portfolio Builder", "Screener"],
+        icons=["graph-up-arrow", "shield-check", "cpu", "briefcase", "funnel"], 
         default_index=0,
+        key="nav_selection",
         styles={
             "container": {"padding": "0!important", "background-color": "transparent"},
             "icon": {"color": "#848e9c", "font-size": "18px"}, 
@@ -76,6 +85,76 @@ with st.sidebar:
         }
     )
 
+    # Thống kê cache dùng chung toàn server (để sizing RAM)
+    with st.expander("🧠 Shared Data Cache", expanded=False):
+        cache_stats = get_dataset_cache().stats()
+        st.caption(f"Resident: **{cache_stats['resident_bytes'] / 1024 ** 2:,.1f} MB** / {cache_stats['budget_bytes'] / 1024 ** 2:,.0f} MB")
+        st.caption(f"Ticker frames: {cache_stats['frame_bytes'] / 1024 ** 2:,.1f} MB | Watchlist panels: {cache_stats['panel_bytes'] / 1024 ** 2:,.1f} MB ({cache_stats['panel_entries']})")
+        st.caption(f"Entries: {cache_stats['entries']} ({cache_stats['pinned_entries']} in use) | Session refs: {cache_stats['session_refs']}")
+        st.caption(f"Hit ratio: **{cache_stats['hit_ratio']:.1%}** ({cache_stats['hits']} hits / {cache_stats['misses']} misses) | Evictions: {cache_stats['evictions']}")
+        st.caption(f"Analytics snapshots pending: {get_snapshot_store().pending}")
+
+    # Báo cáo làm sạch dữ liệu (clean_panel) của watchlist đang xem - ghi nhận 1 lần lúc tải
+    if st.session_state.dataset is not None:
+        quality = st.session_state.dataset.quality_report()
+        issues = quality.drop(columns=["Bars", "Split details"]).sum(axis=1) if not quality.empty else None
+        with st.expander(f"🧪 Data Quality{f' ({int((issues > 0).sum())} flagged)' if issues is not None else ''}", expanded=False):
+            if quality.empty:
+                st.caption("No cleaning report (data cleaning disabled via `ALPHAQUANT_DATA_CLEANING`).")
+            else:
+                st.caption("Repaired: duplicates, non-positive prices, bad ticks, gaps, OHLC. Flagged only: split candidates, outliers, stale bars.")
+                st.dataframe(quality[issues > 0] if (issues > 0).any() else quality, use_container_width=True)
+
+    # Scheduler nền làm nóng cache cho các watchlist cấu hình sẵn
+    with st.expander("⏱️ Background Refresh", expanded=False):
+        refresh_status = get_scheduler().status()
+        if not refresh_status["jobs"]:
+            st.caption("Disabled. Set `ALPHAQUANT_REFRESH_WATCHLISTS` (e.g. `AAPL,MSFT@1d;BTC-USD@1h`) to enable.")
+        else:
+            st.caption(f"Queue depth: **{refresh_status['queue_depth']}** | Running: {refresh_status['running']}")
+            for job in refresh_status["jobs"]:
+                last = datetime.fromtimestamp(job["last_refresh"]).strftime('%d/%m %H:%M:%S') if job["last_refresh"] else "never"
+                state = "🔄" if job["running"] else ("⚠️" if job["last_error"] else "✅")
+                st.caption(f"{state} `{job['watchlist']}` | Last: {last} | Next in {job['next_in'] / 60:.0f} min"
+                           + (f" | {job['last_error']}" if job["last_error"] else ""))
+            if st.button("Refresh now", use_container_width=True):
+                get_scheduler().trigger()
+
+    # Cảnh báo: luật của scheduler (toàn server) + luật riêng của session trên watchlist đang xem
+    fresh_alerts = recent_alerts(st.session_state.get("alerts_seen_id", 0))
+    if fresh_alerts:
+        if "alerts_seen_id" in st.session_state:  # session mới không toast lại cảnh báo cũ
+            for event in fresh_alerts[:3]:
+                st.toast(event["message"], icon="🔔")
+        st.session_state.alerts_seen_id = fresh_alerts[0]["id"]
+    with st.expander("🔔 Alerts", expanded=False):
+        rules_text = st.text_area("Rules (one per line)", value=config.ALERT_RULES.replace("; ", "\n"), key="alert_rules",
+                                  height=150, help="volatility(span) > x | drawdown < x | zscore(span) < x | cross(fast, slow) [up|down] | var_breach(span, conf)")
+        if st.session_state.dataset is not None:
+            handle = st.session_state.dataset
+            cached = st.session_state.get("alert_eval")
+            if cached is None or cached[0] != (handle.key, rules_text):
+                try:
+                    engine = AlertEngine(rules_text, periods=PERIODS_PER_YEAR.get(handle.interval, 252))
+                    history = engine.ingest_panel(get_field_panel(handle.frame, 'Close'), notify=False, max_bars=config.ALERT_REPLAY_BARS)
+                    cached = ((handle.key, rules_text), engine.active(), history, None)
+                except ValueError as e:
+                    cached = ((handle.key, rules_text), None, [], str(e))
+                st.session_state.alert_eval = cached
+            _, active, history, error = cached
+            if error:
+                st.error(error)
+            elif active.empty:
+                st.caption(f"No rule active on the latest bar ({len(history)} alerts in loaded history).")
+            else:
+                st.caption(f"Active on the latest bar ({len(history)} alerts in loaded history):")
+                st.dataframe(active[["Ticker", "Rule", "Message"]], hide_index=True, use_container_width=True)
+        server_alerts = recent_alerts()[:10]
+        st.caption(f"Background refresh alerts: {len(server_alerts) or 'none yet'}"
+                   + (f" | log: `{config.ALERT_LOG_PATH}`" if config.ALERT_LOG_PATH else ""))
+        for event in server_alerts:
+            st.caption(f"{event['time']:%d/%m %H:%M} `{event['interval']}` {event['message']}")
+
 # --- 5. TOP FILTER BAR (SEARCH & ADD MODE) ---
 with st.container(border=True):
     c1, c2, c3, c4 = st.columns([2, 0.8, 1, 0.8])
@@ -109,9 +188,7 @@ with st.container(border=True):
         selected_interval = interval_map[interval_label]
         
     with c3:
-        today = date.today()
-        default_start = today - timedelta(days=365)
-        if selected_interval in ['1m', '5m', '30m', '1h']: default_start = today - timedelta(days=59)
+        default_start, today = default_date_range(selected_interval)
         date_range = st.date_input("Range", value=(default_start, today), max_value=today, format="DD/MM/YYYY", label_visibility="collapsed")
         
     with c4:
@@ -122,16 +199,45 @@ with st.container(border=True):
             else:
                 s, e = date_range
                 with st.spinner(f"Fetching data for {len(st.session_state.tickers)} assets..."):
-                    df_res = fetch_stock_data(st.session_state.tickers, str(s), str(e), selected_interval)
-                    if df_res is not None and not df_res.empty:
-                        st.session_state.df = df_res
+                    # Fetch service dùng chung process: gộp request trùng giữa các session,
+                    # báo tiến độ từng mã ngay khi tải xong
+                    progress = st.progress(0.0)
+                    def on_ticker_done(ticker, frame, done, total):
+                        status = "✅" if frame is not None else "❌"
+                        progress.progress(done / total, text=f"{status} {ticker} ({done}/{total})")
+                    # Tải ở interval mịn nhất Yahoo cho phép rồi gộp tại chỗ -> đổi 5m/30m/1h không tải lại
+                    fetch_interval = base_interval(selected_interval, s, e)
+                    try:
+                        handle = get_dataset_cache().load(
+                            st.session_state.tickers, str(s), str(e), selected_interval,
+                            fetch_fn=lambda missing: get_fetch_service().fetch(missing, str(s), str(e), fetch_interval, on_result=on_ticker_done),
+                            base_interval=fetch_interval,
+                            refresh=True,  # người dùng bấm UPDATE -> luôn tải bar mới nhất, không trả bản cũ trong cache
+                        )
+                    except ValueError as err:
+                        # Compact storage làm lệch chỉ số quá ngưỡng -> không nạp, báo lỗi rõ ràng
+                        progress.empty()
+                        st.error(f"❌ {err}")
+                        st.stop()
+                    progress.empty()
+                    if handle is not None:
+                        st.session_state.dataset = handle
+                        # Lưu vào kho giá local -> universe cho Screener
+                        save_to_price_store(handle.frame, handle.tickers, selected_interval)
+                        # Tính sẵn analytics bundle ở nền -> các trang mở ra hiển thị ngay
+                        get_snapshot_store().schedule(handle.frame, handle.tickers)
                         st.success("Loaded!")
                     else: st.error("No Data.")
 
 # --- 6. MAIN ROUTING (CLEAN VERSION) ---
 
+# 0. Screener chạy trên kho giá local, không cần watchlist đã load
+if nav_selection == "Screener":
+    screener.render_screener(selected_interval)
+    st.stop()
+
 # 1. Kiểm tra Data đã load chưa
-if st.session_state.df is None:
+if st.session_state.dataset is None:
     st.info("👋 Welcome to AlphaQuant! Type a ticker above (e.g., BTC-USD) and press Enter to start.")
     st.stop()
 
@@ -140,15 +246,17 @@ if not st.session_state.tickers:
     st.warning("⚠️ Your watchlist is empty. Please add a ticker in the 'Add Ticker' box above.")
     st.stop()
 
-# 3. Điều hướng vào các View
+# 3. Điều hướng vào các View (df là tham chiếu tới bản dùng chung trong cache, chỉ đọc)
+df = st.session_state.dataset.frame
+
 if nav_selection == "Market Overview":
-    dashboard.render_dashboard(st.session_state.df, st.session_state.tickers)
+    dashboard.render_dashboard(df, st.session_state.tickers)
 
 elif nav_selection == "Risk Analysis (CFA)":
-    risk.render_risk_analysis(st.session_state.df, st.session_state.tickers)
+    risk.render_risk_analysis(df, st.session_state.tickers)
 
 elif nav_selection == "AI Forecast":
-    ai_forecast.render_ai_forecast(st.session_state.df, st.session_state.tickers)
+    ai_forecast.render_ai_forecast(df, st.session_state.tickers)
 
 elif nav_selection == "Portfolio Builder":
-    portfolio.render_portfolio_builder(st.session_state.df, st.session_state.tickers)
\ No newline at end of file
+    portfolio.render_portfolio_builder(df, st.session_state.tickers)
\ No newline at end of file
@@ -0,0 +1,234 @@
+# loadtest.py
+"""
+Load test nhiều session đồng thời cho app.py (chạy headless qua Streamlit AppTest, cùng 1 process
+như server thật -> các session dùng chung fetch service / dataset cache / snapshot store).
+Dữ liệu lấy từ provider synthetic (không cần mạng), kho giá & snapshot ghi vào thư mục tạm.
+
+Chạy: python loadtest.py --sessions 1,2,4,8 --iterations 2
+"""
+
+import argparse
+import gc
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 1. MÔI TRƯỜNG (phải đặt trước khi import src: config đọc env lúc import) ---
+os.environ.setdefault("ALPHAQUANT_DATA_PROVIDER", "synthetic")
+_WORKDIR = tempfile.mkdtemp(prefix="alphaquant-loadtest-")
+os.environ.setdefault("ALPHAQUANT_PRICE_STORE", os.path.join(_WORKDIR, "price_store"))
+os.environ.setdefault("ALPHAQUANT_SNAPSHOT_DIR", os.path.join(_WORKDIR, "snapshots"))
+
+import numpy as np
+import pandas as pd
+from streamlit import config as st_config
+from streamlit.runtime import Runtime
+from streamlit.testing.v1 import AppTest
+from src.dataset_cache import get_dataset_cache
+from src.fetch_service import get_fetch_service
+
+try:
+    import psutil
+except ImportError:  # không có psutil -> đọc /proc (Linux)
+    psutil = None
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+# Universe giả lập: cổ phiếu + crypto, mỗi session chọn ngẫu nhiên vài mã -> cache trùng 1 phần giữa các session
+UNIVERSE = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "JPM", "V", "XOM", "KO", "PEP", "SPY", "QQQ",
+            "GLD", "TLT", "BTC-USD", "ETH-USD", "SOL-USD", "BNB-USD"]
+
+
+# --- 2. CHẠY APPTEST SONG SONG TRONG 1 PROCESS ---
+
+def _allow_concurrent_apptests():
+    """
+    Mỗi AppTest.run() gắn 1 mock Runtime toàn cục rồi đặt lại None khi xong -> session khác đang chạy dở
+    gặp "Runtime hasn't been created!". Giữ lại Runtime gần nhất làm dự phòng cho khoảng hở đó
+    và bật cố định global.appTest (AppTest chỉ patch option này trong lúc run).
+    """
+    pinned = {}
+    original_instance = Runtime.instance.__func__
+
+    def instance(cls):
+        if cls._instance is not None:
+            pinned["runtime"] = cls._instance
+            return cls._instance
+        return pinned["runtime"] if "runtime" in pinned else original_instance(cls)
+
+    def exists(cls):
+        return cls._instance is not None or "runtime" in pinned
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+    st_config.set_option("global.appTest", True)
+
+
+def _rss_bytes():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+# --- 3. KỊCH BẢN TƯƠNG TÁC ---
+# Mỗi bước: (nhãn, hàm(at) thao tác widget rồi rerun). Nhãn dùng để tách latency theo loại tương tác.
+
+def _click(label):
+    def step(at):
+        next(b for b in at.button if label in b.label).click().run()
+    return step
+
+def _goto(page):
+    def step(at):
+        at.session_state["nav_selection"] = page
+        at.run()
+    return step
+
+def _add_ticker(ticker):
+    def step(at):
+        at.text_input(key="new_ticker_input").input(ticker).run()
+    return step
+
+SCENARIOS = {
+    # Xem thị trường & rủi ro, chạy Monte Carlo
+    "analyst": lambda: [
+        ("page:dashboard", _goto("Market Overview")),
+        ("page:risk", _goto("Risk Analysis (CFA)")),
+        ("page:forecast", _goto("AI Forecast")),
+        ("monte_carlo", _click("Run All Simulations")),
+    ],
+    # Tối ưu danh mục + walk-forward backtest
+    "allocator": lambda: [
+        ("page:portfolio", _goto("Portfolio Builder")),
+        ("optimize", _click("Optimize Portfolio")),
+        ("backtest", _click("Run Backtest")),
+        ("page:dashboard", _goto("Market Overview")),
+    ],
+    # Chỉ chuyển trang qua lại (rerun nhẹ, đo overhead script)
+    "browser": lambda: [
+        ("page:risk", _goto("Risk Analysis (CFA)")),
+        ("page:dashboard", _goto("Market Overview")),
+        ("page:portfolio", _goto("Portfolio Builder")),
+        ("page:forecast", _goto("AI Forecast")),
+    ],
+}
+
+
+def run_session(scenario, iterations, rng, timeout):
+    """1 session: mở app, thêm mã, UPDATE rồi lặp kịch bản `iterations` lần. Trả về (app, [(nhãn, giây, lỗi)])."""
+    samples = []
+
+    def timed(label, step, at):
+        t0 = time.perf_counter()
+        try:
+            step(at)
+            error = str(at.exception[0].value) if len(at.exception) else None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        samples.append((label, time.perf_counter() - t0, error))
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    timed("open", lambda a: a.run(), at)
+    for ticker in rng.sample(UNIVERSE, 3):
+        timed("add_ticker", _add_ticker(ticker), at)
+    timed("update", _click("UPDATE"), at)
+    for _ in range(iterations):
+        for label, step in SCENARIOS[scenario]():
+            timed(label, step, at)
+    return at, samples
+
+
+# --- 4. CHẠY THEO MỨC CONCURRENCY & BÁO CÁO ---
+
+def run_level(n_sessions, iterations, seed, timeout):
+    """N session chạy đồng thời (mỗi session 1 thread, kịch bản xoay vòng). Trả về (summary dict, DataFrame samples)."""
+    gc.collect()
+    rss_before = _rss_bytes()
+    cache_before = get_dataset_cache().stats()
+    scenarios = list(SCENARIOS)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_sessions) as pool:
+        futures = [pool.submit(run_session, scenarios[i % len(scenarios)], iterations,
+                               random.Random(seed * 1000 + i), timeout) for i in range(n_sessions)]
+        results = [f.result() for f in futures]
+    wall = time.perf_counter() - t0
+
+    # Đo RAM khi các session (AppTest + session_state) vẫn còn sống; tách phần cache dùng chung ra
+    gc.collect()
+    cache_after = get_dataset_cache().stats()
+    rss_delta = _rss_bytes() - rss_before
+    cache_delta = cache_after["resident_bytes"] - cache_before["resident_bytes"]
+
+    rows = [(i, scenarios[i % len(scenarios)], label, seconds, error)
+            for i, (_, samples) in enumerate(results) for label, seconds, error in samples]
+    samples = pd.DataFrame(rows, columns=["session", "scenario", "step", "seconds", "error"])
+    latency = samples["seconds"].to_numpy()
+    hits = cache_after["hits"] - cache_before["hits"]
+    lookups = hits + cache_after["misses"] - cache_before["misses"]
+    summary = {
+        "sessions": n_sessions,
+        "reruns": len(samples),
+        "errors": int(samples["error"].notna().sum()),
+        "wall_s": wall,
+        "reruns_per_s": len(samples) / wall,
+        "p50_ms": np.percentile(latency, 50) * 1e3,
+        "p95_ms": np.percentile(latency, 95) * 1e3,
+        "p99_ms": np.percentile(latency, 99) * 1e3,
+        "max_ms": latency.max() * 1e3,
+        "rss_delta_mb": rss_delta / 1024 ** 2,
+        "shared_cache_mb": cache_delta / 1024 ** 2,
+        "per_session_mb": (rss_delta - cache_delta) / n_sessions / 1024 ** 2,
+        "cache_hit_ratio": hits / lookups if lookups else float("nan"),
+    }
+    del results
+    return summary, samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the AlphaQuant Streamlit app")
+    parser.add_argument("--sessions", default="1,2,4,8", help="Các mức concurrency, phân cách bằng dấu phẩy")
+    parser.add_argument("--iterations", type=int, default=2, help="Số lần lặp kịch bản mỗi session")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-warmup", action="store_true", help="Bỏ lượt chạy làm nóng (import, JIT, BLAS) trước khi đo")
+    parser.add_argument("--timeout", type=float, default=300, help="Timeout mỗi rerun (giây)")
+    parser.add_argument("--by-step", action="store_true", help="In thêm latency theo từng loại tương tác")
+    parser.add_argument("--csv", help="Lưu toàn bộ mẫu latency ra file CSV")
+    args = parser.parse_args()
+
+    _allow_concurrent_apptests()
+    levels = [int(x) for x in args.sessions.split(",") if x.strip()]
+    print(f"Provider: {os.environ['ALPHAQUANT_DATA_PROVIDER']} | workdir: {_WORKDIR}")
+    if not args.no_warmup:
+        # Import view, JIT Numba, khởi tạo BLAS... chỉ tốn 1 lần / process -> không tính vào mức đầu tiên
+        for i, scenario in enumerate(SCENARIOS):
+            run_session(scenario, 1, random.Random(i), args.timeout)
+
+    summaries, all_samples = [], []
+    for level in levels:
+        summary, samples = run_level(level, args.iterations, args.seed + level, args.timeout)
+        summaries.append(summary)
+        all_samples.append(samples.assign(level=level))
+        print(f"{level:>3} sessions | {summary['reruns']:>4} reruns in {summary['wall_s']:6.1f}s | "
+              f"p50 {summary['p50_ms']:7.0f} ms | p95 {summary['p95_ms']:7.0f} ms | p99 {summary['p99_ms']:7.0f} ms | "
+              f"{summary['reruns_per_s']:5.2f} reruns/s | {summary['per_session_mb']:6.1f} MB/session | errors {summary['errors']}")
+        for error in samples["error"].dropna().unique()[:3]:
+            print(f"      ❌ {error}")
+
+    print("\n=== Summary ===")
+    print(pd.DataFrame(summaries).set_index("sessions").round(2).to_string())
+    samples = pd.concat(all_samples, ignore_index=True)
+    if args.by_step:
+        by_step = samples.groupby(["level", "step"])["seconds"].describe(percentiles=[0.5, 0.95, 0.99])
+        print("\n=== Latency by step (s) ===")
+        print(by_step[["count", "50%", "95%", "99%", "max"]].round(3).to_string())
+    if args.csv:
+        samples.to_csv(args.csv, index=False)
+        print(f"\nSamples -> {args.csv}")
+    print(f"Fetch service: {get_fetch_service().stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,11 @@
 
 import sys
 import pandas as pd
-from src.data_loader import fetch_stock_data
-from src.quant_engine import calculate_log_returns, calculate_descriptive_stats
+from src.data_loader import fetch_stock_data, clean_panel
+from src.quant_engine import calculate_log_returns, calculate_descriptive_stats, get_field_panel
 from src.visualizer import plot_return_distribution
+from src.alerts import AlertEngine
+from src import config
 
 def main():
     print("=== ALPHAQUANT ANALYTICS SUITE V1.1 ===")
@@ -41,6 +43,12 @@ def main():
         else:
             # Nếu có dữ liệu, thoát khỏi vòng lặp nhập liệu và đi tiếp
             break
+
+    # Làm sạch 1 lần (bad tick, giá <= 0, nến thiếu...) trước mọi tính toán
+    df, quality = clean_panel(df, [ticker])
+    for _, repairs in quality.drop(columns=["Bars", "Split details"]).iterrows():
+        if repairs.any():
+            print("🧪 Data quality: " + ", ".join(f"{name} {count}" for name, count in repairs.items() if count))
     # ---------------------------------------------
 
     try:
@@ -69,16 +77,18 @@ def main():
         print(stats_table)
         print("="*40)
         
-        # Nhận xét tự động
-        vol_str = stats_table.loc["Annualized Volatility", "Value"]
-        vol = float(vol_str.strip('%'))
-        
-        if vol > 30:
-            print(f"⚠️ CẢNH BÁO: Biến động CAO ({vol}%/năm). Rủi ro lớn.")
-        elif vol < 15:
-            print(f"✅ AN TOÀN: Biến động THẤP ({vol}%/năm). Khá ổn định.")
-        else:
-            print(f"ℹ️ TRUNG BÌNH: Biến động ({vol}%/năm).")
+        # Nhận xét tự động: luật cảnh báo cấu hình (config.ALERT_RULES), cùng engine với scheduler của app
+        engine = AlertEngine(config.ALERT_RULES)
+        history = engine.ingest_panel(get_field_panel(df, target_col).set_axis([ticker], axis=1), notify=False)
+        active = engine.active()
+        if active.empty:
+            print("✅ Không có luật cảnh báo nào đang kích hoạt ở phiên cuối.")
+        for message in active["Message"]:
+            print(f"⚠️ CẢNH BÁO: {message}")
+        if history:
+            print(f"ℹ️ {len(history)} cảnh báo trong lịch sử, gần nhất:")
+            for event in history[-3:]:
+                print(f"   {event['time']:%Y-%m-%d} | {event['message']}")
             
         # 5. Visualization
         print("\n[3/3] Đang vẽ biểu đồ phân phối...")
@@ -0,0 +1,486 @@
+# service.py
+"""
+Dịch vụ HTTP/JSON local cho quant_engine (stats, rủi ro, tối ưu danh mục, Monte Carlo) - dùng từ tool nội bộ
+không qua giao diện Streamlit. Chạy chung process-wide dataset cache / fetch service với app.
+- Gom các request /v1/stats tương thích tới trong 1 cửa sổ ngắn thành 1 lời gọi vector hóa trên cả lô mã.
+- Cache kết quả theo fingerprint dữ liệu (dữ liệu đổi sau refresh -> tự tính lại).
+- Kết quả lớn (chuỗi giá, đường Monte Carlo, frontier) trả dạng NDJSON chunked, không dựng cả body trong RAM.
+- /v1/metrics: latency p50/p95/p99 theo endpoint, kích thước batch, cache hit.
+
+Chạy: python service.py --offline --port 8765
+      curl -s localhost:8765/v1/stats -d '{"tickers": ["AAPL", "BTC-USD"]}'
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+from src import config
+from src.data_loader import base_interval, dataset_fingerprint, default_date_range
+from src.dataset_cache import get_dataset_cache
+from src.fetch_service import get_fetch_service
+from src.monte_carlo import HORIZONS, resolve_workers, simulate_parallel, simulate_streaming, term_structure
+from src.quant_engine import (allocate_portfolio, calculate_screen_metrics, drawdown_analytics, get_field_panel,
+                              optimize_portfolio)
+
+STREAM_CHUNK_ROWS = 1000  # số dòng NDJSON mỗi chunk HTTP
+INTERVALS = ("1m", "5m", "30m", "1h", "1d", "1wk")
+
+
+class ServiceError(Exception):
+    """Lỗi trả về client dạng {"error": ...} với HTTP status tương ứng."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# --- 1. MICRO-BATCHING ---
+
+class MicroBatcher:
+    """
+    Gom các request cùng key tới trong `window` giây (hoặc đủ max_batch) thành 1 lời gọi
+    handler(key, [payload]) -> [kết quả]; mỗi request nhận Future của riêng nó.
+    """
+
+    def __init__(self, handler, window=0.01, max_batch=64):
+        self.handler = handler
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}  # key -> [(payload, Future)]
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.batched_requests = 0
+
+    def submit(self, key, payload):
+        future = Future()
+        with self._lock:
+            batch = self._pending.get(key)
+            if batch is None:
+                batch = self._pending[key] = []
+                timer = threading.Timer(self.window, self._flush, (key, batch))
+                timer.daemon = True
+                timer.start()
+            batch.append((payload, future))
+            full = len(batch) >= self.max_batch
+        if full:
+            self._flush(key, batch)
+        return future
+
+    def _flush(self, key, batch):
+        with self._lock:
+            if self._pending.get(key) is not batch:
+                return  # đã chạy (đủ max_batch trước khi hết cửa sổ)
+            del self._pending[key]
+            self.batches += 1
+            self.batched_requests += len(batch)
+        try:
+            results = self.handler(key, [payload for payload, _ in batch])
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+
+
+# --- 2. LATENCY METRICS ---
+
+class LatencyMetrics:
+    """Latency theo endpoint (reservoir `window` request gần nhất), số lỗi, cache hit."""
+
+    def __init__(self, window=2048):
+        self._lock = threading.Lock()
+        self._window = window
+        self._endpoints = {}
+        self.started = time.time()
+
+    def record(self, endpoint, seconds, error=False, cache_hit=False):
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {"count": 0, "errors": 0, "cache_hits": 0,
+                                                          "latency": deque(maxlen=self._window)})
+            entry["count"] += 1
+            entry["errors"] += int(error)
+            entry["cache_hits"] += int(cache_hit)
+            entry["latency"].append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {name: dict(e, latency=np.array(e["latency"])) for name, e in self._endpoints.items()}
+        report = {}
+        for name, e in endpoints.items():
+            latency = e.pop("latency") * 1e3
+            report[name] = dict(e, **({f"p{q}_ms": float(np.percentile(latency, q)) for q in (50, 95, 99)}
+                                      if len(latency) else {}), max_ms=float(latency.max()) if len(latency) else None)
+        return {"uptime_s": time.time() - self.started, "endpoints": report}
+
+
+# --- 3. JSON / NDJSON ---
+
+def _jsonable(value):
+    """numpy / pandas -> kiểu JSON (NaN / inf -> null)."""
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return _jsonable(value.tolist())
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+def _frame_records(frame):
+    """DataFrame -> {index: {cột: giá trị}}."""
+    return _jsonable(frame.to_dict(orient="index"))
+
+
+class Stream:
+    """Kết quả trả dạng NDJSON: header (dòng đầu) + các dòng sinh dần từ rows() (chunked transfer)."""
+
+    def __init__(self, header, rows):
+        self.header = header
+        self.rows = rows  # callable -> iterator các dòng (dict)
+
+    def lines(self):
+        yield _jsonable(self.header)
+        for row in self.rows():
+            yield row
+
+
+def _panel_rows(panel):
+    # Duyệt theo block để không tạo cả list dict của panel lớn
+    values, columns = panel.to_numpy(dtype=float), [str(c) for c in panel.columns]
+    for start in range(0, len(panel), STREAM_CHUNK_ROWS):
+        block = values[start:start + STREAM_CHUNK_ROWS]
+        for stamp, row in zip(panel.index[start:start + STREAM_CHUNK_ROWS], block):
+            yield {"time": stamp.isoformat(), **{c: (float(v) if np.isfinite(v) else None) for c, v in zip(columns, row)}}
+
+
+# --- 4. ANALYTICS SERVICE ---
+
+class AnalyticsService:
+    """Định tuyến request -> tính toán; dữ liệu qua dataset cache dùng chung, kết quả cache theo fingerprint."""
+
+    def __init__(self, batch_window=None, cache_size=None):
+        self.metrics = LatencyMetrics()
+        self.cache_size = cache_size or config.SERVICE_CACHE_SIZE
+        self._cache = OrderedDict()  # (endpoint, fingerprint, tham số) -> kết quả
+        self._cache_lock = threading.Lock()
+        window = (config.SERVICE_BATCH_WINDOW_MS if batch_window is None else batch_window) / 1000
+        self.stats_batcher = MicroBatcher(self._run_stats_batch, window=window)
+        self.routes = {
+            "/v1/stats": self.stats,
+            "/v1/optimize": self.optimize,
+            "/v1/monte_carlo": self.monte_carlo,
+            "/v1/series": self.series,
+        }
+
+    # --- 4.1 Cache ---
+    def _cached(self, key, compute):
+        """(kết quả, cache_hit). compute() chạy ngoài lock; 2 request trùng cùng lúc có thể cùng tính."""
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key], True
+        value = compute()
+        with self._cache_lock:
+            self._cache[key] = value
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return value, False
+
+    # --- 4.2 Dữ liệu ---
+    @staticmethod
+    def _range(body):
+        """(tickers, start, end, interval) đã chuẩn hóa từ body request."""
+        tickers = body.get("tickers", body.get("ticker"))
+        tickers = [tickers] if isinstance(tickers, str) else tickers
+        if not tickers or not all(isinstance(t, str) and t.strip() for t in tickers):
+            raise ServiceError(400, "'tickers' must be a non-empty list of symbols")
+        interval = body.get("interval", "1d")
+        if interval not in INTERVALS:
+            raise ServiceError(400, f"Unknown interval '{interval}' ({', '.join(INTERVALS)})")
+        default_start, today = default_date_range(interval)
+        start, end = str(body.get("start") or default_start), str(body.get("end") or today)
+        return list(dict.fromkeys(t.strip().upper() for t in tickers)), start, end, interval
+
+    @staticmethod
+    def _load(tickers, start, end, interval):
+        """DatasetHandle từ dataset cache dùng chung (chỉ tải mã còn thiếu, qua fetch service)."""
+        fetch_interval = base_interval(interval, start, end)
+        handle = get_dataset_cache().load(
+            tickers, start, end, interval,
+            fetch_fn=lambda missing: get_fetch_service().fetch(missing, start, end, fetch_interval),
+            base_interval=fetch_interval,
+        )
+        if handle is None:
+            raise ServiceError(404, f"No data for {', '.join(tickers)} ({interval}, {start} -> {end})")
+        return handle
+
+    # --- 4.3 Endpoints ---
+    def stats(self, body):
+        """Return, Volatility, Sharpe, Sortino, VaR, Skew/Kurtosis + Calmar / Ulcer / drawdown theo mã (batch)."""
+        tickers, start, end, interval = self._range(body)
+        rf = float(body.get("risk_free_rate", 0.03))
+        result = self.stats_batcher.submit((start, end, interval, rf), tickers).result(timeout=config.SERVICE_TIMEOUT_SECONDS)
+        return result, result["cache_hits"] == len(tickers)
+
+    def _run_stats_batch(self, key, requests):
+        """
+        1 lô request cùng (khoảng ngày, interval, rf): tải hợp các mã 1 lần, tính các mã chưa có trong cache
+        bằng 1 lời gọi calculate_screen_metrics + drawdown_analytics trên cả panel (mỗi cột độc lập,
+        nên kết quả từng mã không phụ thuộc lô). Cache theo fingerprint dữ liệu từng mã.
+        """
+        start, end, interval, rf = key
+        union = list(dict.fromkeys(t for tickers in requests for t in tickers))
+        handle = self._load(union, start, end, interval)
+        cache = get_dataset_cache()
+        fingerprints = {t: dataset_fingerprint(cache.get_frame(t, start, end, interval)) for t in handle.tickers}
+
+        rows, hits = {}, set()
+        with self._cache_lock:
+            for t, fp in fingerprints.items():
+                if fp is not None and ("stats", fp, rf) in self._cache:
+                    self._cache.move_to_end(("stats", fp, rf))
+                    rows[t] = self._cache[("stats", fp, rf)]
+                    hits.add(t)
+        missing = [t for t, fp in fingerprints.items() if fp is not None and t not in rows]
+        if missing:
+            close = get_field_panel(handle.frame, 'Close')[missing]
+            metrics = calculate_screen_metrics(close, rf)
+            drawdown = drawdown_analytics(close)[0][["CAGR", "Calmar", "Ulcer Index", "Pain Index",
+                                                     "Current Drawdown", "Episodes"]]
+            computed = _frame_records(metrics.join(drawdown))
+            with self._cache_lock:
+                for t in missing:
+                    rows[t] = self._cache[("stats", fingerprints[t], rf)] = computed[str(t)]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [{"tickers": {t: rows[t] for t in tickers if t in rows},
+                 "missing": [t for t in tickers if t not in rows],
+                 "cache_hits": sum(t in hits for t in tickers),
+                 "batch_size": len(requests)} for tickers in requests]
+
+    def optimize(self, body):
+        """Markowitz (max_sharpe / min_vol trên frontier mô phỏng) hoặc risk parity (erc / hrp)."""
+        tickers, start, end, interval = self._range(body)
+        method = body.get("method", "max_sharpe")
+        rf = float(body.get("risk_free_rate", 0.03))
+        num_portfolios = int(body.get("num_portfolios", 5000))
+        if method not in ("max_sharpe", "min_vol", "erc", "hrp"):
+            raise ServiceError(400, f"Unknown method '{method}' (max_sharpe, min_vol, erc, hrp)")
+        if len(tickers) < 2:
+            raise ServiceError(400, "Portfolio optimization needs at least 2 tickers")
+        handle = self._load(tickers, start, end, interval)
+
+        def compute():
+            if method in ("erc", "hrp"):
+                return {"portfolio": allocate_portfolio(handle.frame, method=method, risk_free_rate=rf)}
+            result = optimize_portfolio(handle.frame, num_portfolios=num_portfolios, risk_free_rate=rf)
+            return result and {"portfolio": result[method], "frontier": result["results"]}
+
+        key = ("optimize", dataset_fingerprint(handle.frame), method, rf, num_portfolios)
+        result, hit = self._cached(key, compute)
+        if result is None or result["portfolio"] is None:
+            raise ServiceError(422, "Not enough overlapping history to optimize")
+        payload = {"method": method, "tickers": handle.tickers, **result["portfolio"]}
+        if body.get("frontier") and "frontier" in result:
+            # 1 dòng / danh mục mô phỏng (return, std, sharpe) -> stream
+            frontier = result["frontier"]
+            rows = lambda: ({"return": float(r), "std": float(s), "sharpe": float(sh)} for r, s, sh in frontier.T)
+            return Stream(payload, rows), hit
+        return payload, hit
+
+    def monte_carlo(self, body):
+        """GBM Monte Carlo 1 mã: bảng VaR / CVaR / xác suất có lãi theo kỳ hạn; paths=true -> stream đường mẫu."""
+        tickers, start, end, interval = self._range(body)
+        days = int(body.get("days", 252))
+        simulations = int(body.get("simulations", 10_000))
+        seed = int(body.get("seed", 0))
+        if not 1 <= days <= 2520 or not 1 <= simulations <= config.SERVICE_MAX_SIMULATIONS:
+            raise ServiceError(400, f"'days' must be in [1, 2520] and 'simulations' in [1, {config.SERVICE_MAX_SIMULATIONS}]")
+        ticker = tickers[0]
+        handle = self._load([ticker], start, end, interval)
+        prices = get_field_panel(handle.frame, 'Close')[ticker].dropna()
+        if len(prices) < 30:
+            raise ServiceError(422, f"Not enough data for {ticker}. Need at least 30 data points.")
+
+        def compute():
+            # Cùng seed -> cùng kết quả dù chạy tuần tự hay trên process pool
+            parallel = simulations >= config.MC_PARALLEL_MIN_SIMULATIONS and resolve_workers() > 1
+            simulate = simulate_parallel if parallel else simulate_streaming
+            return simulate(prices, days, simulations, seed=seed)
+
+        result, hit = self._cached(("monte_carlo", dataset_fingerprint(handle.frame), days, simulations, seed), compute)
+        if result is None:
+            raise ServiceError(422, f"Simulation failed for {ticker}")
+        horizons = sorted(set(h for h in HORIZONS if h <= days) | {days})
+        payload = {"ticker": ticker, "days": days, "simulations": simulations, "seed": seed,
+                   "curr_price": result["curr_price"],
+                   "term_structure": _frame_records(term_structure(result, horizons))}
+        if body.get("paths"):
+            # Dải phân vị theo ngày + các đường mẫu -> stream từng dòng
+            def rows():
+                for d in range(days + 1):
+                    yield {"day": d, "mean": float(result["mean_path"][d]),
+                           **{f"p{q}": float(band[d]) for q, band in result["bands"].items()}}
+                for i, path in enumerate(result["sample_paths"].T):
+                    yield {"sample_path": i, "prices": path.tolist()}
+            return Stream(payload, rows), hit
+        return payload, hit
+
+    def series(self, body):
+        """Chuỗi giá (field) hoặc log return của watchlist, stream 1 dòng / bar."""
+        tickers, start, end, interval = self._range(body)
+        field = body.get("field", "Close")
+        handle = self._load(tickers, start, end, interval)
+        try:
+            panel = get_field_panel(handle.frame, field)
+        except KeyError:
+            raise ServiceError(400, f"Unknown field '{field}'") from None
+        if body.get("returns"):
+            # Mỗi mã so với bar hợp lệ trước đó của chính nó (lịch giao dịch khác nhau trong panel hợp)
+            panel = panel.astype(float)
+            panel = np.log(panel / panel.ffill().shift(1)).iloc[1:]
+        header = {"tickers": [str(c) for c in panel.columns], "field": field, "returns": bool(body.get("returns")),
+                  "rows": len(panel), "fingerprint": dataset_fingerprint(handle.frame)}
+        return Stream(header, lambda: _panel_rows(panel)), False
+
+    def status(self):
+        return {"provider": config.DATA_PROVIDER, "dataset_cache": get_dataset_cache().stats(),
+                "fetch": dict(get_fetch_service().stats), "response_cache_entries": len(self._cache),
+                "batches": self.stats_batcher.batches, "batched_requests": self.stats_batcher.batched_requests,
+                "mean_batch_size": self.stats_batcher.batched_requests / self.stats_batcher.batches
+                if self.stats_batcher.batches else None, **self.metrics.snapshot()}
+
+
+# --- 5. HTTP ---
+
+def make_handler(service, verbose=False):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive + chunked transfer cho stream
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+        def _send_json(self, status, payload):
+            body = json.dumps(_jsonable(payload), allow_nan=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_stream(self, stream):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            buffer = []
+            for line in stream.lines():
+                buffer.append(json.dumps(line, allow_nan=False))
+                if len(buffer) >= STREAM_CHUNK_ROWS:
+                    self._write_chunk(buffer)
+                    buffer = []
+            if buffer:
+                self._write_chunk(buffer)
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _write_chunk(self, lines):
+            data = ("\n".join(lines) + "\n").encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+        def do_GET(self):
+            t0 = time.perf_counter()
+            path = self.path.split("?", 1)[0]
+            if path == "/v1/health":
+                self._send_json(200, {"status": "ok", "provider": config.DATA_PROVIDER})
+            elif path == "/v1/metrics":
+                self._send_json(200, service.status())
+            else:
+                self._send_json(404, {"error": f"Unknown endpoint {path}"})
+            service.metrics.record(f"GET {path}", time.perf_counter() - t0)
+
+        def do_POST(self):
+            t0 = time.perf_counter()
+            path = self.path.split("?", 1)[0]
+            error, hit = False, False
+            try:
+                route = service.routes.get(path)
+                if route is None:
+                    raise ServiceError(404, f"Unknown endpoint {path}")
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError as e:
+                    raise ServiceError(400, f"Invalid JSON: {e}") from None
+                if not isinstance(body, dict):
+                    raise ServiceError(400, "Request body must be a JSON object")
+                result = route(body)
+                if isinstance(result, tuple):
+                    result, hit = result
+                if isinstance(result, Stream):
+                    self._send_stream(result)
+                else:
+                    self._send_json(200, result)
+            except ServiceError as e:
+                error = True
+                self._send_json(e.status, {"error": str(e)})
+            except (ValueError, TypeError) as e:
+                error = True
+                self._send_json(400, {"error": str(e)})
+            except Exception as e:
+                error = True
+                self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            finally:
+                service.metrics.record(f"POST {path}", time.perf_counter() - t0, error=error, cache_hit=hit)
+
+    return Handler
+
+
+def make_server(host=None, port=None, service=None, verbose=False):
+    """ThreadingHTTPServer (1 thread / kết nối) chạy AnalyticsService; port=0 -> cổng ngẫu nhiên."""
+    service = service or AnalyticsService()
+    server = ThreadingHTTPServer((host or config.SERVICE_HOST, config.SERVICE_PORT if port is None else port),
+                                 make_handler(service, verbose))
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON analytics service for AlphaQuant")
+    parser.add_argument("--host", default=config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVICE_PORT)
+    parser.add_argument("--offline", action="store_true", help="Dùng provider synthetic (không cần mạng)")
+    parser.add_argument("--batch-window-ms", type=float, default=config.SERVICE_BATCH_WINDOW_MS,
+                        help="Cửa sổ gom request /v1/stats thành 1 lô")
+    parser.add_argument("--verbose", action="store_true", help="In log từng request")
+    args = parser.parse_args()
+
+    if args.offline:
+        config.DATA_PROVIDER = "synthetic"
+    server = make_server(args.host, args.port, AnalyticsService(batch_window=args.batch_window_ms), args.verbose)
+    print(f"AlphaQuant service on http://{args.host}:{server.server_address[1]} | provider: {config.DATA_PROVIDER}")
+    print("POST /v1/stats /v1/optimize /v1/monte_carlo /v1/series | GET /v1/health /v1/metrics")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,510 @@
+# src/alerts.py
+
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from collections import deque
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from src import config
+
+# Số bar / năm theo interval (cổ phiếu, phiên 6.5h) để năm hóa volatility
+PERIODS_PER_YEAR = {"1m": 252 * 390, "5m": 252 * 78, "30m": 252 * 13, "1h": 252 * 7, "1d": 252, "1wk": 52}
+
+# --- 1. LUẬT CẢNH BÁO ---
+# Cú pháp 1 luật (phân cách bằng ";" hoặc xuống dòng, "#" là comment):
+#   volatility(span) > 0.30   : volatility năm hóa của log return (EWMA theo span, span=0 -> lũy tiến)
+#   drawdown < -20%           : giá / đỉnh lũy tiến - 1
+#   zscore(span) < -3         : z-score của return vừa tới so với mean / std EWMA TRƯỚC bar đó
+#   cross(fast, slow) up      : EMA nhanh cắt EMA chậm (up | down, bỏ trống -> cả hai chiều)
+#   var_breach(span, 0.99)    : return vừa tới thấp hơn VaR tham số (mean - z·std EWMA) ở độ tin cậy cho trước
+
+_OPS = {">": np.greater, "<": np.less, ">=": np.greater_equal, "<=": np.less_equal}
+_RULE_RE = re.compile(r"^(\w+)\s*(?:\(([^)]*)\))?\s*(?:(>=|<=|>|<)\s*([-+]?\d*\.?\d+)(%?))?\s*(up|down)?$", re.IGNORECASE)
+_DEFAULT_SPANS = {"volatility": 63, "zscore": 20, "var_breach": 63}
+
+
+class Rule:
+    """1 luật cảnh báo đã parse. metric_keys: các trạng thái metric cần (dùng chung giữa các luật cùng key)."""
+
+    def __init__(self, spec, metric, args=(), op=None, threshold=None, direction=None):
+        self.spec = spec
+        self.metric = metric
+        self.args = tuple(args)
+        self.op = op
+        self.threshold = threshold
+        self.direction = direction
+
+    @property
+    def metric_keys(self):
+        if self.metric == "drawdown":
+            return (("peak",),)
+        if self.metric == "cross":
+            return (("ema", self.args[0]), ("ema", self.args[1]))
+        return (("moments", self.args[0]),)
+
+    @property
+    def is_event(self):
+        """Luật dạng sự kiện 1 bar (cắt EMA, cú sốc z-score, vượt VaR) -> báo mỗi lần xảy ra; luật trạng thái chỉ báo khi chuyển vào."""
+        return self.metric in ("cross", "zscore", "var_breach")
+
+    def __repr__(self):
+        return f"Rule({self.spec!r})"
+
+
+def parse_rule(spec):
+    """"volatility(63) > 30%" -> Rule. Sai cú pháp / thiếu tham số -> ValueError."""
+    spec = " ".join(spec.split())
+    match = _RULE_RE.match(spec)
+    if match is None:
+        raise ValueError(f"Invalid alert rule: {spec!r}")
+    metric, args, op, threshold, percent, direction = match.groups()
+    metric = metric.lower()
+    try:
+        args = [float(a) for a in args.split(",") if a.strip()] if args else []
+    except ValueError:
+        raise ValueError(f"Invalid alert rule arguments: {spec!r}") from None
+    if threshold is not None:
+        threshold = float(threshold) / (100 if percent else 1)
+
+    if metric in ("volatility", "zscore", "drawdown"):
+        if op is None or direction is not None:
+            raise ValueError(f"Alert rule needs a comparison (e.g. '{metric} > 1'): {spec!r}")
+        args = [] if metric == "drawdown" else [int(args[0]) if args else _DEFAULT_SPANS[metric]]
+    elif metric == "cross":
+        if len(args) != 2 or op is not None or not 0 < args[0] < args[1]:
+            raise ValueError(f"Alert rule must be 'cross(fast, slow) [up|down]' with fast < slow: {spec!r}")
+        args = [int(args[0]), int(args[1])]
+    elif metric == "var_breach":
+        if op is not None or direction is not None or len(args) > 2:
+            raise ValueError(f"Alert rule must be 'var_breach(span[, confidence])': {spec!r}")
+        span = int(args[0]) if args else _DEFAULT_SPANS[metric]
+        confidence = args[1] if len(args) > 1 else 0.95
+        if not 0.5 < confidence < 1:
+            raise ValueError(f"VaR confidence must be in (0.5, 1): {spec!r}")
+        args = [span, confidence]
+    else:
+        raise ValueError(f"Unknown alert metric '{metric}' (volatility, drawdown, zscore, cross, var_breach)")
+    if args and args[0] < 0:
+        raise ValueError(f"Alert rule span must be >= 0: {spec!r}")
+    return Rule(spec, metric, args, op, threshold, direction and direction.lower())
+
+
+def parse_rules(spec):
+    """Chuỗi nhiều luật -> [Rule], bỏ dòng trống / comment, bỏ luật trùng."""
+    rules = {}
+    for line in re.split(r"[;\n]", spec or ""):
+        line = line.split("#", 1)[0].strip()
+        if line:
+            rule = parse_rule(line)
+            rules.setdefault(rule.spec, rule)
+    return list(rules.values())
+
+
+# --- 2. TRẠNG THÁI METRIC TĂNG DẦN (struct-of-arrays, 1 dòng / mã) ---
+
+class _State:
+    """Các mảng trạng thái theo dòng mã; FIELDS: tên -> (dtype, giá trị khởi tạo). Mỗi bar chỉ cập nhật dòng có giá mới."""
+
+    FIELDS = {}
+
+    def __init__(self, capacity):
+        for name, (dtype, fill) in self.FIELDS.items():
+            setattr(self, name, np.full(capacity, fill, dtype))
+
+    def grow(self, capacity):
+        for name, (dtype, fill) in self.FIELDS.items():
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+
+class _Moments(_State):
+    """
+    Mean / phương sai của log return: EWMA (span > 0, α = 2 / (span + 1)) hoặc lũy tiến (span = 0).
+    α hiệu dụng = max(α, 1/n) -> các bar đầu là trung bình lũy tiến, không lệch về 0. Giữ cả giá trị TRƯỚC bar mới.
+    """
+
+    FIELDS = {"n": (np.int64, 0), "mean": (float, 0.0), "var": (float, 0.0),
+              "prev_mean": (float, np.nan), "prev_var": (float, np.nan)}
+
+    def __init__(self, span, capacity):
+        super().__init__(capacity)
+        self.alpha = 2.0 / (span + 1) if span else 0.0
+        self.warmup = span or 20
+
+    def update(self, rows, prices, returns):
+        ok = np.isfinite(returns)
+        rows, r = rows[ok], returns[ok]
+        n = self.n[rows] + 1
+        alpha = np.maximum(self.alpha, 1.0 / n)
+        mean, var = self.mean[rows], self.var[rows]
+        self.prev_mean[rows], self.prev_var[rows] = mean, var
+        diff = r - mean
+        incr = alpha * diff
+        self.mean[rows] = mean + incr
+        self.var[rows] = (1 - alpha) * (var + diff * incr)
+        self.n[rows] = n
+
+
+class _Peak(_State):
+    """Đỉnh lũy tiến và drawdown hiện tại."""
+
+    FIELDS = {"peak": (float, np.nan), "drawdown": (float, np.nan)}
+    warmup = 0
+
+    def update(self, rows, prices, returns):
+        peak = np.fmax(self.peak[rows], prices)
+        self.peak[rows] = peak
+        self.drawdown[rows] = prices / peak - 1
+
+
+class _Ema(_State):
+    """EMA giá theo span (bar đầu = giá)."""
+
+    FIELDS = {"n": (np.int64, 0), "value": (float, np.nan)}
+
+    def __init__(self, span, capacity):
+        super().__init__(capacity)
+        self.alpha = 2.0 / (span + 1)
+        self.warmup = span
+
+    def update(self, rows, prices, returns):
+        value = self.value[rows]
+        self.value[rows] = np.where(np.isfinite(value), value + self.alpha * (prices - value), prices)
+        self.n[rows] += 1
+
+
+_STATE_TYPES = {"moments": _Moments, "peak": _Peak, "ema": _Ema}
+
+def _make_state(key, capacity):
+    cls = _STATE_TYPES[key[0]]
+    return cls(*key[1:], capacity) if len(key) > 1 else cls(capacity)
+
+
+# --- 3. ALERT ENGINE ---
+
+_EVENT_IDS = itertools.count(1)  # id tăng dần toàn process -> UI lấy cảnh báo mới bằng events_since(id)
+
+
+class AlertEngine:
+    """
+    Đánh giá luật cảnh báo tăng dần khi bar mới tới:
+    - Trạng thái metric (EWMA moments, đỉnh, EMA) lưu dạng mảng theo mã, cập nhật O(1) / mã / bar ->
+      chi phí mỗi lần update tỷ lệ với số mã CÓ bar mới, không phải cả universe.
+    - Các luật cùng metric (VD volatility(63) > 0.3, var_breach(63)) dùng chung 1 trạng thái, tính 1 lần.
+    - Luật trạng thái (volatility, drawdown) chỉ báo khi điều kiện chuyển false -> true, không spam mỗi bar;
+      luật sự kiện (cross, zscore, var_breach) báo mỗi bar xảy ra.
+    - notifiers: callable(events) (log file, webhook...) gọi khi notify=True.
+    """
+
+    def __init__(self, rules, periods=252, notifiers=(), history=500, capacity=256):
+        self.rules = parse_rules(rules) if isinstance(rules, str) else list(rules)
+        self.periods = periods
+        self.notifiers = list(notifiers)
+        self._capacity = capacity
+        self._index = {}
+        self._tickers = []
+        self._last_price = np.full(capacity, np.nan)
+        self._last_time = np.full(capacity, np.iinfo(np.int64).min, np.int64)
+        self._states = {}
+        for rule in self.rules:
+            for key in rule.metric_keys:
+                if key not in self._states:
+                    self._states[key] = _make_state(key, capacity)
+        self._active = [np.zeros(capacity, bool) for _ in self.rules]
+        self._value = [np.full(capacity, np.nan) for _ in self.rules]
+        self._sign = [np.zeros(capacity, np.int8) for _ in self.rules]  # dấu EMA nhanh - chậm (luật cross)
+        self._z = [norm.ppf(rule.args[1]) if rule.metric == "var_breach" else None for rule in self.rules]
+        self.fired = np.zeros(len(self.rules), np.int64)
+        self.events = deque(maxlen=history)
+        self.bars = 0  # tổng số (mã × bar) đã xử lý
+        self._lock = threading.RLock()
+
+    @property
+    def tickers(self):
+        return list(self._tickers)
+
+    @property
+    def metric_states(self):
+        return len(self._states)
+
+    def _rows(self, tickers):
+        """Dòng trạng thái của các mã (mã mới -> cấp dòng, mảng đầy -> tăng gấp đôi)."""
+        new = [t for t in dict.fromkeys(tickers) if t not in self._index]
+        if new:
+            for t in new:
+                self._index[t] = len(self._tickers)
+                self._tickers.append(t)
+            if len(self._tickers) > self._capacity:
+                capacity = max(len(self._tickers), 2 * self._capacity)
+                self._grow(capacity)
+        return np.fromiter((self._index[t] for t in tickers), np.int64, len(tickers))
+
+    def _grow(self, capacity):
+        def grown(arr, fill):
+            new = np.full(capacity, fill, arr.dtype)
+            new[:len(arr)] = arr
+            return new
+        self._last_price = grown(self._last_price, np.nan)
+        self._last_time = grown(self._last_time, np.iinfo(np.int64).min)
+        for state in self._states.values():
+            state.grow(capacity)
+        self._active = [grown(a, False) for a in self._active]
+        self._value = [grown(v, np.nan) for v in self._value]
+        self._sign = [grown(s, 0) for s in self._sign]
+        self._capacity = capacity
+
+    def _evaluate(self, i, rule, rows, returns):
+        """(giá trị metric, điều kiện) của luật i trên các dòng vừa cập nhật."""
+        if rule.metric == "drawdown":
+            value = self._states[("peak",)].drawdown[rows]
+            return value, _OPS[rule.op](value, rule.threshold)
+        if rule.metric == "cross":
+            fast, slow = (self._states[key] for key in rule.metric_keys)
+            value = fast.value[rows] / slow.value[rows] - 1
+            sign = np.sign(value).astype(np.int8)
+            prev = self._sign[i][rows]
+            ready = np.minimum(fast.n[rows], slow.n[rows]) > slow.warmup
+            up, down = ready & (prev < 0) & (sign > 0), ready & (prev > 0) & (sign < 0)
+            self._sign[i][rows] = np.where(sign != 0, sign, prev)
+            return value, {"up": up, "down": down}.get(rule.direction, up | down)
+
+        moments = self._states[rule.metric_keys[0]]
+        if rule.metric == "volatility":
+            value = np.sqrt(moments.var[rows] * self.periods)
+            return value, (moments.n[rows] >= moments.warmup) & _OPS[rule.op](value, rule.threshold)
+        # zscore / var_breach: so return vừa tới với mean / std TRƯỚC bar đó
+        ready = np.isfinite(returns) & (moments.n[rows] > moments.warmup)
+        mean, std = moments.prev_mean[rows], np.sqrt(moments.prev_var[rows])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if rule.metric == "zscore":
+                value = (returns - mean) / std
+                return value, ready & (std > 0) & _OPS[rule.op](value, rule.threshold)
+            value = returns
+            return value, ready & (returns < mean - self._z[i] * std)
+
+    def _describe(self, rule, ticker, value):
+        if rule.metric == "cross":
+            return f"{ticker}: EMA({rule.args[0]}) crossed {'above' if value > 0 else 'below'} EMA({rule.args[1]})"
+        if rule.metric == "var_breach":
+            return f"{ticker}: return {value:+.2%} breached {rule.args[1]:.0%} VaR (span {rule.args[0]})"
+        if rule.metric == "zscore":
+            return f"{ticker}: {rule.spec} (z = {value:+.2f})"
+        return f"{ticker}: {rule.spec} (now {value:.2%})"
+
+    def update_rows(self, rows, prices, timestamp, notify=True):
+        """Nạp 1 bar (cùng timestamp) cho các dòng `rows`. Trả về list cảnh báo vừa kích hoạt."""
+        prices = np.asarray(prices, dtype=float)
+        events = []
+        with self._lock:
+            prev = self._last_price[rows]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                returns = np.log(prices / prev)
+            self._last_price[rows] = prices
+            self._last_time[rows] = timestamp
+            self.bars += len(rows)
+            for state in self._states.values():
+                state.update(rows, prices, returns)
+
+            for i, rule in enumerate(self.rules):
+                value, cond = self._evaluate(i, rule, rows, returns)
+                fired = cond if rule.is_event else cond & ~self._active[i][rows]
+                self._active[i][rows] = cond
+                self._value[i][rows] = value
+                if not fired.any():
+                    continue
+                self.fired[i] += int(fired.sum())
+                when = pd.Timestamp(timestamp)
+                for j in np.flatnonzero(fired):
+                    ticker = self._tickers[rows[j]]
+                    events.append({"id": next(_EVENT_IDS), "time": when, "ticker": ticker, "rule": rule.spec,
+                                   "value": float(value[j]), "message": self._describe(rule, ticker, value[j])})
+            if notify:
+                self.events.extend(events)
+        if notify and events:
+            for notifier in self.notifiers:
+                try:
+                    notifier(events)
+                except Exception as e:
+                    print(f"⚠️ Alert notifier {type(notifier).__name__} failed: {e}")
+        return events
+
+    def update(self, prices, timestamp=None, notify=True):
+        """Bar mới cho các mã thay đổi: Series / dict {ticker: giá}. Mã không có giá hợp lệ bị bỏ qua."""
+        prices = pd.Series(prices, dtype=float).dropna()
+        prices = prices[prices > 0]
+        if prices.empty:
+            return []
+        timestamp = pd.Timestamp(timestamp if timestamp is not None else time.time_ns()).as_unit("ns").value
+        with self._lock:
+            return self.update_rows(self._rows(list(prices.index)), prices.to_numpy(), timestamp, notify)
+
+    def ingest_panel(self, close_panel, notify=True, max_bars=None):
+        """
+        Nạp bảng giá (time × tickers): chỉ các bar MỚI hơn bar cuối đã thấy của từng mã (refresh định kỳ
+        thường chỉ thêm 1-2 bar -> O(bar mới × mã đổi)). Lần đầu là warm-up toàn bộ lịch sử,
+        max_bars giới hạn số bar nạp. Trả về list cảnh báo kích hoạt.
+        """
+        if close_panel is None or close_panel.empty:
+            return []
+        index = pd.DatetimeIndex(close_panel.index)
+        stamps = (index.tz_convert("UTC") if index.tz is not None else index).as_unit("ns").asi8
+        close = close_panel.to_numpy(dtype=float)
+        events = []
+        with self._lock:
+            rows = self._rows([str(t) for t in close_panel.columns])
+            fresh = (stamps[:, None] > self._last_time[rows][None, :]) & np.isfinite(close) & (close > 0)
+            times = np.flatnonzero(fresh.any(axis=1))
+            if max_bars is not None:
+                times = times[-max_bars:]
+            for t in times:
+                cols = np.flatnonzero(fresh[t])
+                events += self.update_rows(rows[cols], close[t, cols], stamps[t], notify)
+        return events
+
+    def ingest_refresh(self, close_panel, warmup_bars=None):
+        """
+        Bar mới từ 1 lần refresh: quyết định warm-up theo TỪNG mã (trong cùng lock với lúc nạp) - mã chưa theo dõi
+        chỉ warm-up lịch sử (tối đa warmup_bars, không báo cảnh báo cũ), mã đang theo dõi báo bình thường.
+        """
+        if close_panel is None or close_panel.empty:
+            return []
+        panel = close_panel.set_axis([str(t) for t in close_panel.columns], axis=1)
+        with self._lock:
+            new = [t for t in panel.columns if t not in self._index]
+            tracked = [t for t in panel.columns if t in self._index]
+            if new:
+                self.ingest_panel(panel[new], notify=False, max_bars=warmup_bars)
+            return self.ingest_panel(panel[tracked]) if tracked else []
+
+    def active(self):
+        """Các (mã, luật) đang ở trạng thái kích hoạt (luật sự kiện: xảy ra ở bar cuối), kèm giá trị metric hiện tại."""
+        with self._lock:
+            n = len(self._tickers)
+            records = [(self._tickers[r], rule.spec, float(self._value[i][r]),
+                        self._describe(rule, self._tickers[r], self._value[i][r]))
+                       for i, rule in enumerate(self.rules) for r in np.flatnonzero(self._active[i][:n])]
+        return pd.DataFrame(records, columns=["Ticker", "Rule", "Value", "Message"])
+
+    def events_since(self, event_id=0):
+        with self._lock:
+            return [e for e in self.events if e["id"] > event_id]
+
+    def stats(self):
+        return {"tickers": len(self._tickers), "rules": len(self.rules), "metric_states": len(self._states),
+                "bars": self.bars, "fired": int(self.fired.sum())}
+
+
+# --- 4. KÊNH THÔNG BÁO ---
+
+class LogNotifier:
+    """Ghi mỗi cảnh báo 1 dòng JSON vào file log local."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, events):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, default=str, ensure_ascii=False) + "\n")
+
+
+class WebhookNotifier:
+    """Stub webhook: POST JSON {"alerts": [...]} tới URL trên thread nền (timeout ngắn, lỗi chỉ in ra)."""
+
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def _post(self, body):
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except Exception as e:
+            print(f"⚠️ Alert webhook {self.url} failed: {e}")
+
+    def __call__(self, events):
+        body = json.dumps({"alerts": events}, default=str).encode()
+        threading.Thread(target=self._post, args=(body,), name="alphaquant-webhook", daemon=True).start()
+
+
+def default_notifiers():
+    notifiers = [LogNotifier(config.ALERT_LOG_PATH)] if config.ALERT_LOG_PATH else []
+    if config.ALERT_WEBHOOK_URL:
+        notifiers.append(WebhookNotifier(config.ALERT_WEBHOOK_URL))
+    return notifiers
+
+
+# --- 5. ENGINE DÙNG CHUNG (1 / interval) ---
+
+_ENGINES = {}
+_ENGINES_LOCK = threading.Lock()
+
+def get_alert_engine(interval="1d"):
+    """AlertEngine dùng chung toàn process cho 1 interval (luật từ config.ALERT_RULES), do scheduler nạp bar mới."""
+    with _ENGINES_LOCK:
+        if interval not in _ENGINES:
+            _ENGINES[interval] = AlertEngine(config.ALERT_RULES, periods=PERIODS_PER_YEAR.get(interval, 252),
+                                             notifiers=default_notifiers())
+        return _ENGINES[interval]
+
+def ingest_refresh(close_panel, interval):
+    """Bar mới từ 1 lần refresh -> engine của interval (mã mới chỉ warm-up, xem AlertEngine.ingest_refresh)."""
+    return get_alert_engine(interval).ingest_refresh(close_panel, warmup_bars=config.ALERT_REPLAY_BARS)
+
+def recent_alerts(after_id=0):
+    """Cảnh báo đã phát (mọi interval) có id > after_id, mới nhất trước."""
+    with _ENGINES_LOCK:
+        engines = list(_ENGINES.items())
+    events = [dict(e, interval=interval) for interval, engine in engines for e in engine.events_since(after_id)]
+    return sorted(events, key=lambda e: e["id"], reverse=True)
+
+
+# Benchmark: python -m src.alerts
+if __name__ == "__main__":
+    from src.alerts import AlertEngine
+
+    rng = np.random.default_rng(3)
+    n_tickers, n_warmup = 5000, 300
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+    log_ret = rng.standard_t(4, (n_warmup, n_tickers)) * 0.012
+    panel = pd.DataFrame(100 * np.exp(np.cumsum(log_ret, axis=0)), columns=tickers,
+                         index=pd.date_range("2024-01-01", periods=n_warmup, freq="B"))
+    rules = config.ALERT_RULES
+    engine = AlertEngine(rules)
+    print(f"{len(engine.rules)} rules -> {engine.metric_states} shared metric states")
+
+    t0 = time.perf_counter(); engine.ingest_panel(panel, notify=False); t_warm = time.perf_counter() - t0
+    print(f"Warm-up {n_warmup} bars × {n_tickers} tickers: {t_warm:.2f}s | active now: {len(engine.active())}")
+
+    last = panel.iloc[-1].to_numpy().copy()
+    timestamp = panel.index[-1]
+    for changed in (10, 100, 1000, n_tickers):
+        timings = []
+        for _ in range(20):
+            timestamp += pd.Timedelta(days=1)
+            cols = rng.choice(n_tickers, changed, replace=False)
+            last[cols] *= np.exp(rng.standard_t(4, changed) * 0.012)
+            prices = pd.Series(last[cols], index=[tickers[c] for c in cols])
+            t0 = time.perf_counter(); engine.update(prices, timestamp); timings.append(time.perf_counter() - t0)
+        print(f"Update {changed:>5} changed tickers: {np.median(timings) * 1e3:6.2f} ms")
+
+    # Đối chiếu: tính lại toàn bộ metric từ lịch sử mỗi bar (pandas ewm trên cả universe)
+    history = pd.concat([panel, panel.iloc[-1:]])
+    t0 = time.perf_counter()
+    log_returns = np.log(history).diff()
+    vol = log_returns.ewm(span=63).std().iloc[-1] * np.sqrt(252)
+    drawdown = (history / history.cummax() - 1).iloc[-1]
+    ema_gap = history.ewm(span=20).mean().iloc[-1] / history.ewm(span=50).mean().iloc[-1] - 1
+    t_full = time.perf_counter() - t0
+    print(f"Full recompute (vol, drawdown, EMA only) per bar: {t_full * 1e3:.0f} ms")
+    print(f"Stats: {engine.stats()} | recent: {[e['message'] for e in list(engine.events)[-3:]]}")
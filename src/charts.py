@@ -0,0 +1,136 @@
+# src/charts.py
+
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import plotly.graph_objects as go
+from src import config
+
+# --- 1. FIGURE CACHE (theo fingerprint dữ liệu + tham số) ---
+
+_FIGURE_CACHE = OrderedDict()
+_FIGURE_CACHE_SIZE = 64
+_FIGURE_LOCK = threading.Lock()
+
+def cached_figure(key, build):
+    """
+    Figure Plotly dựng sẵn cho `key` (fingerprint dữ liệu + tham số vẽ); chưa có -> build() rồi lưu (LRU).
+    Figure trả về dùng chung giữa các session: chỉ đọc, không update_layout / add_trace lên nó.
+    """
+    with _FIGURE_LOCK:
+        fig = _FIGURE_CACHE.get(key)
+        if fig is not None:
+            _FIGURE_CACHE.move_to_end(key)
+            return fig
+    fig = build()
+    with _FIGURE_LOCK:
+        _FIGURE_CACHE[key] = fig
+        while len(_FIGURE_CACHE) > _FIGURE_CACHE_SIZE:
+            _FIGURE_CACHE.popitem(last=False)
+    return fig
+
+
+# --- 2. DOWNSAMPLING PHÍA SERVER ---
+
+def minmax_indices(values, budget):
+    """
+    Vị trí các điểm giữ lại khi vẽ đường: chia thành budget/2 bucket, giữ điểm min & max mỗi bucket
+    (giữ nguyên đỉnh / đáy, khác với lấy mẫu cách đều). NaN bị bỏ qua; n <= budget -> mọi điểm hợp lệ.
+    """
+    values = np.asarray(values, dtype=float)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) <= budget:
+        return valid
+    n_buckets = max(1, budget // 2)
+    bounds = np.linspace(0, len(valid), n_buckets + 1).astype(np.int64)
+    starts = bounds[:-1]
+    v = values[valid]
+    # argmin / argmax từng bucket bằng reduceat: giá trị cực trị rồi lấy vị trí khớp đầu tiên của mỗi bucket
+    lo, hi = np.minimum.reduceat(v, starts), np.maximum.reduceat(v, starts)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(bounds))
+    picks = []
+    for extreme in (lo, hi):
+        hits = np.flatnonzero(v == extreme[bucket])
+        picks.append(hits[np.unique(bucket[hits], return_index=True)[1]])
+    return valid[np.unique(np.concatenate(picks))]
+
+def series_budget(n_series, budget):
+    """
+    Số điểm mỗi series khi 1 chart có nhiều series: tổng chart tối đa ~5 × budget
+    (50 mã × 2000 điểm ~ 4 MB JSON mỗi rerun), nhưng mỗi series không dưới budget / 10.
+    """
+    return int(min(budget, max(budget // 10, budget * 5 // max(1, n_series))))
+
+def candle_buckets(n, budget):
+    """Vị trí bắt đầu các nhóm nến liên tiếp (gộp k = ceil(n / budget) nến thành 1) - None nếu không cần gộp."""
+    if n <= budget:
+        return None
+    return np.arange(0, n, int(np.ceil(n / budget)))
+
+def merge_candles(open_, high, low, close, volume, starts):
+    """Gộp nến theo nhóm (reduceat): Open đầu, High max, Low min, Close cuối, Volume tổng."""
+    ends = np.r_[starts[1:], len(open_)] - 1
+    return (np.asarray(open_)[starts], np.fmax.reduceat(np.asarray(high, dtype=float), starts),
+            np.fmin.reduceat(np.asarray(low, dtype=float), starts), np.asarray(close)[ends],
+            np.add.reduceat(np.nan_to_num(np.asarray(volume, dtype=float)), starts))
+
+def scatter_class(total_points):
+    """go.Scattergl (WebGL) khi tổng số điểm vượt ngưỡng, go.Scatter (SVG) cho chart nhỏ."""
+    return go.Scattergl if total_points > config.CHART_WEBGL_THRESHOLD else go.Scatter
+
+def volume_colors(open_, close, up='#0ECB81', down='#F6465D'):
+    """Màu cột volume theo nến tăng / giảm (vector hóa)."""
+    return np.where(np.asarray(open_) < np.asarray(close), up, down)
+
+
+# Benchmark: python -m src.charts (kiểm tra đúng sai ở tests/test_charts.py)
+if __name__ == "__main__":
+    import pandas as pd
+    from plotly.subplots import make_subplots
+
+    rng = np.random.default_rng(3)
+    n = 200_000  # ~1 năm nến 1m của crypto 24/7 (525k) / ~2 năm nến 1m cổ phiếu
+    index = pd.date_range("2025-01-01", periods=n, freq="1min")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = close * (1 + rng.normal(0, 5e-4, n))
+    high, low = np.maximum(open_, close) * 1.001, np.minimum(open_, close) * 0.999
+    volume = rng.integers(1, 1000, n).astype(float)
+
+    t0 = time.perf_counter()
+    colors = ['#0ECB81' if o < c else '#F6465D' for o, c in zip(open_, close)]
+    t_list = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    volume_colors(open_, close)
+    t_vec = time.perf_counter() - t0
+    print(f"Volume colors: list comprehension {t_list * 1e3:.1f} ms | np.where {t_vec * 1e3:.1f} ms")
+
+    def payload(fig):
+        return len(fig.to_json()) / 1024 ** 2
+
+    t0 = time.perf_counter()
+    full = make_subplots(rows=2, cols=1, shared_xaxes=True)
+    full.add_trace(go.Candlestick(x=index, open=open_, high=high, low=low, close=close), row=1, col=1)
+    full.add_trace(go.Bar(x=index, y=volume, marker_color=colors), row=2, col=1)
+    size_full = payload(full)
+    t_full = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    starts = candle_buckets(n, config.CHART_POINT_BUDGET)
+    o, h, l, c, v = merge_candles(open_, high, low, close, volume, starts)
+    small = make_subplots(rows=2, cols=1, shared_xaxes=True)
+    small.add_trace(go.Candlestick(x=index[starts], open=o, high=h, low=l, close=c), row=1, col=1)
+    small.add_trace(go.Bar(x=index[starts], y=v, marker_color=volume_colors(o, c)), row=2, col=1)
+    size_small = payload(small)
+    t_small = time.perf_counter() - t0
+    print(f"Candlestick {n:,} bars: build+serialize {t_full:.2f}s, {size_full:.1f} MB -> "
+          f"{len(starts):,} bars {t_small:.3f}s, {size_small:.2f} MB")
+
+    t0 = time.perf_counter()
+    keep = minmax_indices(close, config.CHART_POINT_BUDGET)
+    t_keep = time.perf_counter() - t0
+    print(f"Min/max downsample: {n:,} -> {len(keep):,} points in {t_keep * 1e3:.1f} ms")
+
+    cached_figure(("bench",), lambda: small)
+    t0 = time.perf_counter(); cached_figure(("bench",), lambda: small); t_hit = time.perf_counter() - t0
+    print(f"Figure cache hit: {t_hit * 1e6:.0f} µs")
@@ -0,0 +1,102 @@
+# src/config.py
+
+import os
+
+# --- 1. ACCELERATION ---
+# Backend cho các vòng lặp nóng trong src/kernels.py:
+# "auto"  : dùng Numba nếu đã cài, nếu không thì NumPy
+# "numba" : bắt buộc Numba (báo lỗi nếu chưa cài)
+# "numpy" : chỉ dùng bản NumPy tham chiếu
+KERNEL_BACKEND = os.environ.get("ALPHAQUANT_KERNEL_BACKEND", "auto").lower()
+
+# --- 2. DATA FETCHING ---
+# Số request đồng thời tối đa tới Yahoo Finance (dùng chung cho mọi session)
+FETCH_MAX_CONCURRENCY = int(os.environ.get("ALPHAQUANT_FETCH_CONCURRENCY", "4"))
+
+# --- 3. SHARED DATASET CACHE ---
+# Ngân sách RAM (MB) cho cache dữ liệu giá dùng chung giữa các session
+DATASET_CACHE_BUDGET_MB = float(os.environ.get("ALPHAQUANT_CACHE_BUDGET_MB", "1024"))
+
+# --- 4. LOCAL PRICE STORE & SCREENER ---
+# Thư mục lưu giá đã tải (parquet / mã / interval) - nguồn dữ liệu cho Screener
+PRICE_STORE_DIR = os.environ.get("ALPHAQUANT_PRICE_STORE", os.path.join("data", "price_store"))
+
+# --- 5. COMPACT STORAGE ---
+# Lưu dữ liệu đã tải ở dạng gọn: giá float32, Volume int64, bỏ các trường không view nào dùng
+# (~1/2 RAM mỗi session). Khi bật kiểm tra precision, mỗi lần load sẽ so các chỉ số của
+# quant_engine giữa bản float64 và bản gọn, vượt sai số tương đối -> báo lỗi ngay.
+COMPACT_STORAGE = os.environ.get("ALPHAQUANT_COMPACT_STORAGE", "0").lower() in ("1", "true", "yes", "on")
+COMPACT_PRECISION_CHECK = os.environ.get("ALPHAQUANT_COMPACT_CHECK", "1").lower() in ("1", "true", "yes", "on")
+COMPACT_PRECISION_RTOL = float(os.environ.get("ALPHAQUANT_COMPACT_RTOL", "1e-3"))
+
+# --- 6. ANALYTICS SNAPSHOTS ---
+# Thư mục lưu bundle analytics tính sẵn (theo fingerprint dữ liệu) để các trang mở tức thì
+SNAPSHOT_DIR = os.environ.get("ALPHAQUANT_SNAPSHOT_DIR", os.path.join("data", "snapshots"))
+
+# --- 7. BACKGROUND REFRESH SCHEDULER ---
+# Watchlist làm nóng cache định kỳ, phân cách bằng ";" - mỗi mục "TICKER1,TICKER2@interval"
+# (bỏ trống interval -> 1d). VD: "AAPL,MSFT,BTC-USD@1d;BTC-USD,ETH-USD@1h". Rỗng -> tắt scheduler.
+REFRESH_WATCHLISTS = os.environ.get("ALPHAQUANT_REFRESH_WATCHLISTS", "")
+# Chu kỳ refresh (giây), số job chạy song song và thời gian backoff tối đa khi lỗi liên tiếp
+REFRESH_INTERVAL_SECONDS = float(os.environ.get("ALPHAQUANT_REFRESH_INTERVAL", "900"))
+REFRESH_MAX_CONCURRENCY = int(os.environ.get("ALPHAQUANT_REFRESH_CONCURRENCY", "2"))
+REFRESH_MAX_BACKOFF_SECONDS = float(os.environ.get("ALPHAQUANT_REFRESH_MAX_BACKOFF", "3600"))
+
+# --- 8. LOCAL RESAMPLING ---
+# Tải 1 lần ở interval mịn nhất Yahoo cho phép với khoảng ngày đã chọn rồi tự gộp ra interval thô hơn
+# (đổi 5m -> 30m -> 1h không phải tải lại). Tắt -> mỗi interval tải riêng như trước.
+LOCAL_RESAMPLE = os.environ.get("ALPHAQUANT_LOCAL_RESAMPLE", "1").lower() in ("1", "true", "yes", "on")
+
+# --- 9. CHARTS ---
+# Số điểm tối đa mỗi series gửi xuống trình duyệt (nến được gộp, đường giữ min/max mỗi bucket);
+# chart nhiều series (Relative Performance) chia nhỏ hơn, tổng ~5 × budget
+CHART_POINT_BUDGET = int(os.environ.get("ALPHAQUANT_CHART_POINTS", "2000"))
+# Tổng số điểm của 1 chart vượt ngưỡng này -> dùng trace WebGL (Scattergl) thay cho SVG
+CHART_WEBGL_THRESHOLD = int(os.environ.get("ALPHAQUANT_CHART_WEBGL_POINTS", "20000"))
+
+# --- 10. DATA PROVIDER ---
+# Nguồn giá cho fetch_stock_data: "yahoo" (yfinance) hoặc "synthetic" (GBM giả lập tất định, không cần mạng -
+# dùng cho load test / chạy offline). Độ trễ giả lập (ms) mỗi lần tải để mô phỏng mạng.
+DATA_PROVIDER = os.environ.get("ALPHAQUANT_DATA_PROVIDER", "yahoo").lower()
+SYNTHETIC_LATENCY_MS = float(os.environ.get("ALPHAQUANT_SYNTHETIC_LATENCY_MS", "0"))
+
+# --- 11. DATA QUALITY ---
+# Làm sạch dữ liệu 1 lần ngay khi tải vào cache dùng chung (data_loader.clean_panel): timestamp trùng, giá <= 0,
+# bad tick, nến thiếu (ứng viên split chỉ ghi nhận) -> các hàm phía sau dùng thẳng, không tự lọc / copy phòng thủ nữa
+DATA_CLEANING = os.environ.get("ALPHAQUANT_DATA_CLEANING", "1").lower() in ("1", "true", "yes", "on")
+
+# --- 12. FACTOR RISK MODEL ---
+# Watchlist từ N mã trở lên -> covariance ước lượng bằng mô hình nhân tố PCA (randomized SVD): lưu k nhân tố +
+# phương sai riêng thay cho ma trận n × n (optimizer, risk parity, heatmap). 0 -> luôn dùng covariance mẫu.
+FACTOR_MODEL_MIN_ASSETS = int(os.environ.get("ALPHAQUANT_FACTOR_MODEL_MIN_ASSETS", "50"))
+# Số nhân tố cố định; 0 -> tự chọn theo ngưỡng nhiễu Marchenko–Pastur (tối đa 20)
+FACTOR_MODEL_FACTORS = int(os.environ.get("ALPHAQUANT_FACTOR_MODEL_FACTORS", "0"))
+
+# --- 13. PARALLEL MONTE CARLO ---
+# Số process worker cho Monte Carlo song song (0 -> số core). Từ MC_PARALLEL_MIN_SIMULATIONS kịch bản trở lên
+# AI Forecast chia chunk cho process pool; 1 worker -> chạy tuần tự trong process (cùng kết quả từng bit)
+MC_WORKERS = int(os.environ.get("ALPHAQUANT_MC_WORKERS", "0"))
+MC_PARALLEL_MIN_SIMULATIONS = int(os.environ.get("ALPHAQUANT_MC_PARALLEL_MIN_SIMS", "100000"))
+
+# --- 14. ALERTS ---
+# Luật cảnh báo đánh giá tăng dần khi scheduler nạp bar mới (cú pháp: src/alerts.py), phân cách bằng ";"
+ALERT_RULES = os.environ.get(
+    "ALPHAQUANT_ALERT_RULES",
+    "volatility(63) > 30%; volatility(63) < 15%; drawdown < -20%; zscore(20) > 3; zscore(20) < -3; "
+    "cross(20, 50); var_breach(63, 0.99)",
+)
+# File log JSON lines của cảnh báo (rỗng -> tắt) và URL webhook nhận POST JSON (rỗng -> tắt)
+ALERT_LOG_PATH = os.environ.get("ALPHAQUANT_ALERT_LOG", os.path.join("data", "alerts.log"))
+ALERT_WEBHOOK_URL = os.environ.get("ALPHAQUANT_ALERT_WEBHOOK", "")
+# Số bar lịch sử tối đa dùng để warm-up trạng thái metric lần đầu gặp 1 watchlist
+ALERT_REPLAY_BARS = int(os.environ.get("ALPHAQUANT_ALERT_REPLAY_BARS", "2000"))
+
+# --- 15. LOCAL ANALYTICS SERVICE (service.py) ---
+# Địa chỉ lắng nghe, cửa sổ gom request /v1/stats thành 1 lô (ms), số kết quả giữ trong cache theo fingerprint,
+# timeout chờ 1 lô và giới hạn số kịch bản Monte Carlo mỗi request
+SERVICE_HOST = os.environ.get("ALPHAQUANT_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.environ.get("ALPHAQUANT_SERVICE_PORT", "8765"))
+SERVICE_BATCH_WINDOW_MS = float(os.environ.get("ALPHAQUANT_SERVICE_BATCH_WINDOW_MS", "10"))
+SERVICE_CACHE_SIZE = int(os.environ.get("ALPHAQUANT_SERVICE_CACHE_SIZE", "512"))
+SERVICE_TIMEOUT_SECONDS = float(os.environ.get("ALPHAQUANT_SERVICE_TIMEOUT", "120"))
+SERVICE_MAX_SIMULATIONS = int(os.environ.get("ALPHAQUANT_SERVICE_MAX_SIMS", "1000000"))
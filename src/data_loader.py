@@ -1,7 +1,16 @@
 # src/data_loader.py
 
+import hashlib
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import numpy as np
 import yfinance as yf
 import pandas as pd
+from src import config
 
 def fetch_stock_data(tickers, start_date, end_date, interval='1d'):
     """
@@ -14,6 +23,13 @@ def fetch_stock_data(tickers, start_date, end_date, interval='1d'):
         tickers_str = tickers
 
     print(f"🔄 Fetching: {tickers_str}...")
+
+    # Provider synthetic: dữ liệu giả lập tại chỗ (load test / chạy offline), cùng cấu trúc group_by='ticker'
+    if config.DATA_PROVIDER == "synthetic":
+        names = tickers if isinstance(tickers, list) else tickers_str.split()
+        return combine_ticker_frames({t: synthetic_ohlcv(t, start_date, end_date, interval) for t in names}, names)
+    if config.DATA_PROVIDER != "yahoo":
+        raise ValueError(f"Unknown data provider: {config.DATA_PROVIDER}")
     
     try:
         # Tải dữ liệu
@@ -33,4 +49,492 @@ def fetch_stock_data(tickers, start_date, end_date, interval='1d'):
         
     except Exception as e:
         print(f"❌ Error: {e}")
-        return None
\ No newline at end of file
+        return None
+
+INTRADAY_INTERVALS = ['1m', '5m', '30m', '1h']
+
+def default_date_range(interval, today=None):
+    """Khoảng ngày mặc định của app: 1 năm, intraday 59 ngày (giới hạn của Yahoo)."""
+    today = today or date.today()
+    start = today - timedelta(days=59 if interval in INTRADAY_INTERVALS else 365)
+    return start, today
+
+# --- SYNTHETIC PROVIDER (GBM giả lập, không cần mạng) ---
+
+def _is_24_7(ticker):
+    # Crypto (BTC-USD) và FX (EURUSD=X) giao dịch liên tục, cổ phiếu / ETF theo phiên
+    return ticker.endswith("-USD") or ticker.endswith("=X")
+
+def synthetic_ohlcv(ticker, start_date, end_date, interval='1d'):
+    """
+    OHLCV giả lập 1 mã (DataFrame phẳng như 1 mã của fetch_stock_data) cho load test / chạy offline.
+    Tất định theo (ticker, interval, khoảng ngày); drift / volatility / giá đầu riêng từng mã,
+    returns đuôi dày (Student-t, df=4). Lịch: cổ phiếu ngày làm việc (intraday 14:30-21:00 UTC),
+    crypto 24/7. Ngày cuối không tính (giống Yahoo). None nếu khoảng ngày không có phiên nào.
+    """
+    if config.SYNTHETIC_LATENCY_MS > 0:
+        time.sleep(config.SYNTHETIC_LATENCY_MS / 1000)
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    all_day = _is_24_7(ticker)
+    if interval in INTERVAL_NS:
+        index = pd.date_range(start, end, freq=pd.Timedelta(INTERVAL_NS[interval]), inclusive="left", tz="UTC", name="Datetime")
+        if not all_day:
+            minutes = index.hour * 60 + index.minute
+            index = index[(index.dayofweek < 5) & (minutes >= 14 * 60 + 30) & (minutes < 21 * 60)]
+        periods_per_year = (365 if all_day else 252) * NS_PER_DAY / INTERVAL_NS[interval] / (1 if all_day else 24 / 6.5)
+    else:
+        freq = {"1d": "D" if all_day else "B", "1wk": "W-MON"}[interval]
+        index = pd.date_range(start, end, freq=freq, inclusive="left", name="Date")
+        periods_per_year = {"1d": 365 if all_day else 252, "1wk": 52}[interval]
+    n = len(index)
+    if n == 0:
+        return None
+
+    seed = int.from_bytes(hashlib.blake2b(f"{ticker}|{interval}|{start_date}|{end_date}".encode(), digest_size=8).digest(), "little")
+    rng = np.random.default_rng(seed)
+    profile = np.random.default_rng(int.from_bytes(hashlib.blake2b(ticker.encode(), digest_size=8).digest(), "little"))
+    drift, vol = profile.uniform(-0.05, 0.25), profile.uniform(0.5, 0.9) if all_day else profile.uniform(0.15, 0.45)
+    price0 = profile.uniform(20, 500)
+
+    shocks = rng.standard_t(4, n) / np.sqrt(2.0)  # phương sai t(4) = 2 -> chuẩn hóa về 1
+    log_ret = (drift - 0.5 * vol ** 2) / periods_per_year + vol / np.sqrt(periods_per_year) * shocks
+    close = price0 * np.exp(np.cumsum(log_ret))
+    open_ = np.r_[price0, close[:-1]] * np.exp(rng.normal(0, 0.1 * vol / np.sqrt(periods_per_year), n))
+    wick = np.abs(rng.normal(0, 0.5 * vol / np.sqrt(periods_per_year), (2, n)))
+    return pd.DataFrame({
+        "Open": open_,
+        "High": np.maximum(open_, close) * np.exp(wick[0]),
+        "Low": np.minimum(open_, close) * np.exp(-wick[1]),
+        "Close": close,
+        "Volume": rng.lognormal(13, 0.6, n).round().astype("int64"),
+    }, index=index)
+
+
+# --- LOCAL RESAMPLING (tải 1 lần ở độ phân giải mịn nhất, tự gộp ra interval thô hơn) ---
+
+# Các "họ" interval có thể gộp lẫn nhau (mịn -> thô). Intraday của Yahoo chưa điều chỉnh cổ tức,
+# còn 1d/1wk đã auto_adjust -> không dựng nến ngày từ nến intraday.
+INTERVAL_FAMILIES = [['1m', '5m', '30m', '1h'], ['1d', '1wk']]
+# Độ dài lịch sử tối đa Yahoo trả về cho từng interval intraday (ngày, tính từ hôm nay)
+INTERVAL_LIMIT_DAYS = {'1m': 7, '5m': 60, '30m': 60, '1h': 730}
+INTERVAL_NS = {'1m': 60 * 10 ** 9, '5m': 300 * 10 ** 9, '30m': 1800 * 10 ** 9, '1h': 3600 * 10 ** 9}
+NS_PER_DAY = 86_400 * 10 ** 9
+
+def base_interval(interval, start_date, end_date=None, today=None):
+    """
+    Interval mịn nhất (cùng họ, không thô hơn `interval`) mà Yahoo còn trả đủ dữ liệu cho khoảng ngày:
+    VD 1h trong 59 ngày -> tải 5m rồi gộp; 1wk -> tải 1d. Tắt LOCAL_RESAMPLE -> chính `interval`.
+    """
+    if not config.LOCAL_RESAMPLE:
+        return interval
+    family = next((f for f in INTERVAL_FAMILIES if interval in f), None)
+    if family is None:
+        return interval
+    today = today or date.today()
+    oldest = (today - pd.Timestamp(start_date).date()).days
+    for candidate in family[:family.index(interval) + 1]:
+        limit = INTERVAL_LIMIT_DAYS.get(candidate)
+        if limit is None or oldest < limit:
+            return candidate
+    return interval
+
+def _bucket_starts(index, interval):
+    """
+    Vị trí bắt đầu mỗi nến mới + nhãn thời gian (UTC ns) của nến, tính hoàn toàn bằng NumPy trên
+    giờ địa phương của sàn (index tz). Intraday neo theo giờ mở cửa phổ biến nhất (9:30 sàn Mỹ,
+    00:00 crypto 24/7) -> khớp nến 30m / 1h của Yahoo; 1d theo ngày lịch; 1wk theo thứ Hai.
+    """
+    # pandas 2 có thể lưu datetime64[us] -> quy hết về ns trước khi tính
+    index = index.as_unit("ns")
+    tz = getattr(index, "tz", None)
+    utc = index.asi8 if tz is None else index.tz_convert("UTC").asi8
+    wall = index.asi8 if tz is None else index.tz_localize(None).asi8
+    day = wall // NS_PER_DAY
+    if interval == '1d':
+        keys = day * NS_PER_DAY
+    elif interval == '1wk':
+        # 1970-01-01 là thứ Năm -> (day + 3) % 7 = 0 vào thứ Hai
+        keys = (day - (day + 3) % 7) * NS_PER_DAY
+    else:
+        step = INTERVAL_NS[interval]
+        time_of_day = wall - day * NS_PER_DAY
+        # Giờ mở phiên: mode của nến đầu tiên mỗi ngày (bỏ qua ngày thiếu nến mở cửa)
+        first = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+        opens, counts = np.unique(time_of_day[first], return_counts=True)
+        anchor = opens[np.argmax(counts)] % step
+        keys = day * NS_PER_DAY + anchor + (time_of_day - anchor) // step * step
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    # Nhãn UTC = thời điểm UTC của nến đầu bucket lùi về mốc bucket (không vướng DST khi localize)
+    labels = utc[starts] - (wall[starts] - keys[starts])
+    return starts, labels
+
+def _first_valid_at(values, starts, ends, last=False):
+    # Giá trị hợp lệ (không NaN) đầu / cuối của từng bucket - giống "first" / "last" của pandas resample
+    if values.dtype.kind != 'f':
+        return values[ends if last else starts]
+    n = len(values)
+    pos = np.arange(n)
+    valid = ~np.isnan(values)
+    if last:
+        picked = np.maximum.reduceat(np.where(valid, pos, -1), starts)
+        found = picked >= starts
+    else:
+        picked = np.minimum.reduceat(np.where(valid, pos, n), starts)
+        found = picked <= ends
+    return np.where(found, values[np.where(found, picked, 0)], np.nan)
+
+def resample_ohlcv(frame, interval):
+    """
+    Gộp nến OHLCV phẳng (1 mã, index tăng dần) sang interval thô hơn bằng reduceat:
+    Open = đầu, High = max, Low = min, Close/Adj Close = cuối, Volume = tổng (cột khác: cuối).
+    Đầu / cuối bỏ qua NaN như pandas resample "first" / "last".
+    """
+    if frame is None or frame.empty:
+        return frame
+    frame = frame.dropna(how="all")
+    if frame.empty:
+        return frame
+    starts, labels = _bucket_starts(frame.index, interval)
+    ends = np.r_[starts[1:], len(frame)] - 1
+    columns = {}
+    for col in frame.columns:
+        values = frame[col].to_numpy()
+        if col == 'Open':
+            columns[col] = _first_valid_at(values, starts, ends)
+        elif col == 'High':
+            columns[col] = np.fmax.reduceat(values, starts)
+        elif col == 'Low':
+            columns[col] = np.fmin.reduceat(values, starts)
+        elif col == 'Volume':
+            columns[col] = np.add.reduceat(np.nan_to_num(values) if values.dtype.kind == 'f' else values, starts)
+        else:
+            columns[col] = _first_valid_at(values, starts, ends, last=True)
+    index = pd.to_datetime(labels, unit="ns", utc=True).as_unit(frame.index.unit)
+    tz = getattr(frame.index, "tz", None)
+    index = index.tz_convert(tz) if tz is not None else index.tz_localize(None)
+    index.name = frame.index.name
+    return pd.DataFrame(columns, index=index, columns=frame.columns)
+
+def split_by_ticker(df, tickers):
+    """Tách DataFrame group_by='ticker' thành dict {ticker: DataFrame OHLCV phẳng}."""
+    if isinstance(tickers, str): tickers = [tickers]
+    frames = {}
+    if df is None or df.empty: return frames
+
+    if isinstance(df.columns, pd.MultiIndex):
+        available = df.columns.get_level_values(0).unique()
+        for ticker in tickers:
+            if ticker in available:
+                frames[ticker] = df.xs(ticker, level=0, axis=1)
+    elif len(tickers) == 1:
+        frames[tickers[0]] = df
+    return frames
+
+def combine_ticker_frames(frames, tickers=None, keep_int=False):
+    """
+    Ghép dict {ticker: DataFrame} về đúng cấu trúc yfinance group_by='ticker' (MultiIndex Ticker/Price).
+    keep_int=True (bản compact): cột int giữ kiểu int64, phiên thiếu = 0; mặc định phiên thiếu là NaN như yfinance.
+    """
+    order = [t for t in (tickers or frames.keys()) if frames.get(t) is not None and not frames[t].empty]
+    if not order: return None
+    combined = pd.concat({t: frames[t] for t in order}, axis=1)
+    combined.columns = combined.columns.set_names(["Ticker", "Price"])
+    # Lịch giao dịch lệch nhau (cổ phiếu vs crypto) -> concat chèn NaN làm cột int thành float64:
+    # bản compact giữ lại kiểu int (Volume) với phiên thiếu = 0
+    int_cols = [(t, c) for t in order for c, dtype in frames[t].dtypes.items() if pd.api.types.is_integer_dtype(dtype)] \
+        if keep_int else []
+    if int_cols and any(not pd.api.types.is_integer_dtype(combined[col].dtype) for col in int_cols):
+        combined[int_cols] = combined[int_cols].fillna(0).astype("int64")
+    return combined.sort_index()
+
+
+# --- DATA QUALITY (1 lượt vector hóa trên cả panel, chạy 1 lần mỗi lần tải) ---
+
+# Tỷ lệ split / reverse split thường gặp (số cổ phiếu mới / cũ)
+SPLIT_RATIOS = np.array([2, 3, 4, 5, 8, 10, 15, 20, 25, 30, 40, 50], dtype=float)
+SPLIT_TOLERANCE = 0.05  # lệch tối đa so với tỷ lệ chuẩn (biến động giá trong phiên split)
+OUTLIER_Z = 8.0  # ngưỡng robust z-score (MAD) của returns: bad tick / outlier / split
+STALE_BARS = 5  # số phiên liên tiếp giá đứng yên & không khớp lệnh -> giá "chết"
+QUALITY_COLUMNS = ["Bars", "Duplicates", "Non-positive", "Bad ticks", "Gaps filled", "Split candidates", "Outliers",
+                   "Stale bars", "OHLC fixed", "Split details"]
+
+def _prev_valid(values):
+    # Giá trị hợp lệ gần nhất TRƯỚC mỗi dòng, theo từng cột (bỏ qua NaN - phiên nghỉ của mã)
+    return pd.DataFrame(values).ffill().shift(1).to_numpy()
+
+def _next_valid(values):
+    return pd.DataFrame(values).bfill().shift(-1).to_numpy()
+
+def _robust_z(returns):
+    # z-score theo median / MAD từng mã (không bị chính các outlier kéo lệch như std)
+    with np.errstate(all="ignore"):
+        median = np.nanmedian(returns, axis=0)
+        scale = 1.4826 * np.nanmedian(np.abs(returns - median), axis=0)
+        return (returns - median) / np.where(scale > 0, scale, np.nan)
+
+def _run_flags(flags, neutral, min_len):
+    # Đánh dấu các dòng thuộc chuỗi `flags` liên tiếp dài >= min_len (dòng `neutral` không cắt chuỗi)
+    T, N = flags.shape
+    group = np.cumsum(~(flags | neutral), axis=0) + np.arange(N) * (T + 1)
+    counts = np.bincount(group.ravel(), weights=flags.ravel(), minlength=N * (T + 1))
+    return flags & (counts[group] >= min_len)
+
+def clean_panel(df, tickers=None, outlier_z=OUTLIER_Z, stale_bars=STALE_BARS, adjust_splits=False):
+    """
+    Làm sạch panel giá (group_by='ticker' hoặc 1 mã phẳng) trong 1 lượt vector hóa trên ma trận (thời gian × mã):
+    - Timestamp trùng: giữ bản cuối; index sắp xếp tăng dần.
+    - Giá <= 0 và bad tick (nhảy vọt rồi quay đầu ngay phiên sau, |z| > outlier_z): coi như thiếu.
+    - Nến thiếu giá (gaps): Close lấy Close trước đó, Open/High/Low lấy Close. Dòng trống hẳn
+      (phiên nghỉ theo lịch riêng của mã trong panel lẫn cổ phiếu / crypto) giữ nguyên NaN.
+    - High / Low không bao Open / Close: nới ra cho khớp.
+    - Chỉ ghi nhận (không sửa): ứng viên split (bước nhảy khớp tỷ lệ split chuẩn, không quay đầu, volume đổi
+      theo cùng tỷ lệ), returns ngoại lai (biến động thật), giá đứng yên >= stale_bars phiên.
+      Cú sập -50% kèm volume x3 trông y hệt split 2:1 -> không tự sửa giá. Dữ liệu Yahoo đã auto_adjust;
+      adjust_splits=True chỉ dùng khi BIẾT dữ liệu chưa điều chỉnh (không bao giờ áp cho crypto / FX 24/7).
+    Trả về (DataFrame đã làm sạch, cùng cấu trúc & dtype; báo cáo DataFrame mã × QUALITY_COLUMNS).
+    """
+    if df is None or df.empty:
+        return df, pd.DataFrame(columns=QUALITY_COLUMNS)
+    flat = not isinstance(df.columns, pd.MultiIndex)
+    if flat:
+        ticker = tickers[0] if isinstance(tickers, list) else (tickers or "ASSET")
+        df = combine_ticker_frames({ticker: df}, [ticker])
+    available = list(df.columns.get_level_values(0).unique())
+    tickers = [t for t in ([tickers] if isinstance(tickers, str) else tickers or available) if t in available]
+    present_fields = set(df.columns.get_level_values(1))
+    fields = [f for f in PRICE_FIELDS if f in present_fields]
+    close_field = 'Adj Close' if 'Adj Close' in fields else 'Close'
+
+    def matrix(field, dtype=float):
+        return df.reindex(columns=pd.MultiIndex.from_product([tickers, [field]])).to_numpy(dtype=dtype, copy=True)
+
+    # 1. Timestamp trùng (giữ bản cuối) & thứ tự thời gian
+    present_raw = ~np.isnan(np.stack([matrix(f) for f in fields])).all(axis=0)
+    dup = df.index.duplicated(keep="last")
+    duplicates = (present_raw & dup[:, None]).sum(axis=0)
+    if dup.any():
+        df = df[~dup]
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    prices = {f: matrix(f) for f in fields}
+    volume = matrix("Volume") if "Volume" in present_fields else None
+    # Mã có phiên ở dòng này <=> có ít nhất 1 giá (Volume int của panel ghép đã bị lấp 0 ở phiên nghỉ)
+    present = ~np.isnan(np.stack(list(prices.values()))).all(axis=0)
+
+    # 2. Giá <= 0 -> thiếu
+    with np.errstate(invalid="ignore"):
+        non_positive = np.zeros_like(present)
+        for f in fields:
+            bad = prices[f] <= 0
+            non_positive |= bad
+            prices[f][bad] = np.nan
+
+    # 3. Bad tick: nhảy vọt rồi quay đầu ở phiên kế tiếp -> bỏ cả nến
+    close = prices[close_field]
+    with np.errstate(all="ignore"):
+        ret = np.log(close / _prev_valid(close))
+        ret_next = np.log(_next_valid(close) / close)
+        z, z_next = _robust_z(ret), _robust_z(ret_next)
+        bad_ticks = ((np.abs(z) > outlier_z) & (np.abs(z_next) > outlier_z) & (np.sign(ret) != np.sign(ret_next))
+                     & (np.abs(ret + ret_next) < 0.5 * np.abs(ret)))
+    for f in fields:
+        prices[f][bad_ticks] = np.nan
+
+    # 4. Lấp nến thiếu giá (chỉ trên các dòng mã có phiên)
+    close = prices[close_field]
+    missing = present & np.isnan(np.stack(list(prices.values()))).any(axis=0)
+    filled_close = pd.DataFrame(close).ffill().to_numpy()
+    close[present & np.isnan(close)] = filled_close[present & np.isnan(close)]
+    for f in fields:
+        hole = present & np.isnan(prices[f])
+        prices[f][hole] = close[hole]
+    gaps = missing & ~np.isnan(close)
+
+    # 5. Ứng viên split: giá nhảy đúng tỷ lệ, volume đổi ngược chiều cùng tỷ lệ
+    with np.errstate(all="ignore"):
+        ret = np.log(close / _prev_valid(close))
+        z = _robust_z(ret)
+        move = np.exp(-ret)  # giá cũ / giá mới: split k:1 -> ~k, reverse 1:k -> ~1/k
+        ratio = np.where(move >= 1, move, 1 / move)
+        nearest = SPLIT_RATIOS[np.abs(ratio[..., None] - SPLIT_RATIOS).argmin(axis=-1)]
+        candidate = (np.abs(z) > outlier_z) & (np.abs(ratio / nearest - 1) < SPLIT_TOLERANCE)
+    # Xác nhận bằng volume (median 5 phiên trước / sau) - chỉ xét các ứng viên, thường rất ít
+    splits = np.zeros_like(candidate)  # không có volume để xác nhận -> không phải ứng viên
+    if volume is not None:
+        for i, j in zip(*np.nonzero(candidate)):
+            sessions = np.flatnonzero(present[:, j])
+            k = np.searchsorted(sessions, i)
+            before, after = np.median(volume[sessions[max(0, k - 5):k], j]), np.median(volume[sessions[k:k + 5], j])
+            expected = nearest[i, j] if move[i, j] >= 1 else 1 / nearest[i, j]
+            splits[i, j] = before > 0 and expected / 2.5 < after / before < expected * 2.5
+    # Chỉ điều chỉnh khi được yêu cầu rõ ràng, và không bao giờ với crypto / FX (không có split)
+    adjustable = np.array([adjust_splits and not _is_24_7(t) for t in tickers], dtype=bool)
+    adjusted = splits & adjustable
+    factor = np.where(adjusted, np.where(move >= 1, nearest, 1 / nearest), 1.0)
+    # Hệ số điều chỉnh mỗi phiên = tích các split xảy ra SAU phiên đó
+    adjust = np.cumprod(factor[::-1], axis=0)[::-1] / factor
+    if adjusted.any():
+        for f in fields:
+            prices[f] /= adjust
+        if volume is not None:
+            volume *= adjust
+
+    # 6. High / Low phải bao Open / Close
+    ohlc_fixed = np.zeros_like(present)
+    if {"Open", "High", "Low"} <= set(fields):
+        body_hi, body_lo = np.fmax(prices["Open"], prices["Close"]), np.fmin(prices["Open"], prices["Close"])
+        with np.errstate(invalid="ignore"):
+            ohlc_fixed = (prices["High"] < body_hi) | (prices["Low"] > body_lo)
+        prices["High"], prices["Low"] = np.fmax(prices["High"], body_hi), np.fmin(prices["Low"], body_lo)
+
+    # 7. Chỉ ghi nhận: outlier còn lại & giá đứng yên
+    with np.errstate(all="ignore"):
+        ret = np.log(close / _prev_valid(close))
+        outliers = (np.abs(_robust_z(ret)) > outlier_z) & ~adjusted
+        no_trade = np.ones_like(present) if volume is None else ~(volume > 0)
+        stale = _run_flags(present & (ret == 0) & no_trade, ~present, stale_bars)
+
+    # Dựng lại panel 1 lần (giữ dtype gốc từng cột, VD Volume int64 / giá float32)
+    repaired = dict(prices, **({"Volume": volume} if volume is not None else {}))
+    position = {t: j for j, t in enumerate(tickers)}
+    columns = {}
+    for col in df.columns:
+        t, f = col
+        if t in position and f in repaired:
+            values, dtype = repaired[f][:, position[t]], df[col].dtype
+            columns[col] = np.round(np.nan_to_num(values)).astype(dtype) if dtype.kind in "iu" else values.astype(dtype)
+        else:
+            columns[col] = df[col].to_numpy()
+    out = pd.DataFrame(columns, index=df.index)
+    out.columns = df.columns
+
+    split_details = [", ".join(f"{'%g:1' % r if m >= 1 else '1:%g' % r} @ {df.index[i]:%Y-%m-%d}"
+                               + (" (adjusted)" if adjusted[i, j] else "")
+                               for i, r, m in zip(np.flatnonzero(splits[:, j]), nearest[splits[:, j], j], move[splits[:, j], j]))
+                     for j in range(len(tickers))]
+    report = pd.DataFrame({
+        "Bars": present.sum(axis=0),
+        "Duplicates": duplicates,
+        "Non-positive": non_positive.sum(axis=0),
+        "Bad ticks": bad_ticks.sum(axis=0),
+        "Gaps filled": gaps.sum(axis=0),
+        "Split candidates": splits.sum(axis=0),
+        "Outliers": outliers.sum(axis=0),
+        "Stale bars": stale.sum(axis=0),
+        "OHLC fixed": ohlc_fixed.sum(axis=0),
+        "Split details": split_details,
+    }, index=pd.Index(tickers, name="Ticker"))
+    if flat:
+        out = out.xs(tickers[0], level=0, axis=1)
+    return out, report
+
+
+# --- COMPACT STORAGE (float32 / int64) ---
+
+PRICE_FIELDS = ["Open", "High", "Low", "Close", "Adj Close"]
+COMPACT_FIELDS = PRICE_FIELDS + ["Volume"]
+
+def compact_price_frame(frame):
+    """
+    Bản gọn của DataFrame OHLCV phẳng (1 mã): chỉ giữ OHLC/Adj Close/Volume,
+    giá float32 (~7 chữ số có nghĩa), Volume int64 (phiên thiếu = 0).
+    """
+    if frame is None or frame.empty: return frame
+    keep = [c for c in frame.columns if c in COMPACT_FIELDS]
+    compact = frame[keep].copy()
+    prices = [c for c in keep if c in PRICE_FIELDS]
+    compact[prices] = compact[prices].astype("float32")
+    if "Volume" in compact.columns:
+        compact["Volume"] = compact["Volume"].fillna(0).round().astype("int64")
+    return compact
+
+def compact_panel(df, tickers=None):
+    """Bản gọn của DataFrame group_by='ticker' (nhiều mã)."""
+    if df is None: return None
+    if not isinstance(df.columns, pd.MultiIndex):
+        return compact_price_frame(df)
+    tickers = tickers or list(df.columns.get_level_values(0).unique())
+    frames = {t: compact_price_frame(f) for t, f in split_by_ticker(df, tickers).items()}
+    return combine_ticker_frames(frames, tickers, keep_int=True)
+
+
+_FINGERPRINTS = {}  # id(df) -> fingerprint, tự xóa khi DataFrame bị thu hồi
+
+def dataset_fingerprint(df):
+    """
+    Dấu vân tay nội dung của DataFrame (index + cột + giá trị) để làm key cache.
+    Nhớ theo object: cùng 1 DataFrame dùng chung (dataset cache) chỉ phải hash 1 lần.
+    """
+    if df is None: return None
+    cached = _FINGERPRINTS.get(id(df))
+    if cached is not None: return cached
+
+    h = hashlib.sha1()
+    h.update(str(list(df.columns)).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    fingerprint = h.hexdigest()[:16]
+    _FINGERPRINTS[id(df)] = fingerprint
+    weakref.finalize(df, _FINGERPRINTS.pop, id(df), None)
+    return fingerprint
+
+
+# --- LOCAL PRICE STORE (1 file parquet / mã / interval) ---
+
+def _store_path(ticker, interval, store_dir=None):
+    safe = ticker.replace("/", "_").replace("^", "_idx_")
+    return os.path.join(store_dir or config.PRICE_STORE_DIR, interval, f"{safe}.parquet")
+
+def save_to_price_store(df, tickers, interval, store_dir=None):
+    """
+    Lưu dữ liệu vừa tải vào kho giá local (gộp với lịch sử cũ, dữ liệu mới ghi đè).
+    Ghi file tạm rồi os.replace để các session / process khác không đọc phải file dở dang.
+    """
+    saved = []
+    for ticker, frame in split_by_ticker(df, tickers).items():
+        frame = frame.dropna(how="all")
+        if frame.empty: continue
+        path = _store_path(ticker, interval, store_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            if os.path.exists(path):
+                old = pd.read_parquet(path)
+                frame = pd.concat([old[~old.index.isin(frame.index)], frame]).sort_index()
+            # Nhiều session trong cùng process có thể ghi cùng mã cùng lúc -> tên file tạm riêng từng thread
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            frame.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+            saved.append(ticker)
+        except Exception as e:
+            print(f"❌ Price store error ({ticker}): {e}")
+    return saved
+
+def list_price_store(interval, store_dir=None):
+    """
+    Liệt kê universe trong kho giá: {ticker: (mtime_ns, size)}.
+    Chỉ đọc metadata file (không đọc dữ liệu) -> phát hiện mã thay đổi rất rẻ.
+    """
+    folder = os.path.join(store_dir or config.PRICE_STORE_DIR, interval)
+    listing = {}
+    if not os.path.isdir(folder): return listing
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.endswith(".parquet"):
+                ticker = entry.name[:-len(".parquet")].replace("_idx_", "^")
+                st_info = entry.stat()
+                listing[ticker] = (st_info.st_mtime_ns, st_info.st_size)
+    return listing
+
+def load_from_price_store(tickers, interval, store_dir=None, columns=None):
+    """Đọc các mã từ kho giá local, trả về DataFrame group_by='ticker' (None nếu không có mã nào)."""
+    if isinstance(tickers, str): tickers = [tickers]
+
+    def read_one(ticker):
+        try:
+            return pd.read_parquet(_store_path(ticker, interval, store_dir), columns=columns)
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+
+    # Đọc song song (pyarrow nhả GIL khi đọc file) - quan trọng khi universe hàng nghìn mã
+    with ThreadPoolExecutor(max_workers=min(8, max(1, len(tickers)))) as pool:
+        frames = dict(zip(tickers, pool.map(read_one, tickers)))
+    return combine_ticker_frames(frames, tickers)
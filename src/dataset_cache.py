@@ -0,0 +1,269 @@
+# src/dataset_cache.py
+
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from src import config
+from src.data_loader import split_by_ticker, combine_ticker_frames, compact_panel, resample_ohlcv, clean_panel, QUALITY_COLUMNS
+from src.quant_engine import verify_compact_precision
+
+
+def frame_nbytes(df):
+    """Dung lượng RAM thực của DataFrame (bao gồm index)."""
+    if df is None: return 0
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+class DatasetHandle:
+    """
+    Tham chiếu nhẹ của 1 session tới panel dữ liệu trong cache (không copy DataFrame).
+    Handle bị thu hồi (GC) -> tự giảm reference count, panel có thể bị LRU evict.
+    """
+
+    def __init__(self, cache, panel_key, tickers, start_date, end_date, interval):
+        self.key = panel_key
+        self.tickers = list(tickers)
+        self.start_date, self.end_date, self.interval = start_date, end_date, interval
+        self._cache = cache
+        self._finalizer = weakref.finalize(self, cache._release, panel_key)
+
+    @property
+    def frame(self):
+        """
+        DataFrame group_by='ticker' dùng chung (chỉ đọc, KHÔNG được sửa in-place).
+        Panel lưu theo thứ tự mã đã sắp xếp; cột được xếp lại theo thứ tự watchlist khi đọc.
+        """
+        return self._cache._get_panel(self)
+
+    def quality_report(self):
+        """Báo cáo chất lượng dữ liệu (clean_panel) của các mã trong watchlist, ghi nhận lúc tải."""
+        return self._cache.quality_report(self.tickers, self.start_date, self.end_date, self.interval)
+
+    def release(self):
+        self._finalizer()
+
+    def __repr__(self):
+        return f"DatasetHandle({', '.join(self.tickers)} | {self.interval} | {self.start_date}→{self.end_date})"
+
+
+class DatasetCache:
+    """
+    Cache dữ liệu giá dùng chung toàn process cho mọi session Streamlit.
+    - Key từng mã: (ticker, interval, start, end). Panel của watchlist được ghép 1 lần rồi dùng chung
+      (key theo tập mã đã sắp xếp -> đổi thứ tự watchlist không tạo panel trùng).
+    - Ngân sách RAM (budget_bytes) + LRU evict các entry không còn session nào giữ (refcount = 0);
+      panel là bản ghép lại được từ frame từng mã nên bị evict trước.
+    - stats(): resident bytes (tách frame / panel), hit ratio, evictions... để sizing server.
+    """
+
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = budget_bytes if budget_bytes is not None else int(config.DATASET_CACHE_BUDGET_MB * 1024 ** 2)
+        self._entries = OrderedDict()  # key -> {"frame", "nbytes", "refs", "panel", "views"}
+        self._quality = {}  # ticker key -> dòng báo cáo clean_panel (xóa cùng entry)
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --- 1. ENTRY MANAGEMENT ---
+    def _put(self, key, frame, extra_refs=0):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            refs = (old["refs"] if old else 0) + extra_refs
+            # views: bản xếp lại cột theo thứ tự watchlist của panel (bỏ đi cùng panel cũ)
+            self._entries[key] = {"frame": frame, "nbytes": frame_nbytes(frame), "refs": refs,
+                                  "panel": self.is_panel_key(key), "views": {}}
+            self._evict()
+
+    def _lookup(self, key, count=True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if count: self.misses += 1
+                return None
+            if count: self.hits += 1
+            self._entries.move_to_end(key)
+            return entry["frame"]
+
+    def _evict(self):
+        # Evict LRU trước; entry đang được session giữ thì không đụng tới (có thể tạm vượt budget).
+        # Lượt 1 chỉ evict panel (ghép lại được từ frame từng mã), lượt 2 mới tới frame.
+        resident = sum(e["nbytes"] for e in self._entries.values())
+        for panels_only in (True, False):
+            for key in list(self._entries.keys()):
+                if resident <= self.budget_bytes:
+                    return
+                entry = self._entries[key]
+                if entry["refs"] > 0 or (panels_only and not entry["panel"]):
+                    continue
+                resident -= entry["nbytes"]
+                del self._entries[key]
+                self._quality.pop(key, None)
+                self.evictions += 1
+
+    def _release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["refs"] > 0:
+                entry["refs"] -= 1
+            self._evict()
+
+    # --- 2. PUBLIC API ---
+    @staticmethod
+    def ticker_key(ticker, start_date, end_date, interval):
+        return (ticker, interval, str(start_date), str(end_date))
+
+    @staticmethod
+    def panel_key(tickers, start_date, end_date, interval):
+        # Tập mã đã sắp xếp: cùng watchlist khác thứ tự -> cùng 1 panel
+        return ("__panel__", tuple(sorted(set(tickers))), interval, str(start_date), str(end_date))
+
+    @staticmethod
+    def is_panel_key(key):
+        return key[0] == "__panel__"
+
+    def get_frame(self, ticker, start_date, end_date, interval):
+        """DataFrame OHLCV phẳng của 1 mã nếu đã có trong cache."""
+        return self._lookup(self.ticker_key(ticker, start_date, end_date, interval))
+
+    def put_frame(self, ticker, start_date, end_date, interval, frame):
+        if frame is not None and not frame.empty:
+            self._put(self.ticker_key(ticker, start_date, end_date, interval), frame)
+
+    def load(self, tickers, start_date, end_date, interval, fetch_fn, refresh=False, base_interval=None):
+        """
+        Trả về DatasetHandle cho watchlist; chỉ gọi fetch_fn(missing_tickers) -> DataFrame
+        (cấu trúc group_by='ticker') cho những mã chưa có trong cache. None nếu không có dữ liệu.
+        refresh=True: tải lại toàn bộ watchlist (scheduler nền) và ghép lại panel đang dùng chung.
+        base_interval: fetch_fn tải ở interval mịn hơn này (data_loader.base_interval); nến `interval`
+        được gộp tại chỗ từ bản base trong cache -> đổi interval cùng họ không phải tải lại.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        missing = tickers if refresh else [t for t in tickers if self.get_frame(t, start_date, end_date, interval) is None]
+        if missing:
+            fetch_interval = base_interval or interval
+            to_fetch = missing if refresh or fetch_interval == interval else \
+                [t for t in missing if self.get_frame(t, start_date, end_date, fetch_interval) is None]
+            if to_fetch:
+                fetched = fetch_fn(to_fetch)
+                if config.DATA_CLEANING and fetched is not None:
+                    # Làm sạch 1 lượt cho cả lô vừa tải, trước khi compact & chia sẻ giữa các session
+                    fetched, report = clean_panel(fetched, to_fetch)
+                    with self._lock:
+                        for ticker, row in report.iterrows():
+                            self._quality[self.ticker_key(ticker, start_date, end_date, fetch_interval)] = row
+                if config.COMPACT_STORAGE and fetched is not None:
+                    fetched = self._compact(fetched, to_fetch)
+                for ticker, frame in split_by_ticker(fetched, to_fetch).items():
+                    self.put_frame(ticker, start_date, end_date, fetch_interval, frame)
+            if fetch_interval != interval:
+                # Interval dẫn xuất cũng được cache như 1 entry riêng -> lần sau là cache hit
+                for ticker in missing:
+                    base = self._lookup(self.ticker_key(ticker, start_date, end_date, fetch_interval), count=False)
+                    if base is not None:
+                        self.put_frame(ticker, start_date, end_date, interval, resample_ohlcv(base, interval))
+                        quality = self._quality.get(self.ticker_key(ticker, start_date, end_date, fetch_interval))
+                        if quality is not None:
+                            self._quality[self.ticker_key(ticker, start_date, end_date, interval)] = quality
+
+        key = self.panel_key(tickers, start_date, end_date, interval)
+        if refresh:
+            with self._lock:
+                if key in self._entries:
+                    frames = {t: self.get_frame(t, start_date, end_date, interval) for t in key[1]}
+                    panel = combine_ticker_frames(frames, key[1], keep_int=config.COMPACT_STORAGE)
+                    if panel is not None:
+                        self._put(key, panel)
+        with self._lock:
+            handle = DatasetHandle(self, key, tickers, start_date, end_date, interval)
+            if self._get_panel(handle, pin=True) is None:
+                handle._finalizer.detach()
+                return None
+        return handle
+
+    @staticmethod
+    def _compact(fetched, tickers):
+        # float32 / int64 trước khi vào cache; kiểm tra precision trên chính dữ liệu vừa tải
+        compact = compact_panel(fetched, tickers)
+        if config.COMPACT_PRECISION_CHECK:
+            verify_compact_precision(fetched, compact, tickers, rtol=config.COMPACT_PRECISION_RTOL)
+        return compact
+
+    def _get_panel(self, handle, pin=False):
+        with self._lock:
+            # Đọc panel mỗi lần rerun không tính vào hit ratio, chỉ tính lúc load
+            panel = self._lookup(handle.key, count=pin)
+            if panel is None:
+                # Panel chưa có (hoặc đã bị clear): ghép lại từ các entry từng mã, theo thứ tự của key
+                frames = {t: self.get_frame(t, handle.start_date, handle.end_date, handle.interval) for t in handle.key[1]}
+                panel = combine_ticker_frames(frames, handle.key[1], keep_int=config.COMPACT_STORAGE)
+                if panel is None:
+                    return None
+                self._put(handle.key, panel, extra_refs=1 if pin else 0)
+            elif pin:
+                self._entries[handle.key]["refs"] += 1
+            # Xếp cột theo thứ tự watchlist của session. Bản xếp lại được giữ cạnh panel theo thứ tự mã
+            # -> mỗi rerun nhận lại cùng object (fingerprint / các cache theo id vẫn hit)
+            present = set(panel.columns.get_level_values(0))
+            order = tuple(t for t in handle.tickers if t in present)
+            if tuple(panel.columns.get_level_values(0).unique()) == order:
+                return panel
+            entry = self._entries.get(handle.key)
+            if entry is None or entry["frame"] is not panel:
+                return panel[list(order)]
+            view = entry["views"].get(order)
+            if view is None:
+                view = entry["views"][order] = panel[list(order)]
+                # Copy-on-write (pandas 3) dùng chung bộ nhớ với panel; pandas 2 copy thật -> tính vào budget
+                first = view.columns[0]
+                if not np.shares_memory(view[first].to_numpy(), panel[first].to_numpy()):
+                    entry["nbytes"] += frame_nbytes(view)
+                    self._evict()
+            return view
+
+    def quality_report(self, tickers, start_date, end_date, interval):
+        """DataFrame mã × QUALITY_COLUMNS (chỉ các mã đã được làm sạch lúc tải, theo bản base nếu là interval dẫn xuất)."""
+        with self._lock:
+            rows = {t: self._quality.get(self.ticker_key(t, start_date, end_date, interval)) for t in tickers}
+        rows = {t: row for t, row in rows.items() if row is not None}
+        return pd.DataFrame(rows.values(), index=pd.Index(list(rows), name="Ticker"), columns=QUALITY_COLUMNS)
+
+    def stats(self):
+        """Thống kê để sizing server."""
+        with self._lock:
+            frame_bytes = sum(e["nbytes"] for e in self._entries.values() if not e["panel"])
+            panel_bytes = sum(e["nbytes"] for e in self._entries.values() if e["panel"])
+            lookups = self.hits + self.misses
+            return {
+                "resident_bytes": frame_bytes + panel_bytes,
+                "frame_bytes": frame_bytes,
+                "panel_bytes": panel_bytes,
+                "budget_bytes": self.budget_bytes,
+                "entries": len(self._entries),
+                "panel_entries": sum(1 for e in self._entries.values() if e["panel"]),
+                "pinned_entries": sum(1 for e in self._entries.values() if e["refs"] > 0),
+                "session_refs": sum(e["refs"] for e in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._quality.clear()
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_dataset_cache():
+    """DatasetCache dùng chung toàn process (khởi tạo lười)."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = DatasetCache()
+        return _CACHE
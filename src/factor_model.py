@@ -0,0 +1,163 @@
+# src/factor_model.py
+
+import time
+import numpy as np
+import pandas as pd
+
+# --- 1. RANDOMIZED SVD ---
+
+def randomized_svd(X, k, oversample=10, n_iter=4, seed=0):
+    """
+    Top-k SVD của X (m × n) theo Halko, Martinsson & Tropp (2011): chiếu X lên k + oversample hướng ngẫu nhiên,
+    vài vòng power iteration (QR mỗi vòng cho ổn định) rồi SVD ma trận nhỏ. O(m·n·(k + p)) thay vì O(m·n·min(m, n)).
+    Trả về (U: m × k, s: k, Vt: k × n).
+    """
+    X = np.asarray(X, dtype=float)
+    m, n = X.shape
+    rank = min(k + oversample, m, n)
+    rng = np.random.default_rng(seed)
+    Q = np.linalg.qr(X @ rng.standard_normal((n, rank)))[0]
+    for _ in range(n_iter):
+        Q = np.linalg.qr(X.T @ Q)[0]
+        Q = np.linalg.qr(X @ Q)[0]
+    U_small, s, Vt = np.linalg.svd(Q.T @ X, full_matrices=False)
+    return (Q @ U_small)[:, :k], s[:k], Vt[:k]
+
+
+# --- 2. COVARIANCE DẠNG NHÂN TỐ (LOW-RANK + ĐƯỜNG CHÉO) ---
+
+class FactorCovariance:
+    """
+    Σ = B·Bᵀ + diag(d): B (n × k) factor loadings (phương sai nhân tố đã gộp vào B), d (n) phương sai riêng.
+    Lưu O(n·k) thay vì O(n²); Σ·w = B·(Bᵀw) + d∘w tốn O(n·k). Dùng được như ma trận trong `cov @ w`, `w @ cov @ w`.
+    """
+
+    __array_ufunc__ = None  # ndarray @ model -> gọi __rmatmul__ thay vì ép model thành mảng object
+
+    def __init__(self, loadings, specific, tickers=None, explained=None):
+        self.B = np.asarray(loadings, dtype=float)
+        self.d = np.asarray(specific, dtype=float)
+        self.tickers = list(tickers) if tickers is not None else None
+        self.explained = explained  # tỷ lệ phương sai (tương quan) các nhân tố giải thích
+
+    @property
+    def shape(self):
+        return (len(self.d), len(self.d))
+
+    @property
+    def n_factors(self):
+        return self.B.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.B.nbytes + self.d.nbytes
+
+    def __matmul__(self, x):
+        x = np.asarray(x, dtype=float)
+        return self.B @ (self.B.T @ x) + self.d.reshape((-1,) + (1,) * (x.ndim - 1)) * x
+
+    def __rmatmul__(self, x):
+        # Σ đối xứng: x·Σ = (Σ·xᵀ)ᵀ
+        return (self @ np.asarray(x, dtype=float).T).T
+
+    def scaled(self, factor):
+        """Σ × factor (VD năm hóa từ phương sai theo phiên: factor = 252)."""
+        return FactorCovariance(self.B * np.sqrt(factor), self.d * factor, self.tickers, self.explained)
+
+    def diagonal(self):
+        return np.einsum('ij,ij->i', self.B, self.B) + self.d
+
+    def portfolio_variance(self, weights):
+        """w'Σw cho 1 danh mục (n,) hoặc nhiều danh mục cùng lúc (m × n) -> (m,). O(m·n·k)."""
+        W = np.asarray(weights, dtype=float)
+        return np.square(W @ self.B).sum(axis=-1) + np.square(W) @ self.d
+
+    def solve(self, rhs, shift=None):
+        """
+        (Σ + diag(shift))⁻¹·rhs bằng công thức Woodbury: chỉ nghịch đảo ma trận k × k, O(n·k²).
+        shift: cộng thêm vào đường chéo (VD Hessian của risk parity).
+        """
+        D = self.d if shift is None else self.d + shift
+        rhs = np.asarray(rhs, dtype=float)
+        inv_d = 1.0 / D.reshape((-1,) + (1,) * (rhs.ndim - 1))
+        scaled_B = self.B / D[:, None]
+        inner = np.eye(self.n_factors) + self.B.T @ scaled_B
+        return inv_d * rhs - scaled_B @ np.linalg.solve(inner, self.B.T @ (inv_d * rhs))
+
+    def dense(self):
+        """Ma trận n × n đầy đủ (chỉ dùng khi thật sự cần, VD HRP / heatmap)."""
+        cov = self.B @ self.B.T
+        cov[np.diag_indices_from(cov)] += self.d
+        return cov
+
+    def correlation(self):
+        """Ma trận tương quan (đã khử nhiễu bởi mô hình nhân tố) dạng DataFrame nếu có tên mã."""
+        std = np.sqrt(self.diagonal())
+        corr = self.dense() / np.outer(std, std)
+        return pd.DataFrame(corr, index=self.tickers, columns=self.tickers) if self.tickers is not None else corr
+
+
+def portfolio_variance(weights, cov):
+    """w'Σw cho 1 hoặc nhiều danh mục (m × n), Σ là ma trận đặc hay FactorCovariance."""
+    if isinstance(cov, FactorCovariance):
+        return cov.portfolio_variance(weights)
+    W = np.asarray(weights, dtype=float)
+    return ((W @ np.asarray(cov, dtype=float)) * W).sum(axis=-1)
+
+
+# --- 3. ƯỚC LƯỢNG MÔ HÌNH NHÂN TỐ THỐNG KÊ (PCA) ---
+
+def marchenko_pastur_cutoff(n_assets, n_obs):
+    """Eigenvalue lớn nhất của ma trận tương quan thuần nhiễu (n mã, T quan sát): (1 + √(n/T))²."""
+    return (1.0 + np.sqrt(n_assets / n_obs)) ** 2
+
+def fit_factor_model(returns, n_factors=None, max_factors=20, specific_floor=1e-4, seed=0):
+    """
+    Mô hình nhân tố thống kê: PCA (randomized SVD) trên returns đã chuẩn hóa -> top-k thành phần chính của
+    ma trận tương quan, phần còn lại là phương sai riêng (đường chéo Σ giữ đúng phương sai mẫu).
+    returns: DataFrame / ndarray (T × n) không NaN. n_factors=None -> giữ các thành phần có eigenvalue vượt
+    ngưỡng nhiễu Marchenko–Pastur (tối thiểu 1, tối đa max_factors). Trả về FactorCovariance theo phiên.
+    """
+    tickers = returns.columns if isinstance(returns, pd.DataFrame) else None
+    X = np.asarray(returns, dtype=float)
+    n_obs, n_assets = X.shape
+    X = X - X.mean(axis=0)
+    std = X.std(axis=0, ddof=1)
+    std = np.where(std > 0, std, 1.0)
+    Z = X / std / np.sqrt(n_obs - 1)  # ZᵀZ = ma trận tương quan mẫu
+
+    k_max = max(1, min(n_factors or max_factors, n_assets - 1, n_obs - 1))
+    _, s, Vt = randomized_svd(Z, k_max, seed=seed)
+    eigenvalues = s ** 2
+    k = n_factors or max(1, int(np.sum(eigenvalues > marchenko_pastur_cutoff(n_assets, n_obs))))
+    loadings = Vt[:k].T * s[:k]  # n × k, trên thang tương quan
+    specific = np.clip(1.0 - np.square(loadings).sum(axis=1), specific_floor, None)
+    return FactorCovariance(loadings * std[:, None], specific * std ** 2, tickers,
+                            explained=float(eigenvalues[:k].sum() / n_assets))
+
+
+# Benchmark: python -m src.factor_model (kiểm tra đúng sai ở tests/test_factor_model.py)
+if __name__ == "__main__":
+    # Dùng lớp từ module đã import (không phải __main__) để isinstance trong quant_engine nhận ra
+    from src.factor_model import fit_factor_model
+    from src.quant_engine import risk_parity_weights
+
+    rng = np.random.default_rng(11)
+    n_obs, n_assets, n_true = 756, 1000, 5
+    true_B = rng.normal(0, 0.01, (n_assets, n_true))
+    returns = rng.normal(0, 1, (n_obs, n_true)) @ true_B.T + rng.normal(0, 0.012, (n_obs, n_assets))
+
+    t0 = time.perf_counter(); dense = np.cov(returns, rowvar=False); t_cov = time.perf_counter() - t0
+    t0 = time.perf_counter(); model = fit_factor_model(returns); t_fit = time.perf_counter() - t0
+    print(f"{n_obs} × {n_assets}: np.cov {t_cov * 1e3:.0f} ms ({dense.nbytes / 1024 ** 2:.1f} MB) | "
+          f"PCA fit {t_fit * 1e3:.0f} ms, k={model.n_factors} (true {n_true}), "
+          f"{model.nbytes / 1024 ** 2:.2f} MB, explains {model.explained:.0%} of correlation")
+
+    W = rng.dirichlet(np.ones(n_assets), 5000)
+    t0 = time.perf_counter(); ((W @ dense) * W).sum(axis=1); t_dense = time.perf_counter() - t0
+    t0 = time.perf_counter(); model.portfolio_variance(W); t_model = time.perf_counter() - t0
+    print(f"5000 portfolio variances: dense {t_dense * 1e3:.0f} ms | factor {t_model * 1e3:.1f} ms")
+
+    t0 = time.perf_counter(); risk_parity_weights(dense); t_dense = time.perf_counter() - t0
+    t0 = time.perf_counter(); risk_parity_weights(model); t_model = time.perf_counter() - t0
+    print(f"ERC: dense Newton {t_dense * 1e3:.0f} ms | Woodbury Newton {t_model * 1e3:.0f} ms")
@@ -0,0 +1,155 @@
+# src/fetch_service.py
+
+import asyncio
+import queue
+import threading
+from src import config
+from src.data_loader import fetch_stock_data, split_by_ticker, combine_ticker_frames
+
+
+def _download_single(ticker, start_date, end_date, interval):
+    """Upstream mặc định: tải 1 mã qua fetch_stock_data và trả về DataFrame OHLCV phẳng."""
+    df = fetch_stock_data(ticker, start_date, end_date, interval)
+    return split_by_ticker(df, ticker).get(ticker)
+
+
+class FetchService:
+    """
+    Lớp fetch asyncio dùng chung cho mọi session Streamlit trong process.
+    - Single-flight: các request trùng (ticker, interval, range) đang chạy sẽ chờ chung 1 kết quả.
+    - Giới hạn số request đồng thời tới upstream (Semaphore).
+    - Trả kết quả từng mã ngay khi xong (iter_fetch / on_result) thay vì chờ cả watchlist.
+    upstream: callable(ticker, start, end, interval) -> DataFrame | None (thay bằng stub khi test);
+    exception, None hay DataFrame rỗng đều được tính vào stats['failures'].
+    """
+
+    def __init__(self, upstream=None, max_concurrency=None):
+        self._upstream = upstream or _download_single
+        self._max_concurrency = max_concurrency or config.FETCH_MAX_CONCURRENCY
+        self._inflight = {}  # key -> asyncio.Task (chỉ truy cập trong thread của event loop)
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "coalesced": 0, "upstream_calls": 0, "failures": 0}
+
+        # Event loop riêng chạy nền, các session (thread script của Streamlit) gửi coroutine vào
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._thread = threading.Thread(target=self._run_loop, name="alphaquant-fetch", daemon=True)
+        self._ready = threading.Event()
+        self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._ready.set()
+        self._loop.run_forever()
+
+    def _bump(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    # --- 1. ASYNC CORE (chạy trong event loop) ---
+    async def _call_upstream(self, ticker, start_date, end_date, interval):
+        async with self._semaphore:
+            self._bump("upstream_calls")
+            try:
+                frame = await self._loop.run_in_executor(None, self._upstream, ticker, start_date, end_date, interval)
+            except Exception as e:
+                self._bump("failures")
+                print(f"❌ Fetch error ({ticker}): {e}")
+                return None
+            # fetch_stock_data nuốt exception và trả None/rỗng -> vẫn tính là lỗi upstream
+            if frame is None or frame.empty:
+                self._bump("failures")
+                return None
+            return frame
+
+    async def fetch_one(self, ticker, start_date, end_date, interval='1d'):
+        """Tải 1 mã; nếu đang có request giống hệt thì chờ chung kết quả."""
+        key = (ticker, interval, str(start_date), str(end_date))
+        self._bump("requests")
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._loop.create_task(self._call_upstream(ticker, start_date, end_date, interval))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        else:
+            self._bump("coalesced")
+        # shield: 1 caller bị hủy không làm hủy kết quả của các caller còn lại
+        return await asyncio.shield(task)
+
+    async def _fetch_into(self, tickers, start_date, end_date, interval, out_queue):
+        async def one(ticker):
+            frame = await self.fetch_one(ticker, start_date, end_date, interval)
+            out_queue.put((ticker, frame))
+        await asyncio.gather(*(one(t) for t in tickers))
+
+    # --- 2. SYNC API (gọi từ thread script Streamlit / CLI) ---
+    def iter_fetch(self, tickers, start_date, end_date, interval='1d'):
+        """Generator trả về (ticker, DataFrame | None) theo thứ tự mã nào xong trước."""
+        if isinstance(tickers, str): tickers = [tickers]
+        tickers = list(dict.fromkeys(tickers))
+        out_queue = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._fetch_into(tickers, start_date, end_date, interval, out_queue), self._loop
+        )
+        for _ in tickers:
+            yield out_queue.get()
+        future.result()
+
+    def fetch(self, tickers, start_date, end_date, interval='1d', on_result=None):
+        """
+        Tải cả watchlist, trả về DataFrame cùng cấu trúc fetch_stock_data (group_by='ticker').
+        on_result(ticker, frame, done, total): callback chạy trong thread của caller mỗi khi 1 mã xong.
+        """
+        if isinstance(tickers, str): tickers = [tickers]
+        frames = {}
+        total = len(set(tickers))
+        for done, (ticker, frame) in enumerate(self.iter_fetch(tickers, start_date, end_date, interval), start=1):
+            frames[ticker] = frame
+            if on_result is not None:
+                on_result(ticker, frame, done, total)
+        return combine_ticker_frames(frames, tickers)
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+_SERVICE = None
+_SERVICE_LOCK = threading.Lock()
+
+def get_fetch_service():
+    """FetchService dùng chung cho toàn process (khởi tạo lười)."""
+    global _SERVICE
+    with _SERVICE_LOCK:
+        if _SERVICE is None:
+            _SERVICE = FetchService()
+        return _SERVICE
+
+
+# Benchmark với upstream giả lập (không cần mạng): python -m src.fetch_service (kiểm tra đúng sai ở tests/test_fetch_service.py)
+if __name__ == "__main__":
+    import time
+    import numpy as np
+    import pandas as pd
+    from concurrent.futures import ThreadPoolExecutor
+
+    calls = []
+    def stub_upstream(ticker, start_date, end_date, interval):
+        calls.append(ticker)
+        time.sleep(0.2)
+        idx = pd.date_range(start_date, periods=5, freq="D")
+        close = np.linspace(100, 104, 5)
+        return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1000}, index=idx)
+
+    service = FetchService(upstream=stub_upstream, max_concurrency=2)
+    watchlists = [["AAPL", "MSFT"], ["MSFT", "BTC-USD"], ["AAPL", "MSFT", "BTC-USD"]] * 5
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(len(watchlists)) as pool:
+        list(pool.map(lambda wl: service.fetch(wl, "2024-01-01", "2024-01-06"), watchlists))
+    elapsed = time.perf_counter() - t0
+
+    print(f"{len(watchlists)} sessions -> {len(calls)} upstream calls in {elapsed:.2f}s | stats: {service.stats}")
+    service.close()
@@ -0,0 +1,299 @@
+# src/kernels.py
+
+import time
+import numpy as np
+from scipy.signal import lfilter
+from src import config
+
+# Numba là tùy chọn: không cài thì dùng bản NumPy tham chiếu
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def get_backend():
+    """Backend đang dùng ("numba" hoặc "numpy") theo config.KERNEL_BACKEND."""
+    choice = config.KERNEL_BACKEND
+    if choice == "numpy":
+        return "numpy"
+    if choice == "numba":
+        if not NUMBA_AVAILABLE:
+            raise ImportError("KERNEL_BACKEND='numba' but numba is not installed")
+        return "numba"
+    return "numba" if NUMBA_AVAILABLE else "numpy"
+
+
+# --- 1. BẢN NUMPY (Tham chiếu + Fallback) ---
+
+def _gbm_paths_numpy(last_price, daily_returns):
+    # paths[0] = giá hiện tại, paths[t] = paths[t-1] * daily_returns[t]
+    factors = np.array(daily_returns, dtype=float, copy=True)
+    factors[0] = last_price
+    return np.cumprod(factors, axis=0, out=factors)
+
+def _drawdown_numpy(returns):
+    cumulative = np.cumprod(1 + returns)
+    peak = np.maximum.accumulate(cumulative)
+    return (cumulative - peak) / peak
+
+def _rolling_moments_numpy(values, window, span=256, block=256):
+    # Rolling mean & std (ddof=1) cho mảng (time,) hoặc (time, tickers), O(n) theo độ dài cửa sổ.
+    # Chia output thành khối `span` bước (>= window); mỗi khối chỉ cần span+window-1 dòng dữ liệu
+    # -> dịch về trung bình cục bộ rồi dùng tổng tích lũy (sai số không tích lũy theo n),
+    # phương sai bù (S2 - S1^2/w) / (w-1). Cửa sổ chứa NaN -> NaN (giống pandas rolling(window)).
+    x = np.asarray(values, dtype=float)
+    squeeze = x.ndim == 1
+    if squeeze:
+        x = x[:, None]
+    n, m = x.shape
+    mean = np.full((m, n), np.nan)
+    std = np.full((m, n), np.nan)
+    if n >= window:
+        span = max(span, window)
+        n_blocks = -(-(n - window + 1) // span)
+        padded = np.full((m, n_blocks * span + window - 1), np.nan)
+        padded[:, :n] = x.T
+        # segments[:, k] = dòng k*span .. k*span + span+w-2 -> output (k*span + w-1) .. (k*span + span+w-2)
+        segments = np.lib.stride_tricks.sliding_window_view(padded, span + window - 1, axis=1)[:, ::span]
+        for start in range(0, n_blocks, block):
+            seg = segments[:, start:start + block]                   # (m, blocks, span+w-1)
+            valid = np.isfinite(seg)
+            dev = np.where(valid, seg, 0.0)
+            shift = dev.sum(axis=-1, keepdims=True) / np.maximum(valid.sum(axis=-1, keepdims=True), 1)
+            dev = np.where(valid, dev - shift, 0.0)
+            zero = np.zeros(seg.shape[:-1] + (1,))
+            c1 = np.concatenate([zero, np.cumsum(dev, axis=-1)], axis=-1)
+            c2 = np.concatenate([zero, np.cumsum(dev * dev, axis=-1)], axis=-1)
+            cn = np.concatenate([zero, np.cumsum(valid, axis=-1)], axis=-1)
+            s1 = c1[..., window:] - c1[..., :-window]                 # (m, blocks, span)
+            s2 = c2[..., window:] - c2[..., :-window]
+            bad = (cn[..., window:] - cn[..., :-window]) < window
+            lo = window - 1 + start * span
+            hi = min(lo + seg.shape[1] * span, n)
+            mean[:, lo:hi] = np.where(bad, np.nan, shift + s1 / window).reshape(m, -1)[:, :hi - lo]
+            if window > 1:
+                var = np.maximum(s2 - s1 * s1 / window, 0.0) / (window - 1)
+                std[:, lo:hi] = np.where(bad, np.nan, np.sqrt(var)).reshape(m, -1)[:, :hi - lo]
+    return (mean[0], std[0]) if squeeze else (mean.T, std.T)
+
+def _ewma_numpy(values, alpha):
+    # y[t] = alpha * x[t] + (1 - alpha) * y[t-1] (adjust=False), theo từng cột (tickers).
+    # Dòng NaN -> output NaN, trạng thái giữ nguyên = lọc IIR bậc 1 (scipy lfilter, vòng lặp C) trên các
+    # giá trị hữu hạn của cột; giá trị hữu hạn đầu tiên khởi tạo trạng thái (zi = (1 - alpha) * x0).
+    x = np.asarray(values, dtype=float)
+    squeeze = x.ndim == 1
+    if squeeze:
+        x = x[:, None]
+    out = np.full(x.shape, np.nan)
+    valid = np.isfinite(x)
+    b, a = [alpha], [1.0, -(1.0 - alpha)]
+    dense = valid.all(axis=0) & (len(x) > 0)
+    if dense.any():
+        # Cột không có NaN: lọc cả khối 1 lần
+        block = x[:, dense]
+        out[:, dense] = lfilter(b, a, block, axis=0, zi=(1.0 - alpha) * block[:1])[0]
+    for j in np.flatnonzero(~dense):
+        col = x[valid[:, j], j]
+        if len(col):
+            out[valid[:, j], j] = lfilter(b, a, col, zi=[(1.0 - alpha) * col[0]])[0]
+    return out[:, 0] if squeeze else out
+
+def _sparkline_points_numpy(data, width, height):
+    data = data[~np.isnan(data)]
+    n_points = len(data)
+    min_val, max_val = np.min(data), np.max(data)
+    if max_val == min_val: normalized = np.zeros_like(data)
+    else: normalized = (data - min_val) / (max_val - min_val)
+    x = np.arange(n_points) * (width / (n_points - 1))
+    y = height - (normalized * height)
+    return x, y
+
+
+# --- 2. BẢN NUMBA (Fused loops) ---
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _gbm_paths_numba(last_price, daily_returns):
+        days, sims = daily_returns.shape
+        paths = np.empty((days, sims))
+        for j in range(sims):
+            paths[0, j] = last_price
+        for t in range(1, days):
+            for j in range(sims):
+                paths[t, j] = paths[t - 1, j] * daily_returns[t, j]
+        return paths
+
+    @njit(cache=True)
+    def _drawdown_numba(returns):
+        n = returns.shape[0]
+        out = np.empty(n)
+        cumulative = 1.0
+        peak = -np.inf
+        for i in range(n):
+            cumulative *= 1.0 + returns[i]
+            if cumulative > peak:
+                peak = cumulative
+            out[i] = (cumulative - peak) / peak
+        return out
+
+    @njit(cache=True)
+    def _rolling_moments_numba(x, window):
+        # Welford trượt O(1)/bước, neo lại bằng 2-pass chính xác mỗi `window` bước để chặn sai số tích lũy
+        n, m = x.shape
+        mean = np.full((n, m), np.nan)
+        std = np.full((n, m), np.nan)
+        for j in range(m):
+            bad = 0
+            valid_state = False
+            anchor = 0
+            mu = 0.0
+            m2 = 0.0
+            for i in range(n):
+                if not np.isfinite(x[i, j]):
+                    bad += 1
+                if i >= window and not np.isfinite(x[i - window, j]):
+                    bad -= 1
+                if i < window - 1:
+                    continue
+                if bad > 0:
+                    valid_state = False
+                    continue
+                if not valid_state or i - anchor >= window:
+                    mu = 0.0
+                    for k in range(i - window + 1, i + 1):
+                        mu += x[k, j]
+                    mu /= window
+                    m2 = 0.0
+                    for k in range(i - window + 1, i + 1):
+                        d = x[k, j] - mu
+                        m2 += d * d
+                    anchor = i
+                    valid_state = True
+                else:
+                    x_new = x[i, j]
+                    x_old = x[i - window, j]
+                    delta = x_new - x_old
+                    new_mu = mu + delta / window
+                    m2 += delta * (x_new - new_mu + x_old - mu)
+                    mu = new_mu
+                mean[i, j] = mu
+                if window > 1:
+                    std[i, j] = np.sqrt(m2 / (window - 1)) if m2 > 0 else 0.0
+        return mean, std
+
+    @njit(cache=True)
+    def _ewma_numba(x, alpha):
+        n, m = x.shape
+        out = np.full((n, m), np.nan)
+        for j in range(m):
+            state = np.nan
+            for t in range(n):
+                v = x[t, j]
+                if np.isfinite(v):
+                    state = v if np.isnan(state) else alpha * v + (1 - alpha) * state
+                    out[t, j] = state
+        return out
+
+    @njit(cache=True)
+    def _sparkline_points_numba(data, width, height):
+        n_valid = 0
+        lo = np.inf
+        hi = -np.inf
+        for v in data:
+            if not np.isnan(v):
+                n_valid += 1
+                lo = min(lo, v)
+                hi = max(hi, v)
+        x = np.empty(n_valid)
+        y = np.empty(n_valid)
+        step = width / (n_valid - 1)
+        k = 0
+        for v in data:
+            if not np.isnan(v):
+                norm = 0.0 if hi == lo else (v - lo) / (hi - lo)
+                x[k] = k * step
+                y[k] = height - norm * height
+                k += 1
+        return x, y
+
+
+# --- 3. API CÔNG KHAI (Tự chọn backend) ---
+
+def gbm_paths(last_price, daily_returns):
+    """
+    Đệ quy Monte Carlo: paths[0] = last_price, paths[t] = paths[t-1] * daily_returns[t].
+    daily_returns: ma trận (days, simulations) các hệ số tăng trưởng.
+    """
+    daily_returns = np.asarray(daily_returns, dtype=float)
+    if get_backend() == "numba":
+        return _gbm_paths_numba(float(last_price), daily_returns)
+    return _gbm_paths_numpy(last_price, daily_returns)
+
+def drawdown(returns):
+    """Chuỗi drawdown (số âm) từ simple returns (mảng 1 chiều, không NaN)."""
+    returns = np.asarray(returns, dtype=float)
+    if get_backend() == "numba":
+        return _drawdown_numba(returns)
+    return _drawdown_numpy(returns)
+
+def rolling_moments(values, window):
+    """
+    Rolling mean & std (ddof=1) cho (time,) hoặc (time, tickers). Trả về (mean, std).
+    Cả hai backend O(n) bất kể độ dài cửa sổ: Numba Welford trượt, NumPy tổng tích lũy theo khối.
+    """
+    values = np.asarray(values, dtype=float)
+    if get_backend() == "numba":
+        x = values[:, None] if values.ndim == 1 else values
+        mean, std = _rolling_moments_numba(np.ascontiguousarray(x), int(window))
+        return (mean[:, 0], std[:, 0]) if values.ndim == 1 else (mean, std)
+    return _rolling_moments_numpy(values, int(window))
+
+def ewma(values, alpha):
+    """
+    EMA đệ quy (adjust=False) theo trục thời gian cho (time,) hoặc (time, tickers).
+    EMA chuẩn: alpha = 2 / (span + 1); Wilder (RSI, ATR): alpha = 1 / n.
+    """
+    values = np.asarray(values, dtype=float)
+    if get_backend() == "numba":
+        x = values[:, None] if values.ndim == 1 else values
+        out = _ewma_numba(np.ascontiguousarray(x), float(alpha))
+        return out[:, 0] if values.ndim == 1 else out
+    return _ewma_numpy(values, alpha)
+
+def sparkline_points(data, width, height):
+    """Tọa độ (x, y) của sparkline sau khi bỏ NaN và chuẩn hóa về khung width x height."""
+    data = np.asarray(data, dtype=float)
+    if get_backend() == "numba":
+        return _sparkline_points_numba(data, float(width), float(height))
+    return _sparkline_points_numpy(data, width, height)
+
+
+# Benchmark nhanh khi chạy trực tiếp: python -m src.kernels (parity nằm ở tests/test_kernels.py)
+if __name__ == "__main__":
+    rng = np.random.default_rng(42)
+    factors = np.exp(rng.normal(0.0003, 0.02, (252, 100_000)))
+    rets = rng.normal(0.0005, 0.02, 2_000_000)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (200_000, 20)), axis=0))
+    prices[::97, 3] = np.nan
+    spark = rng.normal(0, 1, 2_000_000)
+
+    cases = [
+        ("gbm_paths", lambda b: b[0](100.0, factors), (_gbm_paths_numpy, "_gbm_paths_numba")),
+        ("drawdown", lambda b: b[0](rets), (_drawdown_numpy, "_drawdown_numba")),
+        ("rolling_moments", lambda b: b[0](prices, 50), (_rolling_moments_numpy, "_rolling_moments_numba")),
+        ("ewma", lambda b: b[0](prices, 2 / 21), (_ewma_numpy, "_ewma_numba")),
+        ("sparkline_points", lambda b: b[0](spark, 200.0, 50.0), (_sparkline_points_numpy, "_sparkline_points_numba")),
+    ]
+
+    print(f"Numba available: {NUMBA_AVAILABLE} | Active backend: {get_backend()}")
+    for name, call, (ref_fn, jit_name) in cases:
+        t0 = time.perf_counter(); call((ref_fn,)); t_ref = time.perf_counter() - t0
+        if not NUMBA_AVAILABLE:
+            print(f"{name:18s} numpy {t_ref * 1000:8.1f} ms")
+            continue
+        jit_fn = globals()[jit_name]
+        call((jit_fn,))  # warm-up (biên dịch JIT)
+        t0 = time.perf_counter(); call((jit_fn,)); t_jit = time.perf_counter() - t0
+        print(f"{name:18s} numpy {t_ref * 1000:8.1f} ms | numba {t_jit * 1000:8.1f} ms | x{t_ref / t_jit:5.1f}")
@@ -1,8 +1,16 @@
 # src/quant_engine.py
 
+import threading
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
-from scipy.stats import skew, kurtosis
+from src.streaming_stats import MomentsAccumulator, QuantileSketch
+from src.monte_carlo import estimate_gbm_params
+from scipy.stats import norm
+from src.kernels import drawdown as kernel_drawdown, rolling_moments, ewma, gbm_paths
+from src.data_loader import dataset_fingerprint, split_by_ticker
+from src.factor_model import FactorCovariance, fit_factor_model, portfolio_variance
+from src import config
 
 def calculate_log_returns(df: pd.DataFrame, col_name: str = 'Close') -> pd.Series:
     """
@@ -37,17 +45,17 @@ def calculate_log_returns(df: pd.DataFrame, col_name: str = 'Close') -> pd.Serie
     # Chuyển về numpy array để tính toán cho an toàn, tránh lỗi index
     prices = price_series.values
     
-    # Công thức: ln(P_t / P_t-1)
-    # Thêm 1e-9 để tránh chia cho 0 nếu có
-    log_returns = np.log(prices[1:] / (prices[:-1] + 1e-9))
+    # Công thức: ln(P_t / P_t-1) - giá đã qua data_loader.clean_panel lúc tải (> 0, không còn bad tick)
+    log_returns = np.log(prices[1:] / prices[:-1])
     
     # Trả về dưới dạng Series để giữ lại ngày tháng (Index) nếu cần plot
     return pd.Series(log_returns, index=price_series.index[1:])
 
-def calculate_descriptive_stats(returns) -> pd.DataFrame:
+def calculate_descriptive_stats(returns, var_method="exact", sketch_k=200) -> pd.DataFrame:
     """
     Tính các chỉ số thống kê mô tả theo chuẩn CFA Level 1.
     FIX: Chuyển đổi về mảng Numpy 1 chiều ngay từ đầu để tránh lỗi Dimension.
+    var_method: "exact" (np.percentile) hoặc "sketch" (KLL quantile sketch, bộ nhớ cố định).
     """
     
     # --- BƯỚC AN TOÀN: Flatten Data ---
@@ -57,30 +65,89 @@ def calculate_descriptive_stats(returns) -> pd.DataFrame:
     else:
         data = np.array(returns).flatten()
         
-    # Loại bỏ NaN và inf trước khi tính
-    data = data[~np.isnan(data)]
-    data = data[~np.isinf(data)]
+    # Loại bỏ NaN và inf trước khi tính (1 lần lọc duy nhất)
+    data = data[np.isfinite(data)]
     
     if len(data) == 0:
         return pd.DataFrame({"Error": ["Not enough data"]})
     # ----------------------------------
 
-    # 1. Central Tendency & Dispersion
-    # Dùng numpy function -> trả về numpy scalar -> .item() chuyển về native python float
-    mean_ret = np.mean(data).item()
-    median_ret = np.median(data).item()
-    std_dev = np.std(data, ddof=1).item() # ddof=1 cho sample standard deviation
+    # 1. Mean, Std, Skew, Kurtosis trong 1 lượt (accumulator gộp được theo chunk)
+    moments = MomentsAccumulator().update(data, assume_finite=True)
     
+    # 2. VaR (Value at Risk)
+    if var_method == "sketch":
+        var_95 = QuantileSketch(k=sketch_k).update(data, assume_finite=True).quantile(0.05)
+    else:
+        var_95 = np.percentile(data, 5).item()
+
+    return format_descriptive_stats(moments, var_95)
+
+def calculate_descriptive_stats_chunked(chunks, sketch_k=200, seed=None) -> pd.DataFrame:
+    """
+    Bản streaming của calculate_descriptive_stats: nhận 1 iterable các chunk returns
+    (file lớn hơn RAM, dữ liệu tick nhiều năm...) và chỉ đọc mỗi chunk 1 lần.
+    Moments chính xác, VaR ước lượng bằng QuantileSketch (sai số rank ~ 1/sketch_k).
+    """
+    moments = MomentsAccumulator()
+    sketch = QuantileSketch(k=sketch_k, seed=seed)
+    for chunk in chunks:
+        if isinstance(chunk, (pd.DataFrame, pd.Series)):
+            chunk = chunk.values
+        data = np.asarray(chunk, dtype=float).ravel()
+        data = data[np.isfinite(data)]
+        moments.update(data, assume_finite=True)
+        sketch.update(data, assume_finite=True)
+
+    return format_descriptive_stats(moments, sketch.quantile(0.05))
+
+def calculate_var_cvar(returns, confidence=0.95, method="exact", sketch_k=200, seed=None):
+    """
+    Tính VaR và CVaR (Expected Shortfall) của chuỗi returns / kịch bản mô phỏng.
+    - method="exact": np.percentile + trung bình đuôi (cần toàn bộ mảng trong RAM).
+    - method="sketch": KLL QuantileSketch; returns có thể là mảng hoặc iterable các chunk
+      (kể cả QuantileSketch đã gộp sẵn từ nhiều worker).
+    Trả về (var, cvar) dưới dạng số âm = lỗ.
+    """
+    alpha = 1 - confidence
+
+    if method == "sketch":
+        if isinstance(returns, QuantileSketch):
+            sketch = returns
+        else:
+            sketch = QuantileSketch(k=sketch_k, seed=seed)
+            chunks = [returns] if isinstance(returns, (np.ndarray, pd.Series, pd.DataFrame, list)) else returns
+            for chunk in chunks:
+                sketch.update(chunk.values if isinstance(chunk, (pd.Series, pd.DataFrame)) else chunk)
+        return sketch.quantile(alpha), sketch.tail_mean(alpha)
+
+    if method != "exact":
+        raise ValueError(f"Unknown VaR method: {method}")
+
+    data = returns.values if isinstance(returns, (pd.Series, pd.DataFrame)) else np.asarray(returns)
+    data = data.ravel()
+    data = data[np.isfinite(data)]
+    if len(data) == 0:
+        return np.nan, np.nan
+    var = np.percentile(data, alpha * 100).item()
+    cvar = data[data <= var].mean().item()
+    return var, cvar
+
+def format_descriptive_stats(moments, var_95) -> pd.DataFrame:
+    """
+    Đóng gói bảng thống kê từ MomentsAccumulator (dùng chung cho bản in-memory,
+    bản streaming theo chunk và bản gộp nhiều worker).
+    """
+    if moments.count == 0:
+        return pd.DataFrame({"Error": ["Not enough data"]})
+
     # Annualize (Năm hóa)
-    annualized_volatility = std_dev * np.sqrt(252)
-    annualized_return = mean_ret * 252
+    annualized_volatility = moments.std(ddof=1) * np.sqrt(252)
+    annualized_return = moments.mean * 252
     
-    # 2. Distribution Shape
-    skew_val = skew(data).item() if hasattr(skew(data), 'item') else float(skew(data))
-    kurt_val = kurtosis(data).item() if hasattr(kurtosis(data), 'item') else float(kurtosis(data))
-    
-    # 3. VaR (Value at Risk)
-    var_95 = np.percentile(data, 5).item()
+    # Distribution Shape
+    skew_val = float(moments.skewness())
+    kurt_val = float(moments.excess_kurtosis())
 
     # Đóng gói kết quả
     stats = {
@@ -93,66 +160,104 @@ def calculate_descriptive_stats(returns) -> pd.DataFrame:
     
     return pd.DataFrame(stats, index=["Value"]).T
 
-# src/quant_engine.py (Bổ sung thêm hàm này)
+# --- BENCHMARK-RELATIVE ANALYTICS (CAPM: Beta, Alpha, Tracking Error, IR) ---
+
+BENCHMARK_METRICS = ["Beta", "Alpha", "Correlation", "R-Squared", "Tracking Error", "Information Ratio"]
 
-def calculate_advanced_metrics(returns, benchmark_returns, risk_free_rate=0.03):
+def _capm_from_sums(n, sx, sy, sxx, syy, sxy, offset_x, offset_y, rf_daily, periods):
     """
-    Tính các chỉ số chuyên sâu: Sharpe, Sortino, Beta, Alpha, Max Drawdown.
-    risk_free_rate: Lãi suất phi rủi ro (mặc định 3%/năm).
+    Các chỉ số CAPM từ tổng moment chéo (scalar hoặc mảng cửa sổ) - x: benchmark, y: tài sản.
+    Tổng tính trên dữ liệu đã trừ offset (phương sai/hiệp phương sai không đổi khi dịch).
     """
-    # 1. Chuẩn bị dữ liệu
-    # Ép kiểu về numpy array 1 chiều và drop NaN
-    if isinstance(returns, pd.Series): returns = returns.values
-    if isinstance(benchmark_returns, pd.Series): benchmark_returns = benchmark_returns.values
-    
-    # Đảm bảo 2 mảng có cùng độ dài (cắt bớt phần thừa)
-    min_len = min(len(returns), len(benchmark_returns))
-    returns = returns[-min_len:]
-    benchmark_returns = benchmark_returns[-min_len:]
-    
-    # Các thông số cơ bản
-    rf_daily = risk_free_rate / 252
-    excess_ret = returns - rf_daily
-    mean_ret = np.mean(returns) * 252
-    volatility = np.std(returns) * np.sqrt(252)
-    
-    # --- A. RISK-ADJUSTED RATIOS ---
-    
-    # Sharpe Ratio: (Rp - Rf) / Sigma
-    sharpe_ratio = (np.mean(excess_ret) / np.std(returns)) * np.sqrt(252)
-    
-    # Sortino Ratio: Chỉ tính rủi ro giảm (Downside Deviation)
-    negative_returns = returns[returns < 0]
-    downside_std = np.std(negative_returns) * np.sqrt(252)
-    sortino_ratio = (mean_ret - risk_free_rate) / downside_std if downside_std != 0 else 0
-    
-    # --- B. MAX DRAWDOWN (Quan trọng nhất) ---
-    # Giả lập đường giá từ returns: Bắt đầu từ 100 đồng
-    cumulative_returns = (1 + returns).cumprod()
-    peak = np.maximum.accumulate(cumulative_returns)
-    drawdown = (cumulative_returns - peak) / peak
-    max_drawdown = np.min(drawdown) # Số âm, ví dụ -0.25
-    
-    # --- C. CAPM METRICS (Beta & Alpha) ---
-    # Covariance giữa Stock và Market
-    covariance = np.cov(returns, benchmark_returns)[0][1]
-    market_variance = np.var(benchmark_returns)
-    
-    beta = covariance / market_variance
-    
-    # Alpha = Return Stock - [Rf + Beta * (Return Market - Rf)]
-    market_return_annual = np.mean(benchmark_returns) * 252
-    alpha = mean_ret - (risk_free_rate + beta * (market_return_annual - risk_free_rate))
-    
-    return {
-        "Sharpe Ratio": round(sharpe_ratio, 2),
-        "Sortino Ratio": round(sortino_ratio, 2),
-        "Max Drawdown": f"{max_drawdown:.2%}",
-        "Beta": round(beta, 2),
-        "Alpha": f"{alpha:.2%}"
-    }
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var_x = (sxx - sx * sx / n) / (n - 1)
+        var_y = (syy - sy * sy / n) / (n - 1)
+        cov = (sxy - sx * sy / n) / (n - 1)
+        mean_x, mean_y = sx / n + offset_x, sy / n + offset_y
+        beta = cov / var_x
+        corr = cov / np.sqrt(var_x * var_y)
+        # Active return (y - x): var = var_y + var_x - 2cov
+        tracking_error = np.sqrt(np.maximum(var_y + var_x - 2 * cov, 0) * periods)
+        return {
+            "Beta": beta,
+            # Jensen's alpha (năm hóa): (Ry - Rf) - Beta * (Rx - Rf)
+            "Alpha": ((mean_y - rf_daily) - beta * (mean_x - rf_daily)) * periods,
+            "Correlation": corr,
+            "R-Squared": corr ** 2,
+            "Tracking Error": tracking_error,
+            "Information Ratio": (mean_y - mean_x) * periods / tracking_error,
+        }
+
+def calculate_benchmark_metrics(asset_returns, benchmark_returns, risk_free_rate=0.03, window=63, periods=252):
+    """
+    Beta / Alpha / Correlation / R² / Tracking Error / Information Ratio của tài sản so với benchmark:
+    toàn mẫu + rolling `window` phiên. Rolling dùng tổng tích lũy các moment chéo (x, y, x², y², xy)
+    -> O(n) bất kể độ dài cửa sổ. Trả về {"summary": dict, "rolling": DataFrame | None} hoặc None.
+    """
+    aligned = pd.concat([asset_returns, benchmark_returns], axis=1, join="inner").dropna()
+    if len(aligned) < 3:
+        return None
+    # Trừ trung bình toàn mẫu trước khi cộng dồn: giảm sai số triệt tiêu của công thức tổng bình phương
+    values = aligned.to_numpy(dtype=float)
+    offset_y, offset_x = values.mean(axis=0)
+    y, x = values[:, 0] - offset_y, values[:, 1] - offset_x
+    rf_daily = risk_free_rate / periods
+    cum = [np.concatenate([[0.0], np.cumsum(v)]) for v in (x, y, x * x, y * y, x * y)]
 
-# ... (Giữ nguyên các import và hàm cũ)
+    full = _capm_from_sums(len(values), *(c[-1] for c in cum), offset_x, offset_y, rf_daily, periods)
+    summary = {name: float(full[name]) for name in BENCHMARK_METRICS}
+    summary["Observations"] = len(values)
+
+    rolling = None
+    if window and len(values) >= window:
+        window_sums = [c[window:] - c[:-window] for c in cum]
+        roll = _capm_from_sums(window, *window_sums, offset_x, offset_y, rf_daily, periods)
+        rolling = pd.DataFrame(roll, index=aligned.index[window - 1:])[BENCHMARK_METRICS]
+    return {"summary": summary, "rolling": rolling}
+
+def _session_keys(index, daily):
+    # Khóa khớp phiên: nến ngày / tuần là NHÃN ngày lịch (0h giờ sàn) -> khớp theo ngày;
+    # intraday là thời điểm -> khớp theo UTC (index naive coi là UTC)
+    index = pd.DatetimeIndex(index)
+    if daily:
+        return index.tz_localize(None) if index.tz is not None else index
+    return index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+
+def align_to_benchmark(asset_prices, benchmark_prices):
+    """
+    Returns của tài sản & benchmark trên các phiên chung (giá được khớp trước rồi mới tính %):
+    crypto giao dịch cuối tuần vẫn so đúng với phiên thứ 6 -> thứ 2 của benchmark cổ phiếu.
+    Nến intraday khác múi giờ (VD: cổ phiếu New York vs benchmark UTC) khớp theo cùng thời điểm UTC.
+    Kết quả giữ index gốc (cả timezone) của tài sản.
+    """
+    asset_prices, benchmark_prices = asset_prices.dropna(), benchmark_prices.dropna()
+    asset_index, bench_index = pd.DatetimeIndex(asset_prices.index), pd.DatetimeIndex(benchmark_prices.index)
+    daily = all((idx == idx.normalize()).all() for idx in (asset_index, bench_index))
+    asset = pd.DataFrame({"asset": asset_prices.to_numpy(), "stamp": asset_index},
+                         index=_session_keys(asset_index, daily))
+    bench = pd.Series(benchmark_prices.to_numpy(), index=_session_keys(bench_index, daily), name="benchmark")
+    prices = asset.join(bench, how="inner").set_index("stamp")
+    prices.index.name = asset_prices.index.name
+    returns = prices.pct_change().dropna()
+    return returns["asset"].rename(asset_prices.name), returns["benchmark"].rename(benchmark_prices.name)
+
+def calculate_benchmark_table(df, tickers, benchmark_prices, risk_free_rate=0.03, window=63):
+    """
+    Chỉ số so với benchmark cho mọi mã trong watchlist.
+    Trả về (DataFrame tóm tắt index=ticker, {ticker: DataFrame rolling}).
+    """
+    frames = split_by_ticker(df, tickers)
+    rows, rolling = {}, {}
+    for ticker, frame in frames.items():
+        col = 'Adj Close' if 'Adj Close' in frame.columns else 'Close'
+        asset_returns, bench_returns = align_to_benchmark(frame[col], benchmark_prices)
+        result = calculate_benchmark_metrics(asset_returns, bench_returns, risk_free_rate, window)
+        if result is None:
+            continue
+        rows[ticker] = result["summary"]
+        rolling[ticker] = result["rolling"]
+    summary = pd.DataFrame.from_dict(rows, orient="index", columns=BENCHMARK_METRICS + ["Observations"])
+    return summary, rolling
 
 def calculate_advanced_metrics(df, risk_free_rate=0.03):
     """
@@ -186,12 +291,8 @@ def calculate_advanced_metrics(df, risk_free_rate=0.03):
     sortino_ratio = (mean_return - risk_free_rate) / downside_std if downside_std != 0 else 0
     
     # 5. MAX DRAWDOWN (Quan trọng nhất)
-    # Tính đường cong tài sản (Cumulative Return)
-    cumulative = (1 + returns).cumprod()
-    # Tìm đỉnh cao nhất tính đến hiện tại (Running Max)
-    running_max = cumulative.cummax()
-    # Tính mức sụt giảm từ đỉnh (Drawdown)
-    drawdown = (cumulative - running_max) / running_max
+    # Cumulative Return -> Running Max -> Drawdown trong 1 kernel (NumPy/Numba tùy config)
+    drawdown = pd.Series(kernel_drawdown(returns.values), index=returns.index)
     max_drawdown = drawdown.min()
     
     return {
@@ -202,6 +303,44 @@ def calculate_advanced_metrics(df, risk_free_rate=0.03):
         "Drawdown Series": drawdown # Trả về cả chuỗi để vẽ biểu đồ
     }
 
+def calculate_return_distribution(log_returns, bins=50, curve_points=100):
+    """
+    Histogram (density) của log returns + đường phân phối chuẩn cùng mean/std và Skew/Kurtosis.
+    Bin sẵn ở server: biểu đồ không còn phụ thuộc độ dài chuỗi (dùng cho Risk page & snapshot).
+    """
+    data = np.asarray(log_returns, dtype=float).ravel()
+    data = data[np.isfinite(data)]
+    if len(data) < 2:
+        return None
+    density, edges = np.histogram(data, bins=bins, density=True)
+    moments = MomentsAccumulator().update(data, assume_finite=True)
+    mu, std = moments.mean, moments.std(ddof=0)
+    x_range = np.linspace(moments.min, moments.max, curve_points)
+    pdf = np.exp(-0.5 * ((x_range - mu) / std) ** 2) / (std * np.sqrt(2 * np.pi)) if std > 0 else np.zeros(curve_points)
+    return {
+        "bin_centers": (edges[:-1] + edges[1:]) / 2,
+        "bin_width": float(edges[1] - edges[0]),
+        "density": density,
+        "pdf_x": x_range,
+        "pdf_y": pdf,
+        "Skewness": moments.skewness(),
+        "Excess Kurtosis": moments.excess_kurtosis(),
+    }
+
+# --- MONTE CARLO (GBM) ---
+
+def run_monte_carlo(prices, days_forecast, num_simulations):
+    """Chạy mô phỏng Monte Carlo dựa trên Series giá đã được trích xuất."""
+    params = estimate_gbm_params(prices)
+    if params is None: return None # Không đủ dữ liệu
+    last_price, drift, std_dev = params
+    
+    # Tạo ma trận ngẫu nhiên
+    daily_returns = np.exp(drift + std_dev * norm.ppf(np.random.rand(days_forecast, num_simulations)))
+    
+    # Đệ quy giá (kernel NumPy/Numba tùy config)
+    return gbm_paths(last_price, daily_returns)
+
 # src/quant_engine.py (Thêm vào cuối file)
 
 def optimize_portfolio(df, num_portfolios=5000, risk_free_rate=0.03):
@@ -227,57 +366,18 @@ def optimize_portfolio(df, num_portfolios=5000, risk_free_rate=0.03):
     # Tính Log Returns
     returns = np.log(data / data.shift(1)).dropna()
     
-    # Tính Mean Return (năm) và Covariance Matrix (năm)
-    avg_returns = returns.mean() * 252
-    cov_matrix = returns.cov() * 252
+    # Tính Mean Return (năm) và Covariance Matrix (năm) - nhiều mã -> mô hình nhân tố PCA (xem estimate_covariance)
+    avg_returns = returns.mean().values * 252
+    cov_matrix = estimate_covariance(returns)
     
-    try:
-        if isinstance(df.columns, pd.MultiIndex):
-            price_levels = df.columns.get_level_values(1).unique()
-            target_col = 'Adj Close' if 'Adj Close' in price_levels else 'Close'
-            data = df.xs(target_col, level=1, axis=1)
-        else:
-            return None
-    except:
-        return None
-
-    if len(data.columns) < 2: return None
+    # 2. Chạy mô phỏng Monte Carlo: sinh mọi danh mục 1 lần (cùng chuỗi số ngẫu nhiên với vòng lặp từng danh mục)
+    weights_record = np.random.random((num_portfolios, len(data.columns)))
+    weights_record /= weights_record.sum(axis=1, keepdims=True) # Chuẩn hóa về 1
 
-    returns = np.log(data / data.shift(1)).dropna()
-    avg_returns = returns.mean() * 252
-    cov_matrix = returns.cov() * 252
-    
-    # 2. Chạy mô phỏng Monte Carlo
     results = np.zeros((3, num_portfolios))
-    weights_record = []
-    
-    # --- CẤU HÌNH RÀNG BUỘC (MỚI) ---
-    # Giới hạn: Không mã nào được chiếm quá 60% danh mục (để ép đa dạng hóa)
-    # Trừ khi chỉ có 2 mã thì cho phép linh động hơn chút, nhưng ở đây ta cứ set cứng để test
-    MAX_WEIGHT = 0.70 # 70%
-
-    for i in range(num_portfolios):
-        # Tạo trọng số ngẫu nhiên
-        weights = np.random.random(len(data.columns))
-        weights /= np.sum(weights) # Chuẩn hóa về 1
-        
-        # --- LOGIC MỚI: BỘ LỌC DIVERSIFICATION ---
-        # Nếu danh mục này có mã nào chiếm > 70%, ta bỏ qua và random lại (Resampling)
-        # Tuy nhiên, để code chạy nhanh và đơn giản, ta sẽ dùng kỹ thuật "Dirichlet" hoặc chấp nhận
-        # Ở đây ta dùng cách đơn giản: Nếu vi phạm, ta "phạt" Sharpe ratio của nó (Soft constraint)
-        # Hoặc đơn giản là sinh ra nhiều mẫu hơn để có mẫu cân bằng.
-        
-        p_return = np.sum(weights * avg_returns)
-        p_std_dev = np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights)))
-        
-        results[0,i] = p_return
-        results[1,i] = p_std_dev
-        results[2,i] = (p_return - risk_free_rate) / p_std_dev
-        
-        weights_record.append(weights)
-
-    # Convert list to array for easier indexing
-    weights_record = np.array(weights_record)
+    results[0] = weights_record @ avg_returns
+    results[1] = np.sqrt(portfolio_variance(weights_record, cov_matrix))
+    results[2] = (results[0] - risk_free_rate) / results[1]
 
     # 3. Tìm danh mục tối ưu
     # Max Sharpe
@@ -288,6 +388,7 @@ def optimize_portfolio(df, num_portfolios=5000, risk_free_rate=0.03):
     
     return {
         "results": results,
+        "weights": weights_record, # (num_portfolios × assets) - để dựng lại kết quả với rf khác
         "max_sharpe": {
             "return": results[0, max_sharpe_idx],
             "std": results[1, max_sharpe_idx],
@@ -300,4 +401,496 @@ def optimize_portfolio(df, num_portfolios=5000, risk_free_rate=0.03):
             "sharpe": results[2, min_vol_idx],
             "weights": dict(zip(data.columns, weights_record[min_vol_idx]))
         }
-    }
\ No newline at end of file
+    }
+
+# --- RISK-PARITY ALLOCATORS (ERC & HRP) ---
+
+def get_portfolio_returns(df):
+    """Bảng log returns (time × tickers) của watchlist, bỏ các dòng thiếu dữ liệu. None nếu < 2 mã."""
+    if not isinstance(df.columns, pd.MultiIndex):
+        return None
+    data = get_field_panel(df, 'Close')
+    if len(data.columns) < 2:
+        return None
+    returns = np.log(data / data.shift(1)).dropna()
+    return returns if len(returns) >= 2 else None
+
+def estimate_covariance(returns, periods=252):
+    """
+    Covariance năm hóa của bảng returns (time × tickers, không NaN). Từ config.FACTOR_MODEL_MIN_ASSETS mã trở lên
+    -> mô hình nhân tố PCA (FactorCovariance, O(n·k) RAM / phép nhân, khử nhiễu); ít mã hơn -> ma trận mẫu đầy đủ.
+    """
+    values = np.asarray(returns, dtype=float)
+    n_assets = values.shape[1]
+    if config.FACTOR_MODEL_MIN_ASSETS and n_assets >= config.FACTOR_MODEL_MIN_ASSETS:
+        model = fit_factor_model(returns, n_factors=config.FACTOR_MODEL_FACTORS or None)
+        return model.scaled(periods)
+    return np.cov(values, rowvar=False) * periods
+
+def risk_parity_weights(cov, budgets=None, x0=None, tol=1e-10, max_iter=100):
+    """
+    Equal Risk Contribution (hoặc risk budgeting theo `budgets`): w_i * (Σw)_i / σ_p = b_i * σ_p.
+    Giải bài toán lồi min 0.5·x'Σx - Σ b_i·ln(x_i) bằng Newton có damping (Spinu, 2013):
+    mỗi bước 1 lần giải hệ n×n, hội tụ bậc 2 trong ~10 bước. x0: warm start (trọng số cũ).
+    cov là FactorCovariance -> mỗi bước giải bằng Woodbury (k×k), O(n·k²) thay vì O(n³).
+    """
+    factor = isinstance(cov, FactorCovariance)
+    cov = cov if factor else np.asarray(cov, dtype=float)
+    n = cov.shape[0]
+    b = np.full(n, 1.0 / n) if budgets is None else np.asarray(budgets, dtype=float) / np.sum(budgets)
+
+    # Điểm khởi đầu: inverse-volatility (hoặc warm start), chuẩn hóa để x'Σx = 1
+    diag = cov.diagonal() if factor else np.diag(cov)
+    x = 1.0 / np.sqrt(diag) if x0 is None else np.clip(np.asarray(x0, dtype=float), 1e-12, None)
+    x = x / np.sqrt(x @ cov @ x)
+
+    for _ in range(max_iter):
+        grad = cov @ x - b / x
+        if np.max(np.abs(grad)) < tol:
+            break
+        if factor:
+            dx = cov.solve(grad, shift=b / x ** 2)
+        else:
+            dx = np.linalg.solve(cov + np.diag(b / x ** 2), grad)
+        # Backtracking: giữ x > 0 (miền xác định của ln)
+        step = 1.0
+        while np.any(x - step * dx <= 0):
+            step *= 0.5
+        x = x - step * dx
+    return x / np.sum(x)
+
+def _quasi_diag_order(corr):
+    # Phân cụm phân cấp (single linkage) trên khoảng cách d = sqrt((1 - ρ) / 2), trả về thứ tự lá
+    from scipy.cluster.hierarchy import linkage, leaves_list
+    from scipy.spatial.distance import squareform
+    dist = np.sqrt(np.clip((1.0 - corr) / 2.0, 0.0, None))
+    np.fill_diagonal(dist, 0.0)
+    link = linkage(squareform(dist, checks=False), method='single')
+    return leaves_list(link)
+
+def _cluster_variance(cov, idx):
+    # Phương sai của cụm khi phân bổ inverse-variance bên trong cụm
+    sub = cov[np.ix_(idx, idx)]
+    ivp = 1.0 / np.diag(sub)
+    ivp /= ivp.sum()
+    return ivp @ sub @ ivp
+
+def hrp_weights(cov, corr=None):
+    """
+    Hierarchical Risk Parity (López de Prado, 2016):
+    1. Phân cụm trên ma trận tương quan -> 2. Quasi-diagonalization -> 3. Recursive bisection
+    (chia vốn giữa 2 nửa tỷ lệ nghịch với phương sai cụm). Không cần nghịch đảo Σ -> ổn định khi Σ nhiễu.
+    cov là FactorCovariance -> dựng ma trận đầy đủ (phân cụm cần khoảng cách từng cặp).
+    """
+    cov = cov.dense() if isinstance(cov, FactorCovariance) else np.asarray(cov, dtype=float)
+    if corr is None:
+        std = np.sqrt(np.diag(cov))
+        corr = cov / np.outer(std, std)
+    order = _quasi_diag_order(np.asarray(corr, dtype=float))
+
+    weights = np.ones(len(order))
+    clusters = [order]
+    while clusters:
+        next_clusters = []
+        for cluster in clusters:
+            if len(cluster) < 2:
+                continue
+            half = len(cluster) // 2
+            left, right = cluster[:half], cluster[half:]
+            var_left, var_right = _cluster_variance(cov, left), _cluster_variance(cov, right)
+            alpha = 1.0 - var_left / (var_left + var_right)
+            weights[left] *= alpha
+            weights[right] *= 1.0 - alpha
+            next_clusters += [left, right]
+        clusters = next_clusters
+    return weights / weights.sum()
+
+def risk_contributions(weights, cov):
+    """Tỷ trọng đóng góp rủi ro của từng tài sản (tổng = 1)."""
+    weights = np.asarray(weights, dtype=float)
+    marginal = (cov if isinstance(cov, FactorCovariance) else np.asarray(cov, dtype=float)) @ weights
+    contrib = weights * marginal
+    return contrib / contrib.sum()
+
+def allocate_portfolio(df, method="erc", risk_free_rate=0.03):
+    """
+    Phân bổ danh mục theo risk parity: method = "erc" (Equal Risk Contribution) hoặc "hrp".
+    Trả về dict cùng cấu trúc với optimize_portfolio()["max_sharpe"] + "risk_contrib". None nếu không đủ dữ liệu.
+    """
+    returns = get_portfolio_returns(df)
+    if returns is None:
+        return None
+
+    # returns đã dropna -> dùng np.cov (nhanh hơn nhiều so với pandas cov/corr xử lý NaN từng cặp) hoặc mô hình nhân tố
+    avg_returns = returns.mean().values * 252
+    cov_matrix = estimate_covariance(returns)
+    if method == "erc":
+        weights = risk_parity_weights(cov_matrix)
+    elif method == "hrp":
+        weights = hrp_weights(cov_matrix)
+    else:
+        raise ValueError(f"Unknown allocation method: {method}")
+
+    p_return = float(weights @ avg_returns)
+    p_std_dev = float(np.sqrt(portfolio_variance(weights, cov_matrix)))
+    return {
+        "return": p_return,
+        "std": p_std_dev,
+        "sharpe": (p_return - risk_free_rate) / p_std_dev,
+        "weights": dict(zip(returns.columns, weights)),
+        "risk_contrib": dict(zip(returns.columns, risk_contributions(weights, cov_matrix))),
+    }
+
+# --- TECHNICAL INDICATORS (Vectorized cho cả watchlist) ---
+
+_INDICATOR_CACHE = OrderedDict()
+_INDICATOR_CACHE_SIZE = 32
+_INDICATOR_LOCK = threading.Lock()  # dùng chung giữa các thread session Streamlit
+
+def get_field_panel(df, field='Close'):
+    """
+    Bảng (time × tickers) của 1 trường giá từ DataFrame group_by='ticker'.
+    field='Close' tự ưu tiên 'Adj Close' nếu có. DataFrame phẳng (1 mã) -> 1 cột tên field.
+    """
+    if isinstance(df.columns, pd.MultiIndex):
+        price_levels = df.columns.get_level_values(1).unique()
+        if field == 'Close' and 'Adj Close' in price_levels:
+            field = 'Adj Close'
+        return df.xs(field, level=1, axis=1)
+    if field == 'Close' and 'Adj Close' in df.columns:
+        field = 'Adj Close'
+    return df[[field]]
+
+def _rolling_on_valid(x, window):
+    # Rolling mean/std trên các quan sát hợp lệ của từng cột (bỏ qua dòng NaN, ví dụ cổ phiếu
+    # nghỉ cuối tuần trong panel có crypto). Dồn giá trị hợp lệ lên đầu cột bằng stable argsort,
+    # tính rolling rồi trả về đúng vị trí thời gian -> không loop theo ticker.
+    valid = np.isfinite(x)
+    order = np.argsort(~valid, axis=0, kind='stable')
+    mean_c, std_c = rolling_moments(np.take_along_axis(x, order, axis=0), window)
+    mean, std = np.empty_like(x), np.empty_like(x)
+    np.put_along_axis(mean, order, mean_c, axis=0)
+    np.put_along_axis(std, order, std_c, axis=0)
+    return np.where(valid, mean, np.nan), np.where(valid, std, np.nan)
+
+def _vwap_panel(high, low, close, volume, index):
+    # VWAP neo theo phiên (intraday: reset mỗi ngày; daily/weekly: neo từ bar đầu tiên)
+    typical = (high + low + close) / 3
+    valid = np.isfinite(typical) & np.isfinite(volume)
+    pv = np.cumsum(np.where(valid, typical * volume, 0.0), axis=0)
+    vol = np.cumsum(np.where(valid, volume, 0.0), axis=0)
+
+    if isinstance(index, pd.DatetimeIndex) and len(index) > 1:
+        day = index.normalize()
+        new_session = np.r_[True, day[1:] != day[:-1]]
+        if not new_session.all():
+            # Trừ đi tổng tích lũy tới trước phiên hiện tại (không loop theo ngày)
+            start = np.maximum.accumulate(np.where(new_session, np.arange(len(index)), 0))
+            base_pv = np.vstack([np.zeros((1, pv.shape[1])), pv[:-1]])[start]
+            base_vol = np.vstack([np.zeros((1, vol.shape[1])), vol[:-1]])[start]
+            pv, vol = pv - base_pv, vol - base_vol
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vwap = pv / vol
+    return np.where(valid & (vol > 0), vwap, np.nan)
+
+def compute_indicators(df, sma_windows=(20, 50), ema_windows=(20,), bb_window=20, bb_k=2.0,
+                       rsi_window=14, macd=(12, 26, 9), atr_window=14):
+    """
+    Tính SMA, EMA, Bollinger, RSI, MACD, ATR, VWAP cho MỌI ticker cùng lúc trên mảng (time × tickers).
+    - Kernel cumulative/đệ quy (src.kernels), không loop theo ticker, KHÔNG sửa df gốc.
+    - Kết quả cache theo fingerprint dữ liệu + tham số: vẽ lại chart không phải tính lại.
+    Trả về dict {tên chỉ báo: DataFrame (index thời gian × cột ticker)} - chỉ đọc.
+    """
+    params = (tuple(sma_windows), tuple(ema_windows), bb_window, bb_k, rsi_window, tuple(macd), atr_window)
+    key = (dataset_fingerprint(df), params)
+    with _INDICATOR_LOCK:
+        cached = _INDICATOR_CACHE.get(key)
+        if cached is not None:
+            _INDICATOR_CACHE.move_to_end(key)
+            return cached
+
+    close_df = get_field_panel(df, 'Close')
+    index, tickers = close_df.index, close_df.columns
+    close = close_df.to_numpy(dtype=float)
+    # Giá đóng cửa hợp lệ gần nhất trước mỗi bar (bỏ qua các dòng NaN của từng mã)
+    prev_close = close_df.ffill().shift(1).to_numpy(dtype=float)
+    wrap = lambda arr: pd.DataFrame(arr, index=index, columns=tickers)
+    out = {}
+
+    # 1. Trend: SMA, EMA
+    for w in sma_windows:
+        out[f"SMA{w}"] = wrap(_rolling_on_valid(close, w)[0])
+    for w in ema_windows:
+        out[f"EMA{w}"] = wrap(ewma(close, 2 / (w + 1)))
+
+    # 2. Bollinger Bands
+    bb_mid, bb_std = _rolling_on_valid(close, bb_window)
+    out["BB Middle"] = wrap(bb_mid)
+    out["BB Upper"] = wrap(bb_mid + bb_k * bb_std)
+    out["BB Lower"] = wrap(bb_mid - bb_k * bb_std)
+
+    # 3. RSI (Wilder smoothing)
+    delta = close - prev_close
+    avg_gain = ewma(np.where(np.isnan(delta), np.nan, np.clip(delta, 0, None)), 1 / rsi_window)
+    avg_loss = ewma(np.where(np.isnan(delta), np.nan, np.clip(-delta, 0, None)), 1 / rsi_window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    out[f"RSI{rsi_window}"] = wrap(np.where(avg_loss == 0, 100.0, rsi))
+
+    # 4. MACD
+    fast, slow, signal = macd
+    macd_line = ewma(close, 2 / (fast + 1)) - ewma(close, 2 / (slow + 1))
+    macd_signal = ewma(macd_line, 2 / (signal + 1))
+    out["MACD"] = wrap(macd_line)
+    out["MACD Signal"] = wrap(macd_signal)
+    out["MACD Hist"] = wrap(macd_line - macd_signal)
+
+    # 5. ATR & VWAP (cần High/Low/Volume)
+    try:
+        high = get_field_panel(df, 'High')[tickers].to_numpy(dtype=float)
+        low = get_field_panel(df, 'Low')[tickers].to_numpy(dtype=float)
+        volume = get_field_panel(df, 'Volume')[tickers].to_numpy(dtype=float)
+    except KeyError:
+        high = low = volume = None
+
+    if high is not None:
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+        out[f"ATR{atr_window}"] = wrap(ewma(true_range, 1 / atr_window))
+        out["VWAP"] = wrap(_vwap_panel(high, low, close, volume, index))
+
+    with _INDICATOR_LOCK:
+        _INDICATOR_CACHE[key] = out
+        while len(_INDICATOR_CACHE) > _INDICATOR_CACHE_SIZE:
+            _INDICATOR_CACHE.popitem(last=False)
+    return out
+
+# --- DRAWDOWN EPISODES (Vectorized cho cả watchlist, O(n)) ---
+
+_DRAWDOWN_CACHE = OrderedDict()
+_DRAWDOWN_CACHE_SIZE = 16
+_DRAWDOWN_LOCK = threading.Lock()
+DRAWDOWN_SUMMARY_COLUMNS = ["Bars", "CAGR", "Max Drawdown", "Current Drawdown", "Calmar", "Ulcer Index", "Pain Index",
+                            "Episodes", "Longest"]
+EPISODE_COLUMNS = ["Ticker", "Peak", "Trough", "Recovery", "Depth", "Bars to Trough", "Bars to Recover",
+                   "Duration", "Time to Recover", "Ongoing"]
+
+def drawdown_analytics(close_panel):
+    """
+    Mọi episode peak -> trough -> recovery của mọi mã trong 1 lượt tuyến tính trên toàn panel (time × tickers):
+    đỉnh chạy = fmax.accumulate (bỏ qua NaN), các đoạn underwater liên tiếp được tách bằng cờ bắt đầu / kết thúc
+    trên mảng quan sát hợp lệ trải phẳng, độ sâu mỗi episode = minimum.reduceat. Không loop theo mã / episode.
+    Trả về (summary: 1 dòng / mã, episodes: 1 dòng / episode theo EPISODE_COLUMNS). Thời lượng tính theo số bar
+    hợp lệ và theo thời gian thực (index) -> dùng được cho mọi interval, kể cả nến phút.
+    """
+    close = close_panel.to_numpy(dtype=float)
+    index, tickers = close_panel.index, close_panel.columns
+    if not len(close):
+        return (pd.DataFrame(index=tickers, columns=DRAWDOWN_SUMMARY_COLUMNS),
+                pd.DataFrame(columns=EPISODE_COLUMNS))
+    with np.errstate(invalid='ignore'):
+        close = np.where(close > 0, close, np.nan)
+        dd = close / np.fmax.accumulate(close, axis=0) - 1
+
+    # 1. Quan sát hợp lệ trải phẳng theo từng mã (column-major): vị trí thời gian + mã
+    valid = np.isfinite(dd).T
+    col, pos = np.nonzero(valid)
+    vals = dd.T[valid]
+    n = len(vals)
+    under = vals < 0
+    new_col = np.r_[True, col[1:] != col[:-1]] if n else np.zeros(0, dtype=bool)
+    prev_under = np.r_[False, under[:-1]] & ~new_col
+    starts = np.flatnonzero(under & ~prev_under)  # bar đầu tiên dưới đỉnh (đỉnh = bar hợp lệ liền trước)
+    ends = np.flatnonzero(under & ~np.r_[under[1:] & ~new_col[1:], False]) + 1  # bar sau bar underwater cuối
+
+    # 2. Độ sâu + đáy từng episode (khoảng giữa 2 episode chỉ có giá trị 0 -> reduceat không lẫn)
+    depth = np.minimum.reduceat(vals, starts) if len(starts) else np.zeros(0)
+    is_start = np.zeros(n, dtype=bool)
+    is_start[starts] = True
+    episode = np.cumsum(is_start) - 1
+    at_trough = under & (vals == depth[np.maximum(episode, 0)]) if len(starts) else np.zeros(n, dtype=bool)
+    trough = np.flatnonzero(at_trough)[np.unique(episode[at_trough], return_index=True)[1]]
+    peak = starts - 1
+    recovered = (ends < n) & (col[np.minimum(ends, n - 1)] == col[starts])
+    recovery = np.where(recovered, ends, ends - 1)  # chưa hồi phục -> tính đến bar cuối của mã
+
+    timestamps = index[pos]
+    episodes = pd.DataFrame({
+        "Ticker": tickers[col[starts]],
+        "Peak": timestamps[peak],
+        "Trough": timestamps[trough],
+        "Recovery": timestamps[recovery].where(recovered),
+        "Depth": depth,
+        "Bars to Trough": trough - peak,
+        "Bars to Recover": np.where(recovered, recovery - trough, -1),
+        "Duration": timestamps[recovery] - timestamps[peak],
+        "Time to Recover": (timestamps[recovery] - timestamps[trough]).where(recovered),
+        "Ongoing": ~recovered,
+    }, columns=EPISODE_COLUMNS)
+    episodes["Bars to Recover"] = episodes["Bars to Recover"].where(recovered).astype("Int64")
+
+    # 3. Chỉ số theo mã: Ulcer = √mean(dd²), Pain = mean|dd|, Calmar = CAGR / |Max DD| (CAGR theo thời gian thực)
+    bars = valid.sum(axis=1)
+    has_data = bars > 0
+    first = np.where(has_data, valid.argmax(axis=1), 0)
+    last = np.where(has_data, valid.shape[1] - 1 - valid[:, ::-1].argmax(axis=1), 0)
+    columns = np.arange(len(tickers))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        max_dd = np.fmin.reduce(dd, axis=0)
+        ulcer = np.sqrt(np.nansum(dd ** 2, axis=0) / bars)
+        pain = -np.nansum(dd, axis=0) / bars
+        current = np.where(has_data, dd[last, columns], np.nan)
+        if isinstance(index, pd.DatetimeIndex):
+            years = (index[last] - index[first]).total_seconds().to_numpy() / (365.25 * 86400)
+            growth = close[last, columns] / close[first, columns]
+            cagr = np.where(has_data & (years > 0), growth ** (1 / np.where(years > 0, years, 1)) - 1, np.nan)
+        else:
+            cagr = np.full(len(tickers), np.nan)
+        calmar = np.where(max_dd < 0, cagr / -max_dd, np.nan)
+
+    counts = episodes.groupby("Ticker", sort=False).agg(Episodes=("Depth", "size"), Longest=("Duration", "max"))
+    summary = pd.DataFrame({
+        "Bars": bars,
+        "CAGR": cagr,
+        "Max Drawdown": max_dd,
+        "Current Drawdown": current,
+        "Calmar": calmar,
+        "Ulcer Index": ulcer,
+        "Pain Index": pain,
+    }, index=tickers).join(counts)
+    summary["Episodes"] = summary["Episodes"].fillna(0).astype(int)
+    return summary, episodes
+
+def calculate_drawdown_report(df):
+    """drawdown_analytics trên giá Close của cả watchlist, cache theo fingerprint dữ liệu (chỉ đọc)."""
+    key = dataset_fingerprint(df)
+    with _DRAWDOWN_LOCK:
+        cached = _DRAWDOWN_CACHE.get(key)
+        if cached is not None:
+            _DRAWDOWN_CACHE.move_to_end(key)
+            return cached
+    result = drawdown_analytics(get_field_panel(df, 'Close'))
+    with _DRAWDOWN_LOCK:
+        _DRAWDOWN_CACHE[key] = result
+        while len(_DRAWDOWN_CACHE) > _DRAWDOWN_CACHE_SIZE:
+            _DRAWDOWN_CACHE.popitem(last=False)
+    return result
+
+# --- SCREENER METRICS (Vectorized cho hàng nghìn mã) ---
+
+def calculate_screen_metrics(close_panel, risk_free_rate=0.03):
+    """
+    Tính Return, Volatility, Sharpe, Sortino, Max Drawdown, Skew, Kurtosis, VaR cho mọi cột
+    của bảng giá (time × tickers) cùng lúc. Mỗi mã chỉ dùng các quan sát hợp lệ của nó
+    (NaN do lịch giao dịch khác nhau được bỏ qua). Quy ước giống calculate_advanced_metrics
+    (simple returns) và calculate_descriptive_stats (log returns cho Skew/Kurtosis/VaR).
+    """
+    close = close_panel.to_numpy(dtype=float)
+    prev_close = close_panel.ffill().shift(1).to_numpy(dtype=float)
+    valid = np.isfinite(close) & np.isfinite(prev_close) & (prev_close > 0) & (close > 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        simple = np.where(valid, close / prev_close - 1, np.nan)
+        log_ret = np.where(valid, np.log(close / prev_close), np.nan)
+        n = valid.sum(axis=0)
+
+        # 1. Return / Volatility / Sharpe (simple returns)
+        mean = np.nanmean(simple, axis=0)
+        std = np.nanstd(simple, axis=0, ddof=1)
+        rf_daily = risk_free_rate / 252
+        sharpe = (mean - rf_daily) / std * np.sqrt(252)
+
+        # 2. Sortino (downside deviation)
+        downside = np.nanstd(np.where(simple < 0, simple, np.nan), axis=0, ddof=1) * np.sqrt(252)
+        sortino = np.where(downside > 0, (mean * 252 - risk_free_rate) / downside, 0.0)
+
+        # 3. Max Drawdown
+        wealth = np.cumprod(1 + np.nan_to_num(simple), axis=0)
+        max_dd = np.min(wealth / np.maximum.accumulate(wealth, axis=0) - 1, axis=0)
+
+        # 4. Distribution shape & VaR (log returns)
+        dev = log_ret - np.nanmean(log_ret, axis=0)
+        m2 = np.nanmean(dev ** 2, axis=0)
+        skewness = np.nanmean(dev ** 3, axis=0) / m2 ** 1.5
+        kurt = np.nanmean(dev ** 4, axis=0) / m2 ** 2 - 3
+        var_95 = np.nanpercentile(log_ret, 5, axis=0) if len(log_ret) else np.full(close.shape[1], np.nan)
+
+    last_price = close_panel.ffill().iloc[-1].to_numpy(dtype=float) if len(close_panel) else np.full(close.shape[1], np.nan)
+
+    return pd.DataFrame({
+        "LastPrice": last_price,
+        "Bars": n,
+        "Return": mean * 252,
+        "Volatility": std * np.sqrt(252),
+        "Sharpe": sharpe,
+        "Sortino": sortino,
+        "MaxDrawdown": max_dd,
+        "Skew": skewness,
+        "Kurtosis": kurt,
+        "VaR95": var_95,
+    }, index=close_panel.columns)
+
+# --- COMPACT STORAGE: KIỂM TRA PRECISION ---
+
+def _precision_metrics(df, tickers):
+    # Các chỉ số quant_engine mà view dùng, tính trên 1 phiên bản dữ liệu (float64 hoặc compact)
+    metrics = {}
+    for ticker, frame in split_by_ticker(df, tickers).items():
+        frame = frame.dropna(subset=[c for c in ('Close', 'Adj Close') if c in frame.columns])
+        if len(frame) < 3:
+            continue
+        returns = calculate_log_returns(frame, 'Adj Close' if 'Adj Close' in frame.columns else 'Close').values
+        returns = returns[np.isfinite(returns)].astype(float)
+        moments = MomentsAccumulator().update(returns, assume_finite=True)
+        advanced = calculate_advanced_metrics(frame)
+        metrics.update({
+            (ticker, "Annualized Return"): moments.mean * 252,
+            (ticker, "Annualized Volatility"): moments.std() * np.sqrt(252),
+            (ticker, "Skewness"): moments.skewness(),
+            (ticker, "Excess Kurtosis"): moments.excess_kurtosis(),
+            (ticker, "Daily VaR (95%)"): calculate_var_cvar(returns)[0],
+            (ticker, "Sharpe Ratio"): advanced["Sharpe Ratio"],
+            (ticker, "Sortino Ratio"): advanced["Sortino Ratio"],
+            (ticker, "Max Drawdown"): advanced["Max Drawdown"],
+        })
+
+    # Chỉ báo kỹ thuật: sai số lớn nhất trên toàn chuỗi (so theo biên độ của chỉ báo)
+    for name, panel in compute_indicators(df).items():
+        metrics[("*", name)] = panel.to_numpy(dtype=float)
+
+    allocation = allocate_portfolio(df, method="erc") if len(tickers) >= 2 else None
+    if allocation is not None:
+        metrics.update({(t, "ERC Weight"): w for t, w in allocation["weights"].items()})
+    return metrics
+
+def verify_compact_precision(full_df, compact_df, tickers=None, rtol=0.001):
+    """
+    So các chỉ số quant_engine (thống kê mô tả, VaR, Sharpe/Sortino/Drawdown, chỉ báo, ERC)
+    giữa bản float64 gốc và bản compact. Sai lệch > rtol (tương đối, sàn 1e-2 cho số gần 0)
+    -> ValueError liệt kê các chỉ số vượt ngưỡng. Trả về sai lệch tương đối lớn nhất.
+    """
+    if tickers is None:
+        tickers = list(full_df.columns.get_level_values(0).unique())
+    reference = _precision_metrics(full_df, tickers)
+    candidate = _precision_metrics(compact_df, tickers)
+
+    worst = 0.0
+    failures = []
+    for key, ref in reference.items():
+        ref = np.asarray(ref, dtype=float)
+        got = np.asarray(candidate.get(key, np.nan), dtype=float)
+        both_nan = np.isnan(ref) & np.isnan(got)
+        scale = np.nanmax(np.abs(ref)) if ref.ndim else abs(ref)
+        scale = max(float(scale) if np.isfinite(scale) else 0.0, 1e-2)
+        err = np.where(both_nan, 0.0, np.abs(got - ref) / scale)
+        err = float(np.max(err)) if err.size else 0.0
+        if not np.isfinite(err):
+            err = np.inf
+        worst = max(worst, err)
+        if err > rtol:
+            failures.append(f"{key[0]} {key[1]}: rel. error {err:.2e}")
+
+    if failures:
+        raise ValueError("Compact storage changes quant_engine metrics beyond tolerance "
+                         f"(rtol={rtol:g}): " + "; ".join(failures))
+    return worst
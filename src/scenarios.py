@@ -0,0 +1,248 @@
+# src/scenarios.py
+
+import time
+import numpy as np
+import pandas as pd
+
+# --- 1. THƯ VIỆN KỊCH BẢN ---
+
+# Nhân tố -> mã proxy (hồi quy beta của từng tài sản lên lợi suất ngày của các proxy)
+FACTOR_PROXIES = {
+    "Equities": "SPY",
+    "Tech": "QQQ",
+    "Long Bonds": "TLT",
+    "Gold": "GLD",
+    "Crypto": "BTC-USD",
+}
+
+# Giai đoạn lịch sử: (ngày bắt đầu, ngày kết thúc) - lợi suất tính từ giá đóng cửa phiên TRƯỚC ngày bắt đầu
+HISTORICAL_EVENTS = {
+    "GFC: Lehman Collapse (Sep–Nov 2008)": ("2008-09-12", "2008-11-20"),
+    "US Downgrade (Jul–Aug 2011)": ("2011-07-22", "2011-08-08"),
+    "China Deval (Aug 2015)": ("2015-08-18", "2015-08-25"),
+    "Volmageddon (Feb 2018)": ("2018-01-26", "2018-02-08"),
+    "Q4 2018 Selloff": ("2018-10-03", "2018-12-24"),
+    "COVID Crash (Feb–Mar 2020)": ("2020-02-19", "2020-03-23"),
+    "Crypto Crash (May 2021)": ("2021-05-10", "2021-05-23"),
+    "Rate Shock (Jan–Jun 2022)": ("2022-01-03", "2022-06-16"),
+    "FTX Collapse (Nov 2022)": ("2022-11-06", "2022-11-21"),
+    "Yen Carry Unwind (Aug 2024)": ("2024-07-31", "2024-08-05"),
+    "Tariff Shock (Apr 2025)": ("2025-04-02", "2025-04-08"),
+}
+# Ngày sớm nhất cần tải lịch sử (đệm vài phiên trước sự kiện đầu tiên)
+HISTORY_START = "2008-08-01"
+
+# Cú sốc giả định: {tên: {nhân tố: lợi suất}} - nhân tố không nêu di chuyển theo tương quan với nhân tố bị sốc
+FACTOR_SHOCKS = {
+    "Equities −20%": {"Equities": -0.20},
+    "Tech −30%": {"Tech": -0.30},
+    "Crypto −50% Day": {"Crypto": -0.50},
+    "Rates +100bp (Long Bonds −15%)": {"Long Bonds": -0.15},
+    "Stagflation": {"Equities": -0.15, "Long Bonds": -0.10, "Gold": 0.10},
+    "Risk-Off Flight to Quality": {"Equities": -0.10, "Crypto": -0.25, "Long Bonds": 0.05, "Gold": 0.05},
+}
+
+ROLLING_HORIZONS = (1, 5, 21)  # cửa sổ trượt (phiên) dựng kịch bản từ toàn bộ lịch sử
+KIND_EVENT, KIND_SHOCK, KIND_ROLLING = "Historical", "Factor Shock", "Rolling Window"
+
+
+# --- 2. MÔ HÌNH NHÂN TỐ ---
+
+def factor_model(asset_returns, factor_returns, window=504):
+    """
+    Beta (mã × nhân tố, hồi quy bội có hệ số chặn) và covariance nhân tố từ `window` phiên chung gần nhất
+    của lợi suất ngày (simple returns). Trả về (betas DataFrame, factor_cov DataFrame) hoặc None nếu thiếu dữ liệu.
+    """
+    joined = pd.concat([asset_returns, factor_returns], axis=1, join="inner").dropna().iloc[-window:]
+    k = factor_returns.shape[1]
+    if len(joined) <= k + 2:
+        return None
+    X = joined[factor_returns.columns].to_numpy()
+    Y = joined[asset_returns.columns].to_numpy()
+    design = np.column_stack([np.ones(len(X)), X])
+    coef, *_ = np.linalg.lstsq(design, Y, rcond=None)
+    betas = pd.DataFrame(coef[1:].T, index=asset_returns.columns, columns=factor_returns.columns)
+    return betas, pd.DataFrame(np.cov(X, rowvar=False).reshape(k, k), index=factor_returns.columns, columns=factor_returns.columns)
+
+def conditional_factor_moves(shocks, factor_cov):
+    """
+    Di chuyển kỳ vọng của MỌI nhân tố khi một số nhân tố bị sốc: m = Σ[:, S] Σ[S, S]⁻¹ s
+    (nhân tố bị sốc giữ đúng giá trị sốc). shocks: dict {nhân tố: lợi suất}.
+    """
+    factors = list(factor_cov.columns)
+    shocked = [f for f in factors if f in shocks and pd.notna(shocks[f])]
+    if not shocked:
+        return pd.Series(0.0, index=factors)
+    cov = factor_cov.to_numpy()
+    idx = [factors.index(f) for f in shocked]
+    s = np.array([shocks[f] for f in shocked], dtype=float)
+    moves = cov[:, idx] @ np.linalg.lstsq(cov[np.ix_(idx, idx)], s, rcond=None)[0]
+    moves[idx] = s
+    return pd.Series(moves, index=factors)
+
+def _apply_betas(betas, moves):
+    # Lợi suất tài sản = beta · di chuyển nhân tố, chặn dưới -100% (long-only không lỗ quá vốn)
+    return np.maximum(betas.to_numpy() @ moves.reindex(betas.columns).to_numpy(), -1.0)
+
+
+# --- 3. DỰNG MA TRẬN KỊCH BẢN (kịch bản × tài sản, simple returns cả giai đoạn) ---
+
+def event_returns(close, start, end):
+    """
+    Lợi suất từng cột của `close` (time × mã, index ngày) trong giai đoạn [start, end]: giá đóng cửa cuối cùng
+    <= end chia giá đóng cửa cuối cùng TRƯỚC start. NaN nếu mã chưa có giá trước giai đoạn.
+    """
+    filled = close.ffill()
+    before = filled[filled.index < pd.Timestamp(start)]
+    upto = filled[filled.index <= pd.Timestamp(end)]
+    if before.empty or upto.empty:
+        return pd.Series(np.nan, index=close.columns)
+    return upto.iloc[-1] / before.iloc[-1] - 1.0
+
+def historical_scenarios(close, assets, factors, factor_model_result=None, events=None):
+    """
+    Kịch bản giai đoạn lịch sử cho `assets`. Mã chưa niêm yết trong giai đoạn -> proxy bằng mô hình nhân tố
+    (beta × di chuyển kỳ vọng của nhân tố, điều kiện trên các nhân tố quan sát được trong giai đoạn đó).
+    close: panel giá ngày chứa cả assets và mã proxy của factors ({nhân tố: mã}).
+    Trả về (DataFrame kịch bản × assets, Series số mã bị proxy mỗi kịch bản).
+    """
+    rows, proxied = {}, {}
+    for name, (start, end) in (events or HISTORICAL_EVENTS).items():
+        moves = event_returns(close, start, end)
+        asset_moves = moves.reindex(assets)
+        missing = asset_moves.isna()
+        if missing.any() and factor_model_result is not None:
+            betas, factor_cov = factor_model_result
+            observed = {f: moves.get(t) for f, t in factors.items() if f in factor_cov.columns and pd.notna(moves.get(t))}
+            if observed:  # không nhân tố nào có dữ liệu trong giai đoạn -> bỏ sự kiện (dropna ở build_scenarios)
+                factor_moves = conditional_factor_moves(observed, factor_cov)
+                asset_moves[missing] = _apply_betas(betas.loc[asset_moves.index[missing]], factor_moves)
+        rows[name] = asset_moves
+        proxied[name] = int(missing.sum())
+    return pd.DataFrame(rows).T.reindex(columns=assets), pd.Series(proxied)
+
+def factor_shock_scenarios(shocks, factor_model_result, assets):
+    """Kịch bản giả định: shocks {tên: {nhân tố: lợi suất}} -> DataFrame kịch bản × assets qua mô hình nhân tố."""
+    betas, factor_cov = factor_model_result
+    rows = {name: _apply_betas(betas.loc[assets], conditional_factor_moves(shock, factor_cov))
+            for name, shock in shocks.items()}
+    return pd.DataFrame(rows, index=assets).T
+
+def rolling_scenarios(close, horizons=ROLLING_HORIZONS):
+    """
+    Mọi cửa sổ trượt `h` phiên chung (tất cả mã đều có giá) trong lịch sử: mỗi cửa sổ là 1 kịch bản.
+    Tính bằng 1 phép chia ma trận giá dịch h phiên cho mỗi horizon (không lặp theo cửa sổ).
+    """
+    common = close.dropna()
+    values = common.to_numpy(dtype=float)
+    frames = []
+    for h in horizons:
+        if len(values) <= h:
+            continue
+        returns = values[h:] / values[:-h] - 1.0
+        labels = [f"{h}d → {d:%Y-%m-%d}" for d in common.index[h:]]
+        frames.append(pd.DataFrame(returns, index=labels, columns=common.columns))
+    return pd.concat(frames) if frames else pd.DataFrame(columns=close.columns)
+
+def build_scenarios(close, assets, shocks=None, factors=None, horizons=ROLLING_HORIZONS, beta_window=504):
+    """
+    Ma trận kịch bản (MultiIndex Kind/Scenario × assets) gồm: giai đoạn lịch sử, cú sốc nhân tố giả định,
+    và mọi cửa sổ trượt của lịch sử chung. close: panel giá ngày (assets + mã proxy nhân tố).
+    Trả về dict: scenarios, proxied (số mã proxy mỗi sự kiện), betas, factors (nhân tố dùng được).
+    """
+    factors = factors or FACTOR_PROXIES
+    factors = {f: t for f, t in factors.items() if t in close.columns and close[t].notna().sum() > beta_window // 4}
+    model = None
+    if factors:
+        # Lợi suất trên các phiên chung (cổ phiếu vs crypto lệch lịch -> lợi suất cuối tuần dồn vào thứ Hai)
+        daily = close[list(dict.fromkeys(assets + list(factors.values())))].dropna().pct_change().dropna()
+        factor_returns = daily[list(factors.values())].set_axis(list(factors), axis=1)
+        model = factor_model(daily[assets], factor_returns, window=beta_window)
+
+    parts = {}
+    events, proxied = historical_scenarios(close, assets, factors, model)
+    parts[KIND_EVENT] = events.dropna()
+    proxied = proxied.reindex(parts[KIND_EVENT].index)
+    if model is not None and shocks:
+        parts[KIND_SHOCK] = factor_shock_scenarios(shocks, model, assets)
+    parts[KIND_ROLLING] = rolling_scenarios(close[assets], horizons)
+    scenarios = pd.concat({k: v for k, v in parts.items() if not v.empty}, names=["Kind", "Scenario"])
+    return {
+        "scenarios": scenarios,
+        "proxied": proxied,
+        "betas": model[0] if model is not None else None,
+        "factors": factors,
+    }
+
+
+# --- 4. ÁP KỊCH BẢN LÊN DANH MỤC (1 phép nhân ma trận) ---
+
+def scenario_pnl(scenarios, weights):
+    """
+    Lãi/lỗ (tỷ lệ trên vốn, buy & hold) của mọi danh mục dưới mọi kịch bản: R (kịch bản × mã) @ Wᵀ.
+    weights: DataFrame danh mục × mã (hoặc dict tên -> {mã: tỷ trọng}). Trả về DataFrame kịch bản × danh mục.
+    """
+    if isinstance(weights, dict):
+        weights = pd.DataFrame(weights).T
+    weights = weights.reindex(columns=scenarios.columns).fillna(0.0)
+    return pd.DataFrame(scenarios.to_numpy() @ weights.to_numpy().T, index=scenarios.index, columns=weights.index)
+
+def stress_summary(scenarios, weights, tail=0.05, block=512):
+    """
+    Tóm tắt rủi ro kịch bản cho rất nhiều danh mục (VD cả frontier ngẫu nhiên): lỗ tệ nhất, kịch bản tệ nhất,
+    trung bình `tail` kịch bản tệ nhất. Nhân ma trận theo khối danh mục -> RAM tối đa kịch bản × block.
+    weights: ndarray / DataFrame (danh mục × mã, cùng thứ tự cột với scenarios).
+    """
+    R = scenarios.to_numpy(dtype=float)
+    W = np.asarray(weights, dtype=float)
+    n_tail = max(1, int(np.ceil(tail * len(R))))
+    worst = np.empty(len(W))
+    worst_idx = np.empty(len(W), dtype=np.int64)
+    tail_mean = np.empty(len(W))
+    for lo in range(0, len(W), block):
+        pnl = R @ W[lo:lo + block].T  # kịch bản × khối danh mục
+        worst_idx[lo:lo + block] = pnl.argmin(axis=0)
+        worst[lo:lo + block] = pnl.min(axis=0)
+        tail_mean[lo:lo + block] = np.partition(pnl, n_tail - 1, axis=0)[:n_tail].mean(axis=0)
+    index = weights.index if isinstance(weights, pd.DataFrame) else None
+    return pd.DataFrame({
+        "Worst Loss": worst,
+        "Worst Scenario": [scenarios.index[i][-1] if isinstance(scenarios.index, pd.MultiIndex) else scenarios.index[i] for i in worst_idx],
+        f"Tail Mean ({tail:.0%})": tail_mean,
+    }, index=index)
+
+def loss_table(pnl, portfolio, top=20):
+    """Bảng xếp hạng kịch bản lỗ nặng nhất của 1 danh mục (Rank, Kind, Scenario, Return)."""
+    ranked = pnl[portfolio].nsmallest(top)
+    table = ranked.rename("Return").reset_index()
+    table.index = pd.RangeIndex(1, len(table) + 1, name="Rank")
+    return table
+
+def loss_contributions(scenarios, weights, scenario):
+    """Đóng góp từng mã vào lãi/lỗ của danh mục dưới 1 kịch bản: w_i × r_i (tổng = lãi/lỗ danh mục)."""
+    returns = scenarios.loc[scenario]
+    weights = pd.Series(weights).reindex(returns.index).fillna(0.0)
+    return (weights * returns).sort_values()
+
+
+# Benchmark: python -m src.scenarios (1.000 kịch bản × 1.000 danh mục × 50 mã; kiểm tra đúng sai ở tests/test_scenarios.py)
+if __name__ == "__main__":
+    rng = np.random.default_rng(5)
+    n_assets, n_scen, n_port = 50, 1000, 1000
+    scen = pd.DataFrame(rng.normal(-0.02, 0.08, (n_scen, n_assets)), columns=[f"A{i:02d}" for i in range(n_assets)])
+    W = rng.dirichlet(np.ones(n_assets), n_port)
+
+    t0 = time.perf_counter()
+    for s in range(n_scen):
+        row = scen.iloc[s].to_numpy()
+        for p in range(100):
+            float(np.dot(row, W[p]))
+    t_naive = (time.perf_counter() - t0) * n_port / 100  # ngoại suy từ 100 danh mục
+    t0 = time.perf_counter()
+    scenario_pnl(scen, pd.DataFrame(W, columns=scen.columns))
+    t_mat = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    stress_summary(scen, W)
+    t_sum = time.perf_counter() - t0
+    print(f"{n_scen:,} scenarios × {n_port:,} portfolios × {n_assets} assets: loop ~{t_naive:.1f}s (extrapolated) | "
+          f"matrix {t_mat * 1e3:.1f} ms | blocked summary {t_sum * 1e3:.1f} ms")
@@ -0,0 +1,188 @@
+# src/scheduler.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src import config
+from src.alerts import ingest_refresh
+from src.data_loader import base_interval, default_date_range, save_to_price_store
+from src.dataset_cache import get_dataset_cache
+from src.fetch_service import get_fetch_service
+from src.quant_engine import get_field_panel
+from src.snapshots import get_snapshot_store
+
+
+def parse_watchlists(spec):
+    """"AAPL,MSFT@1d;BTC-USD@1h" -> [(("AAPL", "MSFT"), "1d"), (("BTC-USD",), "1h")]."""
+    jobs = []
+    for item in (spec or "").split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        tickers, _, interval = item.partition("@")
+        tickers = tuple(dict.fromkeys(t.strip().upper() for t in tickers.split(",") if t.strip()))
+        if tickers:
+            jobs.append((tickers, interval.strip() or "1d"))
+    return jobs
+
+
+class RefreshJob:
+    """Trạng thái 1 watchlist được refresh định kỳ."""
+
+    def __init__(self, tickers, interval):
+        self.tickers = tuple(tickers)
+        self.interval = interval
+        self.next_run = 0.0  # chạy ngay lần đầu
+        self.last_refresh = None
+        self.last_duration = None
+        self.last_error = None
+        self.failures = 0  # số lần lỗi liên tiếp -> backoff
+        self.running = False
+        self.handle = None  # giữ panel trong cache -> không bị LRU evict giữa các lần refresh
+
+    @property
+    def name(self):
+        return f"{','.join(self.tickers)}@{self.interval}"
+
+
+class RefreshScheduler:
+    """
+    Scheduler nền trong process (không cần dịch vụ ngoài):
+    - Định kỳ tải lại các watchlist cấu hình qua fetch service (fetch_stock_data) -> làm nóng
+      dataset cache, kho giá local (Screener), analytics snapshot và luật cảnh báo (src/alerts.py).
+    - Tối đa `max_concurrency` job cùng lúc; lỗi liên tiếp -> exponential backoff (có trần).
+    - status() cho UI: thời điểm refresh gần nhất, lỗi, độ sâu hàng đợi.
+    """
+
+    def __init__(self, watchlists=None, interval_seconds=None, max_concurrency=None, max_backoff=None,
+                 fetch_fn=None, tick_seconds=1.0):
+        specs = parse_watchlists(config.REFRESH_WATCHLISTS) if watchlists is None else watchlists
+        self.jobs = [RefreshJob(tickers, interval) for tickers, interval in specs]
+        self.interval_seconds = interval_seconds or config.REFRESH_INTERVAL_SECONDS
+        self.max_concurrency = max_concurrency or config.REFRESH_MAX_CONCURRENCY
+        self.max_backoff = max_backoff or config.REFRESH_MAX_BACKOFF_SECONDS
+        self.tick_seconds = tick_seconds
+        # fetch_fn(tickers, start, end, interval, on_result) -> DataFrame; mặc định là fetch service dùng chung
+        self._fetch_fn = fetch_fn or (lambda tickers, s, e, interval, on_result:
+                                      get_fetch_service().fetch(tickers, s, e, interval, on_result=on_result))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pool = None
+        self._thread = None
+
+    # --- 1. VÒNG LẶP ---
+    def start(self):
+        """Khởi động thread nền (idempotent). Không có watchlist nào -> không làm gì."""
+        with self._lock:
+            if self._thread is not None or not self.jobs:
+                return self
+            self._stop.clear()
+            self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="alphaquant-refresh")
+            self._thread = threading.Thread(target=self._loop, name="alphaquant-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self._stop.set()
+        with self._lock:
+            thread, pool = self._thread, self._pool
+            self._thread = self._pool = None
+        if thread is not None and wait:
+            thread.join(timeout=5)
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            now = time.time()
+            with self._lock:
+                running = sum(job.running for job in self.jobs)
+                # Job đến hạn, xếp theo hạn sớm nhất; chỉ nhận thêm trong phạm vi ngân sách concurrency
+                due = sorted((job for job in self.jobs if not job.running and job.next_run <= now), key=lambda j: j.next_run)
+                for job in due[:max(0, self.max_concurrency - running)]:
+                    job.running = True
+                    self._pool.submit(self._run_job, job)
+            self._stop.wait(self.tick_seconds)
+
+    # --- 2. 1 LẦN REFRESH ---
+    def _run_job(self, job):
+        t0 = time.perf_counter()
+        failed = []
+
+        def on_result(ticker, frame, done, total):
+            if frame is None:
+                failed.append(ticker)
+
+        try:
+            start, end = default_date_range(job.interval)
+            fetch_interval = base_interval(job.interval, start, end)
+            handle = get_dataset_cache().load(
+                job.tickers, str(start), str(end), job.interval,
+                fetch_fn=lambda missing: self._fetch_fn(missing, str(start), str(end), fetch_interval, on_result),
+                refresh=True, base_interval=fetch_interval,
+            )
+            if handle is None:
+                raise RuntimeError("no data returned")
+            save_to_price_store(handle.frame, handle.tickers, job.interval)
+            get_snapshot_store().build(handle.frame, handle.tickers)
+            ingest_refresh(get_field_panel(handle.frame, 'Close'), job.interval)  # luật cảnh báo trên bar mới
+            error = f"failed: {', '.join(failed)}" if failed else None
+        except Exception as e:
+            handle, error = None, str(e)
+
+        with self._lock:
+            job.running = False
+            job.last_duration = time.perf_counter() - t0
+            job.last_error = error
+            if handle is not None:
+                old, job.handle = job.handle, handle
+                if old is not None:
+                    old.release()
+                job.last_refresh = time.time()
+            if error is None:
+                job.failures = 0
+                job.next_run = time.time() + self.interval_seconds
+            else:
+                # Exponential backoff: interval/4 * 2^failures, tối đa max_backoff
+                job.failures += 1
+                delay = min(self.max_backoff, self.interval_seconds / 4 * 2 ** (job.failures - 1))
+                job.next_run = time.time() + delay
+                print(f"❌ Refresh error ({job.name}): {error} -> retry in {delay:.0f}s")
+
+    def trigger(self):
+        """Đưa mọi job về hạn ngay (nút 'Refresh now')."""
+        with self._lock:
+            for job in self.jobs:
+                job.next_run = 0.0
+
+    # --- 3. TRẠNG THÁI CHO UI ---
+    def status(self):
+        now = time.time()
+        with self._lock:
+            jobs = [{
+                "watchlist": job.name,
+                "last_refresh": job.last_refresh,
+                "next_in": max(0.0, job.next_run - now),
+                "running": job.running,
+                "failures": job.failures,
+                "last_error": job.last_error,
+                "duration": job.last_duration,
+            } for job in self.jobs]
+            return {
+                "active": self._thread is not None,
+                "queue_depth": sum(1 for job in self.jobs if job.running or job.next_run <= now),
+                "running": sum(job.running for job in self.jobs),
+                "jobs": jobs,
+            }
+
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+def get_scheduler():
+    """RefreshScheduler dùng chung toàn process, tự khởi động nếu có watchlist cấu hình."""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = RefreshScheduler().start()
+        return _SCHEDULER
@@ -0,0 +1,162 @@
+# src/screener.py
+
+import ast
+import threading
+import time
+import numpy as np
+import pandas as pd
+from src.data_loader import list_price_store, load_from_price_store
+from src.quant_engine import calculate_screen_metrics, get_field_panel
+
+# Cột của calculate_screen_metrics được phép dùng trong biểu thức lọc
+SCREEN_COLUMNS = ["LastPrice", "Bars", "Return", "Volatility", "Sharpe", "Sortino", "MaxDrawdown", "Skew", "Kurtosis", "VaR95"]
+
+# Whitelist cú pháp của biểu thức lọc: tên cột, số, so sánh, and/or/not, ngoặc (AST không có node ngoặc)
+_FILTER_NODES = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+                 ast.BinOp, ast.BitAnd, ast.BitOr, ast.Invert, ast.Compare, ast.Gt, ast.GtE, ast.Lt, ast.LtE,
+                 ast.Eq, ast.NotEq, ast.Name, ast.Load, ast.Constant)
+
+def validate_filter(filter_expr, columns=SCREEN_COLUMNS):
+    """
+    Kiểm tra biểu thức lọc trước khi đưa vào DataFrame.query (text nhập từ UI).
+    Chỉ cho phép tên cột, số, so sánh, and/or/not và ngoặc; còn lại (@biến, thuộc tính, gọi hàm,
+    chuỗi...) -> ValueError. Trả về biểu thức đã strip.
+    """
+    expr = filter_expr.strip()
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"cannot parse filter '{expr}': {e.msg}") from None
+    for node in ast.walk(tree):
+        if not isinstance(node, _FILTER_NODES):
+            raise ValueError(f"'{type(node).__name__}' is not allowed in a filter")
+        if isinstance(node, ast.Name) and node.id not in columns:
+            raise ValueError(f"unknown column '{node.id}' (allowed: {', '.join(columns)})")
+        if isinstance(node, ast.Constant) and (isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+            raise ValueError(f"only numeric literals are allowed, got {node.value!r}")
+        if isinstance(node, ast.BinOp) and not isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+            raise ValueError("arithmetic is not allowed in a filter, only comparisons combined with and/or/not")
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)) and not isinstance(node.operand, ast.Constant):
+            raise ValueError("unary +/- is only allowed on numbers")
+    return expr
+
+
+class Screener:
+    """
+    Screener trên universe của kho giá local (src.data_loader price store).
+    - refresh(): chỉ tính lại các mã có file thay đổi (mtime/size) kể từ lần screen trước.
+    - screen(): lọc bằng biểu thức đã qua validate_filter (DataFrame.query), sắp xếp và lấy top-k bằng partial sort.
+    """
+
+    def __init__(self, interval='1d', risk_free_rate=0.03, store_dir=None, batch_size=500):
+        self.interval = interval
+        self.risk_free_rate = risk_free_rate
+        self.store_dir = store_dir
+        self.batch_size = batch_size
+        self._signatures = {}  # ticker -> (mtime_ns, size) lúc tính metrics
+        self._metrics = pd.DataFrame()
+        self._lock = threading.Lock()
+        self.last_refresh = {"universe": 0, "recomputed": 0, "removed": 0, "seconds": 0.0}
+
+    def refresh(self, universe=None):
+        """Cập nhật bảng metrics; universe=None -> toàn bộ mã trong kho giá."""
+        with self._lock:
+            t0 = time.perf_counter()
+            listing = list_price_store(self.interval, self.store_dir)
+            if universe is not None:
+                listing = {t: sig for t, sig in listing.items() if t in set(universe)}
+
+            changed = [t for t, sig in listing.items() if self._signatures.get(t) != sig]
+            removed = [t for t in self._signatures if t not in listing]
+
+            # Tính lại theo batch để giới hạn RAM khi universe lớn
+            updates = []
+            for i in range(0, len(changed), self.batch_size):
+                batch = changed[i:i + self.batch_size]
+                df = load_from_price_store(batch, self.interval, self.store_dir, columns=["Close"])
+                if df is None: continue
+                updates.append(calculate_screen_metrics(get_field_panel(df, 'Close'), self.risk_free_rate))
+
+            metrics = self._metrics.drop(index=[t for t in removed + changed if t in self._metrics.index])
+            if updates:
+                metrics = pd.concat([metrics] + updates) if not metrics.empty else pd.concat(updates)
+            self._metrics = metrics
+
+            for t in removed: self._signatures.pop(t, None)
+            for t in changed: self._signatures[t] = listing[t]
+
+            self.last_refresh = {
+                "universe": len(listing),
+                "recomputed": len(changed),
+                "removed": len(removed),
+                "seconds": time.perf_counter() - t0,
+            }
+            return self._metrics
+
+    def screen(self, filter_expr=None, sort_by="Sharpe", ascending=False, top_k=50, refresh=True):
+        """
+        filter_expr: biểu thức lọc, ví dụ "Sharpe > 1 and MaxDrawdown > -0.3 and Bars >= 100".
+        Trả về DataFrame top_k mã đã sắp xếp theo sort_by. Biểu thức/cột sort không hợp lệ -> ValueError.
+        """
+        if filter_expr:
+            filter_expr = validate_filter(filter_expr)
+        if sort_by not in SCREEN_COLUMNS:
+            raise ValueError(f"unknown sort column '{sort_by}'")
+        metrics = self.refresh() if refresh else self._metrics
+        if metrics.empty: return metrics
+        if filter_expr:
+            metrics = metrics.query(filter_expr)
+
+        values = metrics[sort_by].to_numpy(dtype=float)
+        # NaN luôn xếp cuối; argpartition O(n) thay vì sort toàn bộ universe
+        keys = np.where(np.isnan(values), np.inf, values if ascending else -values)
+        k = min(int(top_k), len(keys))
+        if k == 0: return metrics.iloc[:0]
+        top = np.argpartition(keys, k - 1)[:k] if k < len(keys) else np.arange(len(keys))
+        top = top[np.argsort(keys[top], kind="stable")]
+        return metrics.iloc[top]
+
+
+_SCREENERS = {}
+_SCREENERS_LOCK = threading.Lock()
+
+def get_screener(interval='1d', risk_free_rate=0.03):
+    """Screener dùng chung toàn process theo (interval, risk-free rate) để giữ kết quả incremental."""
+    key = (interval, round(risk_free_rate, 6))
+    with _SCREENERS_LOCK:
+        if key not in _SCREENERS:
+            _SCREENERS[key] = Screener(interval=interval, risk_free_rate=risk_free_rate)
+        return _SCREENERS[key]
+
+
+# Benchmark nhanh với universe giả lập: python -m src.screener
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    n_tickers, n_bars = 5000, 252
+    store = tempfile.mkdtemp(prefix="alphaquant_store_")
+    folder = os.path.join(store, "1d")
+    os.makedirs(folder)
+    rng = np.random.default_rng(7)
+    idx = pd.bdate_range("2024-01-01", periods=n_bars)
+
+    t0 = time.perf_counter()
+    for i in range(n_tickers):
+        close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n_bars)))
+        pd.DataFrame({"Close": close, "Volume": 1e6}, index=idx).to_parquet(os.path.join(folder, f"T{i:04d}.parquet"))
+    print(f"Wrote {n_tickers} tickers in {time.perf_counter() - t0:.1f}s -> {store}")
+
+    screener = Screener(store_dir=store)
+    result = screener.screen("Sharpe > 1 and MaxDrawdown > -0.3", top_k=10)
+    print(f"Full screen:        {screener.last_refresh}")
+    print(result.round(3).head())
+
+    # Intraday refresh: chỉ 50 mã có dữ liệu mới
+    for i in range(50):
+        path = os.path.join(folder, f"T{i:04d}.parquet")
+        df = pd.read_parquet(path)
+        df.iloc[-1, 0] *= 1.01
+        df.to_parquet(path)
+    screener.screen("Sharpe > 1", top_k=10)
+    print(f"Incremental screen: {screener.last_refresh}")
@@ -0,0 +1,305 @@
+# src/snapshots.py
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from src import config
+from src.data_loader import dataset_fingerprint, split_by_ticker
+from src.quant_engine import (calculate_descriptive_stats, calculate_advanced_metrics, calculate_log_returns,
+                              calculate_return_distribution, optimize_portfolio, get_field_panel,
+                              run_monte_carlo)
+from src.monte_carlo import HORIZONS, aggregate_paths
+
+# Tăng khi thay đổi nội dung / cách tính của bundle -> snapshot cũ tự động bị bỏ qua
+SNAPSHOT_VERSION = 2
+
+# Tham số mặc định của các view (snapshot chỉ dùng được khi view đang ở đúng tham số này)
+MC_STEPS = HORIZONS[-1]  # 1 lần chạy kỳ hạn dài nhất -> tra cứu mọi kỳ hạn ngắn hơn
+MC_SIMULATIONS = 500
+MC_SAMPLE_PATHS = 50
+FRONTIER_PORTFOLIOS = 5000
+
+
+class AnalyticsSnapshot:
+    """
+    Bundle analytics đã tính sẵn cho 1 dataset (theo fingerprint):
+    meta (JSON: scalars, bảng thống kê) + arrays (drawdown, histogram, correlation, frontier, MC bands).
+    Các chỉ số phụ thuộc risk-free rate được dựng lại từ moments nên dùng được với mọi rf.
+    """
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.arrays = arrays
+
+    @property
+    def fingerprint(self):
+        return self.meta["fingerprint"]
+
+    @property
+    def tickers(self):
+        return self.meta["tickers"]
+
+    def _array(self, name):
+        return self.arrays.get(name)
+
+    @staticmethod
+    def _index(values, tz):
+        # Index lưu dạng datetime64[ns] theo UTC, khôi phục lại timezone gốc
+        index = pd.DatetimeIndex(values)
+        return index.tz_localize("UTC").tz_convert(tz) if tz else index
+
+    # --- 1. RISK ANALYSIS ---
+    def risk(self, ticker, risk_free_rate):
+        """(metrics, distribution) giống calculate_advanced_metrics + calculate_return_distribution; None nếu thiếu."""
+        info = self.meta["risk"].get(ticker)
+        if info is None:
+            return None
+        mean, std, downside = info["mean_daily"], info["std_daily"], info["downside_std"]
+        sharpe = ((mean - risk_free_rate / 252) / std) * np.sqrt(252)
+        sortino = (mean * 252 - risk_free_rate) / downside if downside != 0 else 0
+        drawdown = pd.Series(self._array(f"{ticker}/drawdown"),
+                             index=self._index(self._array(f"{ticker}/drawdown_index"), info["tz"]))
+        metrics = {
+            "Sharpe Ratio": sharpe,
+            "Sortino Ratio": sortino,
+            "Max Drawdown": info["max_drawdown"],
+            "Annualized Volatility": std * np.sqrt(252),
+            "Drawdown Series": drawdown,
+        }
+        distribution = {name: self._array(f"{ticker}/dist_{name}") for name in ("bin_centers", "density", "pdf_x", "pdf_y")}
+        distribution.update({k: info[k] for k in ("bin_width", "Skewness", "Excess Kurtosis")})
+        return metrics, distribution
+
+    def descriptive_stats(self, ticker):
+        table = self.meta["descriptive"].get(ticker)
+        return None if table is None else pd.DataFrame(table, index=["Value"]).T
+
+    # --- 2. MARKET OVERVIEW ---
+    def correlation(self, tickers):
+        corr = self._array("correlation")
+        if corr is None:
+            return None
+        frame = pd.DataFrame(corr, index=self.meta["corr_tickers"], columns=self.meta["corr_tickers"])
+        tickers = [t for t in tickers if t in frame.columns]
+        return frame.loc[tickers, tickers]
+
+    # --- 3. MONTE CARLO ---
+    def monte_carlo(self, ticker, simulations):
+        """Kết quả MC theo ngày (MC_STEPS, xem monte_carlo.horizon_summary) hoặc None nếu số kịch bản khác."""
+        info = self.meta["monte_carlo"].get(ticker)
+        if info is None or simulations != info["simulations"]:
+            return None
+        return dict(info,
+                    mean_path=self._array(f"{ticker}/mc_mean_path"),
+                    bands=dict(zip(info["quantiles"], self._array(f"{ticker}/mc_bands"))),
+                    prob_up=self._array(f"{ticker}/mc_prob_up"),
+                    var_95=self._array(f"{ticker}/mc_var"),
+                    cvar_95=self._array(f"{ticker}/mc_cvar"),
+                    drawdown_hist=self._array(f"{ticker}/mc_drawdown_hist"),
+                    sample_paths=self._array(f"{ticker}/mc_sample_paths"))
+
+    # --- 4. PORTFOLIO ---
+    def frontier(self, num_portfolios, risk_free_rate):
+        """Dựng lại kết quả optimize_portfolio() cho rf bất kỳ từ các danh mục đã mô phỏng sẵn."""
+        info = self.meta.get("frontier")
+        if info is None or info["num_portfolios"] != num_portfolios:
+            return None
+        ret_std = self._array("frontier_ret_std")
+        weights = self._array("frontier_weights")
+        sharpe = (ret_std[0] - risk_free_rate) / ret_std[1]
+        results = np.vstack([ret_std, sharpe])
+
+        def pick(idx):
+            return {"return": results[0, idx], "std": results[1, idx], "sharpe": results[2, idx],
+                    "weights": dict(zip(info["tickers"], weights[idx].astype(float)))}
+        return {"results": results, "max_sharpe": pick(np.argmax(sharpe)), "min_vol": pick(np.argmin(results[1]))}
+
+
+# --- 5. BUILD (tính toàn bộ bundle) ---
+
+def _single_frame(df, ticker):
+    frames = split_by_ticker(df, [ticker])
+    return frames[ticker].dropna() if ticker in frames else None
+
+def build_snapshot(df, tickers=None):
+    """Tính toàn bộ analytics bundle cho dataset. Trả về AnalyticsSnapshot."""
+    if tickers is None:
+        tickers = list(df.columns.get_level_values(0).unique()) if isinstance(df.columns, pd.MultiIndex) else []
+    meta = {"version": SNAPSHOT_VERSION, "fingerprint": dataset_fingerprint(df), "created": time.time(),
+            "tickers": list(tickers), "risk": {}, "descriptive": {}, "monte_carlo": {}}
+    arrays = {}
+
+    for ticker in tickers:
+        single_df = _single_frame(df, ticker)
+        if single_df is None or len(single_df) < 30:
+            continue
+        col = 'Adj Close' if 'Adj Close' in single_df.columns else 'Close'
+        prices = single_df[col]
+
+        # A. Risk metrics (phần không phụ thuộc rf) + drawdown + histogram
+        returns = prices.pct_change().dropna()
+        advanced = calculate_advanced_metrics(single_df)
+        log_returns = calculate_log_returns(single_df, col).dropna()
+        distribution = calculate_return_distribution(log_returns)
+        drawdown = advanced["Drawdown Series"]
+        index = drawdown.index
+        meta["risk"][ticker] = {
+            "mean_daily": float(returns.mean()),
+            "std_daily": float(returns.std()),
+            "downside_std": float(returns[returns < 0].std() * np.sqrt(252)),
+            "max_drawdown": float(advanced["Max Drawdown"]),
+            "tz": str(index.tz) if getattr(index, "tz", None) is not None else None,
+            "bin_width": distribution["bin_width"],
+            "Skewness": float(distribution["Skewness"]),
+            "Excess Kurtosis": float(distribution["Excess Kurtosis"]),
+        }
+        arrays[f"{ticker}/drawdown"] = drawdown.to_numpy(dtype=float)
+        arrays[f"{ticker}/drawdown_index"] = np.asarray(index.tz_convert(None) if getattr(index, "tz", None) is not None else index, dtype="datetime64[ns]")
+        for name in ("bin_centers", "density", "pdf_x", "pdf_y"):
+            arrays[f"{ticker}/dist_{name}"] = np.asarray(distribution[name], dtype=float)
+
+        # B. Bảng thống kê mô tả (CFA)
+        meta["descriptive"][ticker] = calculate_descriptive_stats(log_returns)["Value"].to_dict()
+
+        # C. Monte Carlo term structure với tham số mặc định của AI Forecast (chuỗi giá chưa dropna, giống view)
+        prices = split_by_ticker(df, [ticker])[ticker][col]
+        paths = run_monte_carlo(prices, MC_STEPS + 1, MC_SIMULATIONS)
+        if paths is not None:
+            mc = aggregate_paths(paths, sample_paths=MC_SAMPLE_PATHS)
+            meta["monte_carlo"][ticker] = {"steps": mc["steps"], "simulations": mc["simulations"],
+                                           "curr_price": mc["curr_price"], "quantiles": list(mc["bands"])}
+            arrays[f"{ticker}/mc_mean_path"] = mc["mean_path"]
+            arrays[f"{ticker}/mc_bands"] = np.vstack(list(mc["bands"].values()))
+            arrays[f"{ticker}/mc_prob_up"] = mc["prob_up"]
+            arrays[f"{ticker}/mc_var"] = mc["var_95"]
+            arrays[f"{ticker}/mc_cvar"] = mc["cvar_95"]
+            arrays[f"{ticker}/mc_drawdown_hist"] = mc["drawdown_hist"].astype(np.int32)
+            arrays[f"{ticker}/mc_sample_paths"] = mc["sample_paths"]
+
+    # D. Correlation (giống Market Overview: tương quan giá) & Efficient Frontier
+    if isinstance(df.columns, pd.MultiIndex) and len(tickers) > 1:
+        close = get_field_panel(df, 'Close')
+        corr = close[[t for t in tickers if t in close.columns]].corr()
+        meta["corr_tickers"] = list(corr.columns)
+        arrays["correlation"] = corr.to_numpy(dtype=float)
+
+        opt = optimize_portfolio(df, num_portfolios=FRONTIER_PORTFOLIOS)
+        if opt is not None:
+            meta["frontier"] = {"num_portfolios": FRONTIER_PORTFOLIOS, "tickers": list(opt["max_sharpe"]["weights"].keys())}
+            arrays["frontier_ret_std"] = opt["results"][:2]
+            arrays["frontier_weights"] = opt["weights"].astype(np.float32)
+
+    return AnalyticsSnapshot(meta, arrays)
+
+
+# --- 6. STORE (RAM LRU + file npz có version trên đĩa) ---
+
+class SnapshotStore:
+    """
+    Lưu snapshot theo fingerprint dữ liệu: `{fingerprint}.v{SNAPSHOT_VERSION}.npz`
+    (arrays + meta JSON trong cùng 1 file, không pickle). Build chạy nền, view chỉ đọc.
+    """
+
+    def __init__(self, directory=None, memory_slots=16):
+        self.directory = directory or config.SNAPSHOT_DIR
+        self.memory_slots = memory_slots
+        self._memory = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+
+    def path(self, fingerprint):
+        return os.path.join(self.directory, f"{fingerprint}.v{SNAPSHOT_VERSION}.npz")
+
+    def _remember(self, snapshot):
+        with self._lock:
+            self._memory[snapshot.fingerprint] = snapshot
+            self._memory.move_to_end(snapshot.fingerprint)
+            while len(self._memory) > self.memory_slots:
+                self._memory.popitem(last=False)
+
+    def save(self, snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(snapshot.fingerprint)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp_path, __meta__=np.array(json.dumps(snapshot.meta)), **snapshot.arrays)
+        os.replace(tmp_path, path)
+
+    def load(self, fingerprint):
+        try:
+            with np.load(self.path(fingerprint), allow_pickle=False) as bundle:
+                meta = json.loads(str(bundle["__meta__"]))
+                arrays = {name: bundle[name] for name in bundle.files if name != "__meta__"}
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            return None
+        if meta.get("version") != SNAPSHOT_VERSION or meta.get("fingerprint") != fingerprint:
+            return None
+        return AnalyticsSnapshot(meta, arrays)
+
+    def get(self, df):
+        """Snapshot hợp lệ của đúng dataset này (RAM -> đĩa), None nếu chưa có."""
+        if df is None:
+            return None
+        fingerprint = dataset_fingerprint(df)
+        with self._lock:
+            snapshot = self._memory.get(fingerprint)
+            if snapshot is not None:
+                self._memory.move_to_end(fingerprint)
+                return snapshot
+        snapshot = self.load(fingerprint)
+        if snapshot is not None:
+            self._remember(snapshot)
+        return snapshot
+
+    def build(self, df, tickers=None):
+        """Tính + lưu snapshot (đồng bộ). Bỏ qua nếu đã có bản hợp lệ."""
+        snapshot = self.get(df)
+        if snapshot is not None:
+            return snapshot
+        snapshot = build_snapshot(df, tickers)
+        try:
+            self.save(snapshot)
+        except OSError as e:
+            print(f"❌ Snapshot save error: {e}")
+        self._remember(snapshot)
+        return snapshot
+
+    def schedule(self, df, tickers=None):
+        """Build nền sau mỗi lần load; trùng fingerprint đang chờ thì không xếp hàng lại."""
+        fingerprint = dataset_fingerprint(df)
+        with self._lock:
+            if fingerprint in self._pending or fingerprint in self._memory:
+                return None
+            self._pending.add(fingerprint)
+
+        def job():
+            try:
+                return self.build(df, tickers)
+            except Exception as e:
+                print(f"❌ Snapshot build error: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(fingerprint)
+        return self._pool.submit(job)
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def get_snapshot_store():
+    """SnapshotStore dùng chung toàn process."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = SnapshotStore()
+        return _STORE
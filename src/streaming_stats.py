@@ -0,0 +1,226 @@
+# src/streaming_stats.py
+
+import numpy as np
+
+
+class MomentsAccumulator:
+    """
+    Bộ tích lũy moments 1 lượt (count, mean, M2, M3, M4, min, max).
+    - Cập nhật theo từng chunk (dữ liệu lớn hơn RAM, bar mới đổ về liên tục).
+    - Gộp được giữa các chunk / worker / ticker bằng công thức Pébay (merge song song).
+    Các chỉ số dẫn xuất khớp với numpy/scipy: std (ddof=1), skew & kurtosis (bias=True, Fisher).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.m4 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def from_array(cls, values):
+        """Tạo accumulator từ 1 mảng (tự loại NaN/inf)."""
+        return cls().update(values)
+
+    def update(self, values, assume_finite=False):
+        """
+        Nạp thêm 1 chunk dữ liệu.
+        assume_finite=True: bỏ qua bước lọc NaN/inf khi caller đã làm sạch trước.
+        """
+        data = np.asarray(values, dtype=float).ravel()
+        if not assume_finite:
+            data = data[np.isfinite(data)]
+        if len(data) == 0:
+            return self
+
+        # Moments trung tâm của chunk (cùng cách tính với numpy/scipy để ra đúng số)
+        chunk = MomentsAccumulator()
+        chunk.count = len(data)
+        chunk.mean = np.mean(data).item()
+        dev = data - chunk.mean
+        dev2 = dev ** 2
+        chunk.m2 = np.sum(dev2).item()
+        chunk.m3 = np.sum(dev2 * dev).item()
+        chunk.m4 = np.sum(dev2 ** 2).item()
+        chunk.min = np.min(data).item()
+        chunk.max = np.max(data).item()
+
+        return self.merge(chunk)
+
+    def merge(self, other):
+        """Gộp accumulator khác vào accumulator hiện tại (in-place), trả về self."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean = other.count, other.mean
+            self.m2, self.m3, self.m4 = other.m2, other.m3, other.m4
+            self.min, self.max = other.min, other.max
+            return self
+
+        na, nb = self.count, other.count
+        n = na + nb
+        delta = other.mean - self.mean
+        delta_n = delta / n
+
+        m4 = (self.m4 + other.m4
+              + delta * delta_n ** 3 * na * nb * (na * na - na * nb + nb * nb)
+              + 6 * delta_n ** 2 * (na * na * other.m2 + nb * nb * self.m2)
+              + 4 * delta_n * (na * other.m3 - nb * self.m3))
+        m3 = (self.m3 + other.m3
+              + delta * delta_n ** 2 * na * nb * (na - nb)
+              + 3 * delta_n * (na * other.m2 - nb * self.m2))
+        m2 = self.m2 + other.m2 + delta * delta_n * na * nb
+
+        self.count = n
+        self.mean = self.mean + delta_n * nb
+        self.m2, self.m3, self.m4 = m2, m3, m4
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def copy(self):
+        return MomentsAccumulator().merge(self)
+
+    # --- Các chỉ số dẫn xuất ---
+    def variance(self, ddof=1):
+        if self.count - ddof <= 0:
+            return np.nan
+        return self.m2 / (self.count - ddof)
+
+    def std(self, ddof=1):
+        return np.sqrt(self.variance(ddof))
+
+    def _is_degenerate(self):
+        # Giống scipy: phương sai ~ 0 so với độ lớn của mean -> NaN
+        return self.m2 / self.count <= (np.finfo(float).eps * self.mean) ** 2
+
+    def skewness(self):
+        """Skewness (bias=True) như scipy.stats.skew."""
+        if self.count == 0 or self._is_degenerate():
+            return np.nan
+        m2, m3 = self.m2 / self.count, self.m3 / self.count
+        return m3 / m2 ** 1.5
+
+    def excess_kurtosis(self):
+        """Excess Kurtosis (Fisher, bias=True) như scipy.stats.kurtosis."""
+        if self.count == 0 or self._is_degenerate():
+            return np.nan
+        m2, m4 = self.m2 / self.count, self.m4 / self.count
+        return m4 / m2 ** 2.0 - 3
+
+    def __repr__(self):
+        return f"MomentsAccumulator(count={self.count}, mean={self.mean:.6g}, std={self.std():.6g})"
+
+
+class QuantileSketch:
+    """
+    KLL quantile sketch: ước lượng phân vị (VaR) và CVaR với bộ nhớ cố định.
+    - Nạp theo chunk (update), gộp giữa các worker (merge).
+    - k điều khiển độ chính xác: số phần tử giữ lại ~ 3·k (k=200 -> ~600), sai số rank ~ 1/k
+      (k=200 -> sai số rank < ~0.5%, tức q=5% trả về 1 giá trị nằm trong khoảng
+      phân vị thực 4.5%-5.5%). min/max và count luôn chính xác.
+    - CVaR (tail_mean) là ước lượng gần không chệch nhưng dao động lớn hơn VaR khi
+      đuôi rất dày -> tăng k (500-1000) nếu cần CVaR ổn định.
+    """
+
+    def __init__(self, k=200, seed=None):
+        if k < 8:
+            raise ValueError("k must be >= 8")
+        self.k = int(k)
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # Tầng cao (trọng số lớn) giữ nhiều phần tử hơn, tầng thấp co lại theo cấp số 2/3
+        depth = len(self._levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _compress(self):
+        # Lazy KLL: chỉ nén khi tổng số phần tử vượt tổng sức chứa, bắt đầu từ tầng thấp nhất bị tràn
+        while self.size > sum(self._capacity(h) for h in range(len(self._levels))):
+            level = next(h for h, items in enumerate(self._levels) if len(items) > self._capacity(h))
+            if level + 1 == len(self._levels):
+                self._levels.append(np.empty(0))
+            items = np.sort(self._levels[level])
+            # Số lẻ -> giữ lại 1 phần tử ở tầng hiện tại
+            keep = items[-1:] if len(items) % 2 else items[:0]
+            pairs = items[:len(items) - len(keep)]
+            offset = self._rng.integers(2)
+            self._levels[level + 1] = np.concatenate([self._levels[level + 1], pairs[offset::2]])
+            self._levels[level] = keep
+
+    def update(self, values, assume_finite=False):
+        """Nạp thêm 1 chunk dữ liệu."""
+        data = np.asarray(values, dtype=float).ravel()
+        if not assume_finite:
+            data = data[np.isfinite(data)]
+        if len(data) == 0:
+            return self
+
+        self.count += len(data)
+        self.min = min(self.min, np.min(data).item())
+        self.max = max(self.max, np.max(data).item())
+        self._levels[0] = np.concatenate([self._levels[0], data])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Gộp sketch khác (cùng hoặc khác worker) vào sketch hiện tại, trả về self."""
+        if other.count == 0:
+            return self
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0))
+        for level, items in enumerate(other._levels):
+            self._levels[level] = np.concatenate([self._levels[level], items])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    @property
+    def size(self):
+        """Số phần tử đang giữ trong bộ nhớ."""
+        return sum(len(items) for items in self._levels)
+
+    def _sorted_view(self):
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(lv), 2.0 ** h) for h, lv in enumerate(self._levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], weights[order]
+
+    def quantile(self, q):
+        """Phân vị q (0-1) ước lượng. q có thể là scalar hoặc mảng."""
+        if self.count == 0:
+            return np.nan
+        items, weights = self._sorted_view()
+        cum = np.cumsum(weights)
+        q = np.asarray(q, dtype=float)
+        idx = np.searchsorted(cum, q * cum[-1], side="left").clip(0, len(items) - 1)
+        result = items[idx]
+        # Biên chính xác
+        result = np.where(q <= 0, self.min, np.where(q >= 1, self.max, result))
+        return result.item() if result.ndim == 0 else result
+
+    def tail_mean(self, q):
+        """
+        CVaR (Expected Shortfall) bằng tích phân đuôi trái:
+        trung bình các giá trị trong q khối lượng xác suất thấp nhất.
+        """
+        if self.count == 0 or q <= 0:
+            return np.nan
+        items, weights = self._sorted_view()
+        cum = np.cumsum(weights)
+        tail_mass = q * cum[-1]
+        # Phần tử vắt qua ranh giới chỉ được tính phần trọng số nằm trong đuôi
+        inside = np.clip(tail_mass - (cum - weights), 0, weights)
+        return float(np.sum(items * inside) / tail_mass)
+
+    def __repr__(self):
+        return f"QuantileSketch(k={self.k}, count={self.count}, retained={self.size})"
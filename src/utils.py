@@ -1,26 +1,17 @@
 # src/utils.py
 import streamlit as st
 import numpy as np
+from src.kernels import sparkline_points
 
 def generate_sparkline_svg(data_series, color="#0ECB81", width=200, height=50):
     """Tạo mã SVG cho biểu đồ đường thu nhỏ."""
     if len(data_series) < 2: return ""
-    data = np.array(data_series)
-    data = data[~np.isnan(data)]
-    if len(data) < 2: return ""
+    data = np.asarray(data_series, dtype=float)
+    if np.count_nonzero(~np.isnan(data)) < 2: return ""
     
-    min_val, max_val = np.min(data), np.max(data)
-    if max_val == min_val: normalized = np.zeros_like(data)
-    else: normalized = (data - min_val) / (max_val - min_val)
-    
-    points = []
-    n_points = len(data)
-    for i, val in enumerate(normalized):
-        x = i * (width / (n_points - 1)) if n_points > 1 else 0
-        y = height - (val * height)
-        points.append(f"{x:.1f},{y:.1f}")
-    
-    polyline_points = " ".join(points)
+    # Chuẩn hóa tọa độ bằng kernel (NumPy/Numba), format chuỗi vectorized
+    x, y = sparkline_points(data, width, height)
+    polyline_points = " ".join(np.char.add(np.char.add(np.char.mod("%.1f", x), ","), np.char.mod("%.1f", y)))
     return f'<svg width="100%" height="100%" viewBox="0 0 {width} {height}" preserveAspectRatio="none" xmlns="http://www.w3.org/2000/svg"><polyline points="{polyline_points}" fill="none" stroke="{color}" stroke-width="2" vector-effect="non-scaling-stroke"/></svg>'
 
 def render_metric_card(label, value, delta, delta_desc, sub_text, is_positive, sparkline_data=None):
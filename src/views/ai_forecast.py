@@ -2,37 +2,19 @@
 
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.graph_objects as go
-from scipy.stats import norm
+from plotly.subplots import make_subplots
 # Import hàm render_metric_card để dùng cho các thẻ
 from src.utils import render_metric_card
+from src.quant_engine import run_monte_carlo
+from src.data_loader import dataset_fingerprint
+from src.snapshots import MC_STEPS, get_snapshot_store
+from src import config
+from src.monte_carlo import (HORIZONS, aggregate_paths, horizon_summary, resolve_workers, simulate_parallel,
+                             simulate_streaming, term_structure)
 
-# --- 1. CORE LOGIC (Giữ nguyên) ---
-def run_monte_carlo(prices, days_forecast, num_simulations):
-    """Chạy mô phỏng Monte Carlo dựa trên Series giá đã được trích xuất."""
-    returns = prices.pct_change().dropna()
-    if len(returns) < 2: return None # Không đủ dữ liệu
-    
-    last_price = prices.iloc[-1]
-    
-    log_returns = np.log(1 + returns)
-    u = log_returns.mean()
-    var = log_returns.var()
-    
-    drift = u - (0.5 * var)
-    std_dev = log_returns.std()
-    
-    # Tạo ma trận ngẫu nhiên
-    daily_returns = np.exp(drift + std_dev * norm.ppf(np.random.rand(days_forecast, num_simulations)))
-    
-    price_paths = np.zeros_like(daily_returns)
-    price_paths[0] = last_price
-    
-    for t in range(1, days_forecast):
-        price_paths[t] = price_paths[t-1] * daily_returns[t]
-        
-    return price_paths
+STREAMING_THRESHOLD = 10_000
+HORIZON_LABELS = {1: "1D", 5: "1W", 10: "2W", 21: "1M", 63: "3M", 126: "6M", 252: "1Y"}
 
 def get_single_ticker_data(df, ticker):
     """Trích xuất Series giá của 1 ticker từ DataFrame hỗn hợp."""
@@ -67,13 +49,18 @@ def render_ai_forecast(df, tickers):
     with st.expander("⚙️ Simulation Settings (Apply to All)", expanded=True):
         c1, c2, c3 = st.columns([1, 1, 1])
         with c1:
+            # Chỉ là tra cứu trên kết quả đã mô phỏng (MC_STEPS ngày) -> kéo slider không chạy lại
             days_forecast = st.slider("Forecast Horizon (Days)", 7, 90, 30)
         with c2:
-            num_sim = st.select_slider("Scenarios", options=[200, 500, 1000], value=500)
+            num_sim = st.select_slider("Scenarios", options=[200, 500, 1000, 10_000, 100_000, 1_000_000], value=500)
+            # Trên ngưỡng này luôn chạy streaming (ma trận đầy đủ 1M × 252 ngày ~ 2 GB)
+            streaming = st.toggle("Streaming (constant memory)", value=False,
+                                  help="Sinh đường giá theo chunk và gộp thẳng vào thống kê, chỉ giữ 50 đường mẫu để vẽ.") or num_sim > STREAMING_THRESHOLD
         with c3:
             st.write("") # Spacer
             st.write("")
             run_btn = st.button("🚀 Run All Simulations", type="primary", use_container_width=True)
+        st.caption(f"Each run simulates {MC_STEPS} trading days once; every horizon (slider & term structure) is read from that run.")
 
     # --- TABS RENDERING ---
     # Tạo các tab tương ứng với các mã đã chọn
@@ -81,123 +68,247 @@ def render_ai_forecast(df, tickers):
         st.warning("Please select tickers in the sidebar.")
         return
 
+    # Kết quả lần chạy trước (cùng dataset & tham số) nằm trong session -> đổi horizon chỉ là tra cứu
+    run_key = (dataset_fingerprint(df), num_sim, streaming)
+    cached = st.session_state.get("mc_term_structure")
+    results = cached["results"] if cached is not None and cached["key"] == run_key and not run_btn else None
+    source = "session"
+    if results is None and not run_btn:
+        # Kết quả MC tính sẵn (snapshot) cho tham số mặc định -> hiển thị ngay khi mở trang
+        snapshot = get_snapshot_store().get(df) if not streaming else None
+        results = {t: snapshot.monte_carlo(t, num_sim) for t in tickers} if snapshot is not None else {}
+        results = {t: r for t, r in results.items() if r is not None}
+        source = "snapshot"
+    if run_btn:
+        results, source = {}, "run"
+
     # Tạo giao diện Tab
     tabs = st.tabs(tickers)
 
-    if run_btn:
-        # Nếu bấm nút chạy, duyệt qua từng mã và từng tab
-        for i, ticker in enumerate(tickers):
-            with tabs[i]:
-                st.subheader(f"Analysis for {ticker}")
-                
-                # 1. Trích xuất dữ liệu riêng cho mã này
-                prices = get_single_ticker_data(df, ticker)
-                
-                if prices is None or len(prices) < 30:
-                    st.warning(f"Not enough data for {ticker}. Need at least 30 data points.")
+    for i, ticker in enumerate(tickers):
+        with tabs[i]:
+            if run_btn:
+                result = simulate_ticker(df, ticker, num_sim, streaming)
+                if result is None:
                     continue
+                results[ticker] = result
+            elif ticker not in results:
+                # Trạng thái chờ (khi chưa bấm nút Run)
+                st.info(f"👈 Ready to simulate **{ticker}**. Click 'Run All Simulations' above.")
+                continue
+            else:
+                result = results[ticker]
+
+            st.subheader(f"Analysis for {ticker}")
+            if source == "snapshot":
+                st.caption("⚡ Precomputed snapshot. Click 'Run All Simulations' for a fresh run.")
+            elif source == "session":
+                st.caption(f"⚡ Horizon lookup on the last run ({result['simulations']:,} scenarios × {result['steps']} days) - no re-simulation.")
+            elif streaming:
+                workers = f" across {resolve_workers()} processes" if use_parallel(num_sim) else ""
+                st.caption(f"Streaming mode: {num_sim:,} scenarios{workers}, quantiles & CVaR averaged over 10k-path chunks.")
+            render_forecast_result(ticker, horizon_summary(result, days_forecast), days_forecast)
+            render_term_structure(ticker, result, days_forecast)
 
-                with st.spinner(f"Simulating {ticker}..."):
-                    # 2. Chạy mô phỏng
-                    price_paths = run_monte_carlo(prices, days_forecast, num_sim)
-                    
-                    if price_paths is None:
-                        st.error("Simulation failed due to data issues.")
-                        continue
-
-                    # 3. Tính toán kết quả
-                    final_prices = price_paths[-1]
-                    curr_price = prices.iloc[-1]
-                    
-                    mean_price = np.mean(final_prices)
-                    bull_case = np.percentile(final_prices, 95)
-                    bear_case = np.percentile(final_prices, 5)
-                    prob_up = np.sum(final_prices > curr_price) / num_sim * 100
-                    
-                    # Metrics Quant
-                    scenario_returns = (final_prices - curr_price) / curr_price
-                    var_95 = np.percentile(scenario_returns, 5) 
-                    
-                    # Logic đề xuất
-                    if abs(var_95) > 0.20:
-                        risk_label = "EXTREME RISK"
-                        color = "red"
-                    elif abs(var_95) > 0.10:
-                        risk_label = "HIGH RISK"
-                        color = "orange"
-                    else:
-                        risk_label = "MODERATE"
-                        color = "green"
-
-                    # 4. Hiển thị UI cho từng Tab
-                    # Metrics Row - SỬ DỤNG render_metric_card ĐỂ CÓ KHUNG
-                    m1, m2, m3, m4 = st.columns(4)
-                    with m1:
-                        render_metric_card(
-                            label="Current",
-                            value=f"${curr_price:,.2f}",
-                            delta="",
-                            delta_desc="",
-                            sub_text="",
-                            is_positive=True
-                        )
-                    with m2:
-                        mean_delta = (mean_price - curr_price) / curr_price * 100
-                        render_metric_card(
-                            label="Expected (Mean)",
-                            value=f"${mean_price:,.2f}",
-                            delta=f"{mean_delta:.1f}%",
-                            delta_desc="Current",
-                            sub_text="",
-                            is_positive=mean_delta >= 0
-                        )
-                    with m3:
-                        bull_delta = (bull_case - curr_price) / curr_price * 100
-                        render_metric_card(
-                            label="Bull Case (95%)",
-                            value=f"${bull_case:,.2f}",
-                            delta=f"{bull_delta:.1f}%",
-                            delta_desc="Current",
-                            sub_text="Best Case",
-                            is_positive=True
-                        )
-                    with m4:
-                        bear_delta = (bear_case - curr_price) / curr_price * 100
-                        render_metric_card(
-                            label="Bear Case (5%)",
-                            value=f"${bear_case:,.2f}",
-                            delta=f"{bear_delta:.1f}%",
-                            delta_desc="Current",
-                            sub_text="Worst Case",
-                            is_positive=False
-                        )
-                    
-                    # Chart
-                    fig = go.Figure()
-                    # Vẽ 50 đường mẫu
-                    step = max(1, num_sim // 50)
-                    for k in range(0, num_sim, step):
-                        fig.add_trace(go.Scatter(y=price_paths[:, k], mode='lines', line=dict(width=1, color='rgba(132, 142, 156, 0.2)'), showlegend=False, hoverinfo='skip'))
-                    
-                    fig.add_trace(go.Scatter(y=np.mean(price_paths, axis=1), mode='lines', name='Mean Path', line=dict(width=3, color='#F0B90B')))
-                    fig.add_trace(go.Scatter(x=[0], y=[curr_price], mode='markers', marker=dict(color='white', size=6), name='Start'))
-                    
-                    fig.update_layout(
-                        template='plotly_dark', 
-                        height=400, 
-                        # FIX LỖI TIÊU ĐỀ BỊ CẮT: Tăng lề trên (t) từ 10 lên 40
-                        margin=dict(l=10, r=10, t=40, b=10),
-                        title=f"{ticker} Forecast ({days_forecast} Days)",
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        plot_bgcolor='rgba(0,0,0,0)'
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    # Insight Box
-                    st.info(f"🤖 **Quant Insight for {ticker}:** Risk Level is **:{color}[{risk_label}]**. VaR (95%) is {var_95:.2%}. Probability of profit: **{prob_up:.1f}%**.")
+    if run_btn:
+        st.session_state.mc_term_structure = {"key": run_key, "results": results}
+
+    if len(results) > 1:
+        render_term_structure_overview(results)
+
+
+def simulate_ticker(df, ticker, num_sim, streaming):
+    """1 lần mô phỏng MC_STEPS ngày cho 1 mã -> kết quả theo ngày (None + thông báo nếu lỗi)."""
+    # 1. Trích xuất dữ liệu riêng cho mã này
+    prices = get_single_ticker_data(df, ticker)
+
+    if prices is None or len(prices) < 30:
+        st.warning(f"Not enough data for {ticker}. Need at least 30 data points.")
+        return None
 
+    if streaming:
+        # 2b. Streaming: bộ nhớ cố định bất kể số kịch bản
+        progress = st.progress(0.0)
+        on_progress = lambda done, total: progress.progress(done / total, text=f"Simulating {ticker}: {done:,}/{total:,}")
+        if use_parallel(num_sim):
+            # Nhiều kịch bản -> chia chunk cho process pool (mỗi chunk 1 dòng ngẫu nhiên riêng)
+            result = simulate_parallel(prices, MC_STEPS, num_sim, on_progress=on_progress)
+        else:
+            result = simulate_streaming(prices, MC_STEPS, num_sim, on_progress=on_progress)
+        progress.empty()
     else:
-        # Trạng thái chờ (khi chưa bấm nút Run)
-        for i, ticker in enumerate(tickers):
-            with tabs[i]:
-                st.info(f"👈 Ready to simulate **{ticker}**. Click 'Run All Simulations' above.")
\ No newline at end of file
+        with st.spinner(f"Simulating {ticker}..."):
+            # 2. Chạy mô phỏng (dòng 0 = giá hiện tại) rồi gộp thành thống kê theo từng ngày
+            price_paths = run_monte_carlo(prices, MC_STEPS + 1, num_sim)
+            result = aggregate_paths(price_paths) if price_paths is not None else None
+
+    if result is None:
+        st.error("Simulation failed due to data issues.")
+    return result
+
+
+def use_parallel(num_sim):
+    """Chạy Monte Carlo trên process pool khi đủ nhiều kịch bản và có > 1 worker."""
+    return num_sim >= config.MC_PARALLEL_MIN_SIMULATIONS and resolve_workers() > 1
+
+
+def _horizon_label(days):
+    return HORIZON_LABELS.get(days, f"{days}D")
+
+
+def render_term_structure(ticker, result, days_forecast):
+    """Bảng + biểu đồ VaR / CVaR / xác suất có lãi theo kỳ hạn (kèm kỳ hạn đang chọn trên slider)."""
+    table = term_structure(result, sorted(set(HORIZONS) | {days_forecast}))
+    labels = [_horizon_label(h) for h in table.index]
+
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Bar(x=labels, y=table["VaR 95%"], name='VaR 95%', marker_color='#F0B90B'))
+    fig.add_trace(go.Bar(x=labels, y=table["CVaR 95%"], name='CVaR 95%', marker_color='#F6465D'))
+    fig.add_trace(go.Scatter(x=labels, y=table["Prob. of Profit"], name='Prob. of Profit', mode='lines+markers',
+                             line=dict(width=2, color='#0ECB81')), secondary_y=True)
+    fig.update_layout(
+        template='plotly_dark',
+        height=320,
+        margin=dict(l=10, r=10, t=40, b=10),
+        title=f"{ticker} Risk Term Structure",
+        barmode='group',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    fig.update_yaxes(tickformat='.0%', secondary_y=False)
+    fig.update_yaxes(tickformat='.0%', range=[0, 1], showgrid=False, secondary_y=True)
+    st.plotly_chart(fig, use_container_width=True)
+
+    table = table.set_axis(labels)
+    st.dataframe(table.style.format("{:.2%}").apply(
+        lambda row: ['background-color: rgba(240, 185, 11, 0.15)' if row.name == _horizon_label(days_forecast) else '' for _ in row], axis=1),
+        use_container_width=True)
+
+
+def render_term_structure_overview(results):
+    """So sánh VaR 95% theo kỳ hạn giữa các mã."""
+    st.markdown("#### 📐 Risk Term Structure (All Tickers)")
+    var_table = pd.DataFrame({ticker: term_structure(result)["VaR 95%"] for ticker, result in results.items()})
+    var_table.index = [_horizon_label(h) for h in var_table.index]
+
+    fig = go.Figure()
+    for ticker in var_table.columns:
+        fig.add_trace(go.Scatter(x=var_table.index, y=var_table[ticker], mode='lines+markers', name=ticker))
+    fig.update_layout(
+        template='plotly_dark',
+        height=320,
+        margin=dict(l=10, r=10, t=40, b=10),
+        title="VaR 95% by Horizon",
+        yaxis_tickformat='.0%',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(var_table.style.format("{:.2%}").background_gradient(cmap="RdYlGn", axis=None), use_container_width=True)
+
+
+def render_forecast_result(ticker, result, days_forecast):
+    """Thẻ chỉ số + biểu đồ đường mẫu + insight từ kết quả MC (chạy trực tiếp hoặc snapshot)."""
+    curr_price, mean_price = result["curr_price"], result["mean_price"]
+    bull_case, bear_case = result["bull_case"], result["bear_case"]
+    var_95, cvar_95, prob_up = result["var_95"], result["cvar_95"], result["prob_up"]
+
+    # Logic đề xuất
+    if abs(var_95) > 0.20:
+        risk_label = "EXTREME RISK"
+        color = "red"
+    elif abs(var_95) > 0.10:
+        risk_label = "HIGH RISK"
+        color = "orange"
+    else:
+        risk_label = "MODERATE"
+        color = "green"
+
+    # 4. Hiển thị UI cho từng Tab
+    # Metrics Row - SỬ DỤNG render_metric_card ĐỂ CÓ KHUNG
+    m1, m2, m3, m4 = st.columns(4)
+    with m1:
+        render_metric_card(
+            label="Current",
+            value=f"${curr_price:,.2f}",
+            delta="",
+            delta_desc="",
+            sub_text="",
+            is_positive=True
+        )
+    with m2:
+        mean_delta = (mean_price - curr_price) / curr_price * 100
+        render_metric_card(
+            label="Expected (Mean)",
+            value=f"${mean_price:,.2f}",
+            delta=f"{mean_delta:.1f}%",
+            delta_desc="Current",
+            sub_text="",
+            is_positive=mean_delta >= 0
+        )
+    with m3:
+        bull_delta = (bull_case - curr_price) / curr_price * 100
+        render_metric_card(
+            label="Bull Case (95%)",
+            value=f"${bull_case:,.2f}",
+            delta=f"{bull_delta:.1f}%",
+            delta_desc="Current",
+            sub_text="Best Case",
+            is_positive=True
+        )
+    with m4:
+        bear_delta = (bear_case - curr_price) / curr_price * 100
+        render_metric_card(
+            label="Bear Case (5%)",
+            value=f"${bear_case:,.2f}",
+            delta=f"{bear_delta:.1f}%",
+            delta_desc="Current",
+            sub_text="Worst Case",
+            is_positive=False
+        )
+    
+    # Chart
+    fig = go.Figure()
+    sample_paths = result["sample_paths"]
+    for k in range(sample_paths.shape[1]):
+        fig.add_trace(go.Scatter(y=sample_paths[:, k], mode='lines', line=dict(width=1, color='rgba(132, 142, 156, 0.2)'), showlegend=False, hoverinfo='skip'))
+    
+    bands = result.get("bands")
+    if bands and 5 in bands and 95 in bands:
+        # Dải phân vị 5%-95% theo từng ngày
+        fig.add_trace(go.Scatter(y=bands[95], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(y=bands[5], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(59, 130, 246, 0.15)', name='5%-95% Band'))
+    fig.add_trace(go.Scatter(y=result["mean_path"], mode='lines', name='Mean Path', line=dict(width=3, color='#F0B90B')))
+    fig.add_trace(go.Scatter(x=[0], y=[curr_price], mode='markers', marker=dict(color='white', size=6), name='Start'))
+    
+    fig.update_layout(
+        template='plotly_dark', 
+        height=400, 
+        # FIX LỖI TIÊU ĐỀ BỊ CẮT: Tăng lề trên (t) từ 10 lên 40
+        margin=dict(l=10, r=10, t=40, b=10),
+        title=f"{ticker} Forecast ({days_forecast} Days)",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Phân phối max drawdown trên đường đi đến kỳ hạn đang chọn
+    max_dd = result.get("max_drawdown")
+    if max_dd is not None:
+        bins = max_dd["bins"]
+        fig_dd = go.Figure(go.Bar(x=(bins[:-1] + bins[1:]) / 2, y=max_dd["counts"] / max(1, max_dd["counts"].sum()),
+                                  width=bins[1] - bins[0], marker_color='#F6465D', opacity=0.7, name='Max Drawdown'))
+        fig_dd.update_layout(
+            template='plotly_dark',
+            height=250,
+            margin=dict(l=10, r=10, t=40, b=10),
+            title=f"{ticker} Max Drawdown Distribution (Median {max_dd['median']:.1%}, 5% worst {max_dd['p05']:.1%})",
+            xaxis_tickformat='.0%',
+            yaxis_tickformat='.0%',
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)'
+        )
+        st.plotly_chart(fig_dd, use_container_width=True)
+
+    # Insight Box
+    st.info(f"🤖 **Quant Insight for {ticker}:** Risk Level is **:{color}[{risk_label}]**. VaR (95%) is {var_95:.2%}, CVaR (95%) is {cvar_95:.2%}. Probability of profit: **{prob_up:.1f}%**.")
@@ -2,9 +2,17 @@
 
 import streamlit as st
 import plotly.graph_objects as go
+import numpy as np
 import pandas as pd
 from plotly.subplots import make_subplots
+from src import config
 from src.utils import render_metric_card
+from src.quant_engine import compute_indicators
+from src.data_loader import dataset_fingerprint
+from src.snapshots import get_snapshot_store
+from src.factor_model import fit_factor_model
+from src.charts import (cached_figure, candle_buckets, merge_candles, minmax_indices, scatter_class, series_budget,
+                        volume_colors)
 
 def render_dashboard(df, tickers):
     """
@@ -36,47 +44,17 @@ def render_dashboard(df, tickers):
             st.error(f"Error preparing comparison data: {e}")
             return
 
-        # 2. Tính % Tăng trưởng tích lũy (Cumulative Return)
-        # Công thức: (Giá / Giá đầu kỳ) - 1
-        # dropna() để tránh lỗi nếu các mã có ngày bắt đầu khác nhau
-        normalized_df = (comp_df / comp_df.iloc[0]) - 1
-        
-        # 3. Vẽ biểu đồ so sánh
-        fig = go.Figure()
-        
-        for ticker in tickers:
-            if ticker in normalized_df.columns:
-                fig.add_trace(go.Scatter(
-                    x=normalized_df.index,
-                    y=normalized_df[ticker],
-                    mode='lines',
-                    name=ticker,
-                    hovertemplate='%{y:.2%}'
-                ))
-            
-        fig.update_layout(
-            template='plotly_dark',
-            title="Relative Performance (%)",
-            xaxis_title="Date",
-            yaxis_title="Cumulative Return",
-            height=600,
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            yaxis_tickformat='.0%'
-        )
+        # 2-3. Biểu đồ so sánh: dựng 1 lần / (dataset, watchlist, point budget), rerun chỉ lấy lại từ cache
+        fingerprint = dataset_fingerprint(df)
+        budget = config.CHART_POINT_BUDGET
+        fig = cached_figure(("comparison", fingerprint, tuple(tickers), budget),
+                            lambda: build_comparison_figure(comp_df, tickers, budget))
         st.plotly_chart(fig, use_container_width=True)
         
         # 4. Bảng Correlation (Tương quan)
         with st.expander("📊 Correlation Matrix (Ma trận tương quan)"):
-            corr = comp_df.corr()
-            fig_corr = go.Figure(data=go.Heatmap(
-                z=corr.values,
-                x=corr.columns,
-                y=corr.columns,
-                colorscale='Viridis',
-                texttemplate="%{z:.2f}"
-            ))
-            fig_corr.update_layout(height=500, template='plotly_dark', paper_bgcolor='rgba(0,0,0,0)')
+            fig_corr = cached_figure(("correlation", fingerprint, tuple(tickers)),
+                                     lambda: build_correlation_figure(df, comp_df, tickers))
             st.plotly_chart(fig_corr, use_container_width=True)
             st.caption("Gần 1: Cùng chiều | Gần -1: Ngược chiều | Gần 0: Không liên quan")
 
@@ -149,25 +127,141 @@ def render_dashboard(df, tickers):
     # --- 2. MAIN CHART ---
     with st.expander("⚙️ Chart Settings", expanded=False):
         c1, c2 = st.columns(2)
-        with c1: show_ma = st.multiselect("Indicators", ["MA20", "MA50"], default=["MA20"])
+        with c1: show_ma = st.multiselect("Indicators", ["MA20", "MA50", "EMA20", "Bollinger Bands", "VWAP", "RSI", "MACD"], default=["MA20"])
         with c2: chart_type = st.radio("Type", ["Candlestick", "Line"], horizontal=True)
 
-    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_width=[0.2, 0.7], vertical_spacing=0.05)
+    # Figure dựng 1 lần / (dataset, mã, chỉ báo, kiểu chart, point budget)
+    budget = config.CHART_POINT_BUDGET
+    key = ("price", dataset_fingerprint(df), ticker, tuple(show_ma), chart_type, budget)
+    fig = cached_figure(key, lambda: build_price_figure(df, single_df, ticker, close_col, show_ma, chart_type, budget))
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def build_comparison_figure(comp_df, tickers, budget):
+    """Relative Performance: mỗi mã giữ tối đa series_budget điểm (min/max mỗi bucket), WebGL khi tổng điểm lớn."""
+    # 2. Tính % Tăng trưởng tích lũy (Cumulative Return)
+    # Công thức: (Giá / Giá đầu kỳ) - 1
+    normalized_df = (comp_df / comp_df.iloc[0]) - 1
+
+    # 3. Vẽ biểu đồ so sánh
+    series = {t: normalized_df[t].to_numpy(dtype=float) for t in tickers if t in normalized_df.columns}
+    per_series = series_budget(len(series), budget)
+    keep = {t: minmax_indices(values, per_series) for t, values in series.items()}
+    Scatter = scatter_class(sum(len(idx) for idx in keep.values()))
+    fig = go.Figure()
+    for ticker, idx in keep.items():
+        fig.add_trace(Scatter(
+            x=normalized_df.index[idx],
+            y=series[ticker][idx],
+            mode='lines',
+            name=ticker,
+            hovertemplate='%{y:.2%}'
+        ))
+
+    fig.update_layout(
+        template='plotly_dark',
+        title="Relative Performance (%)",
+        xaxis_title="Date",
+        yaxis_title="Cumulative Return",
+        height=600,
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        yaxis_tickformat='.0%'
+    )
+    return fig
+
+
+def build_correlation_figure(df, comp_df, tickers):
+    n = len(comp_df.columns)
+    title = None
+    if config.FACTOR_MODEL_MIN_ASSETS and n >= config.FACTOR_MODEL_MIN_ASSETS:
+        # Watchlist lớn: tương quan returns đã khử nhiễu bởi mô hình nhân tố PCA, sắp theo nhân tố trội của từng mã
+        corr, model = factor_correlation(comp_df)
+        title = f"PCA factor model: {model.n_factors} factor{'s' if model.n_factors > 1 else ''} explain {model.explained:.0%} of return correlation"
+    else:
+        snapshot = get_snapshot_store().get(df)
+        corr = snapshot.correlation(tickers) if snapshot is not None else None
+        if corr is None or len(corr) != n:
+            corr = comp_df.corr()
+    fig_corr = go.Figure(data=go.Heatmap(
+        z=corr.values,
+        x=corr.columns,
+        y=corr.columns,
+        colorscale='Viridis',
+        texttemplate="%{z:.2f}" if n <= 20 else None
+    ))
+    fig_corr.update_layout(height=500 if n <= 20 else 800, template='plotly_dark', paper_bgcolor='rgba(0,0,0,0)',
+                           title=title)
+    return fig_corr
+
+
+def factor_correlation(comp_df):
+    """(Ma trận tương quan log returns từ mô hình nhân tố, model) - mã được gom theo nhân tố có loading lớn nhất."""
+    returns = np.log(comp_df / comp_df.shift(1)).dropna()
+    model = fit_factor_model(returns, n_factors=config.FACTOR_MODEL_FACTORS or None)
+    loadings = model.B / np.sqrt(model.diagonal())[:, None]
+    dominant = np.abs(loadings).argmax(axis=1)
+    order = np.lexsort((-loadings[np.arange(len(dominant)), dominant], dominant))
+    corr = model.correlation()
+    return corr.iloc[order, order], model
+
+
+def build_price_figure(df, single_df, ticker, close_col, show_ma, chart_type, budget):
+    """
+    Nến + chỉ báo + volume. Quá `budget` nến -> gộp nến liên tiếp (OHLC đúng nghĩa, Volume cộng dồn),
+    đường chỉ báo lấy giá trị cuối mỗi nhóm; đường dùng WebGL khi tổng số điểm lớn.
+    """
+    # Chỉ báo tính 1 lần cho cả watchlist và cache theo dataset (không ghi cột mới vào df dùng chung)
+    indicators = compute_indicators(df)
+    ind_full = lambda name: indicators[name][ticker] if ticker in indicators[name].columns else indicators[name].iloc[:, 0]
+
+    opens, highs, lows = single_df['Open'].to_numpy(), single_df['High'].to_numpy(), single_df['Low'].to_numpy()
+    closes, volumes = single_df[close_col].to_numpy(), single_df['Volume'].to_numpy()
+    starts = candle_buckets(len(single_df), budget)
+    if starts is None:
+        x = single_df.index
+        ind = lambda name: ind_full(name).to_numpy()
+    else:
+        ends = np.r_[starts[1:], len(single_df)] - 1
+        x = single_df.index[starts]
+        opens, highs, lows, closes, volumes = merge_candles(opens, highs, lows, closes, volumes, starts)
+        ind = lambda name: ind_full(name).to_numpy()[ends]
+
+    oscillators = [name for name in ["RSI", "MACD"] if name in show_ma]
+    if oscillators:
+        fig = make_subplots(rows=3, cols=1, shared_xaxes=True, row_width=[0.2, 0.15, 0.65], vertical_spacing=0.04)
+    else:
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_width=[0.2, 0.7], vertical_spacing=0.05)
+    volume_row = 3 if oscillators else 2
+    n_lines = 1 + len(show_ma) + (1 if "Bollinger Bands" in show_ma else 0) + (1 if "MACD" in show_ma else 0)
+    Scatter = scatter_class(len(x) * n_lines)
     
     if chart_type == "Candlestick":
-        fig.add_trace(go.Candlestick(x=single_df.index, open=single_df['Open'], high=single_df['High'], low=single_df['Low'], close=single_df[close_col], name='OHLC'), row=1, col=1)
+        fig.add_trace(go.Candlestick(x=x, open=opens, high=highs, low=lows, close=closes, name='OHLC'), row=1, col=1)
     else:
-        fig.add_trace(go.Scatter(x=single_df.index, y=single_df[close_col], line=dict(color='#0ECB81', width=2), name='Close'), row=1, col=1)
+        fig.add_trace(Scatter(x=x, y=closes, line=dict(color='#0ECB81', width=2), name='Close'), row=1, col=1)
     
     if "MA20" in show_ma: 
-        single_df['MA20'] = single_df[close_col].rolling(20).mean()
-        fig.add_trace(go.Scatter(x=single_df.index, y=single_df['MA20'], line=dict(color='#F0B90B', width=1), name='MA 20'), row=1, col=1)
+        fig.add_trace(Scatter(x=x, y=ind("SMA20"), line=dict(color='#F0B90B', width=1), name='MA 20'), row=1, col=1)
     if "MA50" in show_ma: 
-        single_df['MA50'] = single_df[close_col].rolling(50).mean()
-        fig.add_trace(go.Scatter(x=single_df.index, y=single_df['MA50'], line=dict(color='#9945FF', width=1), name='MA 50'), row=1, col=1)
+        fig.add_trace(Scatter(x=x, y=ind("SMA50"), line=dict(color='#9945FF', width=1), name='MA 50'), row=1, col=1)
+    if "EMA20" in show_ma:
+        fig.add_trace(Scatter(x=x, y=ind("EMA20"), line=dict(color='#3B82F6', width=1), name='EMA 20'), row=1, col=1)
+    if "Bollinger Bands" in show_ma:
+        fig.add_trace(Scatter(x=x, y=ind("BB Upper"), line=dict(color='rgba(132, 142, 156, 0.6)', width=1), name='BB Upper'), row=1, col=1)
+        fig.add_trace(Scatter(x=x, y=ind("BB Lower"), line=dict(color='rgba(132, 142, 156, 0.6)', width=1), fill='tonexty', fillcolor='rgba(132, 142, 156, 0.1)', name='BB Lower'), row=1, col=1)
+    if "VWAP" in show_ma and "VWAP" in indicators:
+        fig.add_trace(Scatter(x=x, y=ind("VWAP"), line=dict(color='#E0E0E0', width=1, dash='dot'), name='VWAP'), row=1, col=1)
+
+    if "RSI" in oscillators:
+        fig.add_trace(Scatter(x=x, y=ind("RSI14"), line=dict(color='#F0B90B', width=1), name='RSI 14'), row=2, col=1)
+    if "MACD" in oscillators:
+        fig.add_trace(Scatter(x=x, y=ind("MACD"), line=dict(color='#3B82F6', width=1), name='MACD'), row=2, col=1)
+        fig.add_trace(Scatter(x=x, y=ind("MACD Signal"), line=dict(color='#F6465D', width=1), name='Signal'), row=2, col=1)
 
-    colors = ['#0ECB81' if o < c else '#F6465D' for o, c in zip(single_df['Open'], single_df[close_col])]
-    fig.add_trace(go.Bar(x=single_df.index, y=single_df['Volume'], marker_color=colors, name='Volume'), row=2, col=1)
+    fig.add_trace(go.Bar(x=x, y=volumes, marker_color=volume_colors(opens, closes), name='Volume'), row=volume_row, col=1)
     
     fig.update_layout(template='plotly_dark', height=600, xaxis_rangeslider_visible=False, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    if starts is not None:
+        fig.update_layout(title=f"{ticker} - {len(single_df):,} bars merged into {len(starts):,} (point budget {budget:,})")
+    return fig
@@ -1,10 +1,29 @@
 # src/views/portfolio.py
 
+import time
+from datetime import date
 import streamlit as st
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
-from src.quant_engine import optimize_portfolio
+from src import config
+from src.quant_engine import optimize_portfolio, allocate_portfolio, get_portfolio_returns, get_field_panel
+from src.data_loader import dataset_fingerprint
+from src.dataset_cache import get_dataset_cache
+from src.fetch_service import get_fetch_service
+from src.snapshots import get_snapshot_store
+from src.walk_forward import WALK_FORWARD_METHODS, walk_forward
+from src.scenarios import (FACTOR_PROXIES, FACTOR_SHOCKS, HISTORY_START, KIND_ROLLING,
+                           ROLLING_HORIZONS, build_scenarios, loss_contributions, loss_table, scenario_pnl, stress_summary)
+
+ALLOCATORS = {
+    "Markowitz (Monte Carlo)": None,
+    "Equal Risk Contribution": "erc",
+    "Hierarchical Risk Parity": "hrp",
+}
+
+ESTIMATION_WINDOWS = {"6M (126)": 126, "1Y (252)": 252, "2Y (504)": 504}
+REBALANCE_FREQUENCIES = {"Weekly": 5, "Monthly": 21, "Quarterly": 63}
 
 def render_portfolio_builder(df, tickers):
     st.markdown(f"### 💼 Portfolio Optimization (Markowitz Model)")
@@ -25,150 +44,138 @@ def render_portfolio_builder(df, tickers):
     with col_ctrl1:
         with st.container(border=True):
             st.markdown("**Settings**")
+            allocator = st.selectbox("Allocator", list(ALLOCATORS.keys()),
+                                     help="Risk Parity (ERC/HRP) ổn định hơn Monte Carlo khi có nhiều mã hoặc covariance nhiễu.")
             num_sim = st.select_slider("Simulations", options=[2000, 5000, 10000], value=5000)
             rf_rate = st.number_input("Risk-Free Rate (%)", 0.0, 10.0, 3.0, step=0.5) / 100
             run_opt = st.button("🚀 Optimize Portfolio", type="primary", use_container_width=True)
+            if config.FACTOR_MODEL_MIN_ASSETS and len(tickers) >= config.FACTOR_MODEL_MIN_ASSETS:
+                st.caption(f"🧮 {len(tickers)} tickers: covariance from a PCA factor model (top-k factors + specific risk).")
+
+    # Efficient Frontier tính sẵn (snapshot) cho tham số hiện tại -> hiển thị ngay khi mở trang
+    frontier_snapshot = None
+    if not run_opt and ALLOCATORS[allocator] is None:
+        snapshot = get_snapshot_store().get(df)
+        frontier_snapshot = snapshot.frontier(num_sim, rf_rate) if snapshot is not None else None
+
+    if run_opt and ALLOCATORS[allocator] is not None:
+        render_risk_parity(df, ALLOCATORS[allocator], allocator, rf_rate)
+        render_asset_metrics(df, rf_rate)
+
+    elif run_opt or frontier_snapshot is not None:
+        if run_opt:
+            with st.spinner("Finding the best allocation matrix..."):
+                # Gọi engine tối ưu
+                opt_results = optimize_portfolio(df, num_portfolios=num_sim, risk_free_rate=rf_rate)
+        else:
+            opt_results = frontier_snapshot
+            st.caption("⚡ Precomputed snapshot. Click 'Optimize Portfolio' for a fresh simulation.")
+
+        if opt_results is None:
+            st.error("Optimization failed. Please check data quality.")
+            return
+
+        # --- 3. HIỂN THỊ KẾT QUẢ ---
+
+        # A. Efficient Frontier Chart (Biểu đồ quan trọng nhất)
+        results = opt_results["results"]
+        max_sharpe = opt_results["max_sharpe"]
+        min_vol = opt_results["min_vol"]
+
+        col_chart, col_alloc = st.columns([2, 1])
+
+        with col_chart:
+            fig = go.Figure()
+
+            # 1. Vẽ 5000 điểm mô phỏng
+            fig.add_trace(go.Scatter(
+                x=results[1,:], # Volatility (X)
+                y=results[0,:], # Return (Y)
+                mode='markers',
+                marker=dict(
+                    color=results[2,:], # Màu theo Sharpe Ratio
+                    colorscale='Viridis',
+                    showscale=True,
+                    size=4,
+                    opacity=0.6,
+                    colorbar=dict(title="Sharpe Ratio")
+                ),
+                name='Portfolios'
+            ))
+
+            # 2. Điểm Max Sharpe (Ngôi sao vàng)
+            fig.add_trace(go.Scatter(
+                x=[max_sharpe['std']], y=[max_sharpe['return']],
+                mode='markers',
+                marker=dict(color='#F0B90B', size=15, symbol='star'),
+                name='Max Sharpe (Optimal)'
+            ))
+
+            # 3. Điểm Min Volatility (Ngôi sao xanh)
+            fig.add_trace(go.Scatter(
+                x=[min_vol['std']], y=[min_vol['return']],
+                mode='markers',
+                marker=dict(color='#3B82F6', size=15, symbol='star'),
+                name='Min Volatility (Safest)'
+            ))
+
+            fig.update_layout(
+                template='plotly_dark',
+                title="Efficient Frontier",
+                xaxis_title="Annualized Volatility (Risk)",
+                yaxis_title="Annualized Return",
+                height=500,
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01)
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+        # B. Allocation Pie Charts (Phân bổ vốn)
+        with col_alloc:
+            st.subheader("🎯 Optimal Allocation")
+
+            # Tab chọn xem Max Sharpe hay Min Vol
+            alloc_tab1, alloc_tab2 = st.tabs(["Max Sharpe", "Min Risk"])
 
-    if run_opt:
-        with st.spinner("Finding the best allocation matrix..."):
-            # Gọi engine tối ưu
-            opt_results = optimize_portfolio(df, num_portfolios=num_sim, risk_free_rate=rf_rate)
-            
-            if opt_results is None:
-                st.error("Optimization failed. Please check data quality.")
-                return
-
-            # --- 3. HIỂN THỊ KẾT QUẢ ---
-            
-            # A. Efficient Frontier Chart (Biểu đồ quan trọng nhất)
-            results = opt_results["results"]
-            max_sharpe = opt_results["max_sharpe"]
-            min_vol = opt_results["min_vol"]
-            
-            col_chart, col_alloc = st.columns([2, 1])
-            
-            with col_chart:
-                fig = go.Figure()
-                
-                # 1. Vẽ 5000 điểm mô phỏng
-                fig.add_trace(go.Scatter(
-                    x=results[1,:], # Volatility (X)
-                    y=results[0,:], # Return (Y)
-                    mode='markers',
-                    marker=dict(
-                        color=results[2,:], # Màu theo Sharpe Ratio
-                        colorscale='Viridis',
-                        showscale=True,
-                        size=4,
-                        opacity=0.6,
-                        colorbar=dict(title="Sharpe Ratio")
-                    ),
-                    name='Portfolios'
-                ))
-                
-                # 2. Điểm Max Sharpe (Ngôi sao vàng)
-                fig.add_trace(go.Scatter(
-                    x=[max_sharpe['std']], y=[max_sharpe['return']],
-                    mode='markers',
-                    marker=dict(color='#F0B90B', size=15, symbol='star'),
-                    name='Max Sharpe (Optimal)'
-                ))
-                
-                # 3. Điểm Min Volatility (Ngôi sao xanh)
-                fig.add_trace(go.Scatter(
-                    x=[min_vol['std']], y=[min_vol['return']],
-                    mode='markers',
-                    marker=dict(color='#3B82F6', size=15, symbol='star'),
-                    name='Min Volatility (Safest)'
-                ))
-                
-                fig.update_layout(
-                    template='plotly_dark',
-                    title="Efficient Frontier",
-                    xaxis_title="Annualized Volatility (Risk)",
-                    yaxis_title="Annualized Return",
-                    height=500,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01)
+            with alloc_tab1:
+                # Pie Chart cho Max Sharpe
+                labels = list(max_sharpe['weights'].keys())
+                values = list(max_sharpe['weights'].values())
+
+                fig_pie1 = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.4)])
+                fig_pie1.update_layout(
+                    template='plotly_dark', 
+                    height=350, 
+                    margin=dict(l=0, r=0, t=30, b=0),
+                    paper_bgcolor='rgba(0,0,0,0)'
                 )
-                st.plotly_chart(fig, use_container_width=True)
-                
-            # B. Allocation Pie Charts (Phân bổ vốn)
-            with col_alloc:
-                st.subheader("🎯 Optimal Allocation")
-                
-                # Tab chọn xem Max Sharpe hay Min Vol
-                alloc_tab1, alloc_tab2 = st.tabs(["Max Sharpe", "Min Risk"])
-                
-                with alloc_tab1:
-                    # Pie Chart cho Max Sharpe
-                    labels = list(max_sharpe['weights'].keys())
-                    values = list(max_sharpe['weights'].values())
-                    
-                    fig_pie1 = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.4)])
-                    fig_pie1.update_layout(
-                        template='plotly_dark', 
-                        height=350, 
-                        margin=dict(l=0, r=0, t=30, b=0),
-                        paper_bgcolor='rgba(0,0,0,0)'
-                    )
-                    st.plotly_chart(fig_pie1, use_container_width=True)
-                    
-                    st.metric("Exp. Return", f"{max_sharpe['return']:.2%}")
-                    st.metric("Sharpe Ratio", f"{max_sharpe['sharpe']:.2f}")
-
-                with alloc_tab2:
-                    # Pie Chart cho Min Vol
-                    labels2 = list(min_vol['weights'].keys())
-                    values2 = list(min_vol['weights'].values())
-                    
-                    fig_pie2 = go.Figure(data=[go.Pie(labels=labels2, values=values2, hole=.4)])
-                    fig_pie2.update_layout(
-                        template='plotly_dark', 
-                        height=350, 
-                        margin=dict(l=0, r=0, t=30, b=0),
-                        paper_bgcolor='rgba(0,0,0,0)'
-                    )
-                    st.plotly_chart(fig_pie2, use_container_width=True)
-                    
-                    st.metric("Exp. Return", f"{min_vol['return']:.2%}")
-                    st.metric("Volatility", f"{min_vol['std']:.2%}")
-                    
-                    st.markdown("---")
-                    st.subheader("🧐 Why this allocation?")
-            
-            # Tính chỉ số riêng lẻ cho từng mã để user hiểu
-            # Lấy data giá
-            try:
-                if isinstance(df.columns, pd.MultiIndex):
-                    price_levels = df.columns.get_level_values(1).unique()
-                    target_col = 'Adj Close' if 'Adj Close' in price_levels else 'Close'
-                    data = df.xs(target_col, level=1, axis=1)
-                else:
-                    data = df
-            except:
-                data = df
-
-            if data is not None:
-                returns = np.log(data / data.shift(1)).dropna()
-                mean_ret = returns.mean() * 252
-                vol = returns.std() * np.sqrt(252)
-                sharpes = (mean_ret - rf_rate) / vol
-                
-                metrics_df = pd.DataFrame({
-                    "Annual Return": mean_ret,
-                    "Volatility": vol,
-                    "Sharpe Ratio": sharpes
-                })
-                
-                # Format hiển thị
-                st.dataframe(
-                    metrics_df.style.format("{:.2%}", subset=["Annual Return", "Volatility"]).format("{:.2f}", subset=["Sharpe Ratio"])
-                    .background_gradient(cmap="RdYlGn", subset=["Sharpe Ratio"]),
-                    use_container_width=True
+                st.plotly_chart(fig_pie1, use_container_width=True)
+
+                st.metric("Exp. Return", f"{max_sharpe['return']:.2%}")
+                st.metric("Sharpe Ratio", f"{max_sharpe['sharpe']:.2f}")
+
+            with alloc_tab2:
+                # Pie Chart cho Min Vol
+                labels2 = list(min_vol['weights'].keys())
+                values2 = list(min_vol['weights'].values())
+
+                fig_pie2 = go.Figure(data=[go.Pie(labels=labels2, values=values2, hole=.4)])
+                fig_pie2.update_layout(
+                    template='plotly_dark', 
+                    height=350, 
+                    margin=dict(l=0, r=0, t=30, b=0),
+                    paper_bgcolor='rgba(0,0,0,0)'
                 )
-                st.caption("💡 **Insight:** Thuật toán sẽ dồn tỷ trọng vào các mã có **Sharpe Ratio** cao (Màu xanh) và hạn chế các mã có Sharpe thấp hoặc âm (Màu đỏ).")
+                st.plotly_chart(fig_pie2, use_container_width=True)
+
+                st.metric("Exp. Return", f"{min_vol['return']:.2%}")
+                st.metric("Volatility", f"{min_vol['std']:.2%}")
+
+                st.markdown("---")
+                st.subheader("🧐 Why this allocation?")
+
+        render_asset_metrics(df, rf_rate)
 
     else:
         st.info("👈 Select parameters and click 'Optimize Portfolio'.")
@@ -177,4 +184,344 @@ def render_portfolio_builder(df, tickers):
         It is a set of optimal portfolios that offer the highest expected return for a defined level of risk.
         * **Max Sharpe Portfolio:** The "sweet spot" that gives the best return per unit of risk.
         * **Min Volatility Portfolio:** The safest possible combination of your selected assets.
-        """)
\ No newline at end of file
+        * **Equal Risk Contribution:** Mỗi mã đóng góp rủi ro bằng nhau vào danh mục.
+        * **Hierarchical Risk Parity:** Gom cụm các mã tương quan rồi chia vốn theo rủi ro từng cụm (không cần nghịch đảo covariance).
+        """)
+
+    render_walk_forward(df, rf_rate)
+    render_stress_test(df, rf_rate)
+
+
+def render_pie(weights):
+    fig_pie = go.Figure(data=[go.Pie(labels=list(weights.keys()), values=list(weights.values()), hole=.4)])
+    fig_pie.update_layout(
+        template='plotly_dark',
+        height=350,
+        margin=dict(l=0, r=0, t=30, b=0),
+        paper_bgcolor='rgba(0,0,0,0)'
+    )
+    st.plotly_chart(fig_pie, use_container_width=True)
+
+
+def render_risk_parity(df, method, label, rf_rate):
+    """Phân bổ Risk Parity (ERC / HRP): pie chart trọng số + đóng góp rủi ro từng mã."""
+    with st.spinner(f"Solving {label}..."):
+        alloc = allocate_portfolio(df, method=method, risk_free_rate=rf_rate)
+
+    if alloc is None:
+        st.error("Optimization failed. Please check data quality.")
+        return
+
+    col_chart, col_alloc = st.columns([2, 1])
+
+    with col_chart:
+        # Weight vs Risk Contribution: ERC -> cột đỏ bằng nhau, HRP -> gần bằng nhau theo cụm
+        labels = list(alloc['weights'].keys())
+        fig = go.Figure()
+        fig.add_trace(go.Bar(x=labels, y=list(alloc['weights'].values()), name='Weight', marker_color='#3B82F6'))
+        fig.add_trace(go.Bar(x=labels, y=list(alloc['risk_contrib'].values()), name='Risk Contribution', marker_color='#F6465D'))
+        fig.update_layout(
+            template='plotly_dark',
+            title=f"{label}: Weight vs Risk Contribution",
+            yaxis_tickformat='.0%',
+            barmode='group',
+            height=500,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01)
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col_alloc:
+        st.subheader("🎯 Optimal Allocation")
+        render_pie(alloc['weights'])
+        st.metric("Exp. Return", f"{alloc['return']:.2%}")
+        st.metric("Volatility", f"{alloc['std']:.2%}")
+        st.metric("Sharpe Ratio", f"{alloc['sharpe']:.2f}")
+
+
+def render_asset_metrics(df, rf_rate):
+    """Bảng chỉ số riêng lẻ cho từng mã để user hiểu vì sao có phân bổ này."""
+    # Lấy data giá
+    try:
+        if isinstance(df.columns, pd.MultiIndex):
+            price_levels = df.columns.get_level_values(1).unique()
+            target_col = 'Adj Close' if 'Adj Close' in price_levels else 'Close'
+            data = df.xs(target_col, level=1, axis=1)
+        else:
+            data = df
+    except:
+        data = df
+
+    if data is not None:
+        returns = np.log(data / data.shift(1)).dropna()
+        mean_ret = returns.mean() * 252
+        vol = returns.std() * np.sqrt(252)
+        sharpes = (mean_ret - rf_rate) / vol
+
+        metrics_df = pd.DataFrame({
+            "Annual Return": mean_ret,
+            "Volatility": vol,
+            "Sharpe Ratio": sharpes
+        })
+
+        # Format hiển thị
+        st.dataframe(
+            metrics_df.style.format("{:.2%}", subset=["Annual Return", "Volatility"]).format("{:.2f}", subset=["Sharpe Ratio"])
+            .background_gradient(cmap="RdYlGn", subset=["Sharpe Ratio"]),
+            use_container_width=True
+        )
+        st.caption("💡 **Insight:** Thuật toán sẽ dồn tỷ trọng vào các mã có **Sharpe Ratio** cao (Màu xanh) và hạn chế các mã có Sharpe thấp hoặc âm (Màu đỏ).")
+
+
+def render_walk_forward(df, rf_rate):
+    """Backtest walk-forward: tối ưu lại trên cửa sổ trượt, equity curve out-of-sample so với Equal Weight."""
+    st.markdown("---")
+    st.markdown("#### 🔁 Walk-Forward Backtest (Out-of-Sample)")
+    st.caption("Tối ưu lại định kỳ trên cửa sổ ước lượng trượt (warm start từ trọng số kỳ trước), giữ danh mục đến kỳ rebalance sau.")
+
+    with st.container(border=True):
+        c1, c2, c3, c4 = st.columns(4)
+        with c1:
+            method = st.selectbox("Strategy", list(WALK_FORWARD_METHODS), format_func=WALK_FORWARD_METHODS.get)
+        with c2:
+            window_label = st.selectbox("Estimation Window", list(ESTIMATION_WINDOWS), index=1)
+        with c3:
+            rebalance_label = st.selectbox("Rebalance", list(REBALANCE_FREQUENCIES), index=1)
+        with c4:
+            cost_bps = st.number_input("Cost (bps / turnover)", 0.0, 100.0, 10.0, step=5.0)
+        run_bt = st.button("▶️ Run Backtest")
+
+    params = (dataset_fingerprint(df), method, window_label, rebalance_label, cost_bps, rf_rate)
+    if run_bt:
+        returns = get_portfolio_returns(df)
+        window = ESTIMATION_WINDOWS[window_label]
+        with st.spinner("Walking forward..."):
+            result = walk_forward(returns, method, window=window, rebalance=REBALANCE_FREQUENCIES[rebalance_label],
+                                  risk_free_rate=rf_rate, cost_bps=cost_bps) if returns is not None else None
+        if result is None:
+            available = 0 if returns is None else len(returns)
+            st.warning(f"Not enough history: need more than {window} common sessions, have {available}. Load a longer date range or use a shorter window.")
+            return
+        # Lưu kết quả để các nút khác trên trang (rerun) không làm mất backtest
+        st.session_state.walk_forward_result = (params, result)
+
+    stored = st.session_state.get("walk_forward_result")
+    if stored is None or stored[0] != params:
+        st.info("Choose a strategy and click 'Run Backtest'. Needs more history than the estimation window.")
+        return
+    result = stored[1]
+
+    equity = result["equity"]
+    fig = go.Figure()
+    for name, color in zip(equity.columns, ['#F0B90B', '#848E9C']):
+        fig.add_trace(go.Scatter(x=equity.index, y=equity[name], mode='lines', name=name, line=dict(width=2, color=color)))
+    fig.update_layout(
+        template='plotly_dark',
+        title="Out-of-Sample Equity Curve",
+        height=400,
+        margin=dict(l=10, r=10, t=40, b=10),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01)
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(
+        result["metrics"].style.format("{:.2%}", subset=["Total Return", "Annual Return", "Annual Volatility", "Max Drawdown", "Avg Turnover", "Annual Turnover"])
+        .format("{:.2f}", subset=["Sharpe Ratio", "Sortino Ratio"])
+        .format("{:.0f}", subset=["Rebalances"]),
+        use_container_width=True
+    )
+
+    col_w, col_t = st.columns([2, 1])
+    with col_w:
+        # Trọng số mục tiêu tại từng ngày rebalance
+        weights = result["weights"]
+        fig_w = go.Figure()
+        for ticker in weights.columns:
+            fig_w.add_trace(go.Scatter(x=weights.index, y=weights[ticker], mode='lines', stackgroup='weights', name=ticker, line=dict(width=0.5)))
+        fig_w.update_layout(
+            template='plotly_dark',
+            title="Target Weights at Each Rebalance",
+            height=350,
+            margin=dict(l=10, r=10, t=40, b=10),
+            yaxis_tickformat='.0%',
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)'
+        )
+        st.plotly_chart(fig_w, use_container_width=True)
+    with col_t:
+        turnover = result["turnover"].iloc[1:]
+        fig_t = go.Figure(go.Bar(x=turnover.index, y=turnover, marker_color='#3B82F6', name='Turnover'))
+        fig_t.update_layout(
+            template='plotly_dark',
+            title="Turnover per Rebalance",
+            height=350,
+            margin=dict(l=10, r=10, t=40, b=10),
+            yaxis_tickformat='.0%',
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)'
+        )
+        st.plotly_chart(fig_t, use_container_width=True)
+
+
+def load_scenario_history(tickers):
+    """Giá đóng cửa ngày từ HISTORY_START đến nay của watchlist + mã proxy nhân tố (qua dataset cache dùng chung)."""
+    start, end = HISTORY_START, str(date.today())
+    symbols = list(dict.fromkeys(list(tickers) + list(FACTOR_PROXIES.values())))
+    handle = get_dataset_cache().load(symbols, start, end, "1d",
+                                      fetch_fn=lambda missing: get_fetch_service().fetch(missing, start, end, "1d"))
+    if handle is None:
+        return None
+    # Giữ handle trong session -> lịch sử dài không bị LRU evict giữa các lần rerun
+    st.session_state.scenario_history_handle = handle
+    return get_field_panel(handle.frame, 'Close')
+
+
+def stress_portfolios(df, rf_rate, num_random=1000):
+    """Danh mục đem stress: Equal Weight, ERC, HRP, Max Sharpe / Min Vol và `num_random` danh mục ngẫu nhiên của frontier."""
+    tickers = list(get_field_panel(df, 'Close').columns)
+    named = {"Equal Weight": dict.fromkeys(tickers, 1.0 / len(tickers))}
+    for label, method in (("Equal Risk Contribution", "erc"), ("Hierarchical Risk Parity", "hrp")):
+        alloc = allocate_portfolio(df, method=method, risk_free_rate=rf_rate)
+        if alloc is not None:
+            named[label] = alloc["weights"]
+    frontier = optimize_portfolio(df, num_portfolios=num_random, risk_free_rate=rf_rate)
+    if frontier is not None:
+        named["Max Sharpe"] = frontier["max_sharpe"]["weights"]
+        named["Min Volatility"] = frontier["min_vol"]["weights"]
+    return pd.DataFrame(named).T.fillna(0.0), frontier
+
+
+def render_stress_test(df, rf_rate):
+    """Stress test: giai đoạn lịch sử + cú sốc nhân tố + mọi cửa sổ trượt, áp lên nhiều danh mục bằng 1 phép nhân ma trận."""
+    st.markdown("---")
+    st.markdown("#### 🧨 Stress Scenarios (Historical & Hypothetical)")
+    st.caption("Lỗ của từng danh mục (buy & hold) nếu lặp lại các giai đoạn lịch sử, các cú sốc nhân tố giả định, "
+               "và mọi cửa sổ 1 / 5 / 21 phiên trong lịch sử. Mã chưa niêm yết trong giai đoạn -> proxy qua beta nhân tố.")
+
+    with st.container(border=True):
+        c1, c2 = st.columns([3, 1])
+        with c1:
+            # Cú sốc giả định (%), ô trống = nhân tố di chuyển theo tương quan với nhân tố bị sốc; thêm dòng để tự định nghĩa
+            default_shocks = pd.DataFrame([{"Scenario": name, **{f: shock.get(f, np.nan) * 100 for f in FACTOR_PROXIES}}
+                                           for name, shock in FACTOR_SHOCKS.items()])
+            edited = st.data_editor(default_shocks, num_rows="dynamic", hide_index=True, use_container_width=True,
+                                    key="stress_shocks",
+                                    column_config={f: st.column_config.NumberColumn(f"{f} ({t}) %", format="%.1f")
+                                                   for f, t in FACTOR_PROXIES.items()})
+        with c2:
+            horizons = st.multiselect("Rolling Windows (sessions)", ROLLING_HORIZONS, default=list(ROLLING_HORIZONS))
+            num_random = st.select_slider("Frontier Portfolios", options=[250, 1000, 2500], value=1000)
+            run_stress = st.button("🧨 Run Stress Test")
+
+    shocks = {}
+    for row in edited.to_dict("records"):
+        name = str(row.get("Scenario") or "").strip()
+        values = {f: row[f] / 100 for f in FACTOR_PROXIES if pd.notna(row.get(f))}
+        if name and values:
+            shocks[name] = values
+
+    params = (dataset_fingerprint(df), tuple(sorted((k, tuple(sorted(v.items()))) for k, v in shocks.items())),
+              tuple(horizons), num_random, rf_rate)
+    if run_stress:
+        tickers = list(get_field_panel(df, 'Close').columns)
+        with st.spinner("Loading scenario history & factor proxies..."):
+            close = load_scenario_history(tickers)
+        assets = [t for t in tickers if close is not None and t in close.columns]
+        if len(assets) < 2:
+            st.warning("Need daily history for at least 2 watchlist tickers to run scenarios.")
+            return
+        with st.spinner("Building scenarios & stressing portfolios..."):
+            t0 = time.perf_counter()
+            built = build_scenarios(close, assets, shocks=shocks, horizons=horizons)
+            weights, frontier = stress_portfolios(df, rf_rate, num_random)
+            weights = weights.reindex(columns=assets).fillna(0.0)
+            scenarios = built["scenarios"]
+            pnl = scenario_pnl(scenarios, weights)
+            summary = stress_summary(scenarios, weights)
+            # Lợi nhuận kỳ vọng (năm) của các danh mục có tên - cùng thước đo với frontier (mean log return × 252)
+            returns = get_portfolio_returns(df)
+            named_return = weights @ (returns.mean() * 252).reindex(assets).fillna(0.0)
+            frontier_summary = None
+            if frontier is not None:
+                random_weights = pd.DataFrame(frontier["weights"], columns=tickers).reindex(columns=assets).fillna(0.0)
+                frontier_summary = stress_summary(scenarios, random_weights).assign(**{"Exp. Return": frontier["results"][0]})
+            elapsed = time.perf_counter() - t0
+        st.session_state.stress_result = (params, {
+            "built": built, "weights": weights, "pnl": pnl, "summary": summary,
+            "frontier": frontier_summary, "named_return": named_return, "elapsed": elapsed,
+        })
+
+    stored = st.session_state.get("stress_result")
+    if stored is None or stored[0] != params:
+        st.info("Edit the factor shocks if needed and click 'Run Stress Test'. Loads daily history since 2008 for the watchlist and factor proxies.")
+        return
+    result = stored[1]
+    built, scenarios = result["built"], result["built"]["scenarios"]
+
+    counts = scenarios.groupby(level="Kind").size()
+    n_portfolios = len(result["weights"]) + (len(result["frontier"]) if result["frontier"] is not None else 0)
+    st.caption(f"{len(scenarios):,} scenarios ({', '.join(f'{n:,} {k.lower()}' for k, n in counts.items())}) × "
+               f"{n_portfolios:,} portfolios in {result['elapsed']:.2f}s | Factors: {', '.join(built['factors']) or 'none loaded'}")
+    if (built["proxied"] > 0).any():
+        st.caption("Proxied via factor betas: " + "; ".join(f"{name} ({n} tickers)" for name, n in built["proxied"].items() if n > 0))
+
+    st.dataframe(
+        result["summary"].style.format("{:.2%}", subset=["Worst Loss", "Tail Mean (5%)"])
+        .background_gradient(cmap="RdYlGn", subset=["Worst Loss", "Tail Mean (5%)"]),
+        use_container_width=True
+    )
+
+    portfolio = st.radio("Portfolio", list(result["weights"].index), horizontal=True, key="stress_portfolio")
+    col_rank, col_contrib = st.columns([1, 1])
+    with col_rank:
+        ranked = loss_table(result["pnl"], portfolio, top=15)
+        st.dataframe(ranked.style.format("{:.2%}", subset=["Return"]), use_container_width=True, height=420)
+    with col_contrib:
+        options = list(zip(ranked["Kind"], ranked["Scenario"]))
+        choice = st.selectbox("Scenario", options, format_func=lambda key: f"{key[1]} ({key[0]})", key="stress_scenario")
+        contrib = loss_contributions(scenarios, result["weights"].loc[portfolio], choice)
+        fig = go.Figure(go.Bar(x=contrib.values, y=contrib.index, orientation='h',
+                               marker_color=np.where(contrib.values < 0, '#F6465D', '#0ECB81')))
+        fig.update_layout(
+            template='plotly_dark',
+            title=f"Contribution to P&L: {result['pnl'].loc[choice, portfolio]:.2%}",
+            height=380,
+            margin=dict(l=10, r=10, t=40, b=10),
+            xaxis_tickformat='.1%',
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)'
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    if result["frontier"] is not None:
+        # Mỗi danh mục ngẫu nhiên: lợi nhuận kỳ vọng vs lỗ kịch bản tệ nhất
+        frontier = result["frontier"]
+        fig_f = go.Figure()
+        fig_f.add_trace(go.Scattergl(x=frontier["Worst Loss"], y=frontier["Exp. Return"], mode='markers', name='Random Portfolios',
+                                     marker=dict(color=frontier["Tail Mean (5%)"], colorscale='RdYlGn', size=5,
+                                                 colorbar=dict(title="Tail Mean"))))
+        named = result["summary"]
+        fig_f.add_trace(go.Scatter(x=named["Worst Loss"], y=result["named_return"], mode='markers+text', name='Named Portfolios',
+                                   text=named.index, textposition='top center',
+                                   marker=dict(color='#F0B90B', size=12, symbol='diamond')))
+        fig_f.update_layout(
+            template='plotly_dark',
+            title="Stress Frontier: Expected Return vs Worst Scenario Loss",
+            xaxis_title="Worst Scenario Loss",
+            yaxis_title="Annualized Return",
+            xaxis_tickformat='.0%',
+            yaxis_tickformat='.0%',
+            height=420,
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)'
+        )
+        st.plotly_chart(fig_f, use_container_width=True)
+
+    with st.expander("📚 Scenario Library: Asset Moves", expanded=False):
+        library = scenarios.drop(index=KIND_ROLLING, level="Kind", errors="ignore")
+        st.dataframe(library.style.format("{:.1%}").background_gradient(cmap="RdYlGn", axis=None),
+                     use_container_width=True)
+
@@ -4,10 +4,18 @@ import streamlit as st
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
-import scipy.stats as stats
-from src.quant_engine import calculate_advanced_metrics, calculate_log_returns
+import time
+from src.quant_engine import (BENCHMARK_METRICS, calculate_advanced_metrics, calculate_benchmark_table,
+                              calculate_drawdown_report, calculate_log_returns, calculate_return_distribution)
+from src.data_loader import split_by_ticker, base_interval
+from src.dataset_cache import get_dataset_cache
+from src.fetch_service import get_fetch_service
+from src.snapshots import get_snapshot_store
 from src.utils import render_metric_card
 
+ROLLING_WINDOWS = {"1M (21)": 21, "3M (63)": 63, "6M (126)": 126, "1Y (252)": 252}
+BENCHMARK_RETRY_SECONDS = 300  # benchmark tải lỗi -> không tải lại trong mỗi lần rerun trước thời hạn này
+
 def get_single_ticker_df(df, ticker):
     """Trích xuất DataFrame chuẩn cho 1 ticker."""
     try:
@@ -26,6 +34,40 @@ def get_single_ticker_df(df, ticker):
     except:
         return None
 
+def load_benchmark_prices(df, benchmark):
+    """
+    Chuỗi giá benchmark: lấy trong watchlist nếu có, không thì tải qua dataset cache / fetch service
+    với cùng khoảng thời gian & interval của dataset đang xem (cùng base interval -> cùng cách gộp nến
+    với watchlist). None nếu không có dữ liệu; lỗi được nhớ trong session BENCHMARK_RETRY_SECONDS giây.
+    """
+    frames = split_by_ticker(df, [benchmark])
+    if benchmark not in frames:
+        dataset = st.session_state.get("dataset")
+        if dataset is None:
+            return None
+        s, e, interval = dataset.start_date, dataset.end_date, dataset.interval
+        failures = st.session_state.setdefault("benchmark_failures", {})
+        failure_key = (benchmark, s, e, interval)
+        if time.monotonic() - failures.get(failure_key, -np.inf) < BENCHMARK_RETRY_SECONDS:
+            return None
+        fetch_interval = base_interval(interval, s, e)
+        handle = get_dataset_cache().load([benchmark], s, e, interval,
+                                          fetch_fn=lambda missing: get_fetch_service().fetch(missing, s, e, fetch_interval),
+                                          base_interval=fetch_interval)
+        if handle is None:
+            failures[failure_key] = time.monotonic()
+            return None
+        failures.pop(failure_key, None)
+        # Giữ handle trong session -> panel benchmark không bị LRU evict giữa các lần rerun
+        st.session_state.benchmark_handle = handle
+        frames = split_by_ticker(handle.frame, [benchmark])
+    frame = frames.get(benchmark)
+    if frame is None:
+        return None
+    col = 'Adj Close' if 'Adj Close' in frame.columns else 'Close'
+    prices = frame[col].dropna()
+    return prices if len(prices) > 2 else None
+
 def render_risk_analysis(df, tickers):
     st.markdown(f"### 🛡️ Risk Analysis (CFA Mode)")
     st.caption("Deep-dive portfolio risk metrics: Sharpe, Sortino, Drawdown & Value-at-Risk.")
@@ -36,8 +78,14 @@ def render_risk_analysis(df, tickers):
 
     # --- 1. GLOBAL SETTINGS ---
     with st.expander("⚙️ Risk Parameters (Global)", expanded=True):
-        rf_input = st.slider("Risk-Free Rate (Annual %)", 0.0, 10.0, 4.0, step=0.1)
-        rf_rate = rf_input / 100
+        c1, c2, c3 = st.columns([2, 1, 1])
+        with c1:
+            rf_input = st.slider("Risk-Free Rate (Annual %)", 0.0, 10.0, 4.0, step=0.1)
+            rf_rate = rf_input / 100
+        with c2:
+            benchmark = st.text_input("Benchmark", value="SPY", help="Mã benchmark cho Beta / Alpha / Tracking Error (VD: SPY, QQQ, BTC-USD).").strip().upper()
+        with c3:
+            window_label = st.selectbox("Rolling Window", list(ROLLING_WINDOWS), index=1)
 
     # --- 2. TABS RENDERING ---
     if not tickers:
@@ -46,26 +94,33 @@ def render_risk_analysis(df, tickers):
 
     tabs = st.tabs(tickers)
 
+    # Snapshot tính sẵn sau lần load (nếu hợp lệ) -> mở trang không cần tính lại từ giá
+    snapshot = get_snapshot_store().get(df)
+    # Episode drawdown của cả watchlist: 1 lượt vector hóa, cache theo fingerprint
+    dd_summary, dd_episodes = calculate_drawdown_report(df)
+
     for i, ticker in enumerate(tickers):
         with tabs[i]:
             st.subheader(f"Risk Profile: {ticker}")
-            
-            # 1. Trích xuất dữ liệu riêng (Đã bao gồm dropna)
-            single_df = get_single_ticker_df(df, ticker)
-            
-            if single_df is None or len(single_df) < 30:
-                st.warning(f"Not enough data for {ticker}. Need at least 30 data points (excluding weekends).")
-                continue
 
-            # 2. Tính toán Metrics
-            metrics = calculate_advanced_metrics(single_df, risk_free_rate=rf_rate)
-            
-            # Lấy Log returns
-            col_name = 'Adj Close' if 'Adj Close' in single_df.columns else 'Close'
-            log_returns = calculate_log_returns(single_df, col_name)
-            
-            # --- FIX BỔ SUNG: Đảm bảo log_returns không còn NaN (double check) ---
-            log_returns = log_returns.dropna()
+            cached = snapshot.risk(ticker, rf_rate) if snapshot is not None else None
+            if cached is not None:
+                metrics, distribution = cached
+            else:
+                # 1. Trích xuất dữ liệu riêng (Đã bao gồm dropna)
+                single_df = get_single_ticker_df(df, ticker)
+
+                if single_df is None or len(single_df) < 30:
+                    st.warning(f"Not enough data for {ticker}. Need at least 30 data points (excluding weekends).")
+                    continue
+
+                # 2. Tính toán Metrics
+                metrics = calculate_advanced_metrics(single_df, risk_free_rate=rf_rate)
+
+                # Lấy Log returns -> histogram + moments (bin sẵn ở server)
+                col_name = 'Adj Close' if 'Adj Close' in single_df.columns else 'Close'
+                log_returns = calculate_log_returns(single_df, col_name)
+                distribution = calculate_return_distribution(log_returns)
 
             # 3. Hiển thị UI (Card có khung)
             c1, c2, c3, c4 = st.columns(4)
@@ -99,8 +154,12 @@ def render_risk_analysis(df, tickers):
 
             with col_chart1:
                 dd_series = metrics["Drawdown Series"]
+                ticker_episodes = dd_episodes[dd_episodes["Ticker"] == ticker].nsmallest(5, "Depth")
                 fig_dd = go.Figure()
                 fig_dd.add_trace(go.Scatter(x=dd_series.index, y=dd_series, mode='lines', fill='tozeroy', name='Drawdown', line=dict(color='#F6465D', width=1), fillcolor='rgba(246, 70, 93, 0.2)'))
+                # Đáy của 5 episode sâu nhất
+                fig_dd.add_trace(go.Scatter(x=ticker_episodes["Trough"], y=ticker_episodes["Depth"], mode='markers', name='Worst Troughs',
+                                            marker=dict(color='#F0B90B', size=8, symbol='triangle-down')))
                 fig_dd.update_layout(
                     template='plotly_dark',
                     height=350,
@@ -114,13 +173,9 @@ def render_risk_analysis(df, tickers):
 
             with col_chart2:
                 fig_dist = go.Figure()
-                fig_dist.add_trace(go.Histogram(x=log_returns, histnorm='probability density', name='Actual Returns', marker_color='#3B82F6', opacity=0.6, nbinsx=50))
-                
-                if len(log_returns) > 1:
-                    x_range = np.linspace(min(log_returns), max(log_returns), 100)
-                    mu, std = np.mean(log_returns), np.std(log_returns)
-                    pdf = stats.norm.pdf(x_range, mu, std)
-                    fig_dist.add_trace(go.Scatter(x=x_range, y=pdf, mode='lines', name='Normal Distribution', line=dict(color='#F6465D', dash='dash', width=2)))
+                if distribution is not None:
+                    fig_dist.add_trace(go.Bar(x=distribution["bin_centers"], y=distribution["density"], width=distribution["bin_width"], name='Actual Returns', marker_color='#3B82F6', opacity=0.6))
+                    fig_dist.add_trace(go.Scatter(x=distribution["pdf_x"], y=distribution["pdf_y"], mode='lines', name='Normal Distribution', line=dict(color='#F6465D', dash='dash', width=2)))
                 
                 fig_dist.update_layout(
                     template='plotly_dark',
@@ -134,18 +189,108 @@ def render_risk_analysis(df, tickers):
                 st.plotly_chart(fig_dist, use_container_width=True)
             
             # 5. Quant Insight Box (Fix lỗi nan)
-            try:
-                skew = stats.skew(log_returns)
-                kurt = stats.kurtosis(log_returns)
-                
-                # Kiểm tra nếu vẫn là nan (phòng hờ)
-                if np.isnan(skew) or np.isnan(kurt):
-                    insight_msg = "Insufficient data points to calculate distribution moments."
-                else:
-                    insight_msg = f"**Skewness:** {skew:.2f} (Lệch {'Phải' if skew>0 else 'Trái'}) | **Kurtosis:** {kurt:.2f} (Độ nhọn)."
-                    if kurt > 3.0:
-                        insight_msg += " Cảnh báo: **Fat Tails** (Đuôi béo) - Rủi ro sự kiện thiên nga đen cao hơn phân phối chuẩn."
-            except:
-                insight_msg = "Calculation Error."
+            if distribution is None or np.isnan(distribution["Skewness"]) or np.isnan(distribution["Excess Kurtosis"]):
+                insight_msg = "Insufficient data points to calculate distribution moments."
+            else:
+                skew, kurt = distribution["Skewness"], distribution["Excess Kurtosis"]
+                insight_msg = f"**Skewness:** {skew:.2f} (Lệch {'Phải' if skew>0 else 'Trái'}) | **Kurtosis:** {kurt:.2f} (Độ nhọn)."
+                if kurt > 3.0:
+                    insight_msg += " Cảnh báo: **Fat Tails** (Đuôi béo) - Rủi ro sự kiện thiên nga đen cao hơn phân phối chuẩn."
             
-            st.info(f"💡 **CFA Insight for {ticker}:** {insight_msg}")
\ No newline at end of file
+            st.info(f"💡 **CFA Insight for {ticker}:** {insight_msg}")
+
+            if ticker in dd_summary.index:
+                render_drawdown_episodes(ticker, dd_summary.loc[ticker], dd_episodes[dd_episodes["Ticker"] == ticker])
+
+    # --- 3. DRAWDOWN ANALYTICS (Cả watchlist) ---
+    render_drawdown_overview(dd_summary)
+
+    # --- 4. BENCHMARK-RELATIVE (CAPM) ---
+    if benchmark:
+        render_benchmark_analysis(df, tickers, benchmark, rf_rate, ROLLING_WINDOWS[window_label])
+
+
+def _days(durations):
+    # Timedelta -> số ngày (float): đọc được cho cả dữ liệu phút lẫn ngày
+    return durations.dt.total_seconds() / 86400
+
+
+def render_drawdown_episodes(ticker, summary, episodes):
+    """Calmar / Ulcer / Pain + bảng các episode peak -> trough -> recovery sâu nhất của 1 mã."""
+    with st.expander(f"📉 {ticker} Drawdown Episodes ({summary['Episodes']:,})", expanded=False):
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Calmar Ratio", f"{summary['Calmar']:.2f}", help="CAGR / |Max Drawdown|")
+        c2.metric("Ulcer Index", f"{summary['Ulcer Index']:.2%}", help="√(trung bình drawdown²): phạt cả độ sâu lẫn thời gian nằm dưới đỉnh")
+        c3.metric("Pain Index", f"{summary['Pain Index']:.2%}", help="Trung bình |drawdown| trên toàn kỳ")
+        c4.metric("Current Drawdown", f"{summary['Current Drawdown']:.2%}")
+
+        table = episodes.nsmallest(10, "Depth").drop(columns="Ticker").assign(
+            Duration=lambda t: _days(t["Duration"]), **{"Time to Recover": lambda t: _days(t["Time to Recover"])})
+        st.dataframe(
+            table.rename(columns={"Duration": "Duration (days)", "Time to Recover": "Recover (days)"}).style
+            .format("{:.2%}", subset=["Depth"])
+            .format("{:,.1f}", subset=["Duration (days)", "Recover (days)"], na_rep="ongoing")
+            .background_gradient(cmap="Reds_r", subset=["Depth"]),
+            use_container_width=True, hide_index=True
+        )
+
+
+def render_drawdown_overview(summary):
+    """Bảng so sánh drawdown của cả watchlist (sâu nhất, hiện tại, Calmar, Ulcer, Pain, số episode, dài nhất)."""
+    if summary.empty:
+        return
+    st.markdown("#### 📉 Drawdown Analytics (Watchlist)")
+    table = summary.assign(Longest=_days(summary["Longest"])).rename(columns={"Longest": "Longest (days)"})
+    st.dataframe(
+        table.style.format("{:.2%}", subset=["CAGR", "Max Drawdown", "Current Drawdown", "Ulcer Index", "Pain Index"])
+        .format("{:.2f}", subset=["Calmar"])
+        .format("{:,.0f}", subset=["Bars", "Episodes"])
+        .format("{:,.1f}", subset=["Longest (days)"])
+        .background_gradient(cmap="RdYlGn", subset=["Calmar"])
+        .background_gradient(cmap="RdYlGn_r", subset=["Ulcer Index", "Pain Index"]),
+        use_container_width=True
+    )
+
+
+def render_benchmark_analysis(df, tickers, benchmark, rf_rate, window):
+    """Beta / Alpha / Correlation / Tracking Error / IR của mọi mã so với benchmark (toàn mẫu + rolling)."""
+    st.markdown(f"#### 📐 Benchmark-Relative Analytics vs {benchmark}")
+
+    with st.spinner(f"Loading benchmark {benchmark}..."):
+        benchmark_prices = load_benchmark_prices(df, benchmark)
+    if benchmark_prices is None:
+        st.warning(f"No data for benchmark **{benchmark}** in the loaded date range.")
+        return
+
+    summary, rolling = calculate_benchmark_table(df, [t for t in tickers if t != benchmark], benchmark_prices, rf_rate, window)
+    if summary.empty:
+        st.warning(f"Not enough overlapping sessions between the watchlist and {benchmark}.")
+        return
+
+    st.dataframe(
+        summary.style.format("{:.2f}", subset=["Beta", "Correlation", "R-Squared", "Information Ratio"])
+        .format("{:.2%}", subset=["Alpha", "Tracking Error"])
+        .format("{:,.0f}", subset=["Observations"])
+        .background_gradient(cmap="RdYlGn", subset=["Alpha", "Information Ratio"]),
+        use_container_width=True
+    )
+
+    metric = st.radio("Rolling Metric", BENCHMARK_METRICS, horizontal=True)
+    fig = go.Figure()
+    for ticker, frame in rolling.items():
+        if frame is not None:
+            fig.add_trace(go.Scatter(x=frame.index, y=frame[metric], mode='lines', name=ticker, line=dict(width=1.5)))
+    if metric == "Beta":
+        fig.add_hline(y=1.0, line_dash="dash", line_color="rgba(255,255,255,0.4)")
+    fig.update_layout(
+        template='plotly_dark',
+        height=380,
+        margin=dict(l=10, r=10, t=40, b=10),
+        title=f"Rolling {metric} vs {benchmark} ({window} sessions)",
+        yaxis_tickformat='.0%' if metric in ("Alpha", "Tracking Error") else None,
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    if all(frame is None for frame in rolling.values()):
+        st.caption(f"Rolling series need at least {window} overlapping sessions.")
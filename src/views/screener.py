@@ -0,0 +1,68 @@
+# src/views/screener.py
+
+import streamlit as st
+from src.screener import get_screener, SCREEN_COLUMNS
+
+SORT_COLUMNS = ["Sharpe", "Sortino", "Return", "Volatility", "MaxDrawdown", "Skew", "Kurtosis", "VaR95", "LastPrice"]
+
+def render_screener(interval='1d'):
+    st.markdown("### 🔎 Universe Screener")
+    st.caption("Lọc & xếp hạng toàn bộ universe trong kho giá local. Chỉ tính lại các mã có dữ liệu mới.")
+
+    with st.container(border=True):
+        c1, c2, c3, c4 = st.columns([3, 1, 1, 1])
+        with c1:
+            filter_expr = st.text_input(
+                "Filter",
+                value="Bars >= 30",
+                placeholder="VD: Sharpe > 1 and MaxDrawdown > -0.3 and Volatility < 0.5",
+                help="So sánh các cột với số, ghép bằng and / or / not và ngoặc. Cột: " + ", ".join(SCREEN_COLUMNS),
+            )
+        with c2:
+            sort_by = st.selectbox("Sort by", SORT_COLUMNS)
+        with c3:
+            top_k = st.number_input("Top K", min_value=5, max_value=1000, value=50, step=5)
+        with c4:
+            ascending = st.toggle("Ascending", value=False)
+            rf_rate = st.number_input("Risk-Free (%)", 0.0, 10.0, 3.0, step=0.5) / 100
+
+        run_btn = st.button("🔎 Run Screen", type="primary")
+
+    if run_btn:
+        screener = get_screener(interval, rf_rate)
+        try:
+            with st.spinner("Screening universe..."):
+                result = screener.screen(filter_expr or None, sort_by=sort_by, ascending=ascending, top_k=top_k)
+        except ValueError as e:
+            st.error(f"Invalid filter expression: {e}")
+            return
+        except Exception as e:
+            st.error(f"Screen failed: {e}")
+            return
+        # Lưu kết quả để các nút bên dưới (rerun) vẫn hiển thị được
+        st.session_state.screen_result = (result, dict(screener.last_refresh), interval)
+
+    if 'screen_result' not in st.session_state:
+        st.info("👈 Set filters and click 'Run Screen'. Data comes from every ticker ever loaded via UPDATE (price store).")
+        return
+
+    result, info, screen_interval = st.session_state.screen_result
+    st.caption(f"Universe: **{info['universe']:,}** tickers ({screen_interval}) | Recomputed: {info['recomputed']:,} | Removed: {info['removed']:,} | {info['seconds']:.2f}s")
+
+    if result.empty:
+        st.warning("No ticker matches the filter. Load more tickers via UPDATE to grow the universe.")
+        return
+
+    st.dataframe(
+        result.style.format("{:.2%}", subset=["Return", "Volatility", "MaxDrawdown", "VaR95"])
+        .format("{:.2f}", subset=["Sharpe", "Sortino", "Skew", "Kurtosis", "LastPrice"])
+        .background_gradient(cmap="RdYlGn", subset=["Sharpe"]),
+        use_container_width=True
+    )
+
+    # Thêm nhanh kết quả vào watchlist
+    if st.button(f"➕ Add top {min(10, len(result))} to Watchlist"):
+        for ticker in result.index[:10]:
+            if ticker not in st.session_state.tickers:
+                st.session_state.tickers.append(ticker)
+        st.success("Added to watchlist. Press 🔄 UPDATE to load them.")
@@ -21,9 +21,8 @@ def plot_return_distribution(returns, ticker):
     # errors='coerce' sẽ biến chữ thành NaN
     returns = pd.to_numeric(returns, errors='coerce')
     
-    # 3. Loại bỏ dữ liệu lỗi (NaN) và Vô cực (inf)
-    returns = returns.dropna()
-    returns = returns[~returns.isin([np.inf, -np.inf])]
+    # 3. Loại bỏ NaN và inf trong 1 lần lọc (giá đã được clean_panel làm sạch lúc tải)
+    returns = returns[np.isfinite(returns)]
     # -----------------------------------------------
 
     # Kiểm tra xem còn dữ liệu để vẽ không
@@ -0,0 +1,205 @@
+# src/walk_forward.py
+
+import time
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from src.quant_engine import calculate_advanced_metrics, hrp_weights, risk_parity_weights
+
+# method -> nhãn hiển thị
+WALK_FORWARD_METHODS = {
+    "erc": "Equal Risk Contribution",
+    "hrp": "Hierarchical Risk Parity",
+    "min_vol": "Min Volatility",
+    "max_sharpe": "Max Sharpe",
+}
+
+
+class RollingCovariance:
+    """
+    Mean & covariance của cửa sổ `window` dòng cuối trước vị trí `end`, cập nhật tăng dần:
+    giữ tổng S = Σr và tích chéo P = Σrr' (đã trừ offset) -> dịch cửa sổ k dòng chỉ tốn O(k·n²)
+    thay vì tính lại O(window·n²). Tính lại từ đầu mỗi `resync_every` lần để chặn sai số cộng dồn.
+    """
+
+    def __init__(self, values, window, resync_every=64):
+        self.values = np.asarray(values, dtype=float)
+        self.window = window
+        self.resync_every = resync_every
+        # Offset lấy từ cửa sổ đầu tiên (không nhìn trước dữ liệu tương lai)
+        self.offset = self.values[:window].mean(axis=0)
+        self.end = None
+        self.updates = 0
+
+    def _resync(self, end):
+        block = self.values[end - self.window:end] - self.offset
+        self.S = block.sum(axis=0)
+        self.P = block.T @ block
+        self.updates = 0
+
+    def at(self, end):
+        """(mean, cov) theo phiên của values[end - window:end]."""
+        if end < self.window:
+            raise ValueError(f"Need at least {self.window} rows before position {end}")
+        if self.end is None or end <= self.end or end - self.end >= self.window or self.updates >= self.resync_every:
+            self._resync(end)
+        else:
+            new = self.values[self.end:end] - self.offset
+            old = self.values[self.end - self.window:end - self.window] - self.offset
+            self.S += new.sum(axis=0) - old.sum(axis=0)
+            self.P += new.T @ new - old.T @ old
+            self.updates += 1
+        self.end = end
+        w = self.window
+        mean = self.S / w + self.offset
+        cov = (self.P - np.outer(self.S, self.S) / w) / (w - 1)
+        return mean, cov
+
+
+def _mean_variance_weights(method, mean, cov, x0, risk_free_rate, max_weight):
+    # Long-only, tổng = 1, trần max_weight; SLSQP khởi động từ trọng số kỳ trước (warm start)
+    n = len(mean)
+    x0 = np.full(n, 1.0 / n) if x0 is None else x0
+    if method == "min_vol":
+        objective = lambda w: (w @ cov @ w, 2 * cov @ w)
+    else:
+        def objective(w):
+            ret, var = w @ mean - risk_free_rate, w @ cov @ w
+            std = np.sqrt(var)
+            return -ret / std, -(mean * std - ret * (cov @ w) / std) / var
+    res = minimize(objective, x0, jac=True, method="SLSQP", bounds=[(0.0, max_weight)] * n,
+                   constraints=[{"type": "eq", "fun": lambda w: w.sum() - 1.0, "jac": lambda w: np.ones(n)}],
+                   options={"ftol": 1e-10, "maxiter": 200})
+    w = np.clip(res.x, 0.0, None)
+    return w / w.sum()
+
+
+def solve_weights(method, mean, cov, x0=None, risk_free_rate=0.03, max_weight=1.0):
+    """Trọng số mục tiêu cho 1 lần rebalance từ mean/cov (năm hóa). x0: trọng số kỳ trước (warm start)."""
+    if method == "erc":
+        return risk_parity_weights(cov, x0=x0)
+    if method == "hrp":
+        return hrp_weights(cov)
+    if method in ("min_vol", "max_sharpe"):
+        return _mean_variance_weights(method, mean, cov, x0, risk_free_rate, max_weight)
+    raise ValueError(f"Unknown walk-forward method: {method}")
+
+
+def _hold(simple_returns, weights):
+    # Giữ nguyên số lượng trong kỳ (trọng số trôi theo giá): (returns danh mục từng phiên, trọng số cuối kỳ)
+    growth = np.cumprod(1.0 + simple_returns, axis=0)
+    value = growth @ weights
+    daily = value / np.concatenate([[1.0], value[:-1]]) - 1.0
+    drifted = weights * growth[-1] / value[-1]
+    return daily, drifted
+
+
+def _performance(returns, turnover, risk_free_rate, periods=252):
+    equity = (1.0 + returns).cumprod()
+    advanced = calculate_advanced_metrics(pd.DataFrame({"Close": pd.concat([pd.Series([1.0]), equity], ignore_index=True)}),
+                                          risk_free_rate=risk_free_rate)
+    years = len(returns) / periods
+    return {
+        "Total Return": float(equity.iloc[-1] - 1.0),
+        "Annual Return": float(returns.mean() * periods),
+        "Annual Volatility": float(advanced["Annualized Volatility"]),
+        "Sharpe Ratio": float(advanced["Sharpe Ratio"]),
+        "Sortino Ratio": float(advanced["Sortino Ratio"]),
+        "Max Drawdown": float(advanced["Max Drawdown"]),
+        # Lần rebalance đầu là mua từ tiền mặt -> không tính vào turnover
+        "Avg Turnover": float(turnover[1:].mean()) if len(turnover) > 1 else 0.0,
+        "Annual Turnover": float(turnover[1:].sum() / years) if years > 0 else 0.0,
+        "Rebalances": len(turnover),
+    }
+
+
+def walk_forward(returns, method="erc", window=252, rebalance=21, risk_free_rate=0.03, cost_bps=0.0,
+                 max_weight=1.0, warm_start=True, periods=252):
+    """
+    Backtest walk-forward: tại mỗi ngày rebalance (cách nhau `rebalance` phiên), ước lượng mean/cov
+    trên `window` phiên TRƯỚC đó (RollingCovariance tăng dần), giải trọng số (warm start từ kỳ trước),
+    giữ danh mục đến lần rebalance sau -> equity curve hoàn toàn out-of-sample.
+    returns: DataFrame log returns (time × tickers, không NaN) - VD get_portfolio_returns(df).
+    Trả về dict (equity, weights, turnover, metrics) hoặc None nếu không đủ dữ liệu.
+    """
+    values = returns.to_numpy(dtype=float)
+    T, n = values.shape
+    if n < 2 or T <= window + 1:
+        return None
+    simple = np.expm1(values)
+    cost = cost_bps / 10_000
+    estimator = RollingCovariance(values, window)
+
+    strategy_ret = np.empty(T - window)
+    equal_ret = np.empty(T - window)
+    starts = list(range(window, T, rebalance))
+    weight_rows = np.empty((len(starts), n))
+    turnover = np.empty(len(starts))
+    equal_turnover = np.empty(len(starts))
+    prev = drifted = equal_drifted = None
+    equal = np.full(n, 1.0 / n)
+
+    for k, start in enumerate(starts):
+        end = min(start + rebalance, T)
+        mean, cov = estimator.at(start)
+        w = solve_weights(method, mean * periods, cov * periods, x0=prev if warm_start else None,
+                          risk_free_rate=risk_free_rate, max_weight=max_weight)
+        # Turnover 1 chiều so với danh mục đã trôi giá (lần đầu: mua toàn bộ từ tiền mặt)
+        turnover[k] = 0.5 * np.abs(w - drifted).sum() if drifted is not None else 1.0
+        daily, drifted = _hold(simple[start:end], w)
+        daily[0] = (1 + daily[0]) * (1 - turnover[k] * cost) - 1
+        strategy_ret[start - window:end - window] = daily
+
+        # Benchmark Equal Weight (rebalance cùng lịch, cùng chi phí)
+        equal_turnover[k] = 0.5 * np.abs(equal - equal_drifted).sum() if equal_drifted is not None else 1.0
+        daily, equal_drifted = _hold(simple[start:end], equal)
+        daily[0] = (1 + daily[0]) * (1 - equal_turnover[k] * cost) - 1
+        equal_ret[start - window:end - window] = daily
+
+        weight_rows[k] = w
+        prev = w
+
+    index = returns.index[window:]
+    rebalance_dates = returns.index[starts]
+    label = WALK_FORWARD_METHODS.get(method, method)
+    daily_returns = pd.DataFrame({label: strategy_ret, "Equal Weight": equal_ret}, index=index)
+    turnover = pd.Series(turnover, index=rebalance_dates, name="Turnover")
+
+    # Equity bắt đầu = 1 tại phiên cuối của cửa sổ ước lượng đầu tiên
+    equity = pd.concat([pd.DataFrame({label: [1.0], "Equal Weight": [1.0]}, index=returns.index[window - 1:window]),
+                        (1.0 + daily_returns).cumprod()])
+    metrics = pd.DataFrame({
+        label: _performance(daily_returns[label], turnover, risk_free_rate, periods),
+        "Equal Weight": _performance(daily_returns["Equal Weight"], equal_turnover, risk_free_rate, periods),
+    }).T
+    return {
+        "equity": equity,
+        "returns": daily_returns,
+        "weights": pd.DataFrame(weight_rows, index=rebalance_dates, columns=returns.columns),
+        "turnover": turnover,
+        "metrics": metrics,
+    }
+
+
+# Benchmark: python -m src.walk_forward (10 năm daily × 50 mã, rebalance tháng; kiểm tra đúng sai ở tests/test_walk_forward.py)
+if __name__ == "__main__":
+    rng = np.random.default_rng(11)
+    T, n = 2520, 50
+    # Returns có cấu trúc nhân tố (1 nhân tố thị trường + 5 ngành) để covariance giống thực tế
+    market = rng.normal(0.0003, 0.01, T)
+    sectors = rng.normal(0, 0.006, (T, 5))
+    loadings = rng.uniform(0.5, 1.5, n)
+    sector_of = np.arange(n) % 5
+    log_returns = market[:, None] * loadings + sectors[:, sector_of] + rng.normal(0.0002, 0.012, (T, n))
+    returns = pd.DataFrame(log_returns, index=pd.bdate_range("2015-01-01", periods=T),
+                           columns=[f"A{i:02d}" for i in range(n)])
+
+    walk_forward(returns, "erc", window=252, rebalance=21)  # làm nóng import / BLAS
+    for method in WALK_FORWARD_METHODS:
+        for warm in ((True, False) if method != "hrp" else (None,)):
+            t0 = time.perf_counter()
+            res = walk_forward(returns, method, window=252, rebalance=21, cost_bps=10, warm_start=bool(warm))
+            elapsed = time.perf_counter() - t0
+            m = res["metrics"].iloc[0]
+            print(f"{method:>10} ({'n/a' if warm is None else 'warm' if warm else 'cold'}) | {elapsed:5.2f}s | {int(m['Rebalances'])} rebalances | "
+                  f"Sharpe {m['Sharpe Ratio']:5.2f} | MaxDD {m['Max Drawdown']:7.2%} | Avg turnover {m['Avg Turnover']:6.2%}")
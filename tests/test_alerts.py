@@ -0,0 +1,28 @@
+# tests/test_alerts.py
+
+import numpy as np
+import pandas as pd
+from src.alerts import AlertEngine
+
+
+def _panel(tickers, n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    log_ret = rng.standard_t(3, (n, len(tickers))) * 0.03
+    return pd.DataFrame(100 * np.exp(np.cumsum(log_ret, axis=0)), columns=tickers,
+                        index=pd.date_range("2024-03-01", periods=n, freq="D", tz="UTC"))
+
+
+def test_overlapping_watchlist_only_warms_up_new_tickers():
+    sent = []
+    engine = AlertEngine("drawdown < -10%; zscore(20) < -2; cross(5, 20)", notifiers=[sent.extend])
+    history = _panel(["AAPL", "MSFT", "TSLA"])
+    assert engine.ingest_refresh(history[["AAPL", "MSFT"]]) == []  # lần đầu: chỉ warm-up
+
+    # Watchlist mới chồng lên watchlist cũ: lịch sử TSLA không được báo như cảnh báo mới
+    assert engine.ingest_refresh(history[["AAPL", "TSLA"]]) == []
+    assert sent == [] and set(engine.tickers) == {"AAPL", "MSFT", "TSLA"}
+
+    # Bar tiếp theo: mã đang theo dõi báo bình thường
+    crash = pd.DataFrame({"AAPL": [1.0], "TSLA": [1.0]}, index=[history.index[-1] + pd.Timedelta(days=1)])
+    events = engine.ingest_refresh(crash)
+    assert {e["ticker"] for e in events} == {"AAPL", "TSLA"} and sent == events
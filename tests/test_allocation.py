@@ -0,0 +1,38 @@
+# tests/test_allocation.py
+
+import numpy as np
+from src.quant_engine import hrp_weights, risk_contributions, risk_parity_weights
+
+
+def _random_cov(n=12, seed=4):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.01, (500, 3)) @ rng.normal(0, 1, (3, n)) + rng.normal(0, 0.01, (500, n))
+    return np.cov(returns, rowvar=False) * 252
+
+
+def test_erc_equalizes_risk_contributions():
+    cov = _random_cov()
+    weights = risk_parity_weights(cov)
+    assert np.isclose(weights.sum(), 1.0) and np.all(weights > 0)
+    np.testing.assert_allclose(risk_contributions(weights, cov), np.full(len(cov), 1 / len(cov)), atol=1e-8)
+
+
+def test_risk_budgets_and_warm_start():
+    cov = _random_cov()
+    budgets = np.linspace(1, 3, len(cov))
+    weights = risk_parity_weights(cov, budgets=budgets)
+    np.testing.assert_allclose(risk_contributions(weights, cov), budgets / budgets.sum(), atol=1e-8)
+    np.testing.assert_allclose(risk_parity_weights(cov, budgets=budgets, x0=weights), weights, atol=1e-10)
+
+
+def test_diagonal_covariance_gives_inverse_vol_erc_and_inverse_variance_hrp():
+    variances = np.array([0.04, 0.09, 0.01, 0.16, 0.25])
+    cov = np.diag(variances)
+    inv_vol = 1 / np.sqrt(variances)
+    np.testing.assert_allclose(risk_parity_weights(cov), inv_vol / inv_vol.sum(), atol=1e-10)
+    np.testing.assert_allclose(hrp_weights(cov), (1 / variances) / (1 / variances).sum(), atol=1e-12)
+
+
+def test_hrp_weights_are_a_long_only_allocation():
+    weights = hrp_weights(_random_cov(n=20, seed=9))
+    assert np.isclose(weights.sum(), 1.0) and np.all(weights > 0)
@@ -0,0 +1,38 @@
+# tests/test_benchmark.py
+
+import numpy as np
+import pandas as pd
+from src.quant_engine import align_to_benchmark
+
+
+def _prices(index, seed=1):
+    return pd.Series(100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.01, len(index)))), index=index)
+
+
+def test_intraday_different_timezones_align_on_same_instant():
+    utc = pd.date_range("2024-03-04 14:30", periods=200, freq="h", tz="UTC")
+    bench = _prices(utc)
+    asset = pd.Series(bench.to_numpy(), index=utc.tz_convert("America/New_York"))  # cùng giá, cùng thời điểm
+    asset_ret, bench_ret = align_to_benchmark(asset, bench)
+    assert len(asset_ret) == len(utc) - 1
+    np.testing.assert_allclose(asset_ret.to_numpy(), bench_ret.to_numpy())
+    assert str(asset_ret.index.tz) == "America/New_York"
+
+
+def test_naive_intraday_is_treated_as_utc():
+    utc = pd.date_range("2024-03-04 14:30", periods=50, freq="h", tz="UTC")
+    bench = _prices(utc)
+    asset_ret, bench_ret = align_to_benchmark(pd.Series(bench.to_numpy(), index=utc.tz_localize(None)), bench)
+    np.testing.assert_allclose(asset_ret.to_numpy(), bench_ret.to_numpy())
+
+
+def test_daily_bars_align_by_calendar_date_across_timezones():
+    days = pd.date_range("2024-01-01", periods=60, freq="D")
+    bench = _prices(days.tz_localize("America/New_York")).loc[lambda s: s.index.dayofweek < 5]  # benchmark cổ phiếu
+    crypto = _prices(days.tz_localize("UTC"), seed=2)  # crypto 7 ngày / tuần, nến 0h UTC
+    asset_ret, bench_ret = align_to_benchmark(crypto, bench)
+    assert len(asset_ret) == len(bench) - 1
+    # Thứ 2 so với thứ 6: return crypto gộp cả cuối tuần
+    monday = asset_ret.index[asset_ret.index.dayofweek == 0][0]
+    friday = monday - pd.Timedelta(days=3)
+    assert np.isclose(asset_ret[monday], crypto[monday] / crypto[friday] - 1)
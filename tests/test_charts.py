@@ -0,0 +1,48 @@
+# tests/test_charts.py
+
+import numpy as np
+from src.charts import cached_figure, candle_buckets, merge_candles, minmax_indices, volume_colors
+
+
+def test_minmax_downsampling_keeps_extremes_of_every_bucket():
+    rng = np.random.default_rng(3)
+    values = np.cumsum(rng.normal(0, 1, 10_000))
+    values[::37] = np.nan
+    keep = minmax_indices(values, 500)
+    assert len(keep) <= 500 and np.all(np.diff(keep) > 0)
+    assert not np.isnan(values[keep]).any()
+    assert values[keep].max() == np.nanmax(values) and values[keep].min() == np.nanmin(values)
+    # Từng bucket: min và max đều được giữ
+    valid = np.flatnonzero(~np.isnan(values))
+    bounds = np.linspace(0, len(valid), 251).astype(np.int64)
+    kept = set(keep)
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        bucket = valid[lo:hi]
+        assert bucket[np.argmin(values[bucket])] in kept and bucket[np.argmax(values[bucket])] in kept
+    # Ít điểm hơn budget -> giữ mọi điểm hợp lệ
+    np.testing.assert_array_equal(minmax_indices(values[:100], 500), np.flatnonzero(~np.isnan(values[:100])))
+
+
+def test_merged_candles_match_a_per_group_loop():
+    rng = np.random.default_rng(5)
+    n = 1003
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    open_ = close + rng.normal(0, 0.5, n)
+    high, low = np.maximum(open_, close) + 0.3, np.minimum(open_, close) - 0.3
+    volume = rng.integers(1, 1000, n).astype(float)
+    volume[10] = np.nan
+    assert candle_buckets(100, 200) is None
+    starts = candle_buckets(n, 100)
+    o, h, l, c, v = merge_candles(open_, high, low, close, volume, starts)
+    for i, (lo, hi) in enumerate(zip(starts, np.r_[starts[1:], n])):
+        assert (o[i], h[i], l[i], c[i]) == (open_[lo], high[lo:hi].max(), low[lo:hi].min(), close[hi - 1])
+        assert np.isclose(v[i], np.nansum(volume[lo:hi]))
+
+
+def test_volume_colors_and_figure_cache():
+    open_, close = np.array([1.0, 2.0, 3.0]), np.array([2.0, 1.0, 3.0])
+    assert list(volume_colors(open_, close)) == ['#0ECB81' if o < c else '#F6465D' for o, c in zip(open_, close)]
+    built = []
+    build = lambda: built.append(1) or object()
+    assert cached_figure(("test-charts",), build) is cached_figure(("test-charts",), build)
+    assert len(built) == 1
@@ -0,0 +1,78 @@
+# tests/test_data_loader.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.data_loader import combine_ticker_frames, compact_panel, resample_ohlcv
+
+
+def _mixed_calendar_frames():
+    days = pd.date_range("2024-01-01", periods=14, freq="D")
+    stock_days = days[days.dayofweek < 5]
+    frames = {
+        "BTC-USD": pd.DataFrame({"Close": np.linspace(40_000, 41_000, len(days)), "Volume": np.arange(len(days)) + 1}, index=days),
+        "AAPL": pd.DataFrame({"Close": np.linspace(180, 190, len(stock_days)), "Volume": np.arange(len(stock_days)) + 1}, index=stock_days),
+    }
+    return frames, days[days.dayofweek >= 5]
+
+
+def test_combine_keeps_missing_volume_as_nan():
+    frames, weekend = _mixed_calendar_frames()
+    panel = combine_ticker_frames(frames, ["BTC-USD", "AAPL"])
+    assert panel[("AAPL", "Volume")].loc[weekend].isna().all()
+    assert panel[("BTC-USD", "Volume")].notna().all()
+
+
+def test_compact_panel_keeps_volume_int_with_zero_for_missing_bars():
+    frames, weekend = _mixed_calendar_frames()
+    panel = compact_panel(combine_ticker_frames(frames, ["BTC-USD", "AAPL"]), ["BTC-USD", "AAPL"])
+    assert panel[("AAPL", "Volume")].dtype == "int64"
+    assert (panel[("AAPL", "Volume")].loc[weekend] == 0).all()
+
+
+def _intraday_5m(days=5, seed=0):
+    # Phiên Mỹ 9:30-16:00 giờ New York, nến 5m
+    index = pd.date_range("2024-03-04", periods=days * 288, freq="5min", tz="America/New_York")
+    minutes = index.hour * 60 + index.minute
+    index = index[(index.dayofweek < 5) & (minutes >= 570) & (minutes < 960)]
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.2, len(index)))
+    return pd.DataFrame({"Open": close + rng.normal(0, 0.05, len(index)), "High": close + 0.3, "Low": close - 0.3,
+                         "Close": close, "Volume": rng.integers(1, 1_000, len(index)).astype(float)}, index=index)
+
+
+def _pandas_resample(frame, rule, **kwargs):
+    agg = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+    resampled = frame.resample(rule, **kwargs)
+    return resampled.agg(agg)[resampled.size() > 0]
+
+
+@pytest.mark.parametrize("interval, rule", [("30m", "30min"), ("1h", "1h")])
+def test_resample_intraday_matches_pandas(interval, rule):
+    frame = _intraday_5m()
+    # Nến 1h neo theo giờ mở cửa 9:30 như Yahoo
+    expected = _pandas_resample(frame, rule, offset="30min" if interval == "1h" else None)
+    result = resample_ohlcv(frame, interval)
+    assert result.index.equals(expected.index)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy())
+
+
+def test_resample_daily_to_weekly_matches_pandas():
+    index = pd.bdate_range("2024-01-01", periods=60, name="Date")
+    close = 100 + np.cumsum(np.random.default_rng(1).normal(size=60))
+    frame = pd.DataFrame({"Open": close, "High": close + 1, "Low": close - 1, "Close": close, "Volume": 10.0}, index=index)
+    expected = _pandas_resample(frame, "W-MON", label="left", closed="left")
+    result = resample_ohlcv(frame, "1wk")
+    assert result.index.equals(expected.index)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy())
+
+
+def test_resample_first_and_last_skip_nan_bars():
+    frame = _intraday_5m(days=2)
+    frame.iloc[::6, frame.columns.get_loc("Open")] = np.nan  # nến đầu mỗi bucket 30m thiếu Open
+    frame.iloc[5::6, frame.columns.get_loc("Close")] = np.nan  # nến cuối thiếu Close
+    frame.iloc[6:12, frame.columns.get_loc("Open")] = np.nan  # cả bucket thiếu Open -> NaN
+    result = resample_ohlcv(frame, "30m")
+    expected = _pandas_resample(frame, "30min")
+    assert result["Open"].notna().sum() == len(result) - 1
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), equal_nan=True)
@@ -0,0 +1,42 @@
+# tests/test_data_quality.py
+
+import numpy as np
+import pandas as pd
+from src.data_loader import clean_panel
+
+
+def _series(ticker, crash_at=200, n=400, seed=5):
+    """OHLCV giả lập 1 mã: giá giảm đúng 50% ở phiên crash_at, volume x3 từ đó (trông y hệt split 2:1)."""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2022-03-14", periods=n, freq="D" if ticker.endswith("-USD") else "B")
+    log_ret = rng.normal(0, 0.01, n)
+    log_ret[crash_at] = np.log(0.5)
+    close = 20000 * np.exp(np.cumsum(log_ret))
+    volume = np.where(np.arange(n) >= crash_at, 3_000_000, 1_000_000).astype("int64")
+    return pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                         "Volume": volume}, index=index)
+
+
+def test_real_crash_is_not_rewritten_as_split():
+    raw = _series("BTC-USD")
+    cleaned, report = clean_panel(raw, ["BTC-USD"])
+    np.testing.assert_allclose(cleaned["Close"].to_numpy(), raw["Close"].to_numpy())
+    assert report.loc["BTC-USD", "Split candidates"] == 1
+    assert report.loc["BTC-USD", "Outliers"] >= 1  # cú sập vẫn được ghi nhận
+    assert "adjusted" not in report.loc["BTC-USD", "Split details"]
+
+
+def test_stock_crash_is_only_flagged_by_default():
+    raw = _series("AAPL")
+    cleaned, report = clean_panel(raw, ["AAPL"])
+    np.testing.assert_allclose(cleaned["Close"].to_numpy(), raw["Close"].to_numpy())
+    assert report.loc["AAPL", "Split candidates"] == 1
+
+
+def test_adjust_splits_opt_in_never_touches_crypto():
+    for ticker, should_adjust in (("AAPL", True), ("BTC-USD", False)):
+        raw = _series(ticker)
+        cleaned, report = clean_panel(raw, [ticker], adjust_splits=True)
+        ratio = raw["Close"].iloc[0] / cleaned["Close"].iloc[0]
+        assert np.isclose(ratio, 2.0 if should_adjust else 1.0, rtol=0.06)
+        assert ("(adjusted)" in report.loc[ticker, "Split details"]) == should_adjust
@@ -0,0 +1,70 @@
+# tests/test_dataset_cache.py
+
+import numpy as np
+import pandas as pd
+from src.dataset_cache import DatasetCache
+from src.data_loader import combine_ticker_frames
+
+
+def _fetcher(calls):
+    def fetch(tickers):
+        calls.append(list(tickers))
+        index = pd.date_range("2024-01-01", periods=30, freq="D")
+        frames = {t: pd.DataFrame({"Close": np.arange(30.0) + i, "Volume": np.arange(30)}, index=index)
+                  for i, t in enumerate(tickers)}
+        return combine_ticker_frames(frames, tickers)
+    return fetch
+
+
+def _load(cache, tickers, calls):
+    return cache.load(tickers, "2024-01-01", "2024-02-01", "1d", fetch_fn=_fetcher(calls))
+
+
+def test_reordered_watchlist_shares_one_panel_but_keeps_its_column_order(monkeypatch):
+    monkeypatch.setattr("src.config.DATA_CLEANING", False)
+    monkeypatch.setattr("src.config.COMPACT_STORAGE", False)
+    cache, calls = DatasetCache(budget_bytes=10 ** 9), []
+    first = _load(cache, ["MSFT", "AAPL"], calls)
+    second = _load(cache, ["AAPL", "MSFT"], calls)
+    assert first.key == second.key
+    assert calls == [["MSFT", "AAPL"]]
+    assert cache.stats()["panel_entries"] == 1
+    assert list(first.frame.columns.get_level_values(0).unique()) == ["MSFT", "AAPL"]
+    assert list(second.frame.columns.get_level_values(0).unique()) == ["AAPL", "MSFT"]
+
+
+def test_panels_are_accounted_and_evicted_before_ticker_frames(monkeypatch):
+    monkeypatch.setattr("src.config.DATA_CLEANING", False)
+    monkeypatch.setattr("src.config.COMPACT_STORAGE", False)
+    cache, calls = DatasetCache(budget_bytes=10 ** 9), []
+    handle = _load(cache, ["AAPL", "MSFT"], calls)
+    stats = cache.stats()
+    assert stats["panel_bytes"] > 0 and stats["frame_bytes"] > 0
+    assert stats["resident_bytes"] == stats["panel_bytes"] + stats["frame_bytes"]
+
+    handle.release()
+    cache.budget_bytes = stats["frame_bytes"]  # chỉ đủ cho frame từng mã -> panel bị evict trước
+    cache._evict()
+    stats = cache.stats()
+    assert stats["panel_entries"] == 0 and stats["frame_bytes"] > 0
+    assert cache.get_frame("AAPL", "2024-01-01", "2024-02-01", "1d") is not None
+
+
+def test_reordered_frame_is_the_same_object_on_every_read(monkeypatch):
+    monkeypatch.setattr("src.config.DATA_CLEANING", False)
+    monkeypatch.setattr("src.config.COMPACT_STORAGE", False)
+    cache, calls = DatasetCache(budget_bytes=10 ** 9), []
+    handle = _load(cache, ["MSFT", "AAPL"], calls)
+    assert handle.frame is handle.frame
+    assert _load(cache, ["MSFT", "AAPL"], calls).frame is handle.frame
+
+
+def test_refresh_refetches_cached_tickers(monkeypatch):
+    monkeypatch.setattr("src.config.DATA_CLEANING", False)
+    monkeypatch.setattr("src.config.COMPACT_STORAGE", False)
+    cache, calls = DatasetCache(budget_bytes=10 ** 9), []
+    _load(cache, ["AAPL", "MSFT"], calls)
+    _load(cache, ["AAPL", "MSFT"], calls)
+    assert calls == [["AAPL", "MSFT"]]
+    cache.load(["AAPL", "MSFT"], "2024-01-01", "2024-02-01", "1d", fetch_fn=_fetcher(calls), refresh=True)
+    assert calls == [["AAPL", "MSFT"], ["AAPL", "MSFT"]]
@@ -0,0 +1,76 @@
+# tests/test_drawdown.py
+
+import numpy as np
+import pandas as pd
+from src.quant_engine import drawdown_analytics
+
+
+def _brute_force_episodes(series):
+    # Duyệt từng bar hợp lệ: (peak, trough, recovery | None, depth) theo nhãn index
+    values = series.dropna()
+    values = values[values > 0]
+    episodes, peak, start = [], -np.inf, None
+    for i, (t, v) in enumerate(values.items()):
+        if v >= peak:
+            if start is not None:
+                episodes.append((*start, t))
+                start = None
+            peak, peak_at = v, t
+        else:
+            dd = v / peak - 1
+            if start is None:
+                start = [peak_at, t, dd]
+            elif dd < start[2]:
+                start[1:] = [t, dd]
+    if start is not None:
+        episodes.append((*start, None))
+    return [(p, tr, rec, d) for p, tr, d, rec in episodes]
+
+
+def _panel(seed=8, T=400):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2022-01-01", periods=T, freq="D")
+    close = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.02, (T, 4)), axis=0)), index=index,
+                         columns=["A", "B", "C", "D"])
+    close.iloc[rng.choice(T, 40, replace=False), 1] = np.nan  # lỗ hổng giữa chuỗi
+    close.iloc[:150, 2] = np.nan  # niêm yết muộn
+    close["D"] = np.r_[np.linspace(100, 200, T // 2), np.linspace(200, 300, T - T // 2)]  # chỉ tăng
+    return close
+
+
+def test_episodes_match_brute_force():
+    close = _panel()
+    summary, episodes = drawdown_analytics(close)
+    for ticker in close.columns:
+        got = episodes[episodes["Ticker"] == ticker]
+        expected = _brute_force_episodes(close[ticker])
+        assert len(got) == len(expected) == summary.loc[ticker, "Episodes"]
+        for row, (peak, trough, recovery, depth) in zip(got.itertuples(index=False), expected):
+            assert row.Peak == peak and row.Trough == trough
+            assert np.isclose(row.Depth, depth, rtol=1e-12)
+            assert (pd.isna(row.Recovery) and row.Ongoing) if recovery is None else (row.Recovery == recovery and not row.Ongoing)
+    assert summary.loc["D", "Episodes"] == 0 and summary.loc["D", "Max Drawdown"] == 0
+
+
+def test_summary_metrics_match_direct_computation():
+    close = _panel()
+    summary, _ = drawdown_analytics(close)
+    for ticker in close.columns:
+        s = close[ticker].dropna()
+        dd = s / s.cummax() - 1
+        years = (s.index[-1] - s.index[0]).total_seconds() / (365.25 * 86400)
+        cagr = (s.iloc[-1] / s.iloc[0]) ** (1 / years) - 1
+        row = summary.loc[ticker]
+        assert row["Bars"] == len(s)
+        assert np.isclose(row["Max Drawdown"], dd.min())
+        assert np.isclose(row["Current Drawdown"], dd.iloc[-1])
+        assert np.isclose(row["Ulcer Index"], np.sqrt((dd ** 2).mean()))
+        assert np.isclose(row["Pain Index"], -dd.mean())
+        assert np.isclose(row["CAGR"], cagr)
+        if dd.min() < 0:
+            assert np.isclose(row["Calmar"], cagr / -dd.min())
+
+
+def test_empty_panel():
+    summary, episodes = drawdown_analytics(pd.DataFrame(columns=["A"], dtype=float))
+    assert list(summary.index) == ["A"] and episodes.empty
@@ -0,0 +1,50 @@
+# tests/test_factor_model.py
+
+import numpy as np
+from src.factor_model import FactorCovariance, fit_factor_model, portfolio_variance
+from src.quant_engine import risk_contributions, risk_parity_weights
+
+
+def _model(n=40, k=3, seed=3):
+    rng = np.random.default_rng(seed)
+    return FactorCovariance(rng.normal(0, 0.1, (n, k)), rng.uniform(0.01, 0.05, n)), rng
+
+
+def test_woodbury_solve_matches_dense_solve():
+    model, rng = _model()
+    dense = model.dense()
+    rhs = rng.normal(size=40)
+    np.testing.assert_allclose(model.solve(rhs), np.linalg.solve(dense, rhs), rtol=1e-10)
+    # Nhiều vế phải và dịch đường chéo (Hessian của risk parity)
+    rhs = rng.normal(size=(40, 4))
+    shift = rng.uniform(0.1, 1.0, 40)
+    np.testing.assert_allclose(model.solve(rhs, shift=shift), np.linalg.solve(dense + np.diag(shift), rhs), rtol=1e-10)
+
+
+def test_matrix_products_and_portfolio_variance_match_dense():
+    model, rng = _model()
+    dense = model.dense()
+    w = rng.dirichlet(np.ones(40))
+    W = rng.dirichlet(np.ones(40), 25)
+    np.testing.assert_allclose(model @ w, dense @ w, rtol=1e-12)
+    np.testing.assert_allclose(W @ model, W @ dense, rtol=1e-12)
+    np.testing.assert_allclose(model.diagonal(), np.diag(dense), rtol=1e-12)
+    np.testing.assert_allclose(portfolio_variance(W, model), portfolio_variance(W, dense), rtol=1e-12)
+    assert np.isclose(portfolio_variance(w, model), w @ dense @ w, rtol=1e-12)
+    np.testing.assert_allclose(model.scaled(252).dense(), dense * 252, rtol=1e-12)
+
+
+def test_erc_with_factor_covariance_matches_dense():
+    model, _ = _model(n=60)
+    w_model = risk_parity_weights(model)
+    np.testing.assert_allclose(w_model, risk_parity_weights(model.dense()), atol=1e-8)
+    np.testing.assert_allclose(risk_contributions(w_model, model), np.full(60, 1 / 60), atol=1e-8)
+
+
+def test_pca_fit_keeps_sample_variances_and_finds_true_factor_count():
+    rng = np.random.default_rng(11)
+    true_B = rng.normal(0, 0.01, (200, 4))
+    returns = rng.normal(0, 1, (500, 4)) @ true_B.T + rng.normal(0, 0.012, (500, 200))
+    model = fit_factor_model(returns)
+    assert model.n_factors == 4
+    np.testing.assert_allclose(model.diagonal(), returns.var(axis=0, ddof=1), rtol=1e-8)
@@ -0,0 +1,50 @@
+# tests/test_fetch_service.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from src.fetch_service import FetchService
+
+
+def test_none_and_empty_upstream_results_count_as_failures():
+    def upstream(ticker, start_date, end_date, interval):
+        if ticker == "BOOM":
+            raise RuntimeError("rate limited")
+        if ticker == "NONE":
+            return None  # fetch_stock_data nuốt exception -> None
+        if ticker == "EMPTY":
+            return pd.DataFrame()
+        idx = pd.date_range(start_date, periods=3, freq="D")
+        return pd.DataFrame({"Open": 1.0, "High": 1.0, "Low": 1.0, "Close": 1.0, "Volume": 10}, index=idx)
+
+    service = FetchService(upstream=upstream, max_concurrency=2)
+    try:
+        panel = service.fetch(["AAPL", "BOOM", "NONE", "EMPTY"], "2024-01-01", "2024-01-04")
+        assert list(panel.columns.get_level_values(0).unique()) == ["AAPL"]
+        assert service.stats["upstream_calls"] == 4
+        assert service.stats["failures"] == 3
+    finally:
+        service.close()
+
+
+def test_concurrent_watchlists_fetch_each_ticker_once():
+    calls = []
+
+    def upstream(ticker, start_date, end_date, interval):
+        calls.append(ticker)
+        time.sleep(0.2)
+        idx = pd.date_range(start_date, periods=5, freq="D")
+        close = np.linspace(100, 104, 5)
+        return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1000}, index=idx)
+
+    service = FetchService(upstream=upstream, max_concurrency=2)
+    watchlists = [["AAPL", "MSFT"], ["MSFT", "BTC-USD"], ["AAPL", "MSFT", "BTC-USD"]] * 5
+    try:
+        with ThreadPoolExecutor(len(watchlists)) as pool:
+            results = list(pool.map(lambda wl: service.fetch(wl, "2024-01-01", "2024-01-06"), watchlists))
+        assert sorted(calls) == ["AAPL", "BTC-USD", "MSFT"]
+        for panel, watchlist in zip(results, watchlists):
+            assert list(panel.columns.get_level_values(0).unique()) == watchlist
+    finally:
+        service.close()
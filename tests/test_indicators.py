@@ -0,0 +1,40 @@
+# tests/test_indicators.py
+
+import numpy as np
+import pandas as pd
+from src.data_loader import combine_ticker_frames, synthetic_ohlcv
+from src.quant_engine import compute_indicators
+
+
+def _panel():
+    # Cổ phiếu (nghỉ cuối tuần) + crypto (24/7) -> panel hợp có dòng NaN theo từng mã
+    tickers = ["AAPL", "BTC-USD"]
+    return combine_ticker_frames({t: synthetic_ohlcv(t, "2024-01-01", "2024-09-30", "1d") for t in tickers}, tickers)
+
+
+def test_indicators_match_pandas_per_ticker_on_valid_bars():
+    df = _panel()
+    out = compute_indicators(df)
+    for ticker in ("AAPL", "BTC-USD"):
+        close = df[ticker]["Close"].dropna()
+        at = lambda name: out[name][ticker].loc[close.index]
+        np.testing.assert_allclose(at("SMA20"), close.rolling(20).mean(), rtol=1e-9)
+        np.testing.assert_allclose(at("SMA50"), close.rolling(50).mean(), rtol=1e-9)
+        np.testing.assert_allclose(at("EMA20"), close.ewm(span=20, adjust=False).mean(), rtol=1e-9)
+        np.testing.assert_allclose(at("BB Upper") - at("BB Middle"), 2 * close.rolling(20).std(), rtol=1e-6)
+        macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+        np.testing.assert_allclose(at("MACD"), macd, rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(at("MACD Signal"), macd.ewm(span=9, adjust=False).mean(), rtol=1e-9, atol=1e-12)
+        delta = close.diff()
+        gain = delta.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+        loss = (-delta).clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+        np.testing.assert_allclose(at("RSI14").iloc[1:], (100 - 100 / (1 + gain / loss)).iloc[1:], rtol=1e-9)
+        # Dòng không giao dịch của mã -> NaN
+        gaps = df[ticker]["Close"].isna()
+        assert out["SMA20"][ticker][gaps].isna().all()
+
+
+def test_indicator_results_are_cached_per_data_and_parameters():
+    df = _panel()
+    assert compute_indicators(df) is compute_indicators(df.copy())
+    assert compute_indicators(df, sma_windows=(10,)) is not compute_indicators(df)
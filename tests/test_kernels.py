@@ -0,0 +1,88 @@
+# tests/test_kernels.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from src import kernels
+
+
+def _prices(n=3_000, tickers=6, seed=7):
+    rng = np.random.default_rng(seed)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n, tickers)), axis=0))
+    prices[::97, 3] = np.nan
+    prices[500:520, 1] = np.nan
+    return prices
+
+
+def _exact_moments(x, window):
+    # 2-pass từng cửa sổ (chuẩn để so), NaN ở đầu chuỗi như pandas
+    windows = np.lib.stride_tricks.sliding_window_view(x, window, axis=0)
+    head = np.full((window - 1,) + x.shape[1:], np.nan)
+    mean = np.concatenate([head, windows.mean(axis=-1)])
+    std = np.concatenate([head, windows.std(axis=-1, ddof=1)]) if window > 1 else np.full(x.shape, np.nan)
+    return mean, std
+
+
+@pytest.mark.parametrize("window", [1, 5, 20, 50, 300])
+def test_rolling_moments_numpy_matches_exact_two_pass(window):
+    prices = _prices()
+    mean, std = kernels._rolling_moments_numpy(prices, window)
+    exact_mean, exact_std = _exact_moments(prices, window)
+    np.testing.assert_allclose(mean, exact_mean, rtol=1e-12, equal_nan=True)
+    np.testing.assert_allclose(std, exact_std, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("n", [5, 19, 20, 21, 275, 276, 277])
+def test_rolling_moments_numpy_edge_lengths_1d(n):
+    x = np.random.default_rng(n).normal(0, 1, n)
+    mean, std = kernels._rolling_moments_numpy(x, 20)
+    expected = pd.Series(x).rolling(20)
+    np.testing.assert_allclose(mean, expected.mean().to_numpy(), rtol=1e-12, equal_nan=True)
+    np.testing.assert_allclose(std, expected.std().to_numpy(), rtol=1e-9, equal_nan=True)
+    assert mean.shape == x.shape
+
+
+def test_rolling_moments_constant_window_has_zero_std():
+    _, std = kernels._rolling_moments_numpy(np.full(100, 5.0), 10)
+    assert np.all(std[9:] == 0.0)
+
+
+@pytest.mark.skipif(not kernels.NUMBA_AVAILABLE, reason="numba not installed")
+def test_numba_kernels_match_numpy_reference():
+    rng = np.random.default_rng(42)
+    prices = _prices()
+    factors = np.exp(rng.normal(0.0003, 0.02, (252, 200)))
+    rets = rng.normal(0.0005, 0.02, 5_000)
+    spark = rng.normal(0, 1, 5_000)
+    spark[::13] = np.nan
+
+    cases = [
+        (kernels._gbm_paths_numpy(100.0, factors), kernels._gbm_paths_numba(100.0, factors)),
+        (kernels._drawdown_numpy(rets), kernels._drawdown_numba(rets)),
+        (kernels._rolling_moments_numpy(prices, 50), kernels._rolling_moments_numba(prices, 50)),
+        (kernels._ewma_numpy(prices, 2 / 21), kernels._ewma_numba(prices, 2 / 21)),
+        (kernels._sparkline_points_numpy(spark, 200.0, 50.0), kernels._sparkline_points_numba(spark, 200.0, 50.0)),
+    ]
+    for ref, out in cases:
+        ref_t = ref if isinstance(ref, tuple) else (ref,)
+        out_t = out if isinstance(out, tuple) else (out,)
+        for a, b in zip(ref_t, out_t):
+            np.testing.assert_allclose(a, b, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_ewma_numpy_matches_pandas_and_skips_nan_rows():
+    prices = _prices()
+    alpha = 2 / 21
+    out = kernels._ewma_numpy(prices, alpha)
+    dense = pd.DataFrame(prices[:, [0, 2]]).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    np.testing.assert_allclose(out[:, [0, 2]], dense, rtol=1e-12)
+
+    # Cột có NaN: trạng thái giữ nguyên qua dòng NaN, output NaN tại đó
+    col = prices[:, 1]
+    expected, state = np.full(len(col), np.nan), np.nan
+    for t, v in enumerate(col):
+        if np.isfinite(v):
+            state = v if np.isnan(state) else alpha * v + (1 - alpha) * state
+            expected[t] = state
+    np.testing.assert_allclose(out[:, 1], expected, rtol=1e-12, equal_nan=True)
+    assert np.isnan(kernels._ewma_numpy(np.full(5, np.nan), alpha)).all()
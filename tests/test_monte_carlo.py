@@ -0,0 +1,129 @@
+# tests/test_monte_carlo.py
+
+import os
+import signal
+import time
+import numpy as np
+import pandas as pd
+from src import monte_carlo
+from src.monte_carlo import get_process_pool, simulate_parallel
+
+RESULT_KEYS = ("mean_path", "prob_up", "var_95", "cvar_95", "drawdown_hist", "sample_paths")
+
+
+def _prices():
+    return pd.Series(100 * np.exp(np.cumsum(np.random.default_rng(7).normal(0.0004, 0.02, 500))))
+
+
+def _assert_identical(a, b):
+    for key in RESULT_KEYS:
+        assert np.array_equal(a[key], b[key]), key
+    for q in a["bands"]:
+        assert np.array_equal(a["bands"][q], b["bands"][q])
+
+
+def test_parallel_results_are_bit_identical_across_worker_counts():
+    reference = simulate_parallel(_prices(), 21, 25_000, workers=1, chunk_size=5_000, seed=11)
+    for workers in (2, 3):
+        _assert_identical(simulate_parallel(_prices(), 21, 25_000, workers=workers, chunk_size=5_000, seed=11), reference)
+
+
+def test_pool_recovers_after_a_worker_is_killed():
+    reference = simulate_parallel(_prices(), 21, 20_000, workers=1, chunk_size=5_000, seed=3)
+    pool = get_process_pool(2)
+    os.kill(next(iter(pool._processes)), signal.SIGKILL)
+    deadline = time.monotonic() + 10
+    while not pool._broken and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert pool._broken
+
+    _assert_identical(simulate_parallel(_prices(), 21, 20_000, workers=2, chunk_size=5_000, seed=3), reference)
+    assert get_process_pool(2) is not pool
+
+
+def test_falls_back_to_in_process_run_when_pool_keeps_breaking(monkeypatch):
+    class BrokenPool:
+        def submit(self, *args, **kwargs):
+            raise monte_carlo.BrokenProcessPool("worker died")
+
+    monkeypatch.setattr(monte_carlo, "get_process_pool", lambda workers: BrokenPool())
+    reference = simulate_parallel(_prices(), 21, 10_000, workers=1, chunk_size=5_000, seed=5)
+    _assert_identical(simulate_parallel(_prices(), 21, 10_000, workers=2, chunk_size=5_000, seed=5), reference)
+
+
+def _paths(sims=20_000, steps=60, seed=3):
+    last_price, drift, std_dev = monte_carlo.estimate_gbm_params(_prices())
+    rng = np.random.default_rng(seed)
+    return monte_carlo.gbm_paths(last_price, np.exp(drift + std_dev * rng.standard_normal((steps + 1, sims))))
+
+
+def test_single_chunk_aggregation_is_exact():
+    paths = _paths()
+    result = monte_carlo.aggregate_paths(paths)
+    curr = paths[0, 0]
+    var = np.percentile(paths, 5, axis=1)
+    cvar = np.array([row[row <= v].mean() for row, v in zip(paths, var)])
+    np.testing.assert_allclose(result["var_95"], var / curr - 1, rtol=1e-12)
+    np.testing.assert_allclose(result["cvar_95"], cvar / curr - 1, rtol=1e-12)
+    np.testing.assert_allclose(result["bands"][95], np.percentile(paths, 95, axis=1), rtol=1e-12)
+    np.testing.assert_allclose(result["mean_path"], paths.mean(axis=1), rtol=1e-12)
+    np.testing.assert_allclose(result["prob_up"], (paths > curr).mean(axis=1) * 100)
+    assert (result["drawdown_hist"].sum(axis=1) == paths.shape[1]).all()
+
+
+def test_chunked_aggregation_counts_exact_and_quantiles_approximate():
+    paths = _paths()
+    full = monte_carlo.aggregate_paths(paths)
+    agg = monte_carlo.MonteCarloAggregator(float(paths[0, 0]), paths.shape[0] - 1)
+    for chunk in np.array_split(paths, 4, axis=1):
+        agg.update(chunk)
+    chunked = agg.result()
+    # Đếm / cộng dồn chính xác, histogram drawdown cộng đúng
+    np.testing.assert_allclose(chunked["prob_up"], full["prob_up"])
+    np.testing.assert_allclose(chunked["mean_path"], full["mean_path"], rtol=1e-12)
+    np.testing.assert_array_equal(chunked["drawdown_hist"], full["drawdown_hist"])
+    # Phân vị / CVaR gộp theo chunk: xấp xỉ (lệch < 1% tương đối)
+    np.testing.assert_allclose(chunked["var_95"][1:], full["var_95"][1:], rtol=0.01)
+    np.testing.assert_allclose(chunked["cvar_95"][1:], full["cvar_95"][1:], rtol=0.01)
+
+
+def test_streaming_is_reproducible_for_a_seed():
+    a = monte_carlo.simulate_streaming(_prices(), 30, 12_000, chunk_size=3_000, seed=9)
+    b = monte_carlo.simulate_streaming(_prices(), 30, 12_000, chunk_size=3_000, seed=9)
+    _assert_identical(a, b)
+    assert a["simulations"] == 12_000 and a["sample_paths"].shape == (31, 50)
+
+
+def test_horizon_summary_matches_a_direct_run_at_that_horizon():
+    paths = _paths(steps=60)
+    summary = monte_carlo.horizon_summary(monte_carlo.aggregate_paths(paths), 21)
+    short = monte_carlo.aggregate_paths(paths[:22])
+    curr = paths[0, 0]
+    assert summary["days"] == 21 and summary["mean_path"].shape == (22,)
+    assert summary["mean_price"] == paths[21].mean()
+    assert summary["bull_case"] == np.percentile(paths[21], 95)
+    assert summary["bear_case"] == np.percentile(paths[21], 5)
+    assert summary["var_95"] == np.percentile(paths[21], 5) / curr - 1
+    # Max drawdown tính đến ngày 21 không phụ thuộc các ngày sau
+    max_dd = np.min(paths[:22] / np.maximum.accumulate(paths[:22], axis=0), axis=0) - 1
+    counts = summary["max_drawdown"]["counts"]
+    np.testing.assert_array_equal(counts, short["drawdown_hist"][21])
+    np.testing.assert_array_equal(counts, np.histogram(max_dd, bins=monte_carlo.DRAWDOWN_BINS)[0])
+    # Kỳ hạn vượt số bước mô phỏng -> kẹp về bước cuối
+    assert monte_carlo.horizon_summary(monte_carlo.aggregate_paths(paths), 500)["days"] == 60
+
+
+def test_term_structure_rows_match_direct_computation():
+    paths = _paths(steps=60)
+    table = monte_carlo.term_structure(monte_carlo.aggregate_paths(paths))
+    curr = paths[0, 0]
+    assert list(table.index) == [1, 5, 10, 21]
+    for h, row in table.iterrows():
+        final = paths[h]
+        var = np.percentile(final, 5)
+        assert np.isclose(row["Expected Return"], final.mean() / curr - 1, rtol=1e-12)
+        assert np.isclose(row["VaR 95%"], var / curr - 1, rtol=1e-12)
+        assert np.isclose(row["CVaR 95%"], final[final <= var].mean() / curr - 1, rtol=1e-12)
+        assert np.isclose(row["Prob. of Profit"], (final > curr).mean())
+        assert np.isclose(row["Bull (95%)"], np.percentile(final, 95) / curr - 1, rtol=1e-12)
+        assert row["VaR 95%"] >= row["CVaR 95%"]
@@ -0,0 +1,82 @@
+# tests/test_scenarios.py
+
+import numpy as np
+import pandas as pd
+from src.scenarios import (build_scenarios, conditional_factor_moves, event_returns, factor_model, historical_scenarios,
+                           scenario_pnl, stress_summary)
+
+
+def _scenarios(n_scen=300, n_assets=8, seed=5):
+    rng = np.random.default_rng(seed)
+    index = pd.MultiIndex.from_tuples([("Rolling Window", f"s{i}") for i in range(n_scen)], names=["Kind", "Scenario"])
+    return pd.DataFrame(rng.normal(-0.02, 0.08, (n_scen, n_assets)), index=index,
+                        columns=[f"A{i}" for i in range(n_assets)])
+
+
+def test_scenario_pnl_matches_per_scenario_dot_products():
+    scen = _scenarios()
+    W = pd.DataFrame(np.random.default_rng(1).dirichlet(np.ones(8), 5), columns=scen.columns)
+    pnl = scenario_pnl(scen, W)
+    expected = [[float(np.dot(scen.iloc[s], W.iloc[p])) for p in range(5)] for s in range(len(scen))]
+    np.testing.assert_allclose(pnl.to_numpy(), expected, rtol=1e-12)
+    # dict danh mục: mã không nắm giữ -> tỷ trọng 0
+    by_name = scenario_pnl(scen, {"AB": {"A0": 0.5, "A1": 0.5}})
+    np.testing.assert_allclose(by_name["AB"], 0.5 * (scen["A0"] + scen["A1"]))
+
+
+def test_stress_summary_matches_brute_force_across_blocks():
+    scen = _scenarios()
+    W = np.random.default_rng(2).dirichlet(np.ones(8), 37)
+    summary = stress_summary(scen, W, tail=0.05, block=10)
+    pnl = scen.to_numpy() @ W.T
+    n_tail = int(np.ceil(0.05 * len(scen)))
+    np.testing.assert_allclose(summary["Worst Loss"], pnl.min(axis=0))
+    np.testing.assert_allclose(summary["Tail Mean (5%)"], np.sort(pnl, axis=0)[:n_tail].mean(axis=0))
+    assert list(summary["Worst Scenario"]) == [f"s{i}" for i in pnl.argmin(axis=0)]
+
+
+def test_conditional_moves_keep_shocks_and_follow_regression():
+    cov = pd.DataFrame([[1e-4, 6e-5], [6e-5, 4e-4]], index=["Equities", "Crypto"], columns=["Equities", "Crypto"])
+    moves = conditional_factor_moves({"Equities": -0.2}, cov)
+    assert moves["Equities"] == -0.2
+    assert np.isclose(moves["Crypto"], -0.2 * 6e-5 / 1e-4)
+    assert (conditional_factor_moves({}, cov) == 0).all()
+
+
+def test_event_returns_use_last_close_before_start():
+    close = pd.DataFrame({"A": [100.0, 110.0, 99.0, 121.0], "B": [np.nan, np.nan, 50.0, 55.0]},
+                         index=pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"]))
+    moves = event_returns(close, "2024-01-03", "2024-01-04")
+    assert np.isclose(moves["A"], 121 / 110 - 1)
+    assert np.isnan(moves["B"])
+
+
+def test_missing_history_is_proxied_with_recovered_betas():
+    rng = np.random.default_rng(5)
+    T = 1500
+    f = rng.multivariate_normal([0, 0], [[1e-4, 6e-5], [6e-5, 4e-4]], T)
+    true_betas = np.array([[1.2, 0.0], [0.5, 0.8]])
+    assets = f @ true_betas.T + rng.normal(0, 2e-3, (T, 2))
+    close = pd.DataFrame(100 * np.cumprod(1 + np.column_stack([assets, f]), axis=0),
+                         index=pd.bdate_range("2015-01-01", periods=T), columns=["X", "Y", "SPY", "BTC-USD"])
+    close.loc[:"2017-06-30", "Y"] = np.nan
+    events = {"Early": ("2016-03-01", "2016-03-31"), "Late": ("2019-03-01", "2019-03-29")}
+    factors = {"Equities": "SPY", "Crypto": "BTC-USD"}
+
+    out = build_scenarios(close, ["X", "Y"], shocks={"Equities −20%": {"Equities": -0.2}},
+                          factors=factors, horizons=(1, 5), beta_window=1000)
+    np.testing.assert_allclose(out["betas"].to_numpy(), true_betas, atol=0.05)
+    assert (out["scenarios"].loc[("Factor Shock", "Equities −20%")] < 0).all()
+    # Rolling window chỉ trên lịch sử chung của X và Y
+    assert len(out["scenarios"].loc["Rolling Window"]) == 2 * close["Y"].notna().sum() - 6
+
+    daily = close.pct_change().dropna()
+    model = factor_model(daily[["X", "Y"]], daily[["SPY", "BTC-USD"]].set_axis(list(factors), axis=1), window=1000)
+    table, proxied = historical_scenarios(close, ["X", "Y"], factors, model, events=events)
+    assert proxied.to_dict() == {"Early": 1, "Late": 0}
+    assert table.notna().all().all()
+    assert table.loc["Late", "Y"] == event_returns(close, *events["Late"])["Y"]
+    # Mã bị proxy = beta · di chuyển nhân tố quan sát được trong giai đoạn
+    early = event_returns(close, *events["Early"])
+    expected = model[0].loc["Y"] @ conditional_factor_moves({f: early[t] for f, t in factors.items()}, model[1])
+    assert np.isclose(table.loc["Early", "Y"], expected)
@@ -0,0 +1,47 @@
+# tests/test_scheduler.py
+
+import time
+from src import scheduler
+from src.data_loader import combine_ticker_frames, synthetic_ohlcv
+from src.scheduler import RefreshScheduler, parse_watchlists
+
+
+def test_parse_watchlists():
+    assert parse_watchlists(" aapl, MSFT ,aapl@1d; BTC-USD@1h ;;@1d") == [(("AAPL", "MSFT"), "1d"), (("BTC-USD",), "1h")]
+    assert parse_watchlists("SPY") == [(("SPY",), "1d")]
+    assert parse_watchlists(None) == []
+
+
+def test_failed_refresh_backs_off_exponentially_with_cap():
+    calls = []
+    sched = RefreshScheduler(watchlists=[(("NOPE",), "1d")], interval_seconds=400, max_backoff=250,
+                             fetch_fn=lambda tickers, s, e, interval, on_result: calls.append(tickers))
+    job = sched.jobs[0]
+    delays = []
+    for _ in range(3):
+        before = time.time()
+        sched._run_job(job)
+        delays.append(job.next_run - before)
+    assert len(calls) == 3 and job.failures == 3 and job.last_error
+    # interval/4 * 2^(n-1): 100, 200, rồi chạm trần 250
+    assert [round(d, -1) for d in delays] == [100, 200, 250]
+    assert sched.status()["jobs"][0]["failures"] == 3
+
+
+def test_successful_refresh_resets_backoff_and_pins_dataset(monkeypatch, tmp_path):
+    monkeypatch.setattr("src.config.PRICE_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(scheduler, "ingest_refresh", lambda close, interval: [])
+    built = []
+    monkeypatch.setattr(scheduler, "get_snapshot_store", lambda: type("Store", (), {"build": lambda self, df, t: built.append(t)})())
+
+    def fetch(tickers, s, e, interval, on_result):
+        return combine_ticker_frames({t: synthetic_ohlcv(t, s, e, interval) for t in tickers}, list(tickers))
+
+    sched = RefreshScheduler(watchlists=[(("SCHEDTEST",), "1d")], interval_seconds=60, fetch_fn=fetch)
+    job = sched.jobs[0]
+    job.failures = 2
+    sched._run_job(job)
+    assert job.failures == 0 and job.last_error is None and job.handle is not None
+    assert 55 < job.next_run - time.time() <= 60
+    assert built == [["SCHEDTEST"]]
+    assert (tmp_path / "1d" / "SCHEDTEST.parquet").exists()
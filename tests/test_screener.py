@@ -0,0 +1,41 @@
+# tests/test_screener.py
+
+import pandas as pd
+import pytest
+from src.screener import Screener, validate_filter
+
+
+def _screener():
+    screener = Screener()
+    screener._metrics = pd.DataFrame({"LastPrice": [10.0, 20.0, 30.0], "Bars": [50, 200, 300],
+                                      "Sharpe": [0.5, 1.5, 2.5], "MaxDrawdown": [-0.5, -0.2, -0.1]},
+                                     index=["A", "B", "C"])
+    return screener
+
+
+def test_valid_filter_is_applied():
+    result = _screener().screen("(Sharpe > 1 and MaxDrawdown > -0.3) or not Bars >= 100", refresh=False)
+    assert list(result.index) == ["C", "B", "A"]
+    assert validate_filter("  Sharpe >= -1.5 & Bars < 1e3 ") == "Sharpe >= -1.5 & Bars < 1e3"
+
+
+@pytest.mark.parametrize("expr", [
+    "@__builtins__",
+    "Sharpe.__class__ > 1",
+    "__import__('os').system('true') > 0",
+    "index > 'A'",
+    "Sharpe > 'x'",
+    "Sharpe * 2 > 1",
+    "Sharpe > ",
+    "Unknown > 1",
+    "`Sharpe` > 1",
+    "Sharpe > True",
+])
+def test_unsafe_or_malformed_filters_raise_value_error(expr):
+    with pytest.raises(ValueError):
+        _screener().screen(expr, refresh=False)
+
+
+def test_unknown_sort_column_raises_value_error():
+    with pytest.raises(ValueError):
+        _screener().screen(sort_by="__class__", refresh=False)
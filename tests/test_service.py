@@ -0,0 +1,96 @@
+# tests/test_service.py
+
+import json
+import threading
+import time
+from http.client import HTTPConnection
+import pytest
+from service import AnalyticsService, MicroBatcher, make_server
+
+
+def test_micro_batcher_groups_requests_by_key_within_the_window():
+    calls = []
+
+    def handler(key, payloads):
+        calls.append((key, list(payloads)))
+        return [f"{key}:{p}" for p in payloads]
+
+    batcher = MicroBatcher(handler, window=0.2, max_batch=64)
+    futures = [batcher.submit("a", i) for i in range(3)] + [batcher.submit("b", 9)]
+    assert [f.result(timeout=5) for f in futures] == ["a:0", "a:1", "a:2", "b:9"]
+    assert sorted(calls) == [("a", [0, 1, 2]), ("b", [9])]
+    assert batcher.batches == 2 and batcher.batched_requests == 4
+
+
+def test_micro_batcher_flushes_full_batches_and_propagates_errors():
+    batcher = MicroBatcher(lambda key, payloads: [p * 2 for p in payloads], window=10, max_batch=2)
+    t0 = time.perf_counter()
+    futures = [batcher.submit("k", i) for i in range(2)]
+    assert [f.result(timeout=5) for f in futures] == [0, 2]
+    assert time.perf_counter() - t0 < 5  # đủ max_batch -> không chờ hết cửa sổ
+
+    def boom(key, payloads):
+        raise RuntimeError("upstream down")
+
+    failing = MicroBatcher(boom, window=0.01)
+    futures = [failing.submit("k", i) for i in range(2)]
+    for f in futures:
+        with pytest.raises(RuntimeError, match="upstream down"):
+            f.result(timeout=5)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr("src.config.DATA_PROVIDER", "synthetic")
+    server = make_server("127.0.0.1", 0, AnalyticsService(batch_window=5))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _request(server, method, path, body=None, raw=None):
+    conn = HTTPConnection("127.0.0.1", server.server_address[1], timeout=60)
+    data = raw if raw is not None else (json.dumps(body).encode() if body is not None else None)
+    conn.request(method, path, body=data, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    payload = response.read().decode()
+    conn.close()
+    return response.status, payload
+
+
+@pytest.mark.parametrize("path, body, status", [
+    ("/v1/stats", {"tickers": []}, 400),
+    ("/v1/stats", {"tickers": ["AAPL"], "interval": "2d"}, 400),
+    ("/v1/optimize", {"tickers": ["AAPL"]}, 400),
+    ("/v1/optimize", {"tickers": ["AAPL", "MSFT"], "method": "magic"}, 400),
+    ("/v1/monte_carlo", {"tickers": ["AAPL"], "days": 0}, 400),
+    ("/v1/series", {"tickers": ["AAPL"], "field": "Nope"}, 400),
+    ("/v1/unknown", {}, 404),
+])
+def test_error_codes(server, path, body, status):
+    code, payload = _request(server, "POST", path, body)
+    assert code == status
+    assert "error" in json.loads(payload)
+
+
+def test_malformed_bodies_and_unknown_get(server):
+    assert _request(server, "POST", "/v1/stats", raw=b"{not json")[0] == 400
+    assert _request(server, "POST", "/v1/stats", body=[1, 2])[0] == 400
+    assert _request(server, "GET", "/v1/nothing")[0] == 404
+    assert json.loads(_request(server, "GET", "/v1/health")[1])["status"] == "ok"
+
+
+def test_stats_are_cached_and_errors_are_counted(server):
+    body = {"tickers": ["AAPL", "MSFT"], "start": "2024-01-01", "end": "2024-06-30"}
+    code, first = _request(server, "POST", "/v1/stats", body)
+    assert code == 200
+    first = json.loads(first)
+    assert set(first["tickers"]) == {"AAPL", "MSFT"} and first["cache_hits"] == 0
+    second = json.loads(_request(server, "POST", "/v1/stats", body)[1])
+    assert second["cache_hits"] == 2 and second["tickers"] == first["tickers"]
+
+    _request(server, "POST", "/v1/stats", {"tickers": []})
+    metrics = json.loads(_request(server, "GET", "/v1/metrics")[1])["endpoints"]["POST /v1/stats"]
+    assert metrics["count"] == 3 and metrics["errors"] == 1 and metrics["cache_hits"] == 1
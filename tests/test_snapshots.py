@@ -0,0 +1,49 @@
+# tests/test_snapshots.py
+
+import numpy as np
+from src.data_loader import combine_ticker_frames, dataset_fingerprint, split_by_ticker, synthetic_ohlcv
+from src.quant_engine import calculate_advanced_metrics
+from src.snapshots import SNAPSHOT_VERSION, SnapshotStore, build_snapshot
+
+
+def _panel():
+    tickers = ["AAPL", "BTC-USD"]
+    return combine_ticker_frames({t: synthetic_ohlcv(t, "2023-01-01", "2024-01-01") for t in tickers}, tickers), tickers
+
+
+def test_fingerprint_follows_content_not_object():
+    df, _ = _panel()
+    assert dataset_fingerprint(df) == dataset_fingerprint(df.copy())
+    changed = df.copy()
+    changed.iloc[-1, changed.columns.get_loc(("BTC-USD", "Close"))] *= 1.001
+    assert dataset_fingerprint(changed) != dataset_fingerprint(df)
+
+
+def test_snapshot_risk_matches_live_metrics_for_any_rate():
+    df, tickers = _panel()
+    snapshot = build_snapshot(df, tickers)
+    for rf in (0.0, 0.045):
+        metrics, _ = snapshot.risk("AAPL", rf)
+        live = calculate_advanced_metrics(split_by_ticker(df, ["AAPL"])["AAPL"].dropna(), rf)
+        for key in ("Sharpe Ratio", "Sortino Ratio", "Max Drawdown", "Annualized Volatility"):
+            assert np.isclose(metrics[key], live[key], rtol=1e-9), key
+        # Index snapshot lưu datetime64[ns] -> so giá trị thời điểm, không so đơn vị
+        assert metrics["Drawdown Series"].index.equals(live["Drawdown Series"].index)
+        np.testing.assert_allclose(metrics["Drawdown Series"].to_numpy(), live["Drawdown Series"].to_numpy())
+
+
+def test_store_roundtrip_and_version_guard(tmp_path):
+    df, tickers = _panel()
+    store = SnapshotStore(directory=str(tmp_path))
+    built = store.build(df, tickers)
+    reloaded = SnapshotStore(directory=str(tmp_path)).get(df)
+    assert reloaded is not None and reloaded.fingerprint == built.fingerprint
+    assert reloaded.meta["risk"] == built.meta["risk"]
+    np.testing.assert_array_equal(reloaded.arrays["correlation"], built.arrays["correlation"])
+
+    # Bundle của version khác -> bỏ qua
+    path = store.path(built.fingerprint)
+    built.meta["version"] = SNAPSHOT_VERSION + 1
+    store.save(built)
+    assert SnapshotStore(directory=str(tmp_path)).load(built.fingerprint) is None
+    assert path == store.path(built.fingerprint)
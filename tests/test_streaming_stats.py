@@ -0,0 +1,68 @@
+# tests/test_streaming_stats.py
+
+import numpy as np
+from scipy import stats
+from src.quant_engine import calculate_var_cvar
+from src.streaming_stats import MomentsAccumulator, QuantileSketch
+
+
+def test_chunked_moments_match_numpy_scipy():
+    data = np.random.default_rng(3).standard_t(4, 50_000) * 0.02 + 0.001
+    acc = MomentsAccumulator()
+    for chunk in np.array_split(data, 37):
+        acc.update(chunk)
+    assert acc.count == len(data)
+    assert np.isclose(acc.mean, data.mean(), rtol=1e-12)
+    assert np.isclose(acc.std(), data.std(ddof=1), rtol=1e-10)
+    assert np.isclose(acc.skewness(), stats.skew(data), rtol=1e-8)
+    assert np.isclose(acc.excess_kurtosis(), stats.kurtosis(data), rtol=1e-8)
+    assert (acc.min, acc.max) == (data.min(), data.max())
+
+
+def test_merge_equals_single_pass_and_ignores_non_finite():
+    rng = np.random.default_rng(5)
+    left, right = rng.normal(1, 2, 1_000), rng.normal(-3, 0.5, 3_000)
+    merged = MomentsAccumulator.from_array(np.r_[left, np.nan, np.inf]).merge(MomentsAccumulator.from_array(right))
+    full = MomentsAccumulator.from_array(np.r_[left, right])
+    assert merged.count == full.count == 4_000
+    for field in ("mean", "m2", "m3", "m4"):
+        assert np.isclose(getattr(merged, field), getattr(full, field), rtol=1e-10)
+    assert MomentsAccumulator().merge(MomentsAccumulator()).count == 0
+    assert np.isnan(MomentsAccumulator.from_array([1.0]).std())
+
+
+def test_quantile_sketch_rank_error_and_memory_bound():
+    rng = np.random.default_rng(11)
+    data = rng.standard_t(3, 400_000)
+    sketch = QuantileSketch(k=200, seed=1)
+    for chunk in np.array_split(data, 40):
+        sketch.update(chunk)
+    ranks = np.sort(data)
+    for q in (0.01, 0.05, 0.5, 0.95):
+        # Sai số rank ~ 1/k: giá trị trả về nằm trong khoảng phân vị thực q ± 0.5%
+        rank = np.searchsorted(ranks, sketch.quantile(q)) / len(data)
+        assert abs(rank - q) < 0.005, (q, rank)
+    assert sketch.size < 4 * sketch.k
+    assert (sketch.quantile(0.0), sketch.quantile(1.0)) == (data.min(), data.max())
+
+
+def test_quantile_sketch_tail_mean_and_merge():
+    rng = np.random.default_rng(12)
+    parts = [rng.normal(0, 1, 100_000) for _ in range(4)]
+    sketches = [QuantileSketch(k=500, seed=i).update(p) for i, p in enumerate(parts)]
+    merged = sketches[0]
+    for other in sketches[1:]:
+        merged.merge(other)
+    data = np.concatenate(parts)
+    var = np.percentile(data, 5)
+    assert merged.count == len(data)
+    assert abs(merged.quantile(0.05) - var) < 0.02
+    assert abs(merged.tail_mean(0.05) - data[data <= var].mean()) < 0.03
+    assert np.isnan(QuantileSketch().quantile(0.5))
+
+
+def test_var_cvar_sketch_close_to_exact_for_chunked_input():
+    returns = np.random.default_rng(13).normal(0.0005, 0.02, 200_000)
+    exact_var, exact_cvar = calculate_var_cvar(returns)
+    var, cvar = calculate_var_cvar(iter(np.array_split(returns, 20)), method="sketch", sketch_k=500, seed=0)
+    assert abs(var - exact_var) < 5e-4 and abs(cvar - exact_cvar) < 5e-4
@@ -0,0 +1,47 @@
+# tests/test_walk_forward.py
+
+import numpy as np
+import pandas as pd
+from src.walk_forward import RollingCovariance, walk_forward
+
+
+def _returns(T=700, n=6, seed=11):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0.0003, 0.01, T)[:, None] * rng.uniform(0.5, 1.5, n) + rng.normal(0.0002, 0.012, (T, n))
+    return pd.DataFrame(values, index=pd.bdate_range("2020-01-01", periods=T), columns=[f"A{i}" for i in range(n)])
+
+
+def test_rolling_covariance_matches_direct_recompute():
+    values = _returns().to_numpy()
+    est = RollingCovariance(values, 120, resync_every=8)
+    # Bước tiến đều, nhảy xa hơn cửa sổ và lùi lại đều phải khớp tính lại trực tiếp
+    for end in [*range(120, 500, 7), 650, 300, 699]:
+        mean, cov = est.at(end)
+        window = values[end - 120:end]
+        np.testing.assert_allclose(mean, window.mean(axis=0), rtol=1e-10, atol=1e-14)
+        np.testing.assert_allclose(cov, np.cov(window, rowvar=False), rtol=1e-9, atol=1e-14)
+
+
+def test_walk_forward_is_out_of_sample_and_applies_costs():
+    returns = _returns()
+    res = walk_forward(returns, "erc", window=252, rebalance=21)
+    assert res["returns"].index[0] == returns.index[252]
+    assert list(res["turnover"].index) == list(returns.index[252::21])
+    np.testing.assert_allclose(res["weights"].sum(axis=1), 1.0)
+
+    # Trọng số kỳ đầu chỉ phụ thuộc dữ liệu trước ngày rebalance
+    future = returns.copy()
+    future.iloc[252:] *= -3
+    np.testing.assert_allclose(walk_forward(future, "erc", window=252, rebalance=21)["weights"].iloc[0],
+                               res["weights"].iloc[0])
+
+    # Lợi nhuận phiên đầu = giữ trọng số kỳ đầu; phí giao dịch trừ vào phiên rebalance
+    first = np.expm1(returns.iloc[252].to_numpy()) @ res["weights"].iloc[0].to_numpy()
+    assert np.isclose(res["returns"].iloc[0, 0], first)
+    costly = walk_forward(returns, "erc", window=252, rebalance=21, cost_bps=10)
+    assert np.isclose(costly["returns"].iloc[0, 0], (1 + first) * (1 - 10 / 10_000) - 1)
+    assert costly["equity"].iloc[-1, 0] < res["equity"].iloc[-1, 0]
+
+
+def test_walk_forward_needs_enough_rows():
+    assert walk_forward(_returns(T=200), window=252) is None